@@ -3,18 +3,51 @@ Gunicorn configuration file for BAK UP E-Voucher System
 """
 
 import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
 
 # Server socket
 bind = "127.0.0.1:5000"
 backlog = 2048
 
 # Worker processes
-workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = "sync"
-worker_connections = 1000
-timeout = 30
+# GUNICORN_WORKER_CLASS=sync (default) runs one request per process.
+# GUNICORN_WORKER_CLASS=gevent or eventlet runs many requests per process as
+# greenlets, so requests waiting on Twilio, SMTP/SendGrid or Stripe don't hold a
+# worker, and Socket.IO connections stay open cheaply. Requires the gevent (or
+# eventlet) and psycogreen packages from requirements.txt.
+# Each worker's DB pool is sized from the same setting (src/db_config.py):
+# keep workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) below Postgres max_connections,
+# or set DB_PGBOUNCER=true behind PgBouncer.
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "sync").lower()
+# Workers read it back to size their DB pool; without it the app assumes the threaded dev server
+os.environ["GUNICORN_WORKER_CLASS"] = worker_class
+ASYNC_WORKER = worker_class in ("gevent", "eventlet")
+
+if ASYNC_WORKER:
+    # One process per core; concurrency comes from greenlets, capped per worker
+    workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+    worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", "500"))
+else:
+    workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+    worker_connections = 1000
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = 30
 keepalive = 2
 
+# Application modules live in src/ (main.py imports its siblings directly)
+pythonpath = os.path.join(os.path.dirname(os.path.abspath(__file__)), "src")
+
+# Prometheus: workers write their samples to a shared directory so that
+# /api/metrics reports totals across all of them (see src/metrics.py). Must be
+# in the environment before the workers import the app.
+prometheus_dir = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "bakup-prometheus")
+)
+
 # Logging
 accesslog = "/home/bakup/bakup-clean/logs/gunicorn-access.log"
 errorlog = "/home/bakup/bakup-clean/logs/gunicorn-error.log"
@@ -35,3 +68,40 @@ tmp_upload_dir = None
 # SSL (if using Gunicorn for SSL instead of Nginx)
 # keyfile = "/path/to/keyfile"
 # certfile = "/path/to/certfile"
+
+
+# Server hooks
+def post_fork(server, worker):
+    """Make psycopg2 cooperative under green workers (before any DB connection is opened)"""
+    if not ASYNC_WORKER:
+        return
+    try:
+        if worker_class == "gevent":
+            from psycogreen.gevent import patch_psycopg
+        else:
+            from psycogreen.eventlet import patch_psycopg
+        patch_psycopg()
+    except ImportError:
+        server.log.warning("Worker %s: psycogreen/psycopg2 not installed, database calls will not yield", worker.pid)
+        return
+    server.log.info("Worker %s: psycopg2 patched for %s", worker.pid, worker_class)
+
+
+def on_starting(server):
+    """Migrate the schema, then start with an empty metrics directory so counters from a previous run don't leak in"""
+    # In a child process, so the master never opens a DB connection its workers would inherit
+    migrate = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations", "migrate.py")
+    env = {name: value for name, value in os.environ.items() if name != "PROMETHEUS_MULTIPROC_DIR"}
+    if subprocess.run([sys.executable, migrate], env=env).returncode != 0:
+        raise RuntimeError("Database migration failed; not starting workers")
+    shutil.rmtree(prometheus_dir, ignore_errors=True)
+    os.makedirs(prometheus_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    """Drop the exited worker's live gauges (Socket.IO connections, in-flight calls)"""
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
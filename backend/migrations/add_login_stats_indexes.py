@@ -0,0 +1,75 @@
+"""
+Database Migration Script: Index login statistics
+Version: 1.0.14
+
+Indexes the admin login statistics (src/login_analytics.py):
+- ix_user_login_count on user (login_count, id) and ix_user_last_login on
+  user (last_login, id), for the paginated user list
+- ix_login_session_login_time on login_session (login_time), for the daily
+  histogram (partitioned login_session tables already have it from 1.0.5)
+
+Users with no login_count are set to 0 first so they sort and paginate with
+everyone else.
+
+On PostgreSQL the user indexes are built CONCURRENTLY so logins aren't
+blocked while they build.
+
+Safe to run more than once.
+"""
+
+import os
+import sys
+from sqlalchemy import create_engine, inspect, text
+
+# Get database URL from environment
+DATABASE_URL = os.environ.get('DATABASE_URL')
+if not DATABASE_URL:
+    print("ERROR: DATABASE_URL environment variable not set")
+    sys.exit(1)
+
+# Fix postgres:// to postgresql:// for SQLAlchemy
+if DATABASE_URL.startswith('postgres://'):
+    DATABASE_URL = DATABASE_URL.replace('postgres://', 'postgresql://', 1)
+
+print(f"Connecting to database...")
+engine = create_engine(DATABASE_URL)
+
+USER_INDEXES = (
+    ('ix_user_login_count', 'login_count, id'),
+    ('ix_user_last_login', 'last_login, id'),
+)
+
+
+def run_migration():
+    print("=" * 60)
+    print("Index login statistics")
+    print("=" * 60)
+
+    try:
+        with engine.begin() as conn:
+            updated = conn.execute(text('UPDATE "user" SET login_count = 0 WHERE login_count IS NULL')).rowcount
+            print(f"✓ Set login_count to 0 for {updated} users")
+
+        # CREATE INDEX CONCURRENTLY can't run inside a transaction block
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            concurrently = 'CONCURRENTLY ' if conn.dialect.name == 'postgresql' else ''
+            for name, columns in USER_INDEXES:
+                conn.execute(text(f'CREATE INDEX {concurrently}IF NOT EXISTS {name} ON "user" ({columns})'))
+                print(f"✓ Index {name}")
+
+            existing = [index['name'] for index in inspect(conn).get_indexes('login_session')]
+            if 'ix_login_session_login_time' not in existing:
+                conn.execute(text("CREATE INDEX ix_login_session_login_time ON login_session (login_time)"))
+                print("✓ Index ix_login_session_login_time")
+            else:
+                print("⊘ ix_login_session_login_time already exists")
+        print("\n✅ Migration completed successfully!")
+        return True
+    except Exception as e:
+        print(f"\n❌ Migration failed: {str(e)}")
+        return False
+
+
+if __name__ == '__main__':
+    success = run_migration()
+    sys.exit(0 if success else 1)
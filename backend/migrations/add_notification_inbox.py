@@ -0,0 +1,84 @@
+"""
+Database Migration Script: Add notification_read and notification_inbox tables
+Version: 1.0.11
+
+Per-user read state for group notifications (src/notification_inbox.py):
+- notification_read: one row per (user, notification) the user has read
+- notification_inbox: each user's cached unread count
+- (target_group, created_at) index on notifications for the inbox query
+
+Nothing is backfilled: notifications already flagged is_read stay read for
+everyone, and each user's unread count is counted the first time they load
+their inbox.
+
+Safe to run more than once.
+"""
+
+import os
+import sys
+from sqlalchemy import create_engine, inspect, text
+
+# Get database URL from environment
+DATABASE_URL = os.environ.get('DATABASE_URL')
+if not DATABASE_URL:
+    print("ERROR: DATABASE_URL environment variable not set")
+    sys.exit(1)
+
+# Fix postgres:// to postgresql:// for SQLAlchemy
+if DATABASE_URL.startswith('postgres://'):
+    DATABASE_URL = DATABASE_URL.replace('postgres://', 'postgresql://', 1)
+
+print(f"Connecting to database...")
+engine = create_engine(DATABASE_URL)
+
+TABLES = {
+    'notification_read': """
+        CREATE TABLE notification_read (
+            user_id INTEGER NOT NULL REFERENCES "user" (id) ON DELETE CASCADE,
+            notification_id INTEGER NOT NULL REFERENCES notifications (id) ON DELETE CASCADE,
+            read_at TIMESTAMP NOT NULL,
+            PRIMARY KEY (user_id, notification_id)
+        )
+    """,
+    'notification_inbox': """
+        CREATE TABLE notification_inbox (
+            user_id INTEGER PRIMARY KEY REFERENCES "user" (id) ON DELETE CASCADE,
+            unread_count INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP
+        )
+    """,
+}
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_notifications_target_group_created ON notifications (target_group, created_at)",
+]
+
+
+def run_migration():
+    print("=" * 60)
+    print("Add notification_read and notification_inbox tables")
+    print("=" * 60)
+
+    try:
+        with engine.begin() as conn:
+            inspector = inspect(conn)
+            for table, ddl in TABLES.items():
+                if inspector.has_table(table):
+                    print(f"⊘ {table} table already exists")
+                else:
+                    conn.execute(text(ddl))
+                    print(f"✓ Created {table} table")
+
+            for statement in INDEXES:
+                conn.execute(text(statement))
+            print("✓ Index on notifications (target_group, created_at)")
+        print("\n✅ Migration completed successfully!")
+        return True
+    except Exception as e:
+        print(f"\n❌ Migration failed: {str(e)}")
+        return False
+
+
+if __name__ == '__main__':
+    success = run_migration()
+    sys.exit(0 if success else 1)
@@ -72,7 +72,10 @@ def run_migration():
                 print("✓ Table created successfully")
                 
                 print("Creating indexes...")
-                conn.execute(text(CREATE_INDEXES_SQL))
+                # One statement per execute (SQLite rejects multi-statement strings)
+                for statement in CREATE_INDEXES_SQL.split(';'):
+                    if statement.strip():
+                        conn.execute(text(statement))
                 print("✓ Indexes created successfully")
                 
                 # Commit transaction
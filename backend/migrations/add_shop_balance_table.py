@@ -0,0 +1,80 @@
+"""
+Database Migration Script: Add shop_balance table
+Version: 1.0.10
+
+Adds the per-shop running totals (src/shop_balances.py): lifetime and
+this-month redemptions, payouts reserved by pending/approved requests and
+payouts paid, so "available to pay out" is a single-row read and payout
+requests can be checked against it.
+
+Every shop is backfilled from voucher_ledger redeem entries and payout_request
+by the same reconciliation the nightly scripts/reconcile_shop_balances.py
+runs, so this needs the 1.0.9 ledger.
+
+Safe to run more than once; existing rows are corrected rather than duplicated.
+"""
+
+import os
+import sys
+from sqlalchemy import create_engine, inspect, text
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from shop_balances import reconcile_shop_balances
+
+# Get database URL from environment
+DATABASE_URL = os.environ.get('DATABASE_URL')
+if not DATABASE_URL:
+    print("ERROR: DATABASE_URL environment variable not set")
+    sys.exit(1)
+
+# Fix postgres:// to postgresql:// for SQLAlchemy
+if DATABASE_URL.startswith('postgres://'):
+    DATABASE_URL = DATABASE_URL.replace('postgres://', 'postgresql://', 1)
+
+print(f"Connecting to database...")
+engine = create_engine(DATABASE_URL)
+
+
+def create_table(conn):
+    if inspect(conn).has_table('shop_balance'):
+        print("⊘ shop_balance table already exists")
+    else:
+        conn.execute(text("""
+            CREATE TABLE shop_balance (
+                shop_id INTEGER PRIMARY KEY REFERENCES vendor_shop (id),
+                vendor_id INTEGER NOT NULL REFERENCES "user" (id),
+                redeemed_total FLOAT NOT NULL DEFAULT 0,
+                redemption_count INTEGER NOT NULL DEFAULT 0,
+                period VARCHAR(7),
+                period_redeemed FLOAT NOT NULL DEFAULT 0,
+                reserved_total FLOAT NOT NULL DEFAULT 0,
+                paid_out_total FLOAT NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP
+            )
+        """))
+        print("✓ Created shop_balance table")
+
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_shop_balance_vendor_id ON shop_balance (vendor_id)"))
+    print("✓ Index on shop_balance.vendor_id")
+
+
+def run_migration():
+    print("=" * 60)
+    print("Add shop_balance table")
+    print("=" * 60)
+
+    try:
+        with engine.begin() as conn:
+            create_table(conn)
+        result = reconcile_shop_balances(engine, fix=True)
+        print(f"✓ Backfilled totals for {result['fixed']} of {result['shops']} shops")
+        print("\n✅ Migration completed successfully!")
+        return True
+    except Exception as e:
+        print(f"\n❌ Migration failed: {str(e)}")
+        return False
+
+
+if __name__ == '__main__':
+    success = run_migration()
+    sys.exit(0 if success else 1)
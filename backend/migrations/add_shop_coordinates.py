@@ -0,0 +1,62 @@
+"""
+Database Migration Script: Add shop coordinates
+Version: 1.0.13
+
+Adds latitude and longitude to vendor_shop and fills them from each shop's
+postcode using the bundled outcode table (src/data/outcodes.csv), for
+/api/shops/nearby. New shops and postcode changes are placed by the app;
+rerun this after replacing the outcode table to re-place existing shops.
+
+Safe to run more than once.
+"""
+
+import os
+import sys
+from sqlalchemy import create_engine, inspect, text
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from shop_locations import backfill_shop_coordinates
+
+# Get database URL from environment
+DATABASE_URL = os.environ.get('DATABASE_URL')
+if not DATABASE_URL:
+    print("ERROR: DATABASE_URL environment variable not set")
+    sys.exit(1)
+
+# Fix postgres:// to postgresql:// for SQLAlchemy
+if DATABASE_URL.startswith('postgres://'):
+    DATABASE_URL = DATABASE_URL.replace('postgres://', 'postgresql://', 1)
+
+print(f"Connecting to database...")
+engine = create_engine(DATABASE_URL)
+
+
+def run_migration():
+    print("=" * 60)
+    print("Add shop coordinates")
+    print("=" * 60)
+
+    try:
+        with engine.begin() as conn:
+            columns = [col['name'] for col in inspect(conn).get_columns('vendor_shop')]
+            for column in ('latitude', 'longitude'):
+                if column not in columns:
+                    conn.execute(text(f"ALTER TABLE vendor_shop ADD COLUMN {column} FLOAT"))
+                    print(f"✓ Added {column} column")
+                else:
+                    print(f"⊘ {column} column already exists")
+
+            placed, unknown = backfill_shop_coordinates(conn)
+            print(f"✓ Placed {placed} shops by postcode")
+            if unknown:
+                print(f"⊘ {unknown} shops have no postcode in the outcode table and won't appear in nearby searches")
+        print("\n✅ Migration completed successfully!")
+        return True
+    except Exception as e:
+        print(f"\n❌ Migration failed: {str(e)}")
+        return False
+
+
+if __name__ == '__main__':
+    success = run_migration()
+    sys.exit(0 if success else 1)
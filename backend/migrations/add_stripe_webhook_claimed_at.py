@@ -0,0 +1,55 @@
+"""
+Database Migration Script: Timestamp Stripe webhook claims
+Version: 1.0.15
+
+Adds stripe_webhook_event.claimed_at, set when a worker claims an event. The
+worker uses it to release events left 'processing' by a worker that died
+(src/stripe_webhook_inbox.py reclaim_stale_events). Events already stuck in
+'processing' have no claim time and are released on the worker's next pass.
+
+Safe to run more than once.
+"""
+
+import os
+import sys
+from sqlalchemy import create_engine, inspect, text
+
+# Get database URL from environment
+DATABASE_URL = os.environ.get('DATABASE_URL')
+if not DATABASE_URL:
+    print("ERROR: DATABASE_URL environment variable not set")
+    sys.exit(1)
+
+# Fix postgres:// to postgresql:// for SQLAlchemy
+if DATABASE_URL.startswith('postgres://'):
+    DATABASE_URL = DATABASE_URL.replace('postgres://', 'postgresql://', 1)
+
+print(f"Connecting to database...")
+engine = create_engine(DATABASE_URL)
+
+
+def run_migration():
+    print("=" * 60)
+    print("Timestamp Stripe webhook claims")
+    print("=" * 60)
+
+    try:
+        with engine.begin() as conn:
+            inspector = inspect(conn)
+            if 'stripe_webhook_event' not in inspector.get_table_names():
+                print("⊘ stripe_webhook_event does not exist yet (created by the baseline)")
+            elif 'claimed_at' in [col['name'] for col in inspector.get_columns('stripe_webhook_event')]:
+                print("⊘ claimed_at already exists")
+            else:
+                conn.execute(text("ALTER TABLE stripe_webhook_event ADD COLUMN claimed_at TIMESTAMP"))
+                print("✓ Added column 'claimed_at' to stripe_webhook_event")
+        print("\n✅ Migration completed successfully!")
+        return True
+    except Exception as e:
+        print(f"\n❌ Migration failed: {str(e)}")
+        return False
+
+
+if __name__ == '__main__':
+    success = run_migration()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,110 @@
+"""
+Database Migration Script: Add claimable quantities to surplus_item
+Version: 1.0.6
+
+Adds the columns used by the lock-free claim engine (src/surplus_claims.py):
+- remaining_quantity: numeric amount still claimable, parsed from the
+  free-text quantity ("10 kg" -> 10)
+- parent_item_id: original item a partial claim was split from
+
+and backfills remaining_quantity for existing rows in chunks. Rows whose
+quantity has no leading number are left NULL and can only be claimed in full.
+
+Safe to run more than once.
+"""
+
+import os
+import sys
+from sqlalchemy import create_engine, inspect, text
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from surplus_claims import parse_quantity
+
+BATCH_SIZE = 1000
+
+# Get database URL from environment
+DATABASE_URL = os.environ.get('DATABASE_URL')
+if not DATABASE_URL:
+    print("ERROR: DATABASE_URL environment variable not set")
+    sys.exit(1)
+
+# Fix postgres:// to postgresql:// for SQLAlchemy
+if DATABASE_URL.startswith('postgres://'):
+    DATABASE_URL = DATABASE_URL.replace('postgres://', 'postgresql://', 1)
+
+print(f"Connecting to database...")
+engine = create_engine(DATABASE_URL)
+
+
+def add_columns(conn):
+    columns = [col['name'] for col in inspect(conn).get_columns('surplus_item')]
+
+    if 'remaining_quantity' not in columns:
+        conn.execute(text("ALTER TABLE surplus_item ADD COLUMN remaining_quantity NUMERIC(10, 2)"))
+        print("✓ Added remaining_quantity column")
+    else:
+        print("⊘ remaining_quantity column already exists")
+
+    if 'parent_item_id' not in columns:
+        conn.execute(text("ALTER TABLE surplus_item ADD COLUMN parent_item_id INTEGER REFERENCES surplus_item (id)"))
+        print("✓ Added parent_item_id column")
+    else:
+        print("⊘ parent_item_id column already exists")
+
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_surplus_item_parent_item_id ON surplus_item (parent_item_id)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_surplus_item_collection_status ON surplus_item (collection_status)"))
+    print("✓ Indexes on parent_item_id and collection_status")
+
+
+def backfill_remaining_quantity():
+    """Parse quantity into remaining_quantity for rows that don't have one yet"""
+    last_id = 0
+    updated = 0
+    skipped = 0
+
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(text("""
+                SELECT id, quantity, collection_status FROM surplus_item
+                WHERE id > :last_id AND remaining_quantity IS NULL
+                ORDER BY id LIMIT :limit
+            """), {'last_id': last_id, 'limit': BATCH_SIZE}).fetchall()
+            if not rows:
+                break
+
+            params = []
+            for item_id, quantity, collection_status in rows:
+                amount, _ = parse_quantity(quantity)
+                if amount is None:
+                    skipped += 1
+                    continue
+                # Items already accepted or collected have nothing left to claim
+                params.append({'id': item_id, 'remaining': amount if (collection_status or 'available') == 'available' else 0})
+
+            if params:
+                conn.execute(text("UPDATE surplus_item SET remaining_quantity = :remaining WHERE id = :id"), params)
+            updated += len(params)
+            last_id = rows[-1][0]
+
+    print(f"✓ Backfilled remaining_quantity on {updated} rows ({skipped} without a numeric quantity)")
+
+
+def run_migration():
+    print("=" * 60)
+    print("Add claimable quantities to surplus_item")
+    print("=" * 60)
+
+    try:
+        with engine.begin() as conn:
+            add_columns(conn)
+        backfill_remaining_quantity()
+        print("\n✅ Migration completed successfully!")
+        return True
+    except Exception as e:
+        print(f"\n❌ Migration failed: {str(e)}")
+        return False
+
+
+if __name__ == '__main__':
+    success = run_migration()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,53 @@
+"""
+Database Migration Script: Add cache_version to voucher
+Version: 1.0.8
+
+Adds voucher.cache_version, the version stamp the vendor validation cache
+(src/voucher_cache.py) compares against to decide whether a cached entry is
+still current. It is bumped in the same UPDATE as any change to a voucher's
+status, balance, expiry, recipient or shops.
+
+Safe to run more than once.
+"""
+
+import os
+import sys
+from sqlalchemy import create_engine, inspect, text
+
+# Get database URL from environment
+DATABASE_URL = os.environ.get('DATABASE_URL')
+if not DATABASE_URL:
+    print("ERROR: DATABASE_URL environment variable not set")
+    sys.exit(1)
+
+# Fix postgres:// to postgresql:// for SQLAlchemy
+if DATABASE_URL.startswith('postgres://'):
+    DATABASE_URL = DATABASE_URL.replace('postgres://', 'postgresql://', 1)
+
+print(f"Connecting to database...")
+engine = create_engine(DATABASE_URL)
+
+
+def run_migration():
+    print("=" * 60)
+    print("Add cache_version to voucher")
+    print("=" * 60)
+
+    try:
+        with engine.begin() as conn:
+            columns = [col['name'] for col in inspect(conn).get_columns('voucher')]
+            if 'cache_version' not in columns:
+                conn.execute(text("ALTER TABLE voucher ADD COLUMN cache_version INTEGER NOT NULL DEFAULT 1"))
+                print("✓ Added cache_version column")
+            else:
+                print("⊘ cache_version column already exists")
+        print("\n✅ Migration completed successfully!")
+        return True
+    except Exception as e:
+        print(f"\n❌ Migration failed: {str(e)}")
+        return False
+
+
+if __name__ == '__main__':
+    success = run_migration()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,92 @@
+"""
+Database Migration Script: Add voucher_ledger table
+Version: 1.0.9
+
+Adds the append-only voucher balance history (src/voucher_ledger.py), with
+indexes for the report range sums:
+- (entry_type, created_at): value issued/redeemed/expired in a period
+- (vendor_id, created_at): a vendor's redemptions in a period
+- voucher_id: one voucher's history
+
+Existing vouchers are backfilled in the same transaction: an issue entry for
+the original value (balance plus approved redemption requests), a redeem
+entry per approved request, and a closing entry that zeroes the balance of
+expired, reassigned and fully redeemed vouchers.
+
+Safe to run more than once; vouchers that already have entries are skipped.
+"""
+
+import os
+import sys
+from sqlalchemy import create_engine, inspect, text
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from voucher_ledger import backfill_voucher_ledger
+
+# Get database URL from environment
+DATABASE_URL = os.environ.get('DATABASE_URL')
+if not DATABASE_URL:
+    print("ERROR: DATABASE_URL environment variable not set")
+    sys.exit(1)
+
+# Fix postgres:// to postgresql:// for SQLAlchemy
+if DATABASE_URL.startswith('postgres://'):
+    DATABASE_URL = DATABASE_URL.replace('postgres://', 'postgresql://', 1)
+
+print(f"Connecting to database...")
+engine = create_engine(DATABASE_URL)
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_voucher_ledger_voucher_id ON voucher_ledger (voucher_id)",
+    "CREATE INDEX IF NOT EXISTS ix_voucher_ledger_type_created ON voucher_ledger (entry_type, created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_voucher_ledger_vendor_created ON voucher_ledger (vendor_id, created_at)",
+]
+
+
+def create_table(conn):
+    if inspect(conn).has_table('voucher_ledger'):
+        print("⊘ voucher_ledger table already exists")
+    else:
+        id_column = 'id INTEGER PRIMARY KEY AUTOINCREMENT' if conn.dialect.name == 'sqlite' else 'id SERIAL PRIMARY KEY'
+        conn.execute(text(f"""
+            CREATE TABLE voucher_ledger (
+                {id_column},
+                voucher_id INTEGER NOT NULL REFERENCES voucher (id),
+                entry_type VARCHAR(20) NOT NULL,
+                amount FLOAT NOT NULL,
+                balance_after FLOAT NOT NULL,
+                recipient_id INTEGER REFERENCES "user" (id),
+                vendor_id INTEGER REFERENCES "user" (id),
+                shop_id INTEGER REFERENCES vendor_shop (id),
+                redemption_request_id INTEGER REFERENCES redemption_request (id),
+                related_voucher_id INTEGER REFERENCES voucher (id),
+                created_at TIMESTAMP NOT NULL
+            )
+        """))
+        print("✓ Created voucher_ledger table")
+
+    for statement in INDEXES:
+        conn.execute(text(statement))
+    print("✓ Indexes on voucher_ledger")
+
+
+def run_migration():
+    print("=" * 60)
+    print("Add voucher_ledger table")
+    print("=" * 60)
+
+    try:
+        with engine.begin() as conn:
+            create_table(conn)
+            backfilled = backfill_voucher_ledger(conn)
+            print(f"✓ Backfilled ledger entries for {backfilled} vouchers")
+        print("\n✅ Migration completed successfully!")
+        return True
+    except Exception as e:
+        print(f"\n❌ Migration failed: {str(e)}")
+        return False
+
+
+if __name__ == '__main__':
+    success = run_migration()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,57 @@
+"""
+Database Migration Script: Index vouchers by recipient
+Version: 1.0.12
+
+Adds ix_voucher_recipient_created on voucher (recipient_id, created_at), so a
+recipient's wallet (/api/recipient/vouchers, newest first) and its summary
+(/api/recipient/wallet-summary) read only that recipient's vouchers instead of
+scanning the table.
+
+On PostgreSQL the index is built CONCURRENTLY so vouchers can still be issued
+and redeemed while it builds.
+
+Safe to run more than once.
+"""
+
+import os
+import sys
+from sqlalchemy import create_engine, text
+
+# Get database URL from environment
+DATABASE_URL = os.environ.get('DATABASE_URL')
+if not DATABASE_URL:
+    print("ERROR: DATABASE_URL environment variable not set")
+    sys.exit(1)
+
+# Fix postgres:// to postgresql:// for SQLAlchemy
+if DATABASE_URL.startswith('postgres://'):
+    DATABASE_URL = DATABASE_URL.replace('postgres://', 'postgresql://', 1)
+
+print(f"Connecting to database...")
+engine = create_engine(DATABASE_URL)
+
+
+def run_migration():
+    print("=" * 60)
+    print("Index vouchers by recipient")
+    print("=" * 60)
+
+    try:
+        # CREATE INDEX CONCURRENTLY can't run inside a transaction block
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            concurrently = 'CONCURRENTLY ' if conn.dialect.name == 'postgresql' else ''
+            conn.execute(text(
+                f"CREATE INDEX {concurrently}IF NOT EXISTS ix_voucher_recipient_created "
+                "ON voucher (recipient_id, created_at)"
+            ))
+        print("✓ Index on voucher (recipient_id, created_at)")
+        print("\n✅ Migration completed successfully!")
+        return True
+    except Exception as e:
+        print(f"\n❌ Migration failed: {str(e)}")
+        return False
+
+
+if __name__ == '__main__':
+    success = run_migration()
+    sys.exit(0 if success else 1)
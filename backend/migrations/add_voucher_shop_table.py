@@ -0,0 +1,87 @@
+"""
+Database Migration Script: Add voucher_shop eligibility table
+Version: 1.0.7
+
+Replaces the JSON list in voucher.vendor_restrictions with an indexed link
+table (src/voucher_shops.py):
+- voucher.any_shop: TRUE when the voucher can be used at any shop
+- voucher_shop (voucher_id, shop_id): one row per shop a restricted voucher
+  can be used at, primary key on (voucher_id, shop_id) plus an index on shop_id
+
+The column is added and backfilled from vendor_restrictions in the same
+transaction, so restricted vouchers are never briefly redeemable everywhere.
+vendor_restrictions is left in place as a read-only mirror for older clients.
+
+Safe to run more than once.
+"""
+
+import os
+import sys
+from sqlalchemy import create_engine, inspect, text
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from voucher_shops import backfill_voucher_shops
+
+# Get database URL from environment
+DATABASE_URL = os.environ.get('DATABASE_URL')
+if not DATABASE_URL:
+    print("ERROR: DATABASE_URL environment variable not set")
+    sys.exit(1)
+
+# Fix postgres:// to postgresql:// for SQLAlchemy
+if DATABASE_URL.startswith('postgres://'):
+    DATABASE_URL = DATABASE_URL.replace('postgres://', 'postgresql://', 1)
+
+print(f"Connecting to database...")
+engine = create_engine(DATABASE_URL)
+
+
+def create_table(conn):
+    if inspect(conn).has_table('voucher_shop'):
+        print("⊘ voucher_shop table already exists")
+    else:
+        conn.execute(text("""
+            CREATE TABLE voucher_shop (
+                voucher_id INTEGER NOT NULL REFERENCES voucher (id) ON DELETE CASCADE,
+                shop_id INTEGER NOT NULL REFERENCES vendor_shop (id) ON DELETE CASCADE,
+                PRIMARY KEY (voucher_id, shop_id)
+            )
+        """))
+        print("✓ Created voucher_shop table")
+
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_voucher_shop_shop_id ON voucher_shop (shop_id)"))
+    print("✓ Index on voucher_shop.shop_id")
+
+
+def add_column_and_backfill(conn):
+    columns = [col['name'] for col in inspect(conn).get_columns('voucher')]
+
+    if 'any_shop' not in columns:
+        conn.execute(text("ALTER TABLE voucher ADD COLUMN any_shop BOOLEAN NOT NULL DEFAULT TRUE"))
+        print("✓ Added any_shop column")
+    else:
+        print("⊘ any_shop column already exists (re-running backfill)")
+
+    restricted = backfill_voucher_shops(conn)
+    print(f"✓ Backfilled voucher_shop for {restricted} restricted vouchers")
+
+
+def run_migration():
+    print("=" * 60)
+    print("Add voucher_shop eligibility table")
+    print("=" * 60)
+
+    try:
+        with engine.begin() as conn:
+            create_table(conn)
+            add_column_and_backfill(conn)
+        print("\n✅ Migration completed successfully!")
+        return True
+    except Exception as e:
+        print(f"\n❌ Migration failed: {str(e)}")
+        return False
+
+
+if __name__ == '__main__':
+    success = run_migration()
+    sys.exit(0 if success else 1)
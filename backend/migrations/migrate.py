@@ -0,0 +1,213 @@
+"""
+Database Migration Runner
+Applies every pending migration in version order and records it in schema_version
+
+Replaces the schema checks that used to run inside every web worker and cron
+script at import time (main.check_and_migrate_database and the create_all /
+ALTER block in unified_server.py). Every start path runs it before serving:
+unified_server.py calls apply_pending() in-process, and gunicorn_config.py
+runs this script from the master's on_starting hook. It can also be run by
+hand, once per deploy.
+
+The database is the one the app itself uses: DATABASE_URL if set, otherwise
+main.py's local SQLite fallback. The standalone scripts are pointed at the
+same URL.
+
+1.0.0 (baseline)  Creates any table missing from the models - a fresh database
+                  gets the whole current schema - adds the columns older
+                  deployments were patched with at startup, and seeds the
+                  default categories.
+1.0.4 onwards     The scripts listed in MIGRATIONS (see README.md). Each is
+                  idempotent and still runnable on its own.
+
+Usage:
+    python3 migrate.py                  # apply pending migrations
+    python3 migrate.py --list           # show applied and pending versions
+    python3 migrate.py --stamp 1.0.8    # record versions up to 1.0.8 as applied without running them
+"""
+
+import argparse
+import os
+import runpy
+import sys
+
+MIGRATIONS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(MIGRATIONS_DIR, '..', 'src'))
+
+from sqlalchemy import inspect, text
+from schema_migrations import ensure_version_table, applied_versions, record_version, pending_migrations, version_key
+
+# Columns the app used to add to existing tables when it started
+LEGACY_COLUMNS = {
+    'user': [
+        ('account_status', "VARCHAR(30) DEFAULT 'ACTIVE'"),
+        ('rejection_reason', "TEXT"),
+        ('verified_at', "TIMESTAMP"),
+        ('verified_by_admin_id', "INTEGER REFERENCES \"user\"(id)"),
+    ],
+    'voucher': [
+        ('redeemed_at_shop_id', "INTEGER"),
+    ],
+}
+
+DEFAULT_CATEGORIES = [
+    ('Fresh Produce', 'edible', 'Fruits, vegetables, and fresh items'),
+    ('Bakery', 'edible', 'Bread, pastries, and baked goods'),
+    ('Dairy', 'edible', 'Milk, cheese, yogurt, and dairy products'),
+    ('Meat & Fish', 'edible', 'Fresh and frozen meat and fish'),
+    ('Packaged Foods', 'edible', 'Canned, boxed, and packaged items'),
+    ('Non-Food Items', 'non-edible', 'Toiletries, household items, and other essentials'),
+]
+
+
+def baseline(app, db):
+    """Create missing tables, add legacy startup columns and seed categories"""
+    from main import Category
+    from audit_log import AuditDailySummary, AuditLog, rebuild_audit_summary
+
+    with app.app_context():
+        db.create_all()
+        print("✓ Tables created/verified")
+
+        with db.engine.begin() as conn:
+            inspector = inspect(conn)
+            for table, columns in LEGACY_COLUMNS.items():
+                existing = [col['name'] for col in inspector.get_columns(table)]
+                for col_name, col_def in columns:
+                    if col_name not in existing:
+                        conn.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {col_name} {col_def}'))
+                        print(f"✓ Added column '{col_name}' to {table}")
+
+            # Raw-SQL table with no model (see get_cart_notifications)
+            id_column = 'id INTEGER PRIMARY KEY AUTOINCREMENT' if conn.dialect.name == 'sqlite' else 'id SERIAL PRIMARY KEY'
+            conn.execute(text(f"""
+                CREATE TABLE IF NOT EXISTS cart_notification (
+                    {id_column},
+                    user_id INTEGER NOT NULL,
+                    message TEXT NOT NULL,
+                    type VARCHAR(50) NOT NULL,
+                    surplus_item_id INTEGER,
+                    is_read BOOLEAN DEFAULT FALSE,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (user_id) REFERENCES "user" (id)
+                )
+            """))
+            print("✓ cart_notification table created/verified")
+
+        if not Category.query.first():
+            db.session.add_all([
+                Category(name=name, type=category_type, description=description)
+                for name, category_type, description in DEFAULT_CATEGORIES
+            ])
+            db.session.commit()
+            print("✓ Default categories created")
+
+        # Backfill the audit rollup the first time it is deployed against existing logs
+        if not AuditDailySummary.query.first() and AuditLog.query.first():
+            rebuild_audit_summary()
+            print("✓ audit_daily_summary backfilled")
+    return True
+
+
+def run_script(filename):
+    """Run a standalone migration script in this process; True if it succeeded"""
+    path = os.path.join(MIGRATIONS_DIR, filename)
+    try:
+        namespace = runpy.run_path(path, run_name='migration')
+        # run_migration() returns False or exits non-zero on failure; a script
+        # without one did its work at import and succeeded by not raising
+        run_migration = namespace.get('run_migration')
+        return run_migration is None or run_migration() is not False
+    except SystemExit as e:
+        # Some scripts exit early when there is nothing to do for this database
+        return e.code in (0, None)
+    except Exception as e:
+        print(f"❌ {filename} failed: {str(e)}")
+        return False
+
+
+# (version, description, step) in version order; step is a script filename or a callable
+MIGRATIONS = [
+    ('1.0.0', 'Baseline schema, legacy startup columns and default categories', baseline),
+    ('1.0.4', 'redemption_request table', 'add_redemption_requests_table.py'),
+    ('1.0.5', 'Monthly partitions for audit_logs and login_session', 'partition_log_tables.py'),
+    ('1.0.6', 'surplus_item claimable quantities', 'add_surplus_claim_quantities.py'),
+    ('1.0.7', 'voucher_shop eligibility table', 'add_voucher_shop_table.py'),
+    ('1.0.8', 'voucher.cache_version', 'add_voucher_cache_version.py'),
+    ('1.0.9', 'voucher_ledger balance history', 'add_voucher_ledger.py'),
+    ('1.0.10', 'shop_balance running totals', 'add_shop_balance_table.py'),
+    ('1.0.11', 'Per-user notification read markers and unread counts', 'add_notification_inbox.py'),
+    ('1.0.12', 'voucher (recipient_id, created_at) index', 'add_voucher_recipient_index.py'),
+    ('1.0.13', 'vendor_shop latitude/longitude from postcode', 'add_shop_coordinates.py'),
+    ('1.0.14', 'Login statistics indexes on user and login_session', 'add_login_stats_indexes.py'),
+    ('1.0.15', 'stripe_webhook_event.claimed_at for releasing stale claims', 'add_stripe_webhook_claimed_at.py'),
+]
+
+
+def apply_pending(app, db):
+    """
+    Apply every pending migration to the app's database
+
+    Returns:
+        bool: True if the schema is up to date afterwards
+    """
+    with app.app_context():
+        engine = db.engine
+    # The standalone scripts build their own engine from DATABASE_URL; give them
+    # the app's resolved URL (for SQLite, the absolute path under the instance folder)
+    os.environ['DATABASE_URL'] = engine.url.render_as_string(hide_password=False)
+    ensure_version_table(engine)
+
+    pending = pending_migrations(engine, MIGRATIONS)
+    if not pending:
+        print("⊘ Database schema is up to date")
+        return True
+
+    for version, description, step in pending:
+        print("=" * 60)
+        print(f"{version}: {description}")
+        print("=" * 60)
+        success = step(app, db) if callable(step) else run_script(step)
+        if not success:
+            print(f"\n❌ Migration {version} failed - later migrations not applied")
+            return False
+        record_version(engine, version, description)
+        print(f"✓ Recorded {version}")
+
+    print(f"\n✅ Applied {len(pending)} migration(s)")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Apply pending database migrations')
+    parser.add_argument('--list', action='store_true', help='Show applied and pending versions and exit')
+    parser.add_argument('--stamp', metavar='VERSION', help='Record every version up to VERSION as applied without running it')
+    args = parser.parse_args()
+
+    # Webhook events are applied by the servers, not by this short-lived process
+    os.environ.setdefault('STRIPE_WEBHOOK_WORKER', 'off')
+    from main import app, db
+    with app.app_context():
+        engine = db.engine
+    ensure_version_table(engine)
+
+    if args.list:
+        applied = applied_versions(engine)
+        for version, description, _ in MIGRATIONS:
+            status = f"applied {applied[version]:%Y-%m-%d %H:%M}" if version in applied else 'pending'
+            print(f"{version:>8}  {status:<24}  {description}")
+        return
+
+    if args.stamp:
+        for version, description, _ in MIGRATIONS:
+            if version_key(version) <= version_key(args.stamp):
+                record_version(engine, version, description)
+        print(f"✓ Recorded migrations up to {args.stamp} as applied")
+        return
+
+    if not apply_pending(app, db):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""
+Database Migration Script: Partition audit_logs and login_session by month
+Version: 1.0.5
+
+Converts the append-only log tables into native PostgreSQL RANGE-partitioned
+tables (one partition per calendar month plus a DEFAULT catch-all), copies the
+existing rows across, and backfills the audit_daily_summary rollup used by
+/api/admin/audit-logs/stats.
+
+Old months are then archived and dropped by scripts/log_retention.py instead
+of growing the tables forever.
+
+Run during a quiet period. Safe to run more than once; tables that are
+already partitioned are skipped. A no-op on SQLite.
+"""
+
+import os
+import sys
+from datetime import date
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from log_partitions import (
+    PARTITIONED_TABLES, PARTITION_MONTHS_AHEAD, month_start, add_months,
+    create_month_partition, default_partition_name, is_partitioned
+)
+
+# Get database URL from environment
+DATABASE_URL = os.environ.get('DATABASE_URL')
+if not DATABASE_URL:
+    print("ERROR: DATABASE_URL environment variable not set")
+    sys.exit(1)
+
+# Fix postgres:// to postgresql:// for SQLAlchemy
+if DATABASE_URL.startswith('postgres://'):
+    DATABASE_URL = DATABASE_URL.replace('postgres://', 'postgresql://', 1)
+
+print(f"Connecting to database...")
+engine = create_engine(DATABASE_URL)
+
+CREATE_SUMMARY_SQL = """
+CREATE TABLE IF NOT EXISTS audit_daily_summary (
+    id SERIAL PRIMARY KEY,
+    day DATE NOT NULL,
+    action VARCHAR(100) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT '',
+    user_email VARCHAR(255) NOT NULL DEFAULT '',
+    user_type VARCHAR(50) NOT NULL DEFAULT '',
+    count INTEGER NOT NULL DEFAULT 0,
+    CONSTRAINT uq_audit_daily_summary UNIQUE (day, action, status, user_email, user_type)
+);
+CREATE INDEX IF NOT EXISTS ix_audit_daily_summary_day ON audit_daily_summary(day);
+"""
+
+BACKFILL_SUMMARY_SQL = """
+DELETE FROM audit_daily_summary;
+INSERT INTO audit_daily_summary (day, action, status, user_email, user_type, count)
+SELECT DATE(timestamp), action, COALESCE(status, ''), COALESCE(user_email, ''),
+       COALESCE(user_type, ''), COUNT(*)
+FROM audit_logs
+GROUP BY 1, 2, 3, 4, 5;
+"""
+
+
+def partition_table(conn, table, column):
+    """Swap table for a partitioned copy with monthly partitions and move the rows over"""
+    legacy = f"{table}_legacy"
+    print(f"Partitioning {table} on {column}...")
+
+    conn.execute(text(f'ALTER TABLE "{table}" RENAME TO "{legacy}"'))
+    # Partition key must be part of the primary key; id keeps using the legacy sequence
+    conn.execute(text(
+        f'CREATE TABLE "{table}" (LIKE "{legacy}" INCLUDING DEFAULTS, PRIMARY KEY (id, "{column}")) '
+        f'PARTITION BY RANGE ("{column}")'
+    ))
+    conn.execute(text(f'ALTER SEQUENCE IF EXISTS "{table}_id_seq" OWNED BY "{table}".id'))
+
+    oldest = conn.execute(text(f'SELECT MIN("{column}") FROM "{legacy}"')).scalar()
+    month = month_start(oldest or date.today())
+    last = add_months(month_start(date.today()), PARTITION_MONTHS_AHEAD)
+    count = 0
+    while month <= last:
+        create_month_partition(conn, table, month)
+        month = add_months(month, 1)
+        count += 1
+    conn.execute(text(f'CREATE TABLE IF NOT EXISTS "{default_partition_name(table)}" PARTITION OF "{table}" DEFAULT'))
+    print(f"✓ Created {count} monthly partitions for {table}")
+
+    conn.execute(text(f'INSERT INTO "{table}" SELECT * FROM "{legacy}"'))
+    conn.execute(text(f'DROP TABLE "{legacy}"'))
+    conn.execute(text(
+        f'CREATE INDEX IF NOT EXISTS "ix_{table}_{column}" ON "{table}" ("{column}")'
+    ))
+    print(f"✓ Moved existing rows into partitioned {table}")
+
+
+def run_migration():
+    print("=" * 60)
+    print("Partition audit_logs and login_session by month")
+    print("=" * 60)
+
+    if engine.dialect.name != 'postgresql':
+        print("⊘ Native partitioning requires PostgreSQL - nothing to do.")
+        print("  SQLite databases are pruned by scripts/log_retention.py with ranged deletes.")
+        return True
+
+    try:
+        with engine.begin() as conn:
+            for table, column in PARTITIONED_TABLES.items():
+                if is_partitioned(conn, table):
+                    print(f"⊘ {table} is already partitioned")
+                    continue
+                partition_table(conn, table, column)
+
+            # login_session references user; re-add the FK on the partitioned parent
+            conn.execute(text("""
+                DO $$ BEGIN
+                    ALTER TABLE login_session
+                        ADD CONSTRAINT login_session_user_id_fkey FOREIGN KEY (user_id) REFERENCES "user"(id);
+                EXCEPTION WHEN duplicate_object THEN NULL;
+                END $$;
+            """))
+
+            conn.execute(text(CREATE_SUMMARY_SQL))
+            conn.execute(text(BACKFILL_SUMMARY_SQL))
+            print("✓ audit_daily_summary created and backfilled")
+
+        print("\n✅ Migration completed successfully!")
+        return True
+    except Exception as e:
+        print(f"\n❌ Migration failed: {str(e)}")
+        return False
+
+
+if __name__ == '__main__':
+    success = run_migration()
+    sys.exit(0 if success else 1)
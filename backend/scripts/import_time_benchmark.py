@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Import Time Benchmark
+
+Measures how long `import main` (the Flask app) takes in a fresh interpreter,
+using `python -X importtime`, and lists the slowest modules. Worker boot time
+is dominated by this import, so run it after adding a dependency.
+
+Usage:
+    python3 import_time_benchmark.py                # cumulative time and top 15 modules
+    python3 import_time_benchmark.py --top 30 --runs 5
+
+A throwaway SQLite database is used so no real database is touched.
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+# "import time:       self [us] |  cumulative | imported package"
+LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+# Optional dependencies that should only be imported when a feature is used
+LAZY_MODULES = ('reportlab', 'openpyxl', 'stripe', 'twilio', 'qrcode', 'PIL', 'numpy')
+
+
+def measure(module='main'):
+    """
+    Import `module` in a subprocess with -X importtime
+
+    Returns:
+        dict: module name -> (self_us, cumulative_us) for every module imported
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(tmp, 'import_time.db')}")
+        env['STRIPE_WEBHOOK_WORKER'] = 'off'
+        env['LOG_LEVEL'] = 'WARNING'
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+            cwd=SRC_DIR, env=env, capture_output=True, text=True
+        )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    timings = {}
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, _, name = match.groups()
+            timings[name] = (int(self_us), int(cumulative_us))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the import time of the Flask app')
+    parser.add_argument('--module', default='main', help='Module to import (default main)')
+    parser.add_argument('--top', type=int, default=15, help='Slowest modules to list')
+    parser.add_argument('--runs', type=int, default=3, help='Runs to take the best of')
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(args.runs)]
+    best = min(runs, key=lambda timings: timings[args.module][1])
+    total_ms = best[args.module][1] / 1000
+
+    print(f"import {args.module}: {total_ms:.0f} ms (best of {args.runs})")
+    print(f"\n{'cumulative':>12} {'self':>10}  module")
+    for name, (self_us, cumulative_us) in sorted(best.items(), key=lambda item: -item[1][1])[:args.top]:
+        print(f"{cumulative_us / 1000:>10.1f}ms {self_us / 1000:>8.1f}ms  {name}")
+
+    eager = sorted(name for name in best if name.split('.')[0] in LAZY_MODULES and '.' not in name)
+    if eager:
+        print(f"\n⚠️  Imported at startup but meant to be lazy: {', '.join(eager)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Log Retention Script for BAK UP E-Voucher System
+
+Creates the upcoming monthly partitions for audit_logs and login_session and
+archives every month older than the retention window to a gzip-compressed CSV
+before dropping it from the database.
+
+Usage: python3 log_retention.py
+Cron: 30 2 * * * python3 /path/to/log_retention.py  (runs daily at 2:30 AM)
+
+Environment:
+    DATABASE_URL                    Database to maintain (required)
+    AUDIT_LOG_RETENTION_DAYS        Days of audit_logs to keep (default 365)
+    LOGIN_SESSION_RETENTION_DAYS    Days of login_session to keep (default 180)
+    LOG_ARCHIVE_DIR                 Where the .csv.gz archives are written
+    LOG_PARTITION_MONTHS_AHEAD      Future partitions to pre-create (default 3)
+"""
+
+import os
+import sys
+from datetime import datetime
+from sqlalchemy import create_engine
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from log_partitions import ARCHIVE_DIR, run_log_maintenance
+
+
+def log(message):
+    """Log messages with timestamp"""
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    print(f"[{timestamp}] {message}", flush=True)
+
+
+def main():
+    log("=" * 60)
+    log("Starting log partition maintenance")
+
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        log("ERROR: DATABASE_URL environment variable not set")
+        sys.exit(1)
+    if database_url.startswith('postgres://'):
+        database_url = database_url.replace('postgres://', 'postgresql://', 1)
+
+    try:
+        engine = create_engine(database_url)
+        result = run_log_maintenance(engine)
+    except Exception as e:
+        log(f"ERROR: Log maintenance failed: {e}")
+        sys.exit(1)
+
+    log(f"Partitions ensured: {len(result['partitions'])}")
+    for table, months in result['pruned'].items():
+        if not months:
+            log(f"{table}: nothing older than the retention window")
+        for month, rows in months.items():
+            log(f"{table}: archived {rows} rows for {month[:7]} to {ARCHIVE_DIR}")
+    for table, error in result['errors'].items():
+        log(f"ERROR: {table} maintenance failed: {error}")
+    if result['errors']:
+        sys.exit(1)
+
+    log("Log partition maintenance completed")
+    log("=" * 60)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Notification Fan-out Benchmark for BAK UP E-Voucher System
+
+Creates an audience of users and times giving each of them the same in-app
+notification with notify_audience() (one INSERT ... SELECT), against adding
+one UserNotification object per user as the routes used to.
+
+Uses a throwaway SQLite database by default; set DATABASE_URL to a scratch
+PostgreSQL database for production-like numbers.
+
+Usage:
+    python3 notification_fanout_benchmark.py                  # 100,000 users
+    python3 notification_fanout_benchmark.py --users 10000 --orm
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark notification fan-out')
+    parser.add_argument('--users', type=int, default=100000, help='Audience size')
+    parser.add_argument('--orm', action='store_true', help='Also time one ORM object per user')
+    args = parser.parse_args()
+
+    db_file = None
+    if not os.environ.get('DATABASE_URL'):
+        db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False).name
+        os.environ['DATABASE_URL'] = f'sqlite:///{db_file}'
+
+    from main import app, db, User, UserNotification
+    from notification_fanout import notify_audience
+
+    with app.app_context():
+        db.create_all()
+        db.session.execute(User.__table__.insert(), [
+            {'email': f'bench-fanout-{i}@example.com', 'password_hash': '!', 'first_name': 'Bench',
+             'last_name': str(i), 'user_type': 'recipient', 'is_active': True}
+            for i in range(args.users)
+        ])
+        db.session.commit()
+
+        start = time.perf_counter()
+        created = notify_audience('Benchmark', 'Set-based fan-out', user_types='recipient')
+        db.session.commit()
+        elapsed = time.perf_counter() - start
+        print(f"INSERT ... SELECT: {created} notifications in {elapsed * 1000:.0f} ms")
+
+        if args.orm:
+            start = time.perf_counter()
+            for user in User.query.filter_by(user_type='recipient', is_active=True).all():
+                db.session.add(UserNotification(user_id=user.id, title='Benchmark', message='ORM fan-out', type='info'))
+            db.session.commit()
+            orm_elapsed = time.perf_counter() - start
+            print(f"ORM objects:       {args.users} notifications in {orm_elapsed * 1000:.0f} ms "
+                  f"({orm_elapsed / elapsed:.0f}x slower)")
+
+        db.session.remove()
+    if db_file:
+        os.remove(db_file)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Precompress the Built Frontend for BAK UP E-Voucher System
+
+Writes .br and .gz siblings next to every compressible file in frontend/dist
+so unified_server can serve them directly (see src/static_assets.py) instead
+of compressing on every request. Run after `npm run build`.
+
+Usage:
+    python3 precompress_assets.py                     # frontend/dist
+    python3 precompress_assets.py /path/to/dist
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from static_assets import precompress
+
+DEFAULT_DIST = os.path.join(os.path.dirname(__file__), '..', '..', 'frontend', 'dist')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write .br/.gz siblings for the built frontend')
+    parser.add_argument('dist', nargs='?', default=DEFAULT_DIST, help='Build directory (default frontend/dist)')
+    parser.add_argument('--min-size', type=int, default=256, help='Skip files smaller than this many bytes')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.dist):
+        print(f"ERROR: {args.dist} is not a directory")
+        sys.exit(1)
+
+    counts = precompress(args.dist, min_size=args.min_size)
+    print(f"✓ Precompressed {counts['files']} files ({counts['br']} .br, {counts['gzip']} .gz) in {os.path.abspath(args.dist)}")
+
+
+if __name__ == '__main__':
+    main()
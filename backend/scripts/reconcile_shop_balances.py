@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Shop Balance Reconciliation Script for BAK UP E-Voucher System
+
+Recomputes each shop's running totals (shop_balance) from voucher_ledger
+redeem entries and payout_request, a chunk of shops at a time, and reports any
+drift. With --fix the drifted rows are overwritten with the recomputed totals
+(and rows for shops that have none are created).
+
+Usage: python3 reconcile_shop_balances.py [--fix] [--chunk-size 200]
+Cron: 15 3 * * * python3 /path/to/reconcile_shop_balances.py --fix  (runs daily at 3:15 AM)
+
+Environment:
+    DATABASE_URL    Database to check (required)
+
+Exits with status 2 if drift was found and not fixed, so cron can alert on it.
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime
+from sqlalchemy import create_engine
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from shop_balances import reconcile_shop_balances
+
+
+def log(message):
+    """Log messages with timestamp"""
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    print(f"[{timestamp}] {message}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reconcile shop_balance against the ledger and payouts')
+    parser.add_argument('--fix', action='store_true', help='Overwrite drifted rows with the recomputed totals')
+    parser.add_argument('--chunk-size', type=int, default=200, help='Shops checked per transaction (default 200)')
+    args = parser.parse_args()
+
+    log("=" * 60)
+    log("Starting shop balance reconciliation")
+
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        log("ERROR: DATABASE_URL environment variable not set")
+        sys.exit(1)
+    if database_url.startswith('postgres://'):
+        database_url = database_url.replace('postgres://', 'postgresql://', 1)
+
+    try:
+        engine = create_engine(database_url)
+        result = reconcile_shop_balances(engine, chunk_size=args.chunk_size, fix=args.fix)
+    except Exception as e:
+        log(f"ERROR: Reconciliation failed: {e}")
+        sys.exit(1)
+
+    log(f"Shops checked: {result['shops']}")
+    for mismatch in result['mismatches']:
+        log(f"Shop {mismatch['shop_id']}: {mismatch['column']} stored {mismatch['stored']}, "
+            f"expected {mismatch['expected']}")
+    if args.fix:
+        log(f"Rows written: {result['fixed']}")
+    elif result['mismatches']:
+        log(f"Drift found in {len({m['shop_id'] for m in result['mismatches']})} shops (run with --fix to correct)")
+
+    log("Shop balance reconciliation completed")
+    log("=" * 60)
+    if result['mismatches'] and not args.fix:
+        sys.exit(2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Sync vs Async Worker Load Test for BAK UP E-Voucher System
+
+Starts gunicorn with each worker class in turn against a throwaway SQLite
+database, with Twilio replaced by a fake client that sleeps like a slow SMS
+provider, then fires concurrent POST /api/vendor/redeem-voucher requests (each
+for its own voucher) and reports throughput and latency per worker class.
+
+The fake provider is installed by the post_worker_init hook below: this file
+doubles as the gunicorn config file for the server it starts.
+
+Usage:
+    python3 redeem_loadtest.py                                   # sync vs gevent, 2 workers, 500ms SMS
+    python3 redeem_loadtest.py --requests 400 --concurrency 100 --sms-delay 1.0
+    python3 redeem_loadtest.py --worker-classes sync,gevent,eventlet
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(SCRIPTS_DIR, '..', 'src')
+SECRET_KEY = 'redeem-loadtest'
+
+
+# ============================================
+# gunicorn hook (runs inside each worker)
+# ============================================
+
+def post_worker_init(worker):
+    """Swap the worker's Twilio client for a slow fake one"""
+    sys.path.insert(0, SCRIPTS_DIR)
+    from sms_bulk_benchmark import FakeTwilioClient
+    from sms_service import sms_service
+
+    sms_service.client = FakeTwilioClient(float(os.environ['LOADTEST_SMS_DELAY']))
+    sms_service.from_number = '+447000000000'
+    sms_service.enabled = True
+
+
+# ============================================
+# Harness
+# ============================================
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def seed(db_file, runs, vouchers_per_run):
+    """Create a vendor, a recipient and enough vouchers for every run; return the vendor's session cookie"""
+    sys.path.insert(0, SRC_DIR)
+    from datetime import date, timedelta
+    from main import app, db, User, VendorShop, Voucher
+
+    with app.app_context():
+        db.create_all()
+        vcse = User(email='loadtest-vcse@example.com', password_hash='!', first_name='Load',
+                    last_name='Test', user_type='vcse')
+        vendor = User(email='loadtest-vendor@example.com', password_hash='!', first_name='Load',
+                      last_name='Vendor', user_type='vendor')
+        recipient = User(email='loadtest-recipient@example.com', password_hash='!', first_name='Load',
+                         last_name='Recipient', user_type='recipient', phone='07700900123')
+        db.session.add_all([vcse, vendor, recipient])
+        db.session.flush()
+        db.session.add(VendorShop(vendor_id=vendor.id, shop_name='Load Test Shop', address='1 High St', postcode='NN9 6GR'))
+        expiry = date.today() + timedelta(days=30)
+        db.session.add_all([
+            Voucher(code=f'LOAD{run}X{i:05d}', value=20.0, issued_by=vcse.id, recipient_id=recipient.id, expiry_date=expiry)
+            for run in range(runs) for i in range(vouchers_per_run)
+        ])
+        db.session.commit()
+        cookie = app.session_interface.get_signing_serializer(app).dumps({'user_id': vendor.id})
+        return f'{app.config.get("SESSION_COOKIE_NAME", "session")}={cookie}'
+
+
+def wait_until_ready(url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=2) as response:
+                if response.status == 200:
+                    return True
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.25)
+    return False
+
+
+def redeem(base_url, cookie, code):
+    request = urllib.request.Request(
+        f'{base_url}/api/vendor/redeem-voucher',
+        data=json.dumps({'code': code, 'amount': 5}).encode(),
+        headers={'Content-Type': 'application/json', 'Cookie': cookie},
+        method='POST'
+    )
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=120) as response:
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except (urllib.error.URLError, ConnectionError, OSError):
+        status = None
+    return status, (time.perf_counter() - start) * 1000
+
+
+def run(worker_class, run_index, args, env, cookie):
+    port = free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.abspath(__file__),
+         '-k', worker_class, '-w', str(args.workers), '--worker-connections', '1000',
+         '--timeout', '120', '-b', f'127.0.0.1:{port}', '--chdir', SRC_DIR, 'main:app'],
+        env=dict(env, GUNICORN_WORKER_CLASS=worker_class),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        if not wait_until_ready(f'{base_url}/api/health/ready'):
+            print(f"{worker_class}: server did not become ready")
+            return None
+
+        codes = [f'LOAD{run_index}X{i:05d}' for i in range(args.requests)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            results = list(pool.map(lambda code: redeem(base_url, cookie, code), codes))
+        elapsed = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    latencies = [ms for _, ms in results]
+    ok = sum(1 for status, _ in results if status == 200)
+    print(f"{worker_class:>8}: {ok}/{len(results)} OK in {elapsed:.2f}s = {len(results) / elapsed:.1f} req/s | "
+          f"latency ms p50={percentile(latencies, 50):.0f} p95={percentile(latencies, 95):.0f} "
+          f"max={max(latencies):.0f}")
+    return len(results) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare sync and async gunicorn workers on redeem-voucher')
+    parser.add_argument('--worker-classes', default='sync,gevent', help='Comma-separated gunicorn worker classes')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+    parser.add_argument('--requests', type=int, default=200, help='Redemptions per worker class')
+    parser.add_argument('--concurrency', type=int, default=50, help='Concurrent client connections')
+    parser.add_argument('--sms-delay', type=float, default=0.5, help='Simulated SMS provider latency in seconds')
+    args = parser.parse_args()
+
+    worker_classes = [name.strip() for name in args.worker_classes.split(',') if name.strip()]
+    db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False).name
+    env = dict(
+        os.environ,
+        DATABASE_URL=f'sqlite:///{db_file}',
+        SECRET_KEY=SECRET_KEY,
+        STRIPE_WEBHOOK_WORKER='off',
+        LOADTEST_SMS_DELAY=str(args.sms_delay)
+    )
+    os.environ.update(env)
+    cookie = seed(db_file, len(worker_classes), args.requests)
+
+    print(f"{args.requests} redemptions per run, {args.concurrency} concurrent clients, "
+          f"{args.workers} workers, SMS latency {args.sms_delay * 1000:.0f}ms")
+    throughput = {}
+    for index, worker_class in enumerate(worker_classes):
+        throughput[worker_class] = run(worker_class, index, args, env, cookie)
+
+    os.remove(db_file)
+    if throughput.get('sync') and len(throughput) > 1:
+        for worker_class, value in throughput.items():
+            if worker_class != 'sync' and value:
+                print(f"{worker_class} vs sync: {value / throughput['sync']:.1f}x throughput")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Bulk SMS Benchmark for BAK UP E-Voucher System
+
+Compares the serial send_sms() loop with SMSService.send_many() against a local
+fake Twilio provider that simulates API latency, so no real messages are sent.
+The batch includes the same numbers written in different formats to exercise
+normalization and de-duplication.
+
+Usage:
+    python3 sms_bulk_benchmark.py                          # 200 messages, 150ms latency
+    python3 sms_bulk_benchmark.py --messages 500 --latency 0.3 --workers 16 --rate 40
+"""
+
+import argparse
+import itertools
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from sms_service import SMSService
+
+
+class FakeTwilioClient:
+    """Stands in for twilio.rest.Client: sleeps like an API call and records calls"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._sids = itertools.count(1)
+        self.messages = SimpleNamespace(create=self.create)
+
+    def create(self, body, from_, to):
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.latency)
+        with self._lock:
+            self.in_flight -= 1
+        return SimpleNamespace(sid=f'SM{next(self._sids):032d}', status='queued')
+
+
+def build_service(latency):
+    service = SMSService()
+    service.client = FakeTwilioClient(latency)
+    service.from_number = '+447000000000'
+    service.enabled = True
+    return service
+
+
+def build_batch(count):
+    """Unique recipients, plus ~10% resent with the number in another format"""
+    batch = [(f'07700 9{i:05d}', f'Your voucher code: CODE{i:05d}') for i in range(count)]
+    batch += [(f'+4477009{i:05d}', f'Your voucher code: CODE{i:05d}') for i in range(0, count, 10)]
+    return batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark bulk SMS dispatch against a fake provider')
+    parser.add_argument('--messages', type=int, default=200, help='Number of distinct recipients')
+    parser.add_argument('--latency', type=float, default=0.15, help='Simulated API latency in seconds')
+    parser.add_argument('--workers', type=int, default=8, help='send_many worker threads')
+    parser.add_argument('--rate', type=float, default=50, help='send_many messages per second limit')
+    args = parser.parse_args()
+
+    batch = build_batch(args.messages)
+    print(f"Batch: {len(batch)} messages ({len(batch) - args.messages} duplicates), "
+          f"simulated latency {args.latency * 1000:.0f}ms")
+
+    serial = build_service(args.latency)
+    start = time.perf_counter()
+    serial_sent = sum(1 for number, body in batch if serial.send_sms(number, body)['success'])
+    serial_time = time.perf_counter() - start
+    print(f"Serial loop: {serial_sent} sent, {serial.client.calls} API calls in {serial_time:.2f}s")
+
+    bulk = build_service(args.latency)
+    start = time.perf_counter()
+    result = bulk.send_many(batch, max_workers=args.workers, rate_per_second=args.rate)
+    bulk_time = time.perf_counter() - start
+    print(f"send_many:   {result['sent']} sent, {result['duplicates']} deduplicated, "
+          f"{bulk.client.calls} API calls in {bulk_time:.2f}s "
+          f"(peak concurrency {bulk.client.max_in_flight}, {bulk.client.calls / bulk_time:.1f} msg/s, limit {args.rate:g})")
+    print(f"Speed-up: {serial_time / bulk_time:.1f}x")
+
+    ok = (len(result['results']) == len(batch)
+          and all(r['success'] for r in result['results'])
+          and bulk.client.calls == args.messages
+          and bulk.client.max_in_flight <= args.workers
+          and bulk.client.calls / bulk_time <= args.rate * 1.1)
+    print("PASS" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Stripe Webhook Load Test Harness for BAK UP E-Voucher System
+
+Builds signed Stripe events from the fixtures in tests/fixtures/stripe, fires
+them at /api/payment/webhook (including retried duplicates), reports the ACK
+latency, then drains the inbox and checks every payment was credited once.
+
+Runs against a throwaway SQLite database through the Flask test client, so it
+never touches real data or the Stripe API.
+
+Usage:
+    python3 stripe_webhook_loadtest.py                       # 1000 payments, 20% duplicate deliveries
+    python3 stripe_webhook_loadtest.py --payments 5000 --duplicates 0.5
+"""
+
+import argparse
+import copy
+import hashlib
+import hmac
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), '..', 'tests', 'fixtures', 'stripe')
+WEBHOOK_SECRET = 'whsec_loadtest'
+
+
+def load_fixture(event_type):
+    with open(os.path.join(FIXTURE_DIR, f'{event_type}.json')) as handle:
+        return json.load(handle)
+
+
+def sign(payload, secret=WEBHOOK_SECRET):
+    """Build a Stripe-Signature header the same way Stripe does"""
+    timestamp = int(time.time())
+    signature = hmac.new(secret.encode(), f'{timestamp}.{payload}'.encode(), hashlib.sha256).hexdigest()
+    return f't={timestamp},v1={signature}'
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the Stripe webhook inbox')
+    parser.add_argument('--payments', type=int, default=1000, help='Number of distinct payments')
+    parser.add_argument('--duplicates', type=float, default=0.2, help='Fraction of events delivered twice')
+    args = parser.parse_args()
+
+    db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False).name
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_file}'
+    os.environ['STRIPE_WEBHOOK_SECRET'] = WEBHOOK_SECRET
+    os.environ['STRIPE_WEBHOOK_WORKER'] = 'off'
+
+    from main import app, db, User, PaymentTransaction
+    import stripe_webhook_inbox as inbox
+
+    template = load_fixture('payment_intent.succeeded')
+    client = app.test_client()
+
+    with app.app_context():
+        db.create_all()
+        vcse = User(email='loadtest-vcse@example.com', password_hash='!', first_name='Load',
+                    last_name='Test', user_type='vcse', balance=0.0)
+        db.session.add(vcse)
+        db.session.flush()
+        db.session.bulk_insert_mappings(PaymentTransaction, [
+            {'vcse_id': vcse.id, 'amount': 50.0, 'stripe_payment_intent_id': f'pi_load_{i}', 'status': 'pending'}
+            for i in range(args.payments)
+        ])
+        db.session.commit()
+        vcse_id = vcse.id
+
+    deliveries = []
+    for i in range(args.payments):
+        event = copy.deepcopy(template)
+        event['id'] = f'evt_load_{i}'
+        event['created'] = template['created'] + i
+        event['data']['object']['id'] = f'pi_load_{i}'
+        deliveries.append(json.dumps(event))
+    duplicate_every = int(1 / args.duplicates) if args.duplicates > 0 else 0
+    if duplicate_every:
+        deliveries += deliveries[::duplicate_every]
+
+    latencies = []
+    for payload in deliveries:
+        start = time.perf_counter()
+        response = client.post('/api/payment/webhook', data=payload, content_type='application/json',
+                               headers={'Stripe-Signature': sign(payload)})
+        latencies.append((time.perf_counter() - start) * 1000)
+        if response.status_code != 200:
+            print(f"Unexpected response {response.status_code}: {response.get_data(as_text=True)}")
+            sys.exit(1)
+
+    print(f"Deliveries: {len(deliveries)} ({len(deliveries) - args.payments} duplicates)")
+    print(f"ACK latency ms: p50={percentile(latencies, 50):.2f} p95={percentile(latencies, 95):.2f} "
+          f"p99={percentile(latencies, 99):.2f} max={max(latencies):.2f}")
+
+    with app.app_context():
+        start = time.perf_counter()
+        applied = 0
+        while True:
+            processed = inbox.process_pending_events()
+            applied += processed
+            if processed < inbox.BATCH_SIZE:
+                break
+        elapsed = time.perf_counter() - start
+        print(f"Worker applied {applied} events in {elapsed:.2f}s ({applied / max(elapsed, 1e-9):.0f} events/s)")
+
+        balance = db.session.query(User.balance).filter_by(id=vcse_id).scalar()
+        expected = 50.0 * args.payments
+        print(f"Balance: £{balance:.2f} (expected £{expected:.2f})")
+        ok = abs(balance - expected) < 0.005
+
+    os.remove(db_file)
+    print("PASS" if ok else "FAIL: payments were not credited exactly once")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
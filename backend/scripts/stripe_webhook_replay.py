@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Stripe Webhook Replay Tool for BAK UP E-Voucher System
+
+Re-queues stored Stripe webhook events so the worker applies them again, and
+can fetch events from the Stripe API that never reached the inbox (e.g. while
+the service was down). Event handlers are idempotent, so replaying an event
+that already took effect does not credit a payment twice.
+
+Usage:
+    python3 stripe_webhook_replay.py --status failed          # retry failed events
+    python3 stripe_webhook_replay.py --status processing      # recover events stuck after a crash
+    python3 stripe_webhook_replay.py --event-id evt_123 --event-id evt_456
+    python3 stripe_webhook_replay.py --since 2026-10-01 --drain
+    python3 stripe_webhook_replay.py --fetch evt_789 --drain  # pull from Stripe, then apply
+    python3 stripe_webhook_replay.py --drain                  # external worker mode (STRIPE_WEBHOOK_WORKER=off)
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+
+def log(message):
+    """Log messages with timestamp"""
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    print(f"[{timestamp}] {message}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay Stripe webhook events from the inbox')
+    parser.add_argument('--event-id', action='append', default=[], help='Stripe event ID to replay (repeatable)')
+    parser.add_argument('--status', help='Replay every stored event in this status (failed, processing, ignored, ...)')
+    parser.add_argument('--since', help='Only replay events received on or after this date (YYYY-MM-DD)')
+    parser.add_argument('--fetch', action='append', default=[], help='Fetch a missing event from the Stripe API and store it')
+    parser.add_argument('--drain', action='store_true', help='Apply all pending events before exiting')
+    args = parser.parse_args()
+
+    # Apply events here rather than in a background thread of this process
+    os.environ['STRIPE_WEBHOOK_WORKER'] = 'off'
+    from main import app
+    import stripe_webhook_inbox as inbox
+    from stripe_payment import get_stripe
+
+    with app.app_context():
+        for event_id in args.fetch:
+            event = get_stripe().Event.retrieve(event_id)
+            stored = inbox.store_event(event, json.dumps(event.to_dict_recursive()))
+            log(f"Fetched {event_id} from Stripe ({'stored' if stored else 'already in inbox'})")
+            if not stored:
+                args.event_id.append(event_id)
+
+        if args.event_id or args.status or args.since:
+            since = datetime.strptime(args.since, '%Y-%m-%d') if args.since else None
+            count = inbox.replay_events(event_ids=args.event_id or None, status=args.status, since=since)
+            log(f"Queued {count} events for replay")
+
+        if args.drain:
+            total = 0
+            while True:
+                processed = inbox.process_pending_events()
+                total += processed
+                if processed < inbox.BATCH_SIZE:
+                    break
+            log(f"Applied {total} pending events")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Concurrent Claim Benchmark for BAK UP E-Voucher System
+
+Posts surplus items and has many VCSE threads race to claim them through the
+claim engine, then checks nobody double-claimed: each whole item has exactly
+one winner, and partial claims never add up to more than was posted.
+
+Uses a throwaway SQLite database by default; set DATABASE_URL to a scratch
+PostgreSQL database to measure real row-level contention.
+
+Usage:
+    python3 surplus_claim_benchmark.py                           # 50 items, 20 VCSEs
+    python3 surplus_claim_benchmark.py --items 200 --vcses 50 --partial 2
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark concurrent surplus item claims')
+    parser.add_argument('--items', type=int, default=50, help='Number of items to post')
+    parser.add_argument('--vcses', type=int, default=20, help='Concurrent VCSEs racing for each item')
+    parser.add_argument('--quantity', type=int, default=10, help='Quantity posted per item')
+    parser.add_argument('--partial', type=int, default=0, help='Claim this much per attempt instead of the whole item')
+    args = parser.parse_args()
+
+    db_file = None
+    if not os.environ.get('DATABASE_URL'):
+        db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False).name
+        os.environ['DATABASE_URL'] = f'sqlite:///{db_file}'
+
+    from main import app, db, User, VendorShop, SurplusItem
+    import surplus_claims
+
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            # Let SQLite writers queue on the file lock rather than fail straight away
+            from sqlalchemy import event
+
+            @event.listens_for(db.engine, 'connect')
+            def set_busy_timeout(dbapi_connection, _):
+                dbapi_connection.execute('PRAGMA busy_timeout = 30000')
+
+        db.create_all()
+        vendor = User(email='bench-vendor@example.com', password_hash='!', first_name='Bench',
+                      last_name='Vendor', user_type='vendor')
+        db.session.add(vendor)
+        db.session.flush()
+        shop = VendorShop(vendor_id=vendor.id, shop_name='Bench Shop', address='1 High St',
+                          postcode='NN9 6GR', city='Raunds', phone='01933000000')
+        db.session.add(shop)
+        vcses = [User(email=f'bench-vcse-{i}@example.com', password_hash='!', first_name='VCSE',
+                      last_name=str(i), user_type='vcse') for i in range(args.vcses)]
+        db.session.add_all(vcses)
+        db.session.flush()
+        items = [SurplusItem(vendor_id=vendor.id, shop_id=shop.id, item_name=f'Bread {i}',
+                             quantity=f'{args.quantity} loaves', category='edible')
+                 for i in range(args.items)]
+        db.session.add_all(items)
+        db.session.commit()
+        item_ids = [item.id for item in items]
+        vcse_ids = [vcse.id for vcse in vcses]
+
+    latencies = []
+    outcomes = []  # (item_id, won)
+    lock = threading.Lock()
+    collection_time = datetime.utcnow() + timedelta(hours=2)
+
+    def vcse_worker(vcse_id, barrier):
+        with app.app_context():
+            for item_id in item_ids:
+                barrier.wait()  # everyone hits the same item at the same moment
+                start = time.perf_counter()
+                while True:
+                    try:
+                        claim = surplus_claims.accept_surplus_item(
+                            item_id, vcse_id, collection_time, args.partial or None)
+                        break
+                    except Exception as e:
+                        db.session.rollback()
+                        if 'locked' not in str(e):
+                            raise
+                elapsed = (time.perf_counter() - start) * 1000
+                with lock:
+                    latencies.append(elapsed)
+                    outcomes.append((item_id, claim))
+            db.session.remove()
+
+    barrier = threading.Barrier(args.vcses)
+    threads = [threading.Thread(target=vcse_worker, args=(vcse_id, barrier)) for vcse_id in vcse_ids]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    wins = sum(1 for _, claim in outcomes if claim)
+    print(f"Attempts: {len(outcomes)} by {args.vcses} concurrent VCSEs on {args.items} items in {elapsed:.2f}s "
+          f"({len(outcomes) / elapsed:.0f} claims/s)")
+    print(f"Won: {wins}  Lost (409): {len(outcomes) - wins}")
+    print(f"Claim latency ms: p50={percentile(latencies, 50):.2f} p95={percentile(latencies, 95):.2f} "
+          f"p99={percentile(latencies, 99):.2f}")
+
+    ok = True
+    with app.app_context():
+        for item_id in item_ids:
+            rows = SurplusItem.query.filter(
+                (SurplusItem.id == item_id) | (SurplusItem.parent_item_id == item_id),
+                SurplusItem.collection_status == 'accepted'
+            ).all()
+            claimed = sum(surplus_claims.parse_quantity(row.quantity)[0] or 0 for row in rows)
+            winners = sum(1 for i, claim in outcomes if i == item_id and claim)
+            if claimed > Decimal(args.quantity) or winners != len(rows) or (not args.partial and winners != 1):
+                print(f"Item {item_id}: {winners} winners, {len(rows)} accepted rows, {claimed} claimed")
+                ok = False
+
+    if db_file:
+        os.remove(db_file)
+    print("PASS" if ok else "FAIL: an item was over-claimed")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,6 +4,8 @@ Provides advanced search, transaction filtering, broadcast messaging, and fund a
 """
 
 from flask import jsonify, request, session
+from auth import get_principal
+from notification_fanout import notify_audience
 from datetime import datetime, timedelta
 from sqlalchemy import or_, and_, func
 import json
@@ -28,7 +30,7 @@ def init_admin_enhancements(app, db, User, VendorShop, Voucher, Transaction, ema
             if not user_id:
                 return jsonify({'error': 'Unauthorized'}), 401
             
-            user = User.query.get(user_id)
+            user = get_principal()
             if not user or user.user_type != 'admin':
                 return jsonify({'error': 'Admin access required'}), 403
             
@@ -142,7 +144,7 @@ def init_admin_enhancements(app, db, User, VendorShop, Voucher, Transaction, ema
             if not user_id:
                 return jsonify({'error': 'Unauthorized'}), 401
             
-            user = User.query.get(user_id)
+            user = get_principal()
             if not user or user.user_type != 'admin':
                 return jsonify({'error': 'Admin access required'}), 403
             
@@ -177,6 +179,12 @@ def init_admin_enhancements(app, db, User, VendorShop, Voucher, Transaction, ema
             # Get all matching vouchers
             vouchers = query.order_by(Voucher.created_at.desc()).all()
             
+            # Shops each restricted, unredeemed voucher can be accepted at, in one query
+            from voucher_shops import shops_by_voucher
+            accepted_shops = shops_by_voucher(
+                v.id for v in vouchers if not v.any_shop and not v.redeemed_at_shop_id
+            )
+            
             # Filter by shop, town, or recipient (requires joining with related tables)
             filtered_transactions = []
             for voucher in vouchers:
@@ -200,22 +208,16 @@ def init_admin_enhancements(app, db, User, VendorShop, Voucher, Transaction, ema
                         shop_name_str = shop.shop_name
                         shop_town = shop.town
                 # For active vouchers, show where they can be accepted
-                elif voucher.vendor_restrictions:
-                    try:
-                        import json
-                        shop_ids = json.loads(voucher.vendor_restrictions)
-                        if isinstance(shop_ids, list) and len(shop_ids) > 0:
-                            # Get first shop for display (could show multiple later)
-                            first_shop = VendorShop.query.get(shop_ids[0])
-                            if first_shop:
-                                if len(shop_ids) == 1:
-                                    shop_name_str = first_shop.shop_name
-                                    shop_town = first_shop.town
-                                else:
-                                    shop_name_str = f"{first_shop.shop_name} (+{len(shop_ids)-1} more)"
-                                    shop_town = first_shop.town
-                    except:
-                        shop_name_str = 'All Local Food Shops'
+                elif not voucher.any_shop:
+                    shops = accepted_shops.get(voucher.id, [])
+                    if shops:
+                        # First shop for display (could show multiple later)
+                        first_shop = shops[0]
+                        if len(shops) == 1:
+                            shop_name_str = first_shop.shop_name
+                        else:
+                            shop_name_str = f"{first_shop.shop_name} (+{len(shops)-1} more)"
+                        shop_town = first_shop.town
                 else:
                     # No restrictions = can be used at any shop
                     shop_name_str = 'All Local Food Shops'
@@ -281,7 +283,7 @@ def init_admin_enhancements(app, db, User, VendorShop, Voucher, Transaction, ema
             if not user_id:
                 return jsonify({'error': 'Unauthorized'}), 401
             
-            user = User.query.get(user_id)
+            user = get_principal()
             if not user or user.user_type != 'admin':
                 return jsonify({'error': 'Admin access required'}), 403
             
@@ -318,7 +320,7 @@ def init_admin_enhancements(app, db, User, VendorShop, Voucher, Transaction, ema
             if not user_id:
                 return jsonify({'error': 'Unauthorized'}), 401
             
-            user = User.query.get(user_id)
+            user = get_principal()
             if not user or user.user_type != 'admin':
                 return jsonify({'error': 'Admin access required'}), 403
             
@@ -333,27 +335,22 @@ def init_admin_enhancements(app, db, User, VendorShop, Voucher, Transaction, ema
             if not audiences:
                 return jsonify({'error': 'At least one audience must be selected'}), 400
             
-            # Get recipients based on audience selection
-            recipients = []
-            
-            if 'vcse' in audiences:
-                vcse_users = User.query.filter_by(user_type='vcse', is_active=True).all()
-                recipients.extend(vcse_users)
-            
-            if 'school' in audiences:
-                school_users = User.query.filter_by(user_type='school', is_active=True).all()
-                recipients.extend(school_users)
-            
-            if 'vendor' in audiences:
-                vendor_users = User.query.filter_by(user_type='vendor', is_active=True).all()
-                recipients.extend(vendor_users)
-            
-            if 'recipient' in audiences:
-                recipient_users = User.query.filter_by(user_type='recipient', is_active=True).all()
-                recipients.extend(recipient_users)
+            audiences = [a for a in audiences if a in ('vcse', 'school', 'vendor', 'recipient')]
+            if not audiences:
+                return jsonify({'error': 'At least one audience must be selected'}), 400
             
-            if not recipients:
+            # In-app notification for the whole audience in one INSERT ... SELECT
+            notifications_created = notify_audience(title, body, 'info', user_types=audiences)
+            if not notifications_created:
+                db.session.rollback()
                 return jsonify({'error': 'No recipients found for selected audiences'}), 400
+            db.session.commit()
+            
+            # Only the columns the emails need
+            recipients = db.session.query(User.email, User.first_name, User.last_name).filter(
+                User.user_type.in_(audiences),
+                User.is_active.is_(True)
+            ).all()
             
             # Send emails
             sent_count = 0
@@ -382,11 +379,13 @@ def init_admin_enhancements(app, db, User, VendorShop, Voucher, Transaction, ema
                 'message': 'Broadcast sent successfully',
                 'sent_count': sent_count,
                 'failed_count': failed_count,
+                'notifications_created': notifications_created,
                 'total_recipients': len(recipients),
                 'audiences': audiences
             }), 200
             
         except Exception as e:
+            db.session.rollback()
             return jsonify({'error': f'Broadcast failed: {str(e)}'}), 500
     
     
@@ -404,7 +403,7 @@ def init_admin_enhancements(app, db, User, VendorShop, Voucher, Transaction, ema
             if not user_id:
                 return jsonify({'error': 'Unauthorized'}), 401
             
-            user = User.query.get(user_id)
+            user = get_principal()
             if not user or user.user_type != 'admin':
                 return jsonify({'error': 'Admin access required'}), 403
             
@@ -496,7 +495,7 @@ def init_admin_enhancements(app, db, User, VendorShop, Voucher, Transaction, ema
             if not user_id:
                 return jsonify({'error': 'Unauthorized'}), 401
             
-            user = User.query.get(user_id)
+            user = get_principal()
             if not user or user.user_type != 'admin':
                 return jsonify({'error': 'Admin access required'}), 403
             
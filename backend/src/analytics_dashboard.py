@@ -6,28 +6,13 @@ Provides comprehensive analytics data for the admin dashboard
 from flask import Blueprint, jsonify, request
 from datetime import datetime, timedelta
 from sqlalchemy import func, and_, or_
-from functools import wraps
+
+from auth import require_role
 
 analytics_bp = Blueprint('analytics', __name__)
 
-def admin_required(f):
-    """Decorator to ensure only admins can access analytics endpoints"""
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        # Import here to avoid circular imports
-        from main import User
-        from flask import session
-        
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'error': 'Unauthorized'}), 401
-        
-        user = User.query.get(user_id)
-        if not user or user.role != 'admin':
-            return jsonify({'error': 'Forbidden - Admin access required'}), 403
-        
-        return f(*args, **kwargs)
-    return decorated_function
+# Admin-only access (user_type == 'admin'); principal is loaded once per request
+admin_required = require_role('admin')
 
 
 @analytics_bp.route('/api/analytics/overview', methods=['GET'])
@@ -47,10 +32,10 @@ def get_analytics_overview():
         
         # Total users by role
         total_users = User.query.count()
-        total_vcse = User.query.filter_by(role='vcse').count()
-        total_schools = User.query.filter_by(role='school').count()
-        total_vendors = User.query.filter_by(role='vendor').count()
-        total_recipients = User.query.filter_by(role='recipient').count()
+        total_vcse = User.query.filter_by(user_type='vcse').count()
+        total_schools = User.query.filter_by(user_type='school').count()
+        total_vendors = User.query.filter_by(user_type='vendor').count()
+        total_recipients = User.query.filter_by(user_type='recipient').count()
         
         # Voucher statistics
         total_vouchers = Voucher.query.count()
@@ -69,9 +54,9 @@ def get_analytics_overview():
         ).count()
         
         # Wallet balances
-        total_vcse_balance = db.session.query(func.sum(User.wallet_balance)).filter_by(role='vcse').scalar() or 0
-        total_school_balance = db.session.query(func.sum(User.wallet_balance)).filter_by(role='school').scalar() or 0
-        total_vendor_balance = db.session.query(func.sum(User.wallet_balance)).filter_by(role='vendor').scalar() or 0
+        total_vcse_balance = db.session.query(func.sum(User.balance)).filter_by(user_type='vcse').scalar() or 0
+        total_school_balance = db.session.query(func.sum(User.balance)).filter_by(user_type='school').scalar() or 0
+        total_vendor_balance = db.session.query(func.sum(User.balance)).filter_by(user_type='vendor').scalar() or 0
         
         return jsonify({
             'success': True,
@@ -244,7 +229,7 @@ def get_geographic_distribution():
             User.city,
             func.count(User.id).label('count')
         ).filter(
-            User.role == 'vcse'
+            User.user_type == 'vcse'
         ).group_by(User.city).all()
         
         # Get distribution of schools by city
@@ -252,7 +237,7 @@ def get_geographic_distribution():
             User.city,
             func.count(User.id).label('count')
         ).filter(
-            User.role == 'school'
+            User.user_type == 'school'
         ).group_by(User.city).all()
         
         # Get distribution of vendors by town
@@ -4,6 +4,7 @@ Tracks and logs all important user activities for security and compliance
 """
 
 from flask import Blueprint, jsonify, session, request
+from auth import get_principal
 from datetime import datetime, timedelta
 import logging
 import json
@@ -14,6 +15,7 @@ logger = logging.getLogger(__name__)
 # Global references
 db = None
 User = None
+AuditDailySummary = None
 
 # Audit Log Model
 class AuditLog(db.Model if db else object):
@@ -87,18 +89,111 @@ def init_audit_system(flask_app, app_db, user_model):
                 'timestamp': self.timestamp.strftime('%Y-%m-%d %H:%M:%S') if self.timestamp else None
             }
     
-    globals()['AuditLog'] = AuditLog
+    # Per-day rollup of audit_logs, maintained on every log_activity call so the
+    # stats endpoint never has to scan the (partitioned, ever-growing) raw table
+    class AuditDailySummary(db.Model):
+        __tablename__ = 'audit_daily_summary'
+        __table_args__ = (
+            db.UniqueConstraint('day', 'action', 'status', 'user_email', 'user_type', name='uq_audit_daily_summary'),
+        )
+        
+        id = db.Column(db.Integer, primary_key=True)
+        day = db.Column(db.Date, nullable=False, index=True)
+        action = db.Column(db.String(100), nullable=False)
+        status = db.Column(db.String(20), nullable=False, default='')
+        user_email = db.Column(db.String(255), nullable=False, default='')
+        user_type = db.Column(db.String(50), nullable=False, default='')
+        count = db.Column(db.Integer, nullable=False, default=0)
     
-    # Create table if it doesn't exist
-    with flask_app.app_context():
-        try:
-            db.create_all()
-        except Exception as e:
-            logger.warning(f"Could not create audit_logs table: {e}")
+    globals()['AuditLog'] = AuditLog
+    globals()['AuditDailySummary'] = AuditDailySummary
     
+    # Tables are created and the rollup backfilled by migrations/migrate.py
     logger.info("Audit log system initialized")
 
 
+def _increment_daily_summary(day, action, status, user_email, user_type):
+    """Add one to the rollup row for (day, action, status, user) using a single upsert"""
+    values = {
+        'day': day,
+        'action': action,
+        'status': status or '',
+        'user_email': user_email or '',
+        'user_type': user_type or '',
+        'count': 1
+    }
+    dialect = db.engine.dialect.name
+    
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        table = AuditDailySummary.__table__
+        stmt = insert(table).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['day', 'action', 'status', 'user_email', 'user_type'],
+            set_={'count': table.c.count + 1}
+        )
+        db.session.execute(stmt)
+        return
+    
+    row = AuditDailySummary.query.filter_by(**{k: v for k, v in values.items() if k != 'count'}).first()
+    if row:
+        row.count = AuditDailySummary.count + 1
+    else:
+        db.session.add(AuditDailySummary(**values))
+
+
+def rebuild_audit_summary(date_from=None):
+    """
+    Recompute audit_daily_summary from the raw audit_logs table
+    
+    Args:
+        date_from: Only rebuild days on or after this date (default: everything)
+    
+    Returns:
+        int: Number of rollup rows written
+    """
+    from sqlalchemy import func
+    
+    day = func.date(AuditLog.timestamp)
+    query = db.session.query(
+        day,
+        AuditLog.action,
+        func.coalesce(AuditLog.status, ''),
+        func.coalesce(AuditLog.user_email, ''),
+        func.coalesce(AuditLog.user_type, ''),
+        func.count(AuditLog.id)
+    )
+    delete_query = AuditDailySummary.query
+    if date_from:
+        query = query.filter(AuditLog.timestamp >= date_from)
+        delete_query = delete_query.filter(AuditDailySummary.day >= date_from)
+    
+    rows = query.group_by(
+        day, AuditLog.action, func.coalesce(AuditLog.status, ''),
+        func.coalesce(AuditLog.user_email, ''), func.coalesce(AuditLog.user_type, '')
+    ).all()
+    
+    delete_query.delete(synchronize_session=False)
+    db.session.bulk_insert_mappings(AuditDailySummary, [
+        {
+            'day': datetime.strptime(str(r[0]), '%Y-%m-%d').date(),
+            'action': r[1],
+            'status': r[2],
+            'user_email': r[3],
+            'user_type': r[4],
+            'count': r[5]
+        }
+        for r in rows
+    ])
+    db.session.commit()
+    
+    logger.info("Rebuilt audit_daily_summary with %d rows", len(rows))
+    return len(rows)
+
+
 def log_activity(action, resource_type=None, resource_id=None, details=None, status='success', user_id=None):
     """
     Log a user activity
@@ -147,9 +242,10 @@ def log_activity(action, resource_type=None, resource_id=None, details=None, sta
         )
         
         db.session.add(audit_entry)
+        _increment_daily_summary(datetime.utcnow().date(), action, status, user_email, user_type)
         db.session.commit()
         
-        logger.info(f"Audit log created: {action} by user {user_email} ({user_type})")
+        logger.info("Audit log created: %s by user %s (%s)", action, user_email, user_type)
         return True
     
     except Exception as e:
@@ -169,7 +265,7 @@ def get_audit_logs():
     if not user_id:
         return jsonify({'error': 'Unauthorized'}), 401
     
-    user = User.query.get(user_id)
+    user = get_principal()
     if not user or user.user_type != 'admin':
         return jsonify({'error': 'Forbidden - Admin access required'}), 403
     
@@ -235,7 +331,7 @@ def get_audit_stats():
     if not user_id:
         return jsonify({'error': 'Unauthorized'}), 401
     
-    user = User.query.get(user_id)
+    user = get_principal()
     if not user or user.user_type != 'admin':
         return jsonify({'error': 'Forbidden - Admin access required'}), 403
     
@@ -244,46 +340,49 @@ def get_audit_stats():
         days = int(request.args.get('days', 30))
         date_from = datetime.utcnow() - timedelta(days=days)
         
-        # Total logs
-        total_logs = AuditLog.query.filter(AuditLog.timestamp >= date_from).count()
-        
-        # Logs by status
-        success_logs = AuditLog.query.filter(
-            AuditLog.timestamp >= date_from,
-            AuditLog.status == 'success'
-        ).count()
-        
-        failure_logs = AuditLog.query.filter(
-            AuditLog.timestamp >= date_from,
-            AuditLog.status == 'failure'
-        ).count()
-        
-        # Top actions
+        # Everything below is answered from the daily rollup: one GROUP BY for
+        # status/action/day totals and one for the busiest users
         from sqlalchemy import func
-        top_actions = db.session.query(
-            AuditLog.action,
-            func.count(AuditLog.id).label('count')
+        from collections import Counter
+        
+        day_from = date_from.date()
+        totals = db.session.query(
+            AuditDailySummary.day,
+            AuditDailySummary.action,
+            AuditDailySummary.status,
+            func.sum(AuditDailySummary.count)
         ).filter(
-            AuditLog.timestamp >= date_from
-        ).group_by(AuditLog.action).order_by(func.count(AuditLog.id).desc()).limit(10).all()
+            AuditDailySummary.day >= day_from
+        ).group_by(
+            AuditDailySummary.day, AuditDailySummary.action, AuditDailySummary.status
+        ).all()
+        
+        total_logs = 0
+        by_status = Counter()
+        by_action = Counter()
+        by_day = Counter()
+        for day, action, status, count in totals:
+            count = int(count)
+            total_logs += count
+            by_status[status] += count
+            by_action[action] += count
+            by_day[str(day)] += count
+        
+        success_logs = by_status['success']
+        failure_logs = by_status['failure']
+        top_actions = by_action.most_common(10)
+        activity_by_day = sorted(by_day.items())
         
-        # Top users
         top_users = db.session.query(
-            AuditLog.user_email,
-            AuditLog.user_type,
-            func.count(AuditLog.id).label('count')
-        ).filter(
-            AuditLog.timestamp >= date_from,
-            AuditLog.user_email.isnot(None)
-        ).group_by(AuditLog.user_email, AuditLog.user_type).order_by(func.count(AuditLog.id).desc()).limit(10).all()
-        
-        # Activity by day
-        activity_by_day = db.session.query(
-            func.date(AuditLog.timestamp).label('date'),
-            func.count(AuditLog.id).label('count')
+            AuditDailySummary.user_email,
+            AuditDailySummary.user_type,
+            func.sum(AuditDailySummary.count).label('count')
         ).filter(
-            AuditLog.timestamp >= date_from
-        ).group_by(func.date(AuditLog.timestamp)).order_by(func.date(AuditLog.timestamp)).all()
+            AuditDailySummary.day >= day_from,
+            AuditDailySummary.user_email != ''
+        ).group_by(
+            AuditDailySummary.user_email, AuditDailySummary.user_type
+        ).order_by(func.sum(AuditDailySummary.count).desc()).limit(10).all()
         
         return jsonify({
             'success': True,
@@ -291,8 +390,8 @@ def get_audit_stats():
             'success_logs': success_logs,
             'failure_logs': failure_logs,
             'top_actions': [{'action': action, 'count': count} for action, count in top_actions],
-            'top_users': [{'email': email, 'user_type': user_type, 'count': count} for email, user_type, count in top_users],
-            'activity_by_day': [{'date': str(date), 'count': count} for date, count in activity_by_day]
+            'top_users': [{'email': email, 'user_type': user_type or None, 'count': int(count)} for email, user_type, count in top_users],
+            'activity_by_day': [{'date': date, 'count': count} for date, count in activity_by_day]
         }), 200
     
     except Exception as e:
@@ -308,7 +407,7 @@ def export_audit_logs():
     if not user_id:
         return jsonify({'error': 'Unauthorized'}), 401
     
-    user = User.query.get(user_id)
+    user = get_principal()
     if not user or user.user_type != 'admin':
         return jsonify({'error': 'Forbidden - Admin access required'}), 403
     
@@ -0,0 +1,198 @@
+"""
+Shared Authentication Layer
+Loads the logged-in principal once per request instead of once per route
+
+Most routes only need to know who is calling and what kind of account it is.
+get_principal() answers that from a small per-worker cache of the immutable
+identity fields (id, user_type, is_active) keyed by session['user_id'], so a
+request costs no User query at all while the entry is fresh:
+
+    @app.route('/api/vendor/shops')
+    @require_role('vendor')
+    def get_vendor_shops():
+        vendor_id = g.principal.id
+        ...
+
+Routes that need the full row (balances, names, ...) call current_user(),
+which loads it at most once per request.
+
+Changes to user_type or is_active made in this worker evict the cached entry
+when they commit; other gunicorn workers pick them up within AUTH_CACHE_TTL
+seconds.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import wraps
+
+from flask import g, has_request_context, jsonify, session
+from sqlalchemy import event, inspect as sa_inspect, select
+
+logger = logging.getLogger(__name__)
+
+AUTH_CACHE_TTL = float(os.environ.get('AUTH_CACHE_TTL', '30'))
+AUTH_CACHE_SIZE = int(os.environ.get('AUTH_CACHE_SIZE', '10000'))
+
+Principal = namedtuple('Principal', ['id', 'user_type', 'is_active'])
+Principal.__doc__ = """Identity fields of the logged-in user"""
+
+ROLE_NAMES = {
+    'admin': 'Admin',
+    'vendor': 'Vendor',
+    'vcse': 'VCFSE',
+    'school': 'School',
+    'recipient': 'Recipient'
+}
+
+# Global references
+db = None
+User = None
+
+_cache = OrderedDict()  # user_id -> (Principal, loaded_at)
+_lock = threading.Lock()
+
+
+def init_auth(app_db, user_model):
+    """Initialize the auth layer with database models"""
+    global db, User
+    db = app_db
+    User = user_model
+    event.listen(db.session, 'before_flush', _collect_changed_users)
+    event.listen(db.session, 'after_commit', _evict_committed)
+    event.listen(db.session, 'after_soft_rollback', _forget_pending)
+    logger.info("Auth layer initialized")
+
+
+# ============================================
+# Principal cache
+# ============================================
+
+def _collect_changed_users(session, flush_context, instances):
+    changed = session.info.setdefault('auth_cache_evict', set())
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            state = sa_inspect(obj)
+            if state.attrs.user_type.history.has_changes() or state.attrs.is_active.history.has_changes():
+                changed.add(obj.id)
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            changed.add(obj.id)
+
+
+def _evict_committed(session):
+    for user_id in session.info.pop('auth_cache_evict', ()):
+        invalidate_principal(user_id)
+
+
+def _forget_pending(session, previous_transaction):
+    session.info.pop('auth_cache_evict', None)
+
+
+def invalidate_principal(user_id):
+    """Drop a user's cached identity in this worker"""
+    with _lock:
+        _cache.pop(user_id, None)
+
+
+def clear_principal_cache():
+    """Empty this worker's principal cache"""
+    with _lock:
+        _cache.clear()
+
+
+def load_principal(user_id):
+    """
+    Identity fields for a user ID, cached for AUTH_CACHE_TTL seconds
+
+    Returns:
+        Principal: The principal, or None if the user doesn't exist
+    """
+    now = time.monotonic()
+    with _lock:
+        entry = _cache.get(user_id)
+        if entry is not None and now - entry[1] < AUTH_CACHE_TTL:
+            _cache.move_to_end(user_id)
+            return entry[0]
+
+    row = db.session.execute(
+        select(User.id, User.user_type, User.is_active).where(User.id == user_id)
+    ).first()
+    if row is None:
+        invalidate_principal(user_id)
+        return None
+
+    principal = Principal(row.id, row.user_type, row.is_active is not False)
+    with _lock:
+        _cache[user_id] = (principal, now)
+        _cache.move_to_end(user_id)
+        while len(_cache) > AUTH_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return principal
+
+
+def get_principal():
+    """
+    The logged-in principal for this request, loaded at most once per request
+
+    Returns:
+        Principal: The principal, or None if nobody is logged in
+    """
+    if 'principal' not in g:
+        user_id = session.get('user_id')
+        g.principal = load_principal(user_id) if user_id else None
+    return g.principal
+
+
+def current_user():
+    """The logged-in User row, loaded at most once per request (None if not logged in)"""
+    if 'current_user' not in g:
+        principal = get_principal()
+        g.current_user = db.session.get(User, principal.id) if principal else None
+    return g.current_user
+
+
+def clear_request_principal():
+    """Forget the principal memoized on g (after login/logout within a request)"""
+    if has_request_context():
+        g.pop('principal', None)
+        g.pop('current_user', None)
+
+
+# ============================================
+# Decorators
+# ============================================
+
+def login_required(f):
+    """Reject the request with 401 unless someone is logged in"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not get_principal():
+            return jsonify({'error': 'Unauthorized'}), 401
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def require_role(*roles):
+    """
+    Reject the request unless the logged-in user has one of the given user types
+
+    Returns 401 when nobody is logged in and 403 for other roles or deactivated
+    accounts. The principal is available as g.principal inside the route.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            principal = get_principal()
+            if not principal:
+                return jsonify({'error': 'Unauthorized'}), 401
+            if principal.user_type not in roles:
+                names = ' or '.join(ROLE_NAMES.get(role, role) for role in roles)
+                return jsonify({'error': f'{names} access required'}), 403
+            if not principal.is_active:
+                return jsonify({'error': 'Account is deactivated'}), 403
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
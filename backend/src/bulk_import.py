@@ -4,6 +4,7 @@ Allows admins to import multiple vouchers via CSV file
 """
 
 from flask import Blueprint, request, jsonify, session
+from auth import get_principal
 from werkzeug.utils import secure_filename
 import csv
 import io
@@ -216,7 +217,7 @@ def validate_import():
         if 'user_id' not in session:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(session['user_id'])
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         
@@ -317,7 +318,7 @@ def execute_import():
         if 'user_id' not in session:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(session['user_id'])
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         
@@ -2,7 +2,8 @@
 Bulk recipient upload functionality for VCFSE and Schools
 """
 from flask import Blueprint, request, jsonify, session, send_file
-from werkzeug.security import generate_password_hash
+from auth import get_principal
+from credentials import INVITE_PENDING
 import csv
 import io
 import secrets
@@ -79,7 +80,7 @@ def vcse_bulk_upload_recipients():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type not in ['vcse', 'school']:
             return jsonify({'error': 'Only VCFSE organizations and schools can bulk upload recipients'}), 403
         
@@ -140,14 +141,12 @@ def vcse_bulk_upload_recipients():
         
         for recipient_data in new_recipients:
             try:
-                # Generate random password
-                temp_password = secrets.token_urlsafe(12)
                 verification_token = secrets.token_urlsafe(32)
                 
                 # Create recipient user
                 recipient = User(
                     email=recipient_data['email'],
-                    password_hash=generate_password_hash(temp_password),
+                    password_hash=INVITE_PENDING,  # Sets a password via the reset link
                     first_name=recipient_data['first_name'],
                     last_name=recipient_data['last_name'],
                     phone=recipient_data.get('phone', ''),
@@ -163,13 +162,12 @@ def vcse_bulk_upload_recipients():
                 db.session.add(recipient)
                 db.session.flush()  # Get the ID without committing
                 
-                # Send welcome email with credentials
+                # Send welcome email
                 try:
                     email_service.send_welcome_email(
                         recipient.email,
                         recipient.first_name,
-                        temp_password,
-                        verification_token
+                        'recipient'
                     )
                 except Exception as email_error:
                     print(f"Failed to send welcome email to {recipient.email}: {email_error}")
@@ -6,8 +6,7 @@ Handles CSV upload and bulk voucher creation for VCFSE organizations
 import csv
 import io
 from datetime import datetime, timedelta
-from werkzeug.security import generate_password_hash
-import secrets
+from credentials import INVITE_PENDING
 
 def parse_csv_recipients(csv_file):
     """
@@ -95,6 +94,12 @@ def create_bulk_vouchers(db, User, Voucher, recipients, issuer_id, expiry_days=3
     Returns success/failure results for each recipient
     """
     from flask import current_app
+    from voucher_shops import parse_shop_selection, set_vouchers_shops
+    
+    try:
+        shop_ids = parse_shop_selection(selected_shops)
+    except ValueError as e:
+        return {'error': str(e)}
     
     results = {
         'successful': [],
@@ -117,6 +122,7 @@ def create_bulk_vouchers(db, User, Voucher, recipients, issuer_id, expiry_days=3
         }
     
     # Process each recipient
+    vouchers = []
     for recipient_data in recipients:
         try:
             # Find or create recipient
@@ -124,10 +130,9 @@ def create_bulk_vouchers(db, User, Voucher, recipients, issuer_id, expiry_days=3
             
             if not recipient:
                 # Create new recipient account
-                temp_password = secrets.token_urlsafe(12)
                 recipient = User(
                     email=recipient_data['email'],
-                    password_hash=generate_password_hash(temp_password),
+                    password_hash=INVITE_PENDING,  # Sets a password via the reset link
                     first_name=recipient_data['first_name'],
                     last_name=recipient_data['last_name'],
                     phone=recipient_data['phone'],
@@ -146,11 +151,6 @@ def create_bulk_vouchers(db, User, Voucher, recipients, issuer_id, expiry_days=3
             expiry_date = datetime.utcnow().date() + timedelta(days=expiry_days)
             
             # Create voucher
-            import json
-            vendor_restrictions = None
-            if selected_shops and selected_shops != 'all':
-                vendor_restrictions = json.dumps(selected_shops)
-            
             voucher = Voucher(
                 code=voucher_code,
                 value=recipient_data['voucher_value'],
@@ -158,12 +158,12 @@ def create_bulk_vouchers(db, User, Voucher, recipients, issuer_id, expiry_days=3
                 issued_by=issuer_id,
                 expiry_date=expiry_date,
                 status='active',
-                vendor_restrictions=vendor_restrictions,
                 original_recipient_id=recipient.id,
                 reassignment_count=0
             )
             
             db.session.add(voucher)
+            vouchers.append(voucher)
             
             # Deduct from issuer balance
             issuer.allocated_balance -= recipient_data['voucher_value']
@@ -190,6 +190,7 @@ def create_bulk_vouchers(db, User, Voucher, recipients, issuer_id, expiry_days=3
     
     # Commit all changes
     try:
+        set_vouchers_shops(vouchers, shop_ids)
         db.session.commit()
     except Exception as e:
         db.session.rollback()
@@ -0,0 +1,130 @@
+"""
+Credentials
+Password hashing with a configurable method and cost, rehash on login, and invite-pending accounts
+
+Hashes are Werkzeug's "method$salt$hash" strings, so every hash stored before
+this module existed keeps working. PASSWORD_HASH_METHOD picks the method and
+cost for new hashes, in Werkzeug's notation:
+
+    scrypt                      Werkzeug's default (scrypt:32768:8:1)
+    scrypt:16384:8:1            scrypt with a lower work factor
+    pbkdf2:sha256:600000        PBKDF2-HMAC-SHA256 with 600k iterations
+
+Changing it doesn't invalidate anything: a user whose stored hash was made
+with other parameters is rehashed with the current ones the next time they
+log in successfully.
+
+Accounts created on someone's behalf (recipients added by vouchers and bulk
+imports) get INVITE_PENDING instead of a hash of a random password nobody is
+ever told. It never matches a password, and costs nothing to create; the
+recipient sets a password through the reset-password link.
+
+Hashing and checking run on a small thread pool (PASSWORD_HASH_THREADS,
+default 4), or the hub's native thread pool under gevent/eventlet workers,
+so a hash in progress doesn't stall the other requests a green worker is
+serving, and concurrent logins can't occupy more than that many cores.
+"""
+
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from sqlalchemy import update
+from sqlalchemy.orm.attributes import set_committed_value
+from werkzeug.security import check_password_hash, generate_password_hash
+
+logger = logging.getLogger(__name__)
+
+HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+HASH_THREADS = int(os.environ.get('PASSWORD_HASH_THREADS', '4'))
+
+# Stored in password_hash for accounts without a password; '!' never starts a Werkzeug hash
+INVITE_PENDING = '!invite-pending'
+
+# Global references
+db = None
+User = None
+worker_class = 'sync'
+
+_executor = None
+
+
+def init_credentials(app_db, user_model, gunicorn_worker_class='sync'):
+    """Initialize credentials with database models"""
+    global db, User, worker_class
+    db = app_db
+    User = user_model
+    worker_class = gunicorn_worker_class
+    logger.info("Credentials initialized", extra={'hash_method': HASH_METHOD})
+
+
+def _offload(fn, *args):
+    """Run a CPU-bound call on a real OS thread and wait for it"""
+    global _executor
+    if worker_class == 'gevent':
+        import gevent
+        return gevent.get_hub().threadpool.apply(fn, args)
+    if worker_class == 'eventlet':
+        from eventlet import tpool
+        return tpool.execute(fn, *args)
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=HASH_THREADS, thread_name_prefix='password-hash')
+    return _executor.submit(fn, *args).result()
+
+
+# ============================================
+# Hashes
+# ============================================
+
+def hash_password(password):
+    """Hash a password with the configured method and cost"""
+    return _offload(generate_password_hash, password, HASH_METHOD)
+
+
+def has_usable_password(password_hash):
+    """False for invite-pending and other placeholder hashes that can never match"""
+    return bool(password_hash) and not password_hash.startswith('!')
+
+
+@lru_cache(maxsize=None)
+def _current_parameters():
+    """The method prefix Werkzeug writes for HASH_METHOD, with its defaults filled in"""
+    return generate_password_hash('', HASH_METHOD).split('$', 1)[0]
+
+
+def needs_rehash(password_hash):
+    """True if a usable hash was made with a different method or cost than HASH_METHOD"""
+    if not has_usable_password(password_hash):
+        return False
+    return password_hash.split('$', 1)[0] != _current_parameters()
+
+
+def verify_password(user, password):
+    """
+    Check a user's password, upgrading their stored hash if it is outdated
+
+    The upgrade is a conditional UPDATE (only if the hash hasn't changed in
+    the meantime) in the caller's transaction. Does not commit; the caller
+    commits it along with its own changes.
+
+    Returns:
+        bool: True if the password matches
+    """
+    stored = user.password_hash
+    if not password or not has_usable_password(stored):
+        return False
+    if not _offload(check_password_hash, stored, password):
+        return False
+
+    if needs_rehash(stored):
+        upgraded = hash_password(password)
+        user_table = User.__table__
+        db.session.execute(
+            update(user_table)
+            .where(user_table.c.id == user.id, user_table.c.password_hash == stored)
+            .values(password_hash=upgraded)
+        )
+        set_committed_value(user, 'password_hash', upgraded)
+        logger.info("Upgraded password hash", extra={'user_id': user.id, 'hash_method': HASH_METHOD})
+    return True
@@ -0,0 +1,92 @@
+"""
+Database Engine Configuration
+Connection pool settings for SQLALCHEMY_ENGINE_OPTIONS, sized per worker class
+
+Without gunicorn (unified_server.py's threaded app.run, and scripts) one
+process serves every request on its own thread alongside the background
+threads (Stripe inbox worker, login flush), so it keeps SQLAlchemy's default
+pool of 5 + 10. Gunicorn sync workers handle one request at a time, so a
+couple of connections per process (plus headroom for the background threads)
+is enough; pool_size * workers must stay under the server's max_connections. Green workers (gevent/eventlet)
+run many requests per process and need a bigger pool, but still far fewer
+connections than greenlets - requests queue for up to DB_POOL_TIMEOUT seconds.
+
+Environment:
+    DB_POOL_SIZE, DB_MAX_OVERFLOW    Override the per-worker-class defaults
+    DB_POOL_TIMEOUT                  Seconds to wait for a free connection (default 10)
+    DB_POOL_RECYCLE                  Reconnect connections older than this (default 280)
+    DB_POOL_PRE_PING                 'true' to ping on every checkout (default off;
+                                     pool_recycle already retires idle connections)
+    DB_PGBOUNCER                     'true' when DATABASE_URL points at PgBouncer in
+                                     transaction pooling mode: no client-side pool
+                                     (NullPool) and no prepared statements
+"""
+
+import os
+
+from sqlalchemy.pool import NullPool
+
+# (pool_size, max_overflow) per gunicorn worker class; 'threaded' is no gunicorn at all
+POOL_DEFAULTS = {
+    'threaded': (5, 10),
+    'sync': (2, 3),
+    'gthread': (5, 5),
+    'gevent': (10, 10),
+    'eventlet': (10, 10),
+}
+
+
+def _env_flag(name, default=False):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def engine_options(database_url, worker_class='threaded'):
+    """
+    Build SQLALCHEMY_ENGINE_OPTIONS for a database URL and gunicorn worker class
+
+    Args:
+        database_url: SQLAlchemy database URL
+        worker_class: 'threaded' (not under gunicorn), 'sync', 'gthread', 'gevent' or 'eventlet'
+
+    Returns:
+        dict: Keyword arguments for create_engine()
+    """
+    if database_url.startswith('sqlite'):
+        # SQLite connections are local files; nothing to size or ping
+        return {}
+
+    if _env_flag('DB_PGBOUNCER'):
+        # PgBouncer owns the pool. psycopg2 never uses server-side prepared
+        # statements; psycopg 3 would, so switch them off for that driver too.
+        options = {'poolclass': NullPool}
+        if database_url.startswith('postgresql+psycopg://'):
+            options['connect_args'] = {'prepare_threshold': None}
+        return options
+
+    pool_size, max_overflow = POOL_DEFAULTS.get(worker_class, POOL_DEFAULTS['threaded'])
+    return {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', pool_size)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', max_overflow)),
+        'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', '10')),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', '280')),
+        'pool_pre_ping': _env_flag('DB_POOL_PRE_PING'),
+        # Reuse the most recently returned connection so idle ones age out
+        'pool_use_lifo': True,
+    }
+
+
+def pool_status(engine):
+    """Current pool occupancy for metrics (None for pools without a fixed size)"""
+    pool = engine.pool
+    if not hasattr(pool, 'checkedout'):
+        return None
+    return {
+        'size': pool.size(),
+        'checked_out': pool.checkedout(),
+        'checked_in': pool.checkedin(),
+        'overflow': pool.overflow(),
+        'max_overflow': getattr(pool, '_max_overflow', None),
+    }
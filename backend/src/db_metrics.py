@@ -0,0 +1,143 @@
+"""
+Per-Request Database Instrumentation
+Counts SQL statements and time spent in the database for every request
+
+Cursor execute events on the engine add to counters on flask.g, so each
+request knows how many statements it ran and how long they took. At the end
+of the request the counters are:
+
+- returned as X-DB-Statements / X-DB-Time-Ms (and a Server-Timing entry) when
+  the app runs in debug mode or DB_METRICS_HEADER is set, and
+- folded into per-endpoint totals for this worker, served with the pool
+  occupancy by /api/admin/db-metrics.
+
+Statements run outside a request (background threads, startup) only count
+towards the worker-wide totals.
+"""
+
+import logging
+import os
+import threading
+import time
+
+from flask import current_app, g, has_request_context, jsonify, request
+from sqlalchemy import event
+
+from auth import require_role
+from db_config import pool_status
+
+logger = logging.getLogger(__name__)
+
+DB_METRICS_HEADER = os.environ.get('DB_METRICS_HEADER', '').lower() in ('1', 'true', 'yes', 'on')
+
+# Global references
+db = None
+
+_lock = threading.Lock()
+_endpoints = {}  # endpoint -> {'requests', 'statements', 'db_time_ms', 'max_statements'}
+_totals = {'statements': 0, 'db_time_ms': 0.0, 'background_statements': 0}
+
+
+def init_db_metrics(app, app_db):
+    """Hook the engine and request lifecycle, and register /api/admin/db-metrics"""
+    global db
+    db = app_db
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'handle_error', _handle_error)
+
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+
+    @app.route('/api/admin/db-metrics', methods=['GET'])
+    @require_role('admin')
+    def admin_db_metrics():
+        """Per-endpoint statement counts and DB time for this worker, plus pool occupancy"""
+        return jsonify(get_db_metrics()), 200
+
+    logger.info("DB metrics initialized")
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+def _record(elapsed_ms):
+    in_request = has_request_context() and 'db_statements' in g
+    if in_request:
+        g.db_statements += 1
+        g.db_time_ms += elapsed_ms
+    with _lock:
+        _totals['statements'] += 1
+        _totals['db_time_ms'] += elapsed_ms
+        if not in_request:
+            _totals['background_statements'] += 1
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('query_start_time')
+    if starts:
+        _record((time.perf_counter() - starts.pop()) * 1000)
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute; still count it
+    conn = exception_context.connection
+    starts = conn.info.get('query_start_time') if conn is not None else None
+    if starts:
+        _record((time.perf_counter() - starts.pop()) * 1000)
+
+
+def _start_request():
+    g.db_statements = 0
+    g.db_time_ms = 0.0
+
+
+def _finish_request(response):
+    statements = g.get('db_statements')
+    if statements is None:
+        return response
+    db_time_ms = g.db_time_ms
+
+    endpoint = request.endpoint or 'unmatched'
+    with _lock:
+        stats = _endpoints.setdefault(endpoint, {'requests': 0, 'statements': 0, 'db_time_ms': 0.0, 'max_statements': 0})
+        stats['requests'] += 1
+        stats['statements'] += statements
+        stats['db_time_ms'] += db_time_ms
+        stats['max_statements'] = max(stats['max_statements'], statements)
+
+    if DB_METRICS_HEADER or current_app.debug:
+        response.headers['X-DB-Statements'] = str(statements)
+        response.headers['X-DB-Time-Ms'] = f'{db_time_ms:.2f}'
+        response.headers.add('Server-Timing', f'db;dur={db_time_ms:.2f};desc="{statements} statements"')
+    return response
+
+
+def get_db_metrics():
+    """Snapshot of this worker's counters"""
+    with _lock:
+        endpoints = {
+            name: dict(stats,
+                       db_time_ms=round(stats['db_time_ms'], 2),
+                       avg_statements=round(stats['statements'] / stats['requests'], 2),
+                       avg_db_time_ms=round(stats['db_time_ms'] / stats['requests'], 2))
+            for name, stats in _endpoints.items()
+        }
+        totals = dict(_totals, db_time_ms=round(_totals['db_time_ms'], 2))
+    return {
+        'pid': os.getpid(),
+        'totals': totals,
+        'pool': pool_status(db.engine),
+        'endpoints': dict(sorted(endpoints.items(), key=lambda item: -item[1]['db_time_ms'])),
+    }
+
+
+def reset_db_metrics():
+    """Clear this worker's counters"""
+    with _lock:
+        _endpoints.clear()
+        _totals.update(statements=0, db_time_ms=0.0, background_statements=0)
@@ -1,13 +1,112 @@
 """
 Gmail SMTP Email Service for BAK UP E-Voucher System
 This service uses Gmail SMTP instead of SendGrid for easier setup
+
+Email bodies are rendered from cached templates (see email_templates.py) and
+sent over a small pool of keep-alive SMTP connections, so bulk flows reuse one
+authenticated connection for many messages instead of reconnecting per email.
 """
+import logging
 import os
 import smtplib
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
+from email_templates import apply_substitutions, render_email, render_new_item_notification
+from metrics import outbound_call
+
+logger = logging.getLogger(__name__)
+
+
+class SMTPConnectionPool:
+    """Thread-safe pool of authenticated, keep-alive SMTP connections"""
+
+    def __init__(self, host, port, user, password, max_size=4, idle_timeout=60, timeout=30):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._idle = deque()  # (connection, last_used)
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        server.starttls()
+        server.login(self.user, self.password)
+        return server
+
+    @staticmethod
+    def _close(server):
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    def _acquire(self):
+        self._slots.acquire()
+        try:
+            while True:
+                with self._lock:
+                    if not self._idle:
+                        break
+                    server, last_used = self._idle.pop()
+                if time.monotonic() - last_used < self.idle_timeout:
+                    return server
+                self._close(server)  # the server has probably dropped it already
+            return self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _release(self, server):
+        with self._lock:
+            self._idle.append((server, time.monotonic()))
+        self._slots.release()
+
+    def _discard(self, server):
+        self._close(server)
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; it is returned to the pool unless the SMTP session broke"""
+        server = self._acquire()
+        try:
+            yield server
+        except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError):
+            self._discard(server)
+            raise
+        except BaseException:
+            self._release(server)
+            raise
+        else:
+            self._release(server)
+
+    def close_all(self):
+        """Close every idle connection (e.g. before forking)"""
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for server, _ in idle:
+            self._close(server)
+
+
 class EmailService:
+    # Gmail closes sessions after roughly 100 messages, so bulk sends rotate connections
+    MESSAGES_PER_CONNECTION = 90
+    # A bulk send gives up after this many consecutive failed connection attempts, backing off in between
+    MAX_CONNECT_FAILURES = 3
+    CONNECT_BACKOFF_SECONDS = 1
+
     def __init__(self):
         self.smtp_server = 'smtp.gmail.com'
         self.smtp_port = 587
@@ -16,41 +115,112 @@ class EmailService:
         self.from_email = os.environ.get('FROM_EMAIL', self.smtp_user)
         self.app_url = os.environ.get('APP_URL', 'https://backup-voucher-system.onrender.com')
         self.enabled = bool(self.smtp_user and self.smtp_password)
-        
+        self.pool = SMTPConnectionPool(
+            self.smtp_server, self.smtp_port, self.smtp_user, self.smtp_password,
+            max_size=int(os.environ.get('SMTP_POOL_SIZE', '4')),
+            idle_timeout=int(os.environ.get('SMTP_POOL_IDLE_SECONDS', '60'))
+        )
+
         if not self.enabled:
             print("⚠️  Gmail SMTP not configured. Set GMAIL_USER and GMAIL_APP_PASSWORD environment variables.")
-        
+
+    def _build_message(self, to_email, subject, html_content):
+        message = MIMEMultipart('alternative')
+        message['From'] = f"BAK UP E-Voucher System <{self.from_email}>"
+        message['To'] = to_email
+        message['Subject'] = subject
+        message.attach(MIMEText(html_content, 'html'))
+        return message
+
     def send_email(self, to_email, subject, html_content):
         """Send an email using Gmail SMTP"""
         if not self.enabled:
-            print(f"⚠️  Email not sent to {to_email} (SMTP not configured)")
-            print(f"   Subject: {subject}")
+            logger.warning("Email not sent (SMTP not configured): %s", subject)
             return False
-            
-        try:
-            # Create message
-            message = MIMEMultipart('alternative')
-            message['From'] = f"BAK UP E-Voucher System <{self.from_email}>"
-            message['To'] = to_email
-            message['Subject'] = subject
-            
-            # Attach HTML content
-            html_part = MIMEText(html_content, 'html')
-            message.attach(html_part)
-            
-            # Connect to Gmail SMTP server
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.smtp_user, self.smtp_password)
-                server.send_message(message)
-            
-            print(f"✓ Email sent to {to_email}: {subject}")
-            return True
-            
-        except Exception as e:
-            print(f"✗ Failed to send email to {to_email}: {str(e)}")
-            return False
-    
+
+        message = self._build_message(to_email, subject, html_content)
+        # One retry on a fresh connection in case a pooled one was dropped by the server
+        for attempt in range(2):
+            try:
+                with self.pool.connection() as server, outbound_call('email', 'send'):
+                    server.send_message(message)
+                logger.debug("Email sent: %s", subject)
+                return True
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError) as e:
+                if attempt == 1:
+                    logger.error("Failed to send email: %s", e, extra={'subject': subject})
+            except Exception as e:
+                logger.error("Failed to send email: %s", e, extra={'subject': subject})
+                return False
+        return False
+
+    def send_many(self, messages):
+        """
+        Send many emails, reusing pooled SMTP connections across the batch
+
+        Args:
+            messages: Iterable of dicts with 'to', 'subject' and 'html' keys, plus
+                optional 'substitutions' ({placeholder: value}) filled into the html
+
+        Returns:
+            dict: {'sent': int, 'failed': int, 'results': [{'to', 'success', 'error'}]}
+        """
+        messages = list(messages)
+        results = []
+
+        if not self.enabled:
+            logger.warning("%d emails not sent (SMTP not configured)", len(messages))
+            results = [{'to': m['to'], 'success': False, 'error': 'SMTP not configured'} for m in messages]
+            return {'sent': 0, 'failed': len(results), 'results': results}
+
+        pending = deque(messages)
+        connect_failures = 0
+        while pending:
+            connected = False
+            try:
+                with self.pool.connection() as server:
+                    connected = True
+                    connect_failures = 0
+                    for _ in range(self.MESSAGES_PER_CONNECTION):
+                        if not pending:
+                            break
+                        item = pending[0]
+                        try:
+                            html = apply_substitutions(item['html'], item.get('substitutions'))
+                            with outbound_call('email', 'send_many'):
+                                server.send_message(self._build_message(item['to'], item['subject'], html))
+                            results.append({'to': item['to'], 'success': True, 'error': None})
+                        except smtplib.SMTPServerDisconnected:
+                            raise
+                        except smtplib.SMTPException as e:
+                            # Refused recipient, rejected data, ...: only this message fails
+                            results.append({'to': item['to'], 'success': False, 'error': str(e)})
+                        pending.popleft()
+            except (smtplib.SMTPException, OSError) as e:
+                if connected:
+                    # Connection dropped: fail the message in flight and carry on with a new connection
+                    if pending:
+                        item = pending.popleft()
+                        results.append({'to': item['to'], 'success': False, 'error': str(e)})
+                    continue
+                # Couldn't connect or log in: back off, and give up on the batch if it keeps failing
+                connect_failures += 1
+                if connect_failures >= self.MAX_CONNECT_FAILURES:
+                    logger.error("Bulk email aborted after %d failed connections: %s", connect_failures, e)
+                    while pending:
+                        item = pending.popleft()
+                        results.append({'to': item['to'], 'success': False, 'error': str(e)})
+                    break
+                time.sleep(self.CONNECT_BACKOFF_SECONDS * 2 ** (connect_failures - 1))
+            except Exception as e:
+                while pending:
+                    item = pending.popleft()
+                    results.append({'to': item['to'], 'success': False, 'error': str(e)})
+
+        sent = sum(1 for r in results if r['success'])
+        logger.info("Bulk email: %d sent, %d failed", sent, len(results) - sent)
+        return {'sent': sent, 'failed': len(results) - sent, 'results': results}
+
     def send_welcome_email(self, user_email, user_name, user_type):
         """Send welcome email to new users"""
         user_type_names = {
@@ -60,248 +230,76 @@ class EmailService:
             'school': 'School/Care Organization',
             'admin': 'Administrator'
         }
-        
+
         role_name = user_type_names.get(user_type, 'User')
-        
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background: linear-gradient(135deg, #4CAF50 0%, #45a049 100%); color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0; }}
-                .content {{ background: #f9f9f9; padding: 30px; border-radius: 0 0 10px 10px; }}
-                .button {{ display: inline-block; padding: 12px 30px; background-color: #4CAF50; color: white; text-decoration: none; border-radius: 5px; margin: 20px 0; }}
-                .footer {{ text-align: center; margin-top: 30px; color: #666; font-size: 12px; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>Welcome to BAK UP! 🎉</h1>
-                </div>
-                <div class="content">
-                    <h2>Hello {user_name}!</h2>
-                    <p>Thank you for joining the BAK UP E-Voucher System as a <strong>{role_name}</strong>.</p>
-                    
-                    <p>Your account has been successfully created and you can now access all the features available to you.</p>
-                    
-                    <h3>What's Next?</h3>
-                    <ul>
-                        <li>Log in to your dashboard</li>
-                        <li>Complete your profile information</li>
-                        <li>Start using the platform</li>
-                    </ul>
-                    
-                    <div style="text-align: center;">
-                        <a href="{self.app_url}" class="button">Go to Dashboard</a>
-                    </div>
-                    
-                    <p>If you have any questions or need assistance, please don't hesitate to contact our support team.</p>
-                    
-                    <p>Best regards,<br>
-                    <strong>The BAK UP Team</strong></p>
-                </div>
-                <div class="footer">
-                    <p>This email was sent by BAK UP E-Voucher System<br>
-                    Connecting surplus food with those who need it most</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        
+
+        html_content = render_email('welcome', user_name=user_name, role_name=role_name, app_url=self.app_url)
+
         return self.send_email(
             to_email=user_email,
             subject=f"Welcome to BAK UP - Your {role_name} Account is Ready!",
             html_content=html_content
         )
-    
+
     def send_password_reset_email(self, user_email, user_name, reset_token):
         """Send password reset email with secure link"""
         reset_link = f"{self.app_url}/reset-password?token={reset_token}"
-        
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background: linear-gradient(135deg, #2196F3 0%, #1976d2 100%); color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0; }}
-                .content {{ background: #f9f9f9; padding: 30px; border-radius: 0 0 10px 10px; }}
-                .button {{ display: inline-block; padding: 12px 30px; background-color: #2196F3; color: white; text-decoration: none; border-radius: 5px; margin: 20px 0; }}
-                .warning {{ background-color: #fff3cd; border-left: 4px solid #ffc107; padding: 15px; margin: 20px 0; }}
-                .footer {{ text-align: center; margin-top: 30px; color: #666; font-size: 12px; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>🔐 Password Reset Request</h1>
-                </div>
-                <div class="content">
-                    <h2>Hello {user_name},</h2>
-                    <p>We received a request to reset your password for your BAK UP account.</p>
-                    
-                    <p>Click the button below to create a new password:</p>
-                    
-                    <div style="text-align: center;">
-                        <a href="{reset_link}" class="button">Reset My Password</a>
-                    </div>
-                    
-                    <div class="warning">
-                        <strong>⚠️ Security Notice:</strong>
-                        <ul style="margin: 10px 0;">
-                            <li>This link will expire in <strong>1 hour</strong></li>
-                            <li>If you didn't request this reset, please ignore this email</li>
-                            <li>Your password will remain unchanged</li>
-                        </ul>
-                    </div>
-                    
-                    <p>If the button doesn't work, copy and paste this link into your browser:</p>
-                    <p style="word-break: break-all; color: #2196F3; font-size: 12px;">{reset_link}</p>
-                    
-                    <p>Best regards,<br>
-                    <strong>The BAK UP Team</strong></p>
-                </div>
-                <div class="footer">
-                    <p>This email was sent by BAK UP E-Voucher System<br>
-                    If you didn't request a password reset, please contact support immediately.</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        
+
+        html_content = render_email('password_reset', user_name=user_name, reset_link=reset_link)
+
         return self.send_email(
             to_email=user_email,
             subject="Reset Your BAK UP Password",
             html_content=html_content
         )
 
+    def build_new_item_notification(self, user_email, user_name, item_name, item_type, quantity, shop_name, shop_address='', item_description='', locale='en'):
+        """Build (without sending) the new item email, for use with send_many"""
+        subject, html = render_new_item_notification(
+            locale, self.app_url, user_name, item_name, item_type, quantity,
+            shop_name, shop_address, item_description
+        )
+        return {'to': user_email, 'subject': subject, 'html': html}
+
+    def send_new_item_notification(self, user_email, user_name, item_name, item_type, quantity, shop_name, shop_address='', item_description='', locale='en'):
+        """Send notification email when new item is posted"""
+        message = self.build_new_item_notification(
+            user_email, user_name, item_name, item_type, quantity, shop_name,
+            shop_address, item_description, locale
+        )
+        return self.send_email(message['to'], message['subject'], message['html'])
+
+    def build_voucher_issued_email(self, recipient_email, recipient_name, voucher_code, amount, issuer_name):
+        """Build (without sending) the voucher issued email, for use with send_many"""
+        return {
+            'to': recipient_email,
+            'subject': f"Your BAK UP Voucher Code: {voucher_code}",
+            'html': render_email(
+                'voucher_issued',
+                recipient_name=recipient_name,
+                voucher_code=voucher_code,
+                amount=amount,
+                issuer_name=issuer_name,
+                app_url=self.app_url
+            )
+        }
+
     def send_voucher_issued_email(self, recipient_email, recipient_name, voucher_code, amount, issuer_name):
         """Send email when a voucher is issued"""
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background-color: #4CAF50; color: white; padding: 20px; text-align: center; border-radius: 10px 10px 0 0; }}
-                .content {{ background-color: #f9f9f9; padding: 30px; border-radius: 0 0 10px 10px; }}
-                .voucher-code {{ 
-                    background-color: #fff; 
-                    border: 2px dashed #4CAF50; 
-                    padding: 20px; 
-                    text-align: center; 
-                    font-size: 32px; 
-                    font-weight: bold; 
-                    color: #4CAF50;
-                    margin: 20px 0;
-                }}
-                .amount {{ font-size: 24px; color: #FF9800; font-weight: bold; }}
-                .footer {{ text-align: center; padding: 20px; color: #666; font-size: 12px; }}
-                .button {{
-                    display: inline-block;
-                    padding: 12px 24px;
-                    background-color: #4CAF50;
-                    color: white;
-                    text-decoration: none;
-                    border-radius: 5px;
-                    margin: 10px 0;
-                }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>🎉 Your BAK UP Voucher is Ready!</h1>
-                </div>
-                <div class="content">
-                    <p>Dear {recipient_name},</p>
-                    
-                    <p>You have received a food voucher from <strong>{issuer_name}</strong>.</p>
-                    
-                    <div class="voucher-code">{voucher_code}</div>
-                    
-                    <p style="text-align: center;">
-                        <span class="amount">£{amount:.2f}</span>
-                    </p>
-                    
-                    <h3>How to Use Your Voucher:</h3>
-                    <ol>
-                        <li>Visit any participating local food shop</li>
-                        <li>Select the items you need</li>
-                        <li>Show your voucher code at checkout</li>
-                        <li>The amount will be deducted from your voucher balance</li>
-                    </ol>
-                    
-                    <p style="text-align: center;">
-                        <a href="{self.app_url}" class="button">View Your Voucher</a>
-                    </p>
-                    
-                    <p><strong>Important:</strong> Keep this code safe and only share it with authorized vendors.</p>
-                </div>
-                <div class="footer">
-                    <p>BAK UP E-Voucher System - Connecting surplus food with those who need it most</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        
-        return self.send_email(
-            to_email=recipient_email,
-            subject=f"Your BAK UP Voucher Code: {voucher_code}",
-            html_content=html_content
-        )
+        message = self.build_voucher_issued_email(recipient_email, recipient_name, voucher_code, amount, issuer_name)
+        return self.send_email(message['to'], message['subject'], message['html'])
 
     def send_redemption_receipt_email(self, recipient_email, recipient_name, voucher_code, amount_spent, remaining_balance, vendor_name):
         """Send email when voucher is redeemed"""
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background-color: #2196F3; color: white; padding: 20px; text-align: center; border-radius: 10px 10px 0 0; }}
-                .content {{ background-color: #f9f9f9; padding: 30px; border-radius: 0 0 10px 10px; }}
-                .receipt {{ background-color: #fff; border: 1px solid #ddd; padding: 20px; margin: 20px 0; }}
-                .amount {{ font-size: 20px; font-weight: bold; }}
-                .footer {{ text-align: center; padding: 20px; color: #666; font-size: 12px; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>✓ Voucher Redeemed</h1>
-                </div>
-                <div class="content">
-                    <p>Dear {recipient_name},</p>
-                    
-                    <p>Your voucher has been successfully redeemed at <strong>{vendor_name}</strong>.</p>
-                    
-                    <div class="receipt">
-                        <p><strong>Voucher Code:</strong> {voucher_code}</p>
-                        <p><strong>Amount Spent:</strong> <span class="amount" style="color: #f44336;">-£{amount_spent:.2f}</span></p>
-                        <p><strong>Remaining Balance:</strong> <span class="amount" style="color: #4CAF50;">£{remaining_balance:.2f}</span></p>
-                        <p><strong>Vendor:</strong> {vendor_name}</p>
-                    </div>
-                    
-                    <p>Thank you for using BAK UP!</p>
-                </div>
-                <div class="footer">
-                    <p>BAK UP E-Voucher System</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        
+        html_content = render_email(
+            'redemption_receipt',
+            recipient_name=recipient_name,
+            voucher_code=voucher_code,
+            amount_spent=amount_spent,
+            remaining_balance=remaining_balance,
+            vendor_name=vendor_name
+        )
+
         return self.send_email(
             to_email=recipient_email,
             subject="BAK UP Voucher Redeemed",
@@ -311,38 +309,9 @@ class EmailService:
     def send_payout_request_notification(self, vendor_name, shop_name, amount):
         """Send notification to admin when payout is requested"""
         admin_email = os.environ.get('ADMIN_EMAIL', 'admin@bakup.com')
-        
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background-color: #FF9800; color: white; padding: 20px; text-align: center; border-radius: 10px 10px 0 0; }}
-                .content {{ background-color: #f9f9f9; padding: 30px; border-radius: 0 0 10px 10px; }}
-                .amount {{ font-size: 24px; font-weight: bold; color: #FF9800; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>💰 New Payout Request</h1>
-                </div>
-                <div class="content">
-                    <p>A new payout request has been submitted:</p>
-                    
-                    <p><strong>Vendor:</strong> {vendor_name}</p>
-                    <p><strong>Shop:</strong> {shop_name}</p>
-                    <p><strong>Amount:</strong> <span class="amount">£{amount:.2f}</span></p>
-                    
-                    <p>Please review and process this request in the admin dashboard.</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        
+
+        html_content = render_email('payout_request', vendor_name=vendor_name, shop_name=shop_name, amount=amount)
+
         return self.send_email(
             to_email=admin_email,
             subject=f"New Payout Request from {vendor_name}",
@@ -356,51 +325,24 @@ class EmailService:
             'rejected': '#f44336',
             'pending': '#FF9800'
         }
-        
+
         status_text = {
             'approved': '✓ Approved',
             'rejected': '✗ Rejected',
             'pending': '⏳ Pending'
         }
-        
-        color = status_colors.get(status, '#666')
-        status_display = status_text.get(status, status.title())
-        
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background-color: {color}; color: white; padding: 20px; text-align: center; border-radius: 10px 10px 0 0; }}
-                .content {{ background-color: #f9f9f9; padding: 30px; border-radius: 0 0 10px 10px; }}
-                .amount {{ font-size: 24px; font-weight: bold; color: {color}; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>{status_display}</h1>
-                </div>
-                <div class="content">
-                    <p>Dear {vendor_name},</p>
-                    
-                    <p>Your payout request has been <strong>{status}</strong>.</p>
-                    
-                    <p><strong>Shop:</strong> {shop_name}</p>
-                    <p><strong>Amount:</strong> <span class="amount">£{amount:.2f}</span></p>
-                    
-                    {f'<p><strong>Admin Notes:</strong> {admin_notes}</p>' if admin_notes else ''}
-                    
-                    <p>Best regards,<br>
-                    <strong>The BAK UP Team</strong></p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        
+
+        html_content = render_email(
+            'payout_status',
+            color=status_colors.get(status, '#666'),
+            status_display=status_text.get(status, status.title()),
+            status=status,
+            vendor_name=vendor_name,
+            shop_name=shop_name,
+            amount=amount,
+            admin_notes=admin_notes
+        )
+
         return self.send_email(
             to_email=vendor_email,
             subject=f"Payout Request {status.title()} - {shop_name}",
@@ -409,43 +351,8 @@ class EmailService:
 
     def send_payout_paid_notification(self, vendor_email, vendor_name, shop_name, amount):
         """Send notification when payout is marked as paid"""
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background-color: #4CAF50; color: white; padding: 20px; text-align: center; border-radius: 10px 10px 0 0; }}
-                .content {{ background-color: #f9f9f9; padding: 30px; border-radius: 0 0 10px 10px; }}
-                .amount {{ font-size: 24px; font-weight: bold; color: #4CAF50; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>✓ Payment Sent!</h1>
-                </div>
-                <div class="content">
-                    <p>Dear {vendor_name},</p>
-                    
-                    <p>Great news! Your payout has been processed and sent.</p>
-                    
-                    <p><strong>Shop:</strong> {shop_name}</p>
-                    <p><strong>Amount:</strong> <span class="amount">£{amount:.2f}</span></p>
-                    
-                    <p>The payment should arrive in your account within 2-3 business days.</p>
-                    
-                    <p>Thank you for being part of BAK UP!</p>
-                    
-                    <p>Best regards,<br>
-                    <strong>The BAK UP Team</strong></p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        
+        html_content = render_email('payout_paid', vendor_name=vendor_name, shop_name=shop_name, amount=amount)
+
         return self.send_email(
             to_email=vendor_email,
             subject=f"Payment Sent - £{amount:.2f}",
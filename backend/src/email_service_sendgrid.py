@@ -1,32 +1,42 @@
 """
 SendGrid Email Service for BAK UP E-Voucher System
+Bodies come from the shared cached templates (email_templates.py); bulk sends
+use one API call per batch of personalizations instead of one per recipient.
 """
+import logging
 import os
 from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import Mail, Email, To, Content
 
+from markupsafe import escape
+
+from email_templates import render_email, render_new_item_notification
+from metrics import outbound_call
+
+logger = logging.getLogger(__name__)
+
 class EmailService:
+    # SendGrid accepts at most 1000 personalizations per request
+    MAX_PERSONALIZATIONS = 1000
+
     def __init__(self):
         # Get SendGrid API key
         self.api_key = os.environ.get('SENDGRID_API_KEY', '').strip()
         self.from_email = os.environ.get('FROM_EMAIL', 'noreply@backup-voucher.com').strip()
         self.app_url = os.environ.get('APP_URL', 'https://backup-voucher-system-1.onrender.com')
         self.enabled = bool(self.api_key and len(self.api_key) > 20)
+        # One client per process so the underlying HTTP connection is reused
+        self.client = SendGridAPIClient(self.api_key) if self.enabled else None
         
         if not self.enabled:
-            print("⚠️  SendGrid not configured. Set SENDGRID_API_KEY environment variable.")
-            print(f"   SENDGRID_API_KEY: {'SET' if self.api_key else 'NOT SET'}")
-            print(f"   API Key Length: {len(self.api_key) if self.api_key else 0} characters")
+            logger.warning("SendGrid not configured: SENDGRID_API_KEY is %s", 'too short' if self.api_key else 'not set')
         else:
-            print("✓ SendGrid configured successfully")
-            print(f"   From Email: {self.from_email}")
-            print(f"   API Key Length: {len(self.api_key)} characters")
+            logger.info("SendGrid configured", extra={'from_email': self.from_email})
     
     def send_email(self, to_email, subject, html_content):
         """Send an email using SendGrid"""
         if not self.enabled:
-            print(f"⚠️  Email not sent to {to_email} (SendGrid not configured)")
-            print(f"   Subject: {subject}")
+            logger.warning("Email not sent (SendGrid not configured): %s", subject)
             return False
             
         try:
@@ -37,23 +47,82 @@ class EmailService:
                 html_content=Content("text/html", html_content)
             )
             
-            sg = SendGridAPIClient(self.api_key)
-            response = sg.send(message)
-            
-            # SendGrid returns 202 for successful email acceptance
+            with outbound_call('email', 'send') as call:
+                response = self.client.send(message)
+                # SendGrid returns 202 for successful email acceptance
+                if response.status_code != 202:
+                    call.failed()
+
             if response.status_code == 202:
-                print(f"✓ Email sent to {to_email}: {subject} (Status: {response.status_code})")
+                logger.debug("Email sent: %s", subject)
                 return True
-            else:
-                print(f"✗ SendGrid returned error status {response.status_code} for {to_email}")
-                print(f"   Response body: {response.body}")
-                print(f"   Response headers: {response.headers}")
-                return False
-            
+            logger.error("SendGrid returned status %s: %s", response.status_code, response.body, extra={'subject': subject})
+            return False
+
         except Exception as e:
-            print(f"✗ Failed to send email to {to_email}: {str(e)}")
+            logger.error("Failed to send email: %s", e, extra={'subject': subject})
             return False
     
+    def send_many(self, messages):
+        """
+        Send many emails through SendGrid's batch personalizations
+
+        Messages sharing a subject and body (usually rendered once with
+        placeholders) go out in a single API request per 1000 recipients, with
+        each recipient's 'substitutions' applied by SendGrid.
+
+        Args:
+            messages: Iterable of dicts with 'to', 'subject', 'html' and optional 'substitutions'
+
+        Returns:
+            dict: {'sent': int, 'failed': int, 'results': [{'to', 'success', 'error'}]}
+        """
+        messages = list(messages)
+        if not self.enabled:
+            logger.warning("%d emails not sent (SendGrid not configured)", len(messages))
+            results = [{'to': m['to'], 'success': False, 'error': 'SendGrid not configured'} for m in messages]
+            return {'sent': 0, 'failed': len(results), 'results': results}
+
+        groups = {}
+        for item in messages:
+            groups.setdefault((item['subject'], item['html']), []).append(item)
+
+        results = []
+        for (subject, html_content), items in groups.items():
+            for start in range(0, len(items), self.MAX_PERSONALIZATIONS):
+                batch = items[start:start + self.MAX_PERSONALIZATIONS]
+                error = None
+                try:
+                    recipients = [
+                        To(item['to'], substitutions={
+                            key: str(escape(value)) for key, value in (item.get('substitutions') or {}).items()
+                        } or None)
+                        for item in batch
+                    ]
+                    message = Mail(
+                        from_email=Email(self.from_email, 'BAK UP E-Voucher System'),
+                        to_emails=recipients,
+                        subject=subject,
+                        html_content=Content("text/html", html_content),
+                        is_multiple=True  # one personalization each, recipients never see each other
+                    )
+                    with outbound_call('email', 'send_many') as call:
+                        response = self.client.send(message)
+                        if response.status_code != 202:
+                            call.failed()
+                    if response.status_code != 202:
+                        error = f"SendGrid returned status {response.status_code}"
+                except Exception as e:
+                    error = str(e)
+                if error:
+                    logger.error("SendGrid batch of %d failed: %s", len(batch), error, extra={'subject': subject})
+
+                results.extend({'to': item['to'], 'success': error is None, 'error': error} for item in batch)
+
+        sent = sum(1 for r in results if r['success'])
+        logger.info("Bulk email: %d sent, %d failed", sent, len(results) - sent)
+        return {'sent': sent, 'failed': len(results) - sent, 'results': results}
+
     def send_welcome_email(self, user_email, user_name, user_type):
         """Send welcome email to new users"""
         user_type_names = {
@@ -63,193 +132,46 @@ class EmailService:
             'school': 'School/Care Organization',
             'admin': 'Administrator'
         }
-        
+
         role_name = user_type_names.get(user_type, 'User')
-        
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background-color: #4CAF50; color: white; padding: 20px; text-align: center; border-radius: 5px 5px 0 0; }}
-                .content {{ background-color: #f9f9f9; padding: 30px; border-radius: 0 0 5px 5px; }}
-                .button {{ display: inline-block; padding: 12px 30px; background-color: #4CAF50; color: white; text-decoration: none; border-radius: 5px; margin: 20px 0; }}
-                .footer {{ text-align: center; margin-top: 20px; color: #666; font-size: 12px; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>Welcome to BAK UP E-Voucher System!</h1>
-                </div>
-                <div class="content">
-                    <p>Hello {user_name},</p>
-                    <p>Welcome to the BAK UP E-Voucher System! Your account has been successfully created as a <strong>{role_name}</strong>.</p>
-                    <p>You can now log in to access your dashboard and start using the system.</p>
-                    <a href="{self.app_url}" class="button">Go to Dashboard</a>
-                    <p>If you have any questions or need assistance, please don't hesitate to contact our support team.</p>
-                    <p>Best regards,<br>BAK UP E-Voucher Team</p>
-                </div>
-                <div class="footer">
-                    <p>© 2025 BAK UP E-Voucher System. All rights reserved.</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        
+        html_content = render_email('welcome', user_name=user_name, role_name=role_name, app_url=self.app_url)
+
         return self.send_email(user_email, f"Welcome to BAK UP E-Voucher System - {role_name}", html_content)
-    
+
     def send_password_reset_email(self, user_email, user_name, reset_token):
         """Send password reset email with secure link"""
         reset_link = f"{self.app_url}/reset-password?token={reset_token}"
-        
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background-color: #2196F3; color: white; padding: 20px; text-align: center; border-radius: 5px 5px 0 0; }}
-                .content {{ background-color: #f9f9f9; padding: 30px; border-radius: 0 0 5px 5px; }}
-                .button {{ display: inline-block; padding: 12px 30px; background-color: #2196F3; color: white; text-decoration: none; border-radius: 5px; margin: 20px 0; }}
-                .footer {{ text-align: center; margin-top: 20px; color: #666; font-size: 12px; }}
-                .warning {{ background-color: #fff3cd; border-left: 4px solid #ffc107; padding: 15px; margin: 20px 0; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>🔒 Password Reset Request</h1>
-                </div>
-                <div class="content">
-                    <h2>Hello {user_name},</h2>
-                    <p>We received a request to reset your password for your BAK UP account.</p>
-                    
-                    <p>Click the button below to create a new password:</p>
-                    <a href="{reset_link}" class="button">Reset Password</a>
-                    
-                    <p>Or copy and paste this link into your browser:</p>
-                    <p style="word-break: break-all; background-color: #f0f0f0; padding: 10px; border-radius: 3px; font-family: monospace; font-size: 12px;">{reset_link}</p>
-                    
-                    <div class="warning">
-                        <p style="margin: 0;"><strong>⚠️ Security Notice:</strong></p>
-                        <ul style="margin: 10px 0 0 0;">
-                            <li>This link will expire in 1 hour</li>
-                            <li>If you didn't request this reset, please ignore this email</li>
-                            <li>Never share this link with anyone</li>
-                        </ul>
-                    </div>
-                    
-                    <p>Best regards,<br>BAK UP E-Voucher Team</p>
-                </div>
-                <div class="footer">
-                    <p>© 2025 BAK UP E-Voucher System. All rights reserved.</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        
+        html_content = render_email('password_reset', user_name=user_name, reset_link=reset_link)
+
         return self.send_email(user_email, "🔒 Password Reset Request - BAK UP E-Voucher System", html_content)
-    
-    def send_new_item_notification(self, user_email, user_name, item_name, item_type, quantity, shop_name, shop_address='', item_description=''):
+
+    def build_new_item_notification(self, user_email, user_name, item_name, item_type, quantity, shop_name, shop_address='', item_description='', locale='en'):
+        """Build (without sending) the new item email, for use with send_many"""
+        subject, html = render_new_item_notification(
+            locale, self.app_url, user_name, item_name, item_type, quantity,
+            shop_name, shop_address, item_description
+        )
+        return {'to': user_email, 'subject': subject, 'html': html}
+
+    def send_new_item_notification(self, user_email, user_name, item_name, item_type, quantity, shop_name, shop_address='', item_description='', locale='en'):
         """Send notification email when new item is posted"""
-        item_type_emoji = '🆓' if item_type == 'free' else '🎁'
-        item_type_text = 'Free Item' if item_type == 'free' else 'Discounted Item'
-        
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background-color: #FF9800; color: white; padding: 20px; text-align: center; border-radius: 5px 5px 0 0; }}
-                .content {{ background-color: #f9f9f9; padding: 30px; border-radius: 0 0 5px 5px; }}
-                .item-box {{ background-color: white; padding: 20px; border-left: 4px solid #FF9800; margin: 20px 0; }}
-                .button {{ display: inline-block; padding: 12px 30px; background-color: #FF9800; color: white; text-decoration: none; border-radius: 5px; margin: 20px 0; }}
-                .footer {{ text-align: center; margin-top: 20px; color: #666; font-size: 12px; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>{item_type_emoji} New {item_type_text} Available!</h1>
-                </div>
-                <div class="content">
-                    <p>Hello {user_name},</p>
-                    <p>A new {item_type_text.lower()} has just been posted and is available now!</p>
-                    <div class="item-box">
-                        <h2 style="margin-top: 0; color: #FF9800;">{item_name}</h2>
-                        <p><strong>Shop:</strong> {shop_name}</p>
-                        {f'<p><strong>Location:</strong> {shop_address}</p>' if shop_address else ''}
-                        <p><strong>Quantity Available:</strong> {quantity}</p>
-                        <p><strong>Type:</strong> {item_type_text}</p>
-                        {f'<p><strong>Description:</strong> {item_description}</p>' if item_description else ''}
-                    </div>
-                    <p>Log in now to view details and place your order before it's gone!</p>
-                    <a href="{self.app_url}" class="button">View Item Now</a>
-                    <p>Best regards,<br>BAK UP E-Voucher Team</p>
-                </div>
-                <div class="footer">
-                    <p>© 2025 BAK UP E-Voucher System. All rights reserved.</p>
-                    <p>You're receiving this email because you have notifications enabled in your account settings.</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        
-        return self.send_email(user_email, f"🔔 New {item_type_text}: {item_name}", html_content)
-    
+        message = self.build_new_item_notification(
+            user_email, user_name, item_name, item_type, quantity, shop_name,
+            shop_address, item_description, locale
+        )
+        return self.send_email(message['to'], message['subject'], message['html'])
+
     def send_voucher_issued_email(self, recipient_email, recipient_name, voucher_code, voucher_value, expiry_date):
         """Send email when voucher is issued to recipient"""
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background-color: #4CAF50; color: white; padding: 20px; text-align: center; border-radius: 5px 5px 0 0; }}
-                .content {{ background-color: #f9f9f9; padding: 30px; border-radius: 0 0 5px 5px; }}
-                .voucher-box {{ background-color: white; padding: 30px; border: 3px dashed #4CAF50; margin: 20px 0; text-align: center; }}
-                .voucher-code {{ font-size: 32px; font-weight: bold; color: #4CAF50; letter-spacing: 3px; font-family: monospace; }}
-                .button {{ display: inline-block; padding: 12px 30px; background-color: #4CAF50; color: white; text-decoration: none; border-radius: 5px; margin: 20px 0; }}
-                .footer {{ text-align: center; margin-top: 20px; color: #666; font-size: 12px; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>🎉 Your Voucher is Ready!</h1>
-                </div>
-                <div class="content">
-                    <p>Hello {recipient_name},</p>
-                    <p>Great news! A new food voucher has been issued to you.</p>
-                    <div class="voucher-box">
-                        <p style="margin: 0; color: #666;">Your Voucher Code</p>
-                        <div class="voucher-code">{voucher_code}</div>
-                        <p style="margin: 10px 0 0 0;"><strong>Value:</strong> £{voucher_value:.2f}</p>
-                        <p style="margin: 5px 0 0 0;"><strong>Expires:</strong> {expiry_date}</p>
-                    </div>
-                    <p>You can use this voucher at any participating local food shop. Simply show your voucher code at checkout.</p>
-                    <a href="{self.app_url}" class="button">View My Vouchers</a>
-                    <p><strong>Important:</strong> Please use your voucher before the expiry date.</p>
-                    <p>Best regards,<br>BAK UP E-Voucher Team</p>
-                </div>
-                <div class="footer">
-                    <p>© 2025 BAK UP E-Voucher System. All rights reserved.</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        
+        html_content = render_email(
+            'voucher_ready',
+            recipient_name=recipient_name,
+            voucher_code=voucher_code,
+            voucher_value=voucher_value,
+            expiry_date=expiry_date,
+            app_url=self.app_url
+        )
+
         return self.send_email(recipient_email, f"🎉 Your Food Voucher: £{voucher_value:.2f}", html_content)
 
 # Create global instance
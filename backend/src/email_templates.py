@@ -0,0 +1,119 @@
+"""
+Email Template Rendering for BAK UP E-Voucher System
+HTML email bodies live in templates/email/ and are compiled once per
+(name, locale) and cached for the life of the process.
+
+Translated strings come from notification_translations.py through the
+t() helper available inside every template:
+
+    <h1>{{ t('email_new_item_heading', item_type_text=item_type_text) }}</h1>
+
+A locale-specific file (e.g. new_item_notification.ar.html) is used when
+present, otherwise the shared template is rendered with the locale's strings.
+
+Bulk senders render a template once with placeholders (e.g. user_name='-name-')
+and pass per-recipient 'substitutions' to send_many().
+"""
+import os
+from functools import lru_cache, partial
+
+from jinja2 import Environment, FileSystemLoader, TemplateNotFound, select_autoescape
+from markupsafe import escape
+
+from notification_translations import SUPPORTED_LANGUAGES, get_notification_message
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates', 'email')
+
+_env = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIR),
+    autoescape=select_autoescape(['html']),
+    auto_reload=False,   # templates only change on deploy
+    cache_size=-1,       # never evict compiled templates
+    trim_blocks=True,
+    lstrip_blocks=True
+)
+
+
+def normalize_locale(locale):
+    """Map any locale string ('ar', 'ro-RO', None, ...) onto a supported language"""
+    language = (locale or 'en').split('-')[0].split('_')[0].lower()
+    return language if language in SUPPORTED_LANGUAGES else 'en'
+
+
+@lru_cache(maxsize=None)
+def get_template(name, locale='en'):
+    """
+    Get the compiled template for a name and locale
+
+    Args:
+        name: Template name without extension (e.g. 'voucher_issued')
+        locale: Language code
+
+    Returns:
+        jinja2.Template
+    """
+    try:
+        return _env.get_template(f'{name}.{locale}.html')
+    except TemplateNotFound:
+        return _env.get_template(f'{name}.html')
+
+
+def render_email(name, locale='en', **context):
+    """
+    Render an email body
+
+    Args:
+        name: Template name without extension
+        locale: Language code for translated strings
+        **context: Template variables
+
+    Returns:
+        str: Rendered HTML
+    """
+    locale = normalize_locale(locale)
+    return get_template(name, locale).render(
+        locale=locale,
+        t=partial(get_notification_message, language=locale),
+        **context
+    )
+
+
+def translate(message_key, locale='en', **kwargs):
+    """Translated string for subjects and other text outside a template"""
+    return get_notification_message(message_key, normalize_locale(locale), **kwargs)
+
+
+def render_new_item_notification(locale, app_url, user_name, item_name, item_type, quantity, shop_name, shop_address='', item_description=''):
+    """
+    Subject and body of the new surplus item email, shared by both email backends
+
+    Returns:
+        tuple: (subject, html)
+    """
+    item_type_text = translate('email_free_item' if item_type == 'free' else 'email_discounted_item', locale)
+    subject = translate('email_new_item_subject', locale, item_type_text=item_type_text, item_name=item_name)
+    html = render_email(
+        'new_item_notification', locale,
+        user_name=user_name,
+        item_name=item_name,
+        item_type_emoji='🆓' if item_type == 'free' else '🎁',
+        item_type_text=item_type_text,
+        quantity=quantity,
+        shop_name=shop_name,
+        shop_address=shop_address,
+        item_description=item_description,
+        app_url=app_url
+    )
+    return subject, html
+
+
+def apply_substitutions(html, substitutions):
+    """
+    Fill per-recipient placeholders into a body rendered once for a batch
+
+    Values are plain text and are HTML-escaped, matching what autoescaping
+    would have produced had they been rendered into the template directly.
+    """
+    for placeholder, value in (substitutions or {}).items():
+        html = html.replace(placeholder, str(escape(value)))
+    return html
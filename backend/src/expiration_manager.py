@@ -103,7 +103,7 @@ def send_expiration_alerts(vouchers, sms_service, email_service):
     """
     Send SMS and email alerts for expiring vouchers
     """
-    sent_count = 0
+    sms_messages = []
     failed_count = 0
     
     for voucher_info in vouchers:
@@ -116,7 +116,7 @@ def send_expiration_alerts(vouchers, sms_service, email_service):
             voucher_code = voucher_info['voucher_code']
             value = voucher_info['value']
             
-            # Send SMS alert
+            # Queue SMS alert
             if recipient.get('phone'):
                 sms_message = f"""BAK UP Voucher Expiring Soon!
 
@@ -126,9 +126,7 @@ Please use it before {voucher_info['expiry_date']}.
 
 BAK UP Team"""
                 
-                sms_result = sms_service.send_sms(recipient['phone'], sms_message)
-                if sms_result.get('success'):
-                    sent_count += 1
+                sms_messages.append((recipient['phone'], sms_message))
             
             # Send email alert
             if recipient.get('email'):
@@ -140,6 +138,12 @@ BAK UP Team"""
             print(f"Failed to send alert for voucher {voucher_info.get('voucher_code')}: {str(e)}")
             failed_count += 1
     
+    # Send all SMS alerts as one concurrent, rate-limited batch
+    sent_count = 0
+    if sms_messages:
+        sms_result = sms_service.send_many(sms_messages)
+        sent_count = sms_result['sent']
+    
     return {
         'sent_count': sent_count,
         'failed_count': failed_count
@@ -160,18 +164,23 @@ def get_expired_vouchers_report(Voucher, User, start_date=None, end_date=None):
         
         expired_vouchers = query.all()
         
+        # Expiry zeroes the balance; what was written off is in the ledger
+        from voucher_ledger import expired_amounts
+        written_off = expired_amounts([v.id for v in expired_vouchers])
+        
         results = []
         total_value = 0
         
         for voucher in expired_vouchers:
             recipient = User.query.get(voucher.recipient_id) if voucher.recipient_id else None
             issuer = User.query.get(voucher.issued_by) if voucher.issued_by else None
+            value = written_off.get(voucher.id, 0.0)
             
-            total_value += float(voucher.value)
+            total_value += value
             
             results.append({
                 'voucher_code': voucher.code,
-                'value': float(voucher.value),
+                'value': value,
                 'issued_date': voucher.created_at.isoformat() if hasattr(voucher, 'created_at') else None,
                 'expiry_date': voucher.expiry_date.isoformat(),
                 'recipient_name': f"{recipient.first_name} {recipient.last_name}" if recipient else 'Unknown',
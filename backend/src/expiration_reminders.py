@@ -7,6 +7,9 @@ from datetime import datetime, timedelta
 from flask import Blueprint
 import logging
 
+from auth import get_principal
+from email_templates import render_email
+
 expiration_bp = Blueprint('expiration', __name__)
 logger = logging.getLogger(__name__)
 
@@ -77,23 +80,21 @@ def check_and_send_expiration_reminders():
                     vouchers_by_recipient[recipient_id] = []
                 vouchers_by_recipient[recipient_id].append(voucher)
             
-            # Send reminder emails to each recipient
+            # One query for all recipients, then one bulk send per reminder period
+            recipients = User.query.filter(User.id.in_(list(vouchers_by_recipient))).all() if vouchers_by_recipient else []
+            recipients_by_id = {recipient.id: recipient for recipient in recipients}
+            messages = []
             for recipient_id, vouchers in vouchers_by_recipient.items():
-                recipient = User.query.get(recipient_id)
+                recipient = recipients_by_id.get(recipient_id)
                 if not recipient or not recipient.email:
                     logger.warning(f"Recipient {recipient_id} not found or has no email")
                     continue
-                
-                # Send reminder email
-                success = send_expiration_reminder_email(
-                    recipient=recipient,
-                    vouchers=vouchers,
-                    days_until_expiry=period['days']
-                )
-                
-                if success:
-                    reminders_sent += 1
-                    logger.info(f"Sent {period['label']} reminder to {recipient.email} for {len(vouchers)} voucher(s)")
+                messages.append(build_expiration_reminder_email(recipient, vouchers, period['days']))
+            
+            if messages:
+                result = email_service.send_many(messages)
+                reminders_sent += result['sent']
+                logger.info("Sent %d %s reminder(s), %d failed", result['sent'], period['label'], result['failed'])
         
         return {
             'success': True,
@@ -109,152 +110,57 @@ def check_and_send_expiration_reminders():
         }
 
 
-def send_expiration_reminder_email(recipient, vouchers, days_until_expiry):
+def build_expiration_reminder_email(recipient, vouchers, days_until_expiry):
     """
-    Send an expiration reminder email to a recipient
+    Build an expiration reminder email for a recipient
     
     Args:
         recipient: User object for the recipient
         vouchers: List of Voucher objects expiring soon
         days_until_expiry: Number of days until vouchers expire
     
+    Returns:
+        dict: Message with 'to', 'subject' and 'html', for email_service.send_many()
+    """
+    # Determine urgency level
+    if days_until_expiry == 1:
+        urgency = "URGENT"
+        time_phrase = "tomorrow"
+    elif days_until_expiry == 3:
+        urgency = "Important"
+        time_phrase = "in 3 days"
+    else:
+        urgency = "Reminder"
+        time_phrase = "in 7 days"
+    
+    html_body = render_email(
+        'expiration_reminder',
+        first_name=recipient.first_name,
+        vouchers=vouchers,
+        total_value=sum(v.value for v in vouchers),
+        urgency=urgency,
+        time_phrase=time_phrase,
+        days_until_expiry=days_until_expiry,
+        app_url=email_service.app_url
+    )
+    
+    return {
+        'to': recipient.email,
+        'subject': f"{urgency}: Your BAK UP voucher(s) expire {time_phrase}",
+        'html': html_body
+    }
+
+
+def send_expiration_reminder_email(recipient, vouchers, days_until_expiry):
+    """
+    Send an expiration reminder email to a single recipient
+    
     Returns:
         bool: True if email sent successfully, False otherwise
     """
     try:
-        # Calculate total value
-        total_value = sum(v.value for v in vouchers)
-        
-        # Determine urgency level
-        if days_until_expiry == 1:
-            urgency = "URGENT"
-            time_phrase = "tomorrow"
-        elif days_until_expiry == 3:
-            urgency = "Important"
-            time_phrase = "in 3 days"
-        else:
-            urgency = "Reminder"
-            time_phrase = "in 7 days"
-        
-        # Build voucher list for email
-        voucher_list_html = ""
-        for voucher in vouchers:
-            voucher_list_html += f"""
-            <tr>
-                <td style="padding: 10px; border: 1px solid #ddd;">{voucher.code}</td>
-                <td style="padding: 10px; border: 1px solid #ddd;">£{voucher.value:.2f}</td>
-                <td style="padding: 10px; border: 1px solid #ddd;">{voucher.expiry_date.strftime('%d %B %Y')}</td>
-            </tr>
-            """
-        
-        # Email subject
-        subject = f"{urgency}: Your BAK UP voucher(s) expire {time_phrase}"
-        
-        # Email body (HTML)
-        html_body = f"""
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background-color: #4CAF50; color: white; padding: 20px; text-align: center; border-radius: 5px 5px 0 0; }}
-                .content {{ background-color: #f9f9f9; padding: 20px; }}
-                .urgent {{ background-color: #f44336; }}
-                .important {{ background-color: #FF9800; }}
-                .voucher-table {{ width: 100%; border-collapse: collapse; margin: 20px 0; }}
-                .cta-button {{ display: inline-block; background-color: #4CAF50; color: white; padding: 12px 30px; text-decoration: none; border-radius: 5px; margin: 20px 0; }}
-                .footer {{ text-align: center; padding: 20px; color: #666; font-size: 12px; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header {'urgent' if days_until_expiry == 1 else 'important' if days_until_expiry == 3 else ''}">
-                    <h1>⏰ Voucher Expiration Reminder</h1>
-                </div>
-                <div class="content">
-                    <p>Dear {recipient.first_name},</p>
-                    
-                    <p><strong>This is {urgency.lower()} reminder that you have {len(vouchers)} voucher(s) worth £{total_value:.2f} expiring {time_phrase}.</strong></p>
-                    
-                    <p>Please use your voucher(s) before they expire to avoid losing this valuable support.</p>
-                    
-                    <h3>Your Expiring Vouchers:</h3>
-                    <table class="voucher-table">
-                        <thead>
-                            <tr style="background-color: #4CAF50; color: white;">
-                                <th style="padding: 10px; border: 1px solid #ddd;">Voucher Code</th>
-                                <th style="padding: 10px; border: 1px solid #ddd;">Value</th>
-                                <th style="padding: 10px; border: 1px solid #ddd;">Expiry Date</th>
-                            </tr>
-                        </thead>
-                        <tbody>
-                            {voucher_list_html}
-                        </tbody>
-                    </table>
-                    
-                    <h3>How to Use Your Vouchers:</h3>
-                    <ol>
-                        <li>Visit any participating local shop</li>
-                        <li>Show your voucher code to the vendor</li>
-                        <li>The vendor will validate and redeem your voucher</li>
-                        <li>Select items up to your voucher value</li>
-                    </ol>
-                    
-                    <p style="text-align: center;">
-                        <a href="https://backup-voucher-system-1.onrender.com" class="cta-button">
-                            View My Vouchers
-                        </a>
-                    </p>
-                    
-                    <p><strong>Need help?</strong> Contact us at prince@bakupcic.co.uk or call 01933698347</p>
-                </div>
-                <div class="footer">
-                    <p>This is an automated reminder from BAK UP E-Voucher System</p>
-                    <p>BAK UP CIC | Enterprise Centre, Warth Park, Raunds NN9 6GR</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        
-        # Plain text version
-        text_body = f"""
-        Voucher Expiration Reminder
-        
-        Dear {recipient.first_name},
-        
-        This is {urgency.lower()} reminder that you have {len(vouchers)} voucher(s) worth £{total_value:.2f} expiring {time_phrase}.
-        
-        Your Expiring Vouchers:
-        """
-        
-        for voucher in vouchers:
-            text_body += f"\n- Code: {voucher.code} | Value: £{voucher.value:.2f} | Expires: {voucher.expiry_date.strftime('%d %B %Y')}"
-        
-        text_body += """
-        
-        How to Use Your Vouchers:
-        1. Visit any participating local shop
-        2. Show your voucher code to the vendor
-        3. The vendor will validate and redeem your voucher
-        4. Select items up to your voucher value
-        
-        Need help? Contact us at prince@bakupcic.co.uk or call 01933698347
-        
-        ---
-        BAK UP CIC | Enterprise Centre, Warth Park, Raunds NN9 6GR
-        """
-        
-        # Send email using the email service
-        result = email_service.send_email(
-            to_email=recipient.email,
-            subject=subject,
-            html_body=html_body,
-            text_body=text_body
-        )
-        
-        return result.get('success', False)
-    
+        message = build_expiration_reminder_email(recipient, vouchers, days_until_expiry)
+        return email_service.send_email(message['to'], message['subject'], message['html'])
     except Exception as e:
         logger.error(f"Error sending expiration reminder to {recipient.email}: {str(e)}")
         return False
@@ -273,7 +179,7 @@ def trigger_expiration_check():
     if not user_id:
         return jsonify({'error': 'Unauthorized'}), 401
     
-    user = User.query.get(user_id)
+    user = get_principal()
     if not user or user.user_type != 'admin':
         return jsonify({'error': 'Forbidden - Admin access required'}), 403
     
@@ -298,7 +204,7 @@ def get_expiring_vouchers_preview():
     if not user_id:
         return jsonify({'error': 'Unauthorized'}), 401
     
-    user = User.query.get(user_id)
+    user = get_principal()
     if not user or user.user_type != 'admin':
         return jsonify({'error': 'Forbidden - Admin access required'}), 403
     
@@ -4,18 +4,13 @@ Provides PDF and Excel export capabilities for system reports
 """
 
 from flask import Blueprint, jsonify, session, request, send_file
+from auth import get_principal
 from datetime import datetime
-import io
 import logging
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
-import openpyxl
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-from openpyxl.utils import get_column_letter
+import tempfile
+
+# reportlab and openpyxl are imported inside the generators: together they
+# account for a third of the app's import time and only exports need them
 
 export_bp = Blueprint('export', __name__)
 logger = logging.getLogger(__name__)
@@ -38,21 +33,175 @@ def init_export_system(app_db, user_model, voucher_model, togo_model, transactio
     logger.info("Export system initialized")
 
 
-def generate_pdf_report(report_type, data, filters=None):
+# Rows are fetched from the database in batches of this size and written
+# straight to the output file, so memory use does not grow with report size
+STREAM_BATCH_SIZE = 1000
+PDF_ROWS_PER_PAGE = 40
+
+REPORT_TITLES = {
+    'vouchers': 'Voucher Management Report',
+    'users': 'User Management Report',
+    'transactions': 'Transaction History Report',
+    'togo': 'Food to Go Items Report',
+    'financial': 'Financial Summary Report'
+}
+
+# Column headers and Excel column widths for each report type
+REPORT_COLUMNS = {
+    'vouchers': (['Code', 'Value', 'Status', 'Recipient', 'Issued By', 'Expiry Date'], [16, 12, 12, 28, 28, 14]),
+    'users': (['Name', 'Email', 'User Type', 'Status', 'Registered'], [28, 36, 14, 12, 14]),
+    'transactions': (['Date', 'Type', 'Amount', 'From', 'To', 'Status'], [14, 12, 12, 28, 28, 12]),
+    'togo': (['Item Name', 'Shop', 'Price', 'Discount', 'Status', 'Posted Date'], [32, 28, 12, 12, 12, 14]),
+    'financial': (['Metric', 'Value'], [40, 20]),
+}
+
+
+def _full_name(first_name, last_name):
+    if first_name is None and last_name is None:
+        return 'N/A'
+    return f"{first_name or ''} {last_name or ''}".strip()
+
+
+def _format_date(value):
+    return value.strftime('%Y-%m-%d') if value else 'N/A'
+
+
+def iter_report_rows(report_type):
+    """
+    Stream formatted report rows straight from the database
+    
+    Each report is a single column-only query with its lookups (recipient,
+    issuer, shop, ...) done as SQL joins, read through a server-side cursor
+    in batches of STREAM_BATCH_SIZE.
+    
+    Args:
+        report_type: Type of report ('vouchers', 'users', 'transactions', 'togo', 'financial')
+    
+    Yields:
+        list: One formatted table row per record
+    """
+    from sqlalchemy.orm import aliased
+    
+    if report_type == 'vouchers':
+        recipient = aliased(User)
+        issuer = aliased(User)
+        query = db.session.query(
+            Voucher.code, Voucher.value, Voucher.status, Voucher.expiry_date,
+            recipient.first_name, recipient.last_name,
+            issuer.first_name, issuer.last_name
+        ).outerjoin(recipient, recipient.id == Voucher.recipient_id) \
+         .outerjoin(issuer, issuer.id == Voucher.issued_by) \
+         .order_by(Voucher.id)
+        for code, value, status, expiry, r_first, r_last, i_first, i_last in query.yield_per(STREAM_BATCH_SIZE):
+            yield [
+                code,
+                f"£{float(value or 0):.2f}",
+                status or 'N/A',
+                _full_name(r_first, r_last),
+                _full_name(i_first, i_last),
+                _format_date(expiry)
+            ]
+    
+    elif report_type == 'users':
+        query = db.session.query(
+            User.first_name, User.last_name, User.email, User.user_type, User.created_at
+        ).order_by(User.id)
+        for first_name, last_name, email, user_type, created_at in query.yield_per(STREAM_BATCH_SIZE):
+            yield [_full_name(first_name, last_name), email, user_type, 'Active', _format_date(created_at)]
+    
+    elif report_type == 'transactions':
+        owner = aliased(User)
+        creator = aliased(User)
+        query = db.session.query(
+            Transaction.created_at, Transaction.transaction_type, Transaction.amount, Transaction.status,
+            creator.first_name, creator.last_name, owner.first_name, owner.last_name
+        ).outerjoin(owner, owner.id == Transaction.user_id) \
+         .outerjoin(creator, creator.id == Transaction.created_by) \
+         .order_by(Transaction.id)
+        for created_at, tx_type, amount, status, c_first, c_last, o_first, o_last in query.yield_per(STREAM_BATCH_SIZE):
+            yield [
+                _format_date(created_at),
+                tx_type or 'N/A',
+                f"£{float(amount or 0):.2f}",
+                _full_name(c_first, c_last),
+                _full_name(o_first, o_last),
+                status or 'N/A'
+            ]
+    
+    elif report_type == 'togo':
+        shop = ToGoItem.shop.property.mapper.class_
+        query = db.session.query(
+            ToGoItem.item_name, ToGoItem.price, ToGoItem.original_price, ToGoItem.status,
+            ToGoItem.posted_at, shop.shop_name
+        ).outerjoin(shop, shop.id == ToGoItem.shop_id).order_by(ToGoItem.id)
+        for name, price, original_price, status, posted_at, shop_name in query.yield_per(STREAM_BATCH_SIZE):
+            original = float(original_price or price or 0)
+            discount = round((1 - float(price) / original) * 100) if price is not None and original else 0
+            yield [
+                name,
+                shop_name or 'N/A',
+                f"£{original:.2f}",
+                f"{discount}%",
+                status or 'N/A',
+                _format_date(posted_at)
+            ]
+    
+    elif report_type == 'financial':
+        # Summary metrics rather than records: three GROUP BY queries
+        from sqlalchemy import func
+        from voucher_ledger import ledger_totals
+        
+        totals = ledger_totals()
+        yield ['Vouchers Issued', totals['issue']['count']]
+        yield ['Total Value Issued', f"£{totals['issue']['amount']:.2f}"]
+        yield ['Redemptions', totals['redeem']['count']]
+        yield ['Total Value Redeemed', f"£{totals['redeem']['amount']:.2f}"]
+        yield ['Total Value Expired', f"£{totals['expire']['amount']:.2f}"]
+        
+        by_status = db.session.query(
+            Voucher.status, func.count(Voucher.id), func.coalesce(func.sum(Voucher.value), 0)
+        ).group_by(Voucher.status).order_by(Voucher.status)
+        for status, count, value in by_status:
+            label = (status or 'unknown').capitalize()
+            yield [f'{label} Vouchers', count]
+            yield [f'{label} Vouchers Remaining Balance', f"£{float(value):.2f}"]
+        
+        by_type = db.session.query(
+            Transaction.transaction_type, func.count(Transaction.id), func.coalesce(func.sum(Transaction.amount), 0)
+        ).filter(Transaction.status == 'completed').group_by(Transaction.transaction_type).order_by(Transaction.transaction_type)
+        for tx_type, count, amount in by_type:
+            label = (tx_type or 'unknown').capitalize()
+            yield [f'Wallet {label} Transactions', count]
+            yield [f'Wallet {label} Total', f"£{float(amount):.2f}"]
+
+
+def generate_pdf_report(report_type, rows, filters=None):
     """
     Generate a PDF report
     
+    Pages are laid out and emitted one at a time straight onto a canvas backed
+    by a temporary file, so only a single page of rows is held in memory.
+    
     Args:
         report_type: Type of report ('vouchers', 'users', 'transactions', 'togo', 'financial')
-        data: List of data dictionaries to include in report
+        rows: Iterable of formatted table rows (see iter_report_rows)
         filters: Dictionary of filters applied (for report header)
     
     Returns:
-        BytesIO object containing the PDF
+        Temporary file object containing the PDF, positioned at the start
     """
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch)
-    elements = []
+    from reportlab.lib import colors
+    from reportlab.lib.enums import TA_CENTER
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import inch
+    from reportlab.pdfgen import canvas
+    from reportlab.platypus import Table, TableStyle, Paragraph, Spacer
+
+    output = tempfile.TemporaryFile()
+    pdf = canvas.Canvas(output, pagesize=A4, pageCompression=1)
+    page_width, page_height = A4
+    margin = 0.5*inch
     styles = getSampleStyleSheet()
     
     # Custom styles
@@ -74,89 +223,15 @@ def generate_pdf_report(report_type, data, filters=None):
         alignment=TA_CENTER
     )
     
-    # Header
-    elements.append(Paragraph("BAK UP E-Voucher System", title_style))
-    
-    # Report title
-    report_titles = {
-        'vouchers': 'Voucher Management Report',
-        'users': 'User Management Report',
-        'transactions': 'Transaction History Report',
-        'togo': 'Food to Go Items Report',
-        'financial': 'Financial Summary Report'
-    }
-    elements.append(Paragraph(report_titles.get(report_type, 'System Report'), styles['Heading2']))
-    
-    # Generation info
-    generation_time = datetime.now().strftime('%d %B %Y at %H:%M')
-    elements.append(Paragraph(f"Generated on {generation_time}", subtitle_style))
-    
-    # Filters info
-    if filters:
-        filter_text = "Filters: " + ", ".join([f"{k}: {v}" for k, v in filters.items() if v])
-        elements.append(Paragraph(filter_text, subtitle_style))
-    
-    elements.append(Spacer(1, 0.3*inch))
-    
-    # Data table
-    if report_type == 'vouchers':
-        table_data = [['Code', 'Value', 'Status', 'Recipient', 'Issued By', 'Expiry Date']]
-        for item in data:
-            table_data.append([
-                item.get('code', 'N/A'),
-                f"£{item.get('value', 0):.2f}",
-                item.get('status', 'N/A'),
-                item.get('recipient_name', 'N/A'),
-                item.get('issued_by_name', 'N/A'),
-                item.get('expiry_date', 'N/A')
-            ])
-    
-    elif report_type == 'users':
-        table_data = [['Name', 'Email', 'User Type', 'Status', 'Registered']]
-        for item in data:
-            table_data.append([
-                item.get('name', 'N/A'),
-                item.get('email', 'N/A'),
-                item.get('user_type', 'N/A'),
-                item.get('status', 'Active'),
-                item.get('created_at', 'N/A')
-            ])
-    
-    elif report_type == 'transactions':
-        table_data = [['Date', 'Type', 'Amount', 'From', 'To', 'Status']]
-        for item in data:
-            table_data.append([
-                item.get('date', 'N/A'),
-                item.get('type', 'N/A'),
-                f"£{item.get('amount', 0):.2f}",
-                item.get('from_user', 'N/A'),
-                item.get('to_user', 'N/A'),
-                item.get('status', 'N/A')
-            ])
-    
-    elif report_type == 'togo':
-        table_data = [['Item Name', 'Shop', 'Price', 'Discount', 'Status', 'Posted Date']]
-        for item in data:
-            table_data.append([
-                item.get('name', 'N/A'),
-                item.get('shop_name', 'N/A'),
-                f"£{item.get('original_price', 0):.2f}",
-                f"{item.get('discount_percentage', 0)}%",
-                item.get('status', 'N/A'),
-                item.get('posted_date', 'N/A')
-            ])
+    footer_style = ParagraphStyle(
+        'Footer',
+        parent=styles['Normal'],
+        fontSize=8,
+        textColor=colors.grey,
+        alignment=TA_CENTER
+    )
     
-    elif report_type == 'financial':
-        table_data = [['Metric', 'Value']]
-        for item in data:
-            table_data.append([
-                item.get('metric', 'N/A'),
-                item.get('value', 'N/A')
-            ])
-    
-    # Create table
-    table = Table(table_data, repeatRows=1)
-    table.setStyle(TableStyle([
+    table_style = TableStyle([
         ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2E7D32')),
         ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
         ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
@@ -167,53 +242,83 @@ def generate_pdf_report(report_type, data, filters=None):
         ('GRID', (0, 0), (-1, -1), 1, colors.black),
         ('FONTSIZE', (0, 1), (-1, -1), 8),
         ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey])
-    ]))
+    ])
     
-    elements.append(table)
+    headers, widths = REPORT_COLUMNS.get(report_type, (['Value'], [20]))
+    col_widths = [(page_width - 2*margin) * w / sum(widths) for w in widths]
     
-    # Footer
-    elements.append(Spacer(1, 0.5*inch))
-    footer_style = ParagraphStyle(
-        'Footer',
-        parent=styles['Normal'],
-        fontSize=8,
-        textColor=colors.grey,
-        alignment=TA_CENTER
-    )
-    elements.append(Paragraph("BAK UP CIC | Enterprise Centre, Warth Park, Raunds NN9 6GR", footer_style))
-    elements.append(Paragraph("Contact: prince@bakupcic.co.uk | 01933698347", footer_style))
-    
-    # Build PDF
-    doc.build(elements)
-    buffer.seek(0)
-    return buffer
+    # Header flowables, drawn on the first page only
+    generation_time = datetime.now().strftime('%d %B %Y at %H:%M')
+    header = [
+        Paragraph("BAK UP E-Voucher System", title_style),
+        Paragraph(REPORT_TITLES.get(report_type, 'System Report'), styles['Heading2']),
+        Paragraph(f"Generated on {generation_time}", subtitle_style)
+    ]
+    if filters:
+        filter_text = "Filters: " + ", ".join([f"{k}: {v}" for k, v in filters.items() if v])
+        header.append(Paragraph(filter_text, subtitle_style))
+    header.append(Spacer(1, 0.3*inch))
+    
+    footer = [
+        Paragraph("BAK UP CIC | Enterprise Centre, Warth Park, Raunds NN9 6GR", footer_style),
+        Paragraph("Contact: prince@bakupcic.co.uk | 01933698347", footer_style)
+    ]
+    
+    def draw_flowables(flowables, top):
+        for flowable in flowables:
+            _, height = flowable.wrapOn(pdf, page_width - 2*margin, top)
+            top -= height
+            flowable.drawOn(pdf, margin, top)
+        return top
+    
+    def draw_page(page_rows, first_page):
+        top = page_height - margin
+        if first_page:
+            top = draw_flowables(header, top)
+        table = Table([headers] + page_rows, colWidths=col_widths, repeatRows=1)
+        table.setStyle(table_style)
+        draw_flowables([table], top)
+        draw_flowables(footer, margin + 0.3*inch)
+        pdf.showPage()
+    
+    page_rows = []
+    first_page = True
+    for row in rows:
+        page_rows.append([str(cell) for cell in row])
+        if len(page_rows) == PDF_ROWS_PER_PAGE - (8 if first_page else 0):
+            draw_page(page_rows, first_page)
+            page_rows = []
+            first_page = False
+    if page_rows or first_page:
+        draw_page(page_rows, first_page)
+    
+    pdf.save()
+    output.seek(0)
+    return output
 
 
-def generate_excel_report(report_type, data, filters=None):
+def generate_excel_report(report_type, rows, filters=None):
     """
     Generate an Excel report
     
+    Uses a write-only (constant memory) workbook: rows are appended as they
+    arrive and flushed to a temporary file rather than kept as cell objects.
+    
     Args:
         report_type: Type of report ('vouchers', 'users', 'transactions', 'togo', 'financial')
-        data: List of data dictionaries to include in report
+        rows: Iterable of formatted table rows (see iter_report_rows)
         filters: Dictionary of filters applied (for report header)
     
     Returns:
-        BytesIO object containing the Excel file
+        Temporary file object containing the Excel file, positioned at the start
     """
-    buffer = io.BytesIO()
-    workbook = openpyxl.Workbook()
-    sheet = workbook.active
-    
-    # Report titles
-    report_titles = {
-        'vouchers': 'Voucher Management Report',
-        'users': 'User Management Report',
-        'transactions': 'Transaction History Report',
-        'togo': 'Food to Go Items Report',
-        'financial': 'Financial Summary Report'
-    }
-    sheet.title = report_titles.get(report_type, 'Report')[:31]  # Excel sheet name limit
+    import openpyxl
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+    from openpyxl.utils import get_column_letter
+
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet(REPORT_TITLES.get(report_type, 'Report')[:31])  # Excel sheet name limit
     
     # Styling
     header_fill = PatternFill(start_color="2E7D32", end_color="2E7D32", fill_type="solid")
@@ -227,134 +332,42 @@ def generate_excel_report(report_type, data, filters=None):
         bottom=Side(style='thin')
     )
     
-    # Title
-    sheet.merge_cells('A1:F1')
-    sheet['A1'] = "BAK UP E-Voucher System"
-    sheet['A1'].font = title_font
-    sheet['A1'].alignment = Alignment(horizontal='center')
+    def styled(value, **style):
+        cell = WriteOnlyCell(sheet, value=value)
+        for name, setting in style.items():
+            setattr(cell, name, setting)
+        return cell
     
-    # Report type
-    sheet.merge_cells('A2:F2')
-    sheet['A2'] = report_titles.get(report_type, 'System Report')
-    sheet['A2'].font = Font(bold=True, size=14)
-    sheet['A2'].alignment = Alignment(horizontal='center')
+    # Column widths must be set before any row is written in write-only mode
+    headers, widths = REPORT_COLUMNS.get(report_type, (['Value'], [20]))
+    for col, width in enumerate(widths, 1):
+        sheet.column_dimensions[get_column_letter(col)].width = width
     
-    # Generation info
-    sheet.merge_cells('A3:F3')
+    # Title, report type and generation info
     generation_time = datetime.now().strftime('%d %B %Y at %H:%M')
-    sheet['A3'] = f"Generated on {generation_time}"
-    sheet['A3'].font = subtitle_font
-    sheet['A3'].alignment = Alignment(horizontal='center')
+    sheet.append([styled("BAK UP E-Voucher System", font=title_font)])
+    sheet.append([styled(REPORT_TITLES.get(report_type, 'System Report'), font=Font(bold=True, size=14))])
+    sheet.append([styled(f"Generated on {generation_time}", font=subtitle_font)])
     
     # Filters
     if filters:
-        sheet.merge_cells('A4:F4')
         filter_text = "Filters: " + ", ".join([f"{k}: {v}" for k, v in filters.items() if v])
-        sheet['A4'] = filter_text
-        sheet['A4'].font = subtitle_font
-        sheet['A4'].alignment = Alignment(horizontal='center')
-        start_row = 6
-    else:
-        start_row = 5
+        sheet.append([styled(filter_text, font=subtitle_font)])
+    sheet.append([])
     
     # Headers and data
-    if report_type == 'vouchers':
-        headers = ['Code', 'Value', 'Status', 'Recipient', 'Issued By', 'Expiry Date']
-        for col, header in enumerate(headers, 1):
-            cell = sheet.cell(row=start_row, column=col, value=header)
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.border = border
-            cell.alignment = Alignment(horizontal='center')
-        
-        for row_idx, item in enumerate(data, start_row + 1):
-            sheet.cell(row=row_idx, column=1, value=item.get('code', 'N/A')).border = border
-            sheet.cell(row=row_idx, column=2, value=f"£{item.get('value', 0):.2f}").border = border
-            sheet.cell(row=row_idx, column=3, value=item.get('status', 'N/A')).border = border
-            sheet.cell(row=row_idx, column=4, value=item.get('recipient_name', 'N/A')).border = border
-            sheet.cell(row=row_idx, column=5, value=item.get('issued_by_name', 'N/A')).border = border
-            sheet.cell(row=row_idx, column=6, value=item.get('expiry_date', 'N/A')).border = border
-    
-    elif report_type == 'users':
-        headers = ['Name', 'Email', 'User Type', 'Status', 'Registered']
-        for col, header in enumerate(headers, 1):
-            cell = sheet.cell(row=start_row, column=col, value=header)
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.border = border
-            cell.alignment = Alignment(horizontal='center')
-        
-        for row_idx, item in enumerate(data, start_row + 1):
-            sheet.cell(row=row_idx, column=1, value=item.get('name', 'N/A')).border = border
-            sheet.cell(row=row_idx, column=2, value=item.get('email', 'N/A')).border = border
-            sheet.cell(row=row_idx, column=3, value=item.get('user_type', 'N/A')).border = border
-            sheet.cell(row=row_idx, column=4, value=item.get('status', 'Active')).border = border
-            sheet.cell(row=row_idx, column=5, value=item.get('created_at', 'N/A')).border = border
-    
-    elif report_type == 'transactions':
-        headers = ['Date', 'Type', 'Amount', 'From', 'To', 'Status']
-        for col, header in enumerate(headers, 1):
-            cell = sheet.cell(row=start_row, column=col, value=header)
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.border = border
-            cell.alignment = Alignment(horizontal='center')
-        
-        for row_idx, item in enumerate(data, start_row + 1):
-            sheet.cell(row=row_idx, column=1, value=item.get('date', 'N/A')).border = border
-            sheet.cell(row=row_idx, column=2, value=item.get('type', 'N/A')).border = border
-            sheet.cell(row=row_idx, column=3, value=f"£{item.get('amount', 0):.2f}").border = border
-            sheet.cell(row=row_idx, column=4, value=item.get('from_user', 'N/A')).border = border
-            sheet.cell(row=row_idx, column=5, value=item.get('to_user', 'N/A')).border = border
-            sheet.cell(row=row_idx, column=6, value=item.get('status', 'N/A')).border = border
-    
-    elif report_type == 'togo':
-        headers = ['Item Name', 'Shop', 'Price', 'Discount', 'Status', 'Posted Date']
-        for col, header in enumerate(headers, 1):
-            cell = sheet.cell(row=start_row, column=col, value=header)
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.border = border
-            cell.alignment = Alignment(horizontal='center')
-        
-        for row_idx, item in enumerate(data, start_row + 1):
-            sheet.cell(row=row_idx, column=1, value=item.get('name', 'N/A')).border = border
-            sheet.cell(row=row_idx, column=2, value=item.get('shop_name', 'N/A')).border = border
-            sheet.cell(row=row_idx, column=3, value=f"£{item.get('original_price', 0):.2f}").border = border
-            sheet.cell(row=row_idx, column=4, value=f"{item.get('discount_percentage', 0)}%").border = border
-            sheet.cell(row=row_idx, column=5, value=item.get('status', 'N/A')).border = border
-            sheet.cell(row=row_idx, column=6, value=item.get('posted_date', 'N/A')).border = border
-    
-    elif report_type == 'financial':
-        headers = ['Metric', 'Value']
-        for col, header in enumerate(headers, 1):
-            cell = sheet.cell(row=start_row, column=col, value=header)
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.border = border
-            cell.alignment = Alignment(horizontal='center')
-        
-        for row_idx, item in enumerate(data, start_row + 1):
-            sheet.cell(row=row_idx, column=1, value=item.get('metric', 'N/A')).border = border
-            sheet.cell(row=row_idx, column=2, value=item.get('value', 'N/A')).border = border
-    
-    # Auto-adjust column widths
-    for column in sheet.columns:
-        max_length = 0
-        column_letter = get_column_letter(column[0].column)
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = min(max_length + 2, 50)
-        sheet.column_dimensions[column_letter].width = adjusted_width
-    
-    # Save to buffer
-    workbook.save(buffer)
-    buffer.seek(0)
-    return buffer
+    sheet.append([
+        styled(header, fill=header_fill, font=header_font, border=border, alignment=Alignment(horizontal='center'))
+        for header in headers
+    ])
+    for row in rows:
+        sheet.append([styled(value, border=border) for value in row])
+    
+    # Save to a temporary file
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return output
 
 
 @export_bp.route('/api/export/<report_type>/<format>', methods=['POST'])
@@ -371,7 +384,7 @@ def export_report(report_type, format):
     if not user_id:
         return jsonify({'error': 'Unauthorized'}), 401
     
-    user = User.query.get(user_id)
+    user = get_principal()
     if not user:
         return jsonify({'error': 'User not found'}), 404
     
@@ -383,54 +396,18 @@ def export_report(report_type, format):
         # Get filters from request
         filters = request.json or {}
         
-        # Fetch data based on report type
-        data = []
-        
-        if report_type == 'vouchers':
-            vouchers = Voucher.query.all()
-            for v in vouchers:
-                recipient = User.query.get(v.recipient_id) if v.recipient_id else None
-                issued_by = User.query.get(v.issued_by) if v.issued_by else None
-                data.append({
-                    'code': v.code,
-                    'value': float(v.value),
-                    'status': v.status,
-                    'recipient_name': f"{recipient.first_name} {recipient.last_name}" if recipient else 'N/A',
-                    'issued_by_name': f"{issued_by.first_name} {issued_by.last_name}" if issued_by else 'N/A',
-                    'expiry_date': v.expiry_date.strftime('%Y-%m-%d') if v.expiry_date else 'N/A'
-                })
-        
-        elif report_type == 'users':
-            users = User.query.all()
-            for u in users:
-                data.append({
-                    'name': f"{u.first_name} {u.last_name}",
-                    'email': u.email,
-                    'user_type': u.user_type,
-                    'status': 'Active',
-                    'created_at': u.created_at.strftime('%Y-%m-%d') if hasattr(u, 'created_at') and u.created_at else 'N/A'
-                })
-        
-        elif report_type == 'togo':
-            items = ToGoItem.query.all()
-            for item in items:
-                shop = User.query.get(item.shop_id) if item.shop_id else None
-                data.append({
-                    'name': item.name,
-                    'shop_name': shop.shop_name if shop and hasattr(shop, 'shop_name') else 'N/A',
-                    'original_price': float(item.original_price),
-                    'discount_percentage': float(item.discount_percentage),
-                    'status': item.status,
-                    'posted_date': item.posted_date.strftime('%Y-%m-%d') if item.posted_date else 'N/A'
-                })
+        # Rows are streamed from the database into the output file
+        if report_type not in REPORT_COLUMNS:
+            return jsonify({'error': f'Unknown report type: {report_type}'}), 400
+        rows = iter_report_rows(report_type)
         
         # Generate report
         if format == 'pdf':
-            buffer = generate_pdf_report(report_type, data, filters)
+            buffer = generate_pdf_report(report_type, rows, filters)
             filename = f"{report_type}_report_{datetime.now().strftime('%Y%m%d')}.pdf"
             mimetype = 'application/pdf'
         elif format == 'excel':
-            buffer = generate_excel_report(report_type, data, filters)
+            buffer = generate_excel_report(report_type, rows, filters)
             filename = f"{report_type}_report_{datetime.now().strftime('%Y%m%d')}.xlsx"
             mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
         else:
@@ -4,7 +4,7 @@ Database Initialization Script for BAK UP System
 This script creates all database tables and initializes the admin account
 """
 
-from main import app, db, User, generate_password_hash
+from main import app, db, User, hash_password
 import os
 
 def init_database():
@@ -27,7 +27,7 @@ def init_database():
             print("🔄 Creating admin account...")
             admin = User(
                 email=admin_email,
-                password_hash=generate_password_hash('Prince@2024'),
+                password_hash=hash_password('Prince@2024'),
                 first_name='Prince',
                 last_name='Caesar',
                 user_type='admin',
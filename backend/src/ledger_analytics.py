@@ -0,0 +1,301 @@
+"""
+Ledger Analytics
+Vectorized report breakdowns over a columnar snapshot of the voucher ledger
+
+The financial and impact reports group ledger entries by issuer, vendor,
+shop, town, month and voucher status. Instead of looping over ORM rows, the
+columns they need are pulled with one SELECT into NumPy arrays and grouped
+with np.unique/np.bincount.
+
+voucher_ledger is append-only, so the arrays are kept as a snapshot on disk
+(a compressed .npz per database in LEDGER_SNAPSHOT_DIR) with its high-water
+mark, the largest ledger ID it holds. A refresh only reads entries above the
+mark and appends them. Entries younger than LEDGER_SNAPSHOT_SETTLE_SECONDS
+are read on every refresh but not written to the snapshot yet, so an entry
+whose transaction commits after a higher ID was already visible is still
+picked up. If the entry at the mark no longer matches (the database was
+restored or recreated), the snapshot is rebuilt from scratch.
+
+Voucher status and shop towns can change, so they are not snapshotted: each
+breakdown that needs them reads the current id -> value columns in one query.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from voucher_ledger import ENTRY_TYPES
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = os.environ.get('LEDGER_SNAPSHOT_DIR', os.path.join(tempfile.gettempdir(), 'bakup-analytics'))
+SETTLE_SECONDS = float(os.environ.get('LEDGER_SNAPSHOT_SETTLE_SECONDS', '60'))
+SNAPSHOT_FORMAT = 1
+
+COLUMNS = ('id', 'created', 'entry', 'amount', 'voucher_id', 'issuer_id', 'recipient_id', 'vendor_id', 'shop_id')
+GROUPINGS = ('issuer', 'vendor', 'shop', 'town', 'month', 'status', 'entry_type')
+_ENTRY_CODES = {entry_type: code for code, entry_type in enumerate(ENTRY_TYPES)}
+
+# Global references
+db = None
+Voucher = None
+VoucherLedger = None
+VendorShop = None
+
+np = None  # NumPy, imported by the first ledger_frame() so importing the app doesn't load it
+_snapshot = None  # (arrays, high_water, high_water_created, path) as last saved
+_lock = threading.Lock()
+
+
+def init_ledger_analytics(app_db, voucher_model, ledger_model, vendor_shop_model):
+    """Initialize ledger analytics with database models"""
+    global db, Voucher, VoucherLedger, VendorShop
+    db = app_db
+    Voucher = voucher_model
+    VoucherLedger = ledger_model
+    VendorShop = vendor_shop_model
+    logger.info("Ledger analytics initialized")
+
+
+# ============================================
+# Snapshot
+# ============================================
+
+def _empty():
+    return {
+        'id': np.empty(0, np.int64), 'created': np.empty(0, 'datetime64[s]'), 'entry': np.empty(0, np.int8),
+        'amount': np.empty(0, np.float64), 'voucher_id': np.empty(0, np.int64), 'issuer_id': np.empty(0, np.int64),
+        'recipient_id': np.empty(0, np.int64), 'vendor_id': np.empty(0, np.int64), 'shop_id': np.empty(0, np.int64)
+    }
+
+
+def snapshot_path():
+    """The snapshot file for the current database"""
+    digest = hashlib.sha1(str(db.engine.url).encode()).hexdigest()[:12]
+    return os.path.join(SNAPSHOT_DIR, f'voucher_ledger_{digest}.npz')
+
+
+def _read_snapshot(path):
+    try:
+        with np.load(path) as data:
+            if int(data['format']) != SNAPSHOT_FORMAT:
+                return None
+            arrays = {name: data[name] for name in COLUMNS}
+            return arrays, int(data['high_water']), data['high_water_created'][()]
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning("Ignoring unreadable ledger snapshot %s: %s", path, e)
+        return None
+
+
+def _write_snapshot(path, arrays, high_water, high_water_created):
+    """Save atomically, so readers in other workers never see half a file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez_compressed(f, format=SNAPSHOT_FORMAT, high_water=high_water,
+                                high_water_created=high_water_created, **arrays)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+
+def _still_valid(high_water, high_water_created):
+    """The entry at the mark is still there, unchanged"""
+    if high_water == 0:
+        return True
+    created = db.session.query(VoucherLedger.created_at).filter(VoucherLedger.id == high_water).scalar()
+    return created is not None and np.datetime64(created, 's') == high_water_created
+
+
+def _fetch_after(high_water):
+    """Ledger entries with IDs above the mark, as arrays, in one SELECT"""
+    rows = db.session.execute(
+        select(
+            VoucherLedger.id, VoucherLedger.created_at, VoucherLedger.entry_type, VoucherLedger.amount,
+            VoucherLedger.voucher_id, func.coalesce(Voucher.issued_by, 0),
+            func.coalesce(VoucherLedger.recipient_id, 0), func.coalesce(VoucherLedger.vendor_id, 0),
+            func.coalesce(VoucherLedger.shop_id, 0)
+        )
+        .join(Voucher, Voucher.id == VoucherLedger.voucher_id)
+        .where(VoucherLedger.id > high_water)
+        .order_by(VoucherLedger.id)
+    ).all()
+    if not rows:
+        return _empty()
+    ids, created, entry_types, amounts, voucher_ids, issuers, recipients, vendors, shops = zip(*rows)
+    return {
+        'id': np.array(ids, np.int64),
+        'created': np.array(created, 'datetime64[s]'),
+        'entry': np.array([_ENTRY_CODES.get(t, -1) for t in entry_types], np.int8),
+        'amount': np.array(amounts, np.float64),
+        'voucher_id': np.array(voucher_ids, np.int64),
+        'issuer_id': np.array(issuers, np.int64),
+        'recipient_id': np.array(recipients, np.int64),
+        'vendor_id': np.array(vendors, np.int64),
+        'shop_id': np.array(shops, np.int64)
+    }
+
+
+def _concat(first, second):
+    return {name: np.concatenate([first[name], second[name]]) for name in COLUMNS}
+
+
+def ledger_frame(now=None):
+    """
+    The whole ledger as a LedgerFrame, reading only entries newer than the snapshot
+
+    Returns:
+        LedgerFrame
+    """
+    global _snapshot, np
+    if np is None:
+        import numpy as np
+    now = now or datetime.utcnow()
+    path = snapshot_path()
+    with _lock:
+        snapshot = _snapshot if _snapshot and _snapshot[3] == path else None
+        if snapshot is None:
+            loaded = _read_snapshot(path)
+            snapshot = loaded + (path,) if loaded else None
+        if snapshot is not None and not _still_valid(snapshot[1], snapshot[2]):
+            logger.warning("Ledger snapshot no longer matches the database, rebuilding", extra={'high_water': snapshot[1]})
+            snapshot = None
+        arrays, high_water, high_water_created = snapshot[:3] if snapshot else (_empty(), 0, np.datetime64('NaT', 's'))
+
+        new = _fetch_after(high_water)
+        # Entries before the first one still inside the settle window go into the snapshot
+        young = new['created'] > np.datetime64(now - timedelta(seconds=SETTLE_SECONDS), 's')
+        settled = int(np.argmax(young)) if young.any() else len(young)
+        if settled:
+            arrays = _concat(arrays, {name: column[:settled] for name, column in new.items()})
+            high_water, high_water_created = int(new['id'][settled - 1]), new['created'][settled - 1]
+            try:
+                _write_snapshot(path, arrays, high_water, high_water_created)
+            except OSError as e:
+                logger.warning("Could not save ledger snapshot %s: %s", path, e)
+            logger.info("Extended ledger snapshot", extra={'entries': settled, 'high_water': high_water})
+        _snapshot = (arrays, high_water, high_water_created, path)
+
+    tail = {name: column[settled:] for name, column in new.items()}
+    return LedgerFrame(_concat(arrays, tail) if len(tail['id']) else arrays)
+
+
+# ============================================
+# Vectorized group-bys
+# ============================================
+
+class LedgerFrame:
+    """Ledger columns as NumPy arrays, with filtered totals and group-bys"""
+
+    def __init__(self, arrays):
+        self.columns = arrays
+
+    def __len__(self):
+        return len(self.columns['id'])
+
+    def mask(self, entry_type=None, start=None, end=None, issued_by=None):
+        """Boolean selection of entries of a type, in [start, end), for an issuer"""
+        selected = np.ones(len(self), dtype=bool)
+        if entry_type is not None:
+            selected &= self.columns['entry'] == _ENTRY_CODES[entry_type]
+        if start is not None:
+            selected &= self.columns['created'] >= np.datetime64(start, 's')
+        if end is not None:
+            selected &= self.columns['created'] < np.datetime64(end, 's')
+        if issued_by is not None:
+            selected &= self.columns['issuer_id'] == issued_by
+        return selected
+
+    def totals(self, start=None, end=None, issued_by=None):
+        """
+        Entry counts and values by type, like voucher_ledger.ledger_totals
+
+        Returns:
+            dict: entry_type -> {'count': int, 'amount': float}
+        """
+        selected = self.mask(start=start, end=end, issued_by=issued_by)
+        codes = self.columns['entry'][selected].astype(np.int64)
+        codes_ok = codes >= 0
+        counts = np.bincount(codes[codes_ok], minlength=len(ENTRY_TYPES))
+        sums = np.bincount(codes[codes_ok], weights=self.columns['amount'][selected][codes_ok], minlength=len(ENTRY_TYPES))
+        totals = {}
+        for code, entry_type in enumerate(ENTRY_TYPES):
+            amount = round(float(sums[code]), 2)
+            totals[entry_type] = {
+                'count': int(counts[code]),
+                'amount': -amount if entry_type in ('redeem', 'expire') else amount
+            }
+        return totals
+
+    def _keys(self, by):
+        columns = self.columns
+        if by in ('issuer', 'vendor', 'shop'):
+            return columns[f'{by}_id']
+        if by == 'month':
+            return columns['created'].astype('datetime64[M]')
+        if by == 'entry_type':
+            return columns['entry']
+        if by == 'town':
+            return _lookup(columns['shop_id'], VendorShop.id, func.coalesce(VendorShop.town, ''), '')
+        if by == 'status':
+            return _lookup(columns['voucher_id'], Voucher.id, func.coalesce(Voucher.status, ''), '')
+        raise ValueError(f'by must be one of: {", ".join(GROUPINGS)}')
+
+    def breakdown(self, by, entry_type=None, start=None, end=None, issued_by=None):
+        """
+        Count and value of the selected entries per group
+
+        Values of redemptions and expiries are reported as positive amounts
+        moved, as in totals().
+
+        Returns:
+            list: (key, count, value) tuples; months oldest first as 'YYYY-MM',
+            other groupings by value, largest first. Entry types are names.
+        """
+        selected = self.mask(entry_type, start, end, issued_by)
+        keys = self._keys(by)[selected]
+        amounts = self.columns['amount'][selected]
+        if entry_type in ('redeem', 'expire'):
+            amounts = -amounts
+        if not len(keys):
+            return []
+
+        groups, inverse = np.unique(keys, return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(groups))
+        sums = np.bincount(inverse, weights=amounts, minlength=len(groups))
+
+        if by == 'month':
+            order = np.arange(len(groups))
+            labels = [str(group) for group in groups]
+        else:
+            order = np.lexsort((groups, -sums))
+            labels = groups.tolist()
+            if by == 'entry_type':
+                labels = [ENTRY_TYPES[code] if 0 <= code < len(ENTRY_TYPES) else 'unknown' for code in labels]
+        return [(labels[i], int(counts[i]), round(float(sums[i]), 2)) for i in order]
+
+    def distinct(self, column, entry_type=None, start=None, end=None):
+        """Number of distinct non-zero values of an ID column among the selected entries"""
+        values = self.columns[column][self.mask(entry_type, start, end)]
+        return int(np.unique(values[values != 0]).size)
+
+
+def _lookup(ids, key_column, value_column, default):
+    """Map an ID array to the current value of another column, one query for the whole table"""
+    rows = db.session.execute(select(key_column, value_column).order_by(key_column)).all()
+    if not rows:
+        return np.full(len(ids), default)
+    keys = np.array([row[0] for row in rows], np.int64)
+    values = np.array([row[1] for row in rows] + [default])
+    positions = np.searchsorted(keys, ids)
+    found = (positions < len(keys)) & (keys[np.minimum(positions, len(keys) - 1)] == ids)
+    return values[np.where(found, positions, len(keys))]
@@ -0,0 +1,230 @@
+"""
+Log Table Partitioning & Retention
+Monthly partition management and archival for the append-only log tables
+(audit_logs, login_session)
+
+PostgreSQL: the tables are converted to native RANGE partitions (one per month)
+by migrations/partition_log_tables.py. New partitions are created ahead of time
+and expired months are archived to compressed CSV and then dropped.
+
+SQLite (local development): there is no native partitioning, so expired months
+are archived the same way and removed with a ranged DELETE.
+"""
+
+import csv
+import gzip
+import logging
+import os
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# Partitioned log tables and the timestamp column they are partitioned on
+PARTITIONED_TABLES = {
+    'audit_logs': 'timestamp',
+    'login_session': 'login_time',
+}
+
+# Retention (in days) and archive location, overridable from the environment
+DEFAULT_RETENTION_DAYS = {
+    'audit_logs': int(os.environ.get('AUDIT_LOG_RETENTION_DAYS', '365')),
+    'login_session': int(os.environ.get('LOGIN_SESSION_RETENTION_DAYS', '180')),
+}
+ARCHIVE_DIR = os.environ.get('LOG_ARCHIVE_DIR', os.path.join(os.getcwd(), 'log_archive'))
+PARTITION_MONTHS_AHEAD = int(os.environ.get('LOG_PARTITION_MONTHS_AHEAD', '3'))
+
+
+def month_start(value):
+    """First day of the month containing value"""
+    return date(value.year, value.month, 1)
+
+
+def add_months(value, months):
+    """Shift a first-of-month date by a number of months"""
+    index = value.year * 12 + (value.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    """Name of the monthly partition, e.g. audit_logs_y2026m10"""
+    return f"{table}_y{month.year}m{month.month:02d}"
+
+
+def is_partitioned(conn, table):
+    """True if table is a native PostgreSQL partitioned table"""
+    if conn.dialect.name != 'postgresql':
+        return False
+    result = conn.execute(text("""
+        SELECT 1 FROM pg_partitioned_table pt
+        JOIN pg_class c ON c.oid = pt.partrelid
+        WHERE c.relname = :table
+    """), {'table': table})
+    return result.first() is not None
+
+
+def default_partition_name(table):
+    """Name of the DEFAULT partition catching rows no monthly partition covers"""
+    return f"{table}_default"
+
+
+def _exists(conn, name):
+    return conn.execute(text("SELECT to_regclass(:name)"), {'name': name}).scalar() is not None
+
+
+def create_month_partition(conn, table, month):
+    """
+    Create the partition holding [month, month + 1) if it does not exist.
+
+    Rows for that month that already landed in the DEFAULT partition (because
+    the partition was not created in time) would make CREATE ... PARTITION OF
+    fail, so the default partition is detached while the month's partition is
+    created, and those rows are moved into it before it is attached again.
+    """
+    name = partition_name(table, month)
+    if _exists(conn, name):
+        return name
+
+    column = PARTITIONED_TABLES[table]
+    bounds = {'start': month, 'end': add_months(month, 1)}
+    in_month = f'"{column}" >= :start AND "{column}" < :end'
+    create = (
+        f'CREATE TABLE "{name}" PARTITION OF "{table}" '
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    )
+
+    default = default_partition_name(table)
+    stranded = _exists(conn, default) and conn.execute(
+        text(f'SELECT 1 FROM "{default}" WHERE {in_month} LIMIT 1'), bounds
+    ).first() is not None
+    if not stranded:
+        conn.execute(text(create))
+        return name
+
+    conn.execute(text(f'ALTER TABLE "{table}" DETACH PARTITION "{default}"'))
+    conn.execute(text(create))
+    moved = conn.execute(text(f'INSERT INTO "{name}" SELECT * FROM "{default}" WHERE {in_month}'), bounds).rowcount
+    conn.execute(text(f'DELETE FROM "{default}" WHERE {in_month}'), bounds)
+    conn.execute(text(f'ALTER TABLE "{table}" ATTACH PARTITION "{default}" DEFAULT'))
+    logger.warning("Moved rows out of the default partition", extra={'partition': name, 'rows': moved})
+    return name
+
+
+def ensure_table_partitions(engine, table, months_ahead=PARTITION_MONTHS_AHEAD, today=None):
+    """
+    Make sure table has partitions for the current month and the next months_ahead
+    months, in one transaction. No-op if the table is not natively partitioned.
+
+    Returns:
+        list: Names of the partitions that exist for the window
+    """
+    current = month_start(today or date.today())
+    with engine.begin() as conn:
+        if not is_partitioned(conn, table):
+            return []
+        return [create_month_partition(conn, table, add_months(current, offset)) for offset in range(months_ahead + 1)]
+
+
+def ensure_monthly_partitions(engine, months_ahead=PARTITION_MONTHS_AHEAD, today=None):
+    """
+    Make sure the current month and the next months_ahead months have partitions,
+    one transaction per table. No-op on databases without native partitioning.
+
+    Returns:
+        list: Names of the partitions that exist for the window
+    """
+    created = []
+    for table in PARTITIONED_TABLES:
+        created.extend(ensure_table_partitions(engine, table, months_ahead, today))
+    return created
+
+
+def _archive_month(conn, table, column, month, archive_dir):
+    """Stream one month of rows into a gzip-compressed CSV, returning the row count"""
+    os.makedirs(os.path.join(archive_dir, table), exist_ok=True)
+    path = os.path.join(archive_dir, table, f"{partition_name(table, month)}.csv.gz")
+
+    # Per statement: Connection.execution_options() would stream the DELETE/DETACH that follow too
+    result = conn.execute(
+        text(f'SELECT * FROM "{table}" WHERE "{column}" >= :start AND "{column}" < :end ORDER BY "{column}"')
+        .execution_options(stream_results=True),
+        {'start': month, 'end': add_months(month, 1)}
+    )
+
+    rows = 0
+    with gzip.open(path, 'wt', newline='') as handle:
+        writer = csv.writer(handle)
+        writer.writerow(result.keys())
+        for chunk in result.partitions(5000):
+            writer.writerows(chunk)
+            rows += len(chunk)
+
+    if rows == 0:
+        os.remove(path)
+    return rows
+
+
+def archive_and_prune(engine, table, retention_days=None, archive_dir=ARCHIVE_DIR, today=None):
+    """
+    Archive and remove every whole month older than the retention window.
+
+    On a partitioned PostgreSQL table the expired partition is detached and dropped,
+    otherwise the month is removed with a ranged DELETE.
+
+    Returns:
+        dict: {month: rows_archived} for each month that was pruned
+    """
+    column = PARTITIONED_TABLES[table]
+    if retention_days is None:
+        retention_days = DEFAULT_RETENTION_DAYS[table]
+
+    today = today or date.today()
+    cutoff = month_start(today - timedelta(days=retention_days))
+    pruned = {}
+
+    with engine.connect() as conn:
+        oldest = conn.execute(text(f'SELECT MIN("{column}") FROM "{table}"')).scalar()
+    if oldest is None:
+        return pruned
+    if isinstance(oldest, str):
+        oldest = datetime.fromisoformat(oldest)
+
+    month = month_start(oldest)
+    while month < cutoff:
+        with engine.begin() as conn:
+            rows = _archive_month(conn, table, column, month, archive_dir)
+            name = partition_name(table, month)
+            if is_partitioned(conn, table) and conn.execute(
+                text("SELECT to_regclass(:name)"), {'name': name}
+            ).scalar():
+                conn.execute(text(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"'))
+                conn.execute(text(f'DROP TABLE "{name}"'))
+            else:
+                conn.execute(
+                    text(f'DELETE FROM "{table}" WHERE "{column}" >= :start AND "{column}" < :end'),
+                    {'start': month, 'end': add_months(month, 1)}
+                )
+        pruned[month.isoformat()] = rows
+        logger.info("Archived and pruned %d rows from %s for %s", rows, table, month.strftime('%Y-%m'))
+        month = add_months(month, 1)
+
+    return pruned
+
+
+def run_log_maintenance(engine, archive_dir=ARCHIVE_DIR, today=None):
+    """
+    Create upcoming partitions and apply retention to every log table.
+
+    Each table is maintained on its own, so a failure on one table doesn't stop
+    the other; failures are logged and returned under 'errors'.
+    """
+    summary = {'partitions': [], 'pruned': {}, 'errors': {}}
+    for table in PARTITIONED_TABLES:
+        try:
+            summary['partitions'].extend(ensure_table_partitions(engine, table, today=today))
+            summary['pruned'][table] = archive_and_prune(engine, table, archive_dir=archive_dir, today=today)
+        except Exception as e:
+            logger.exception("Log maintenance failed", extra={'table': table})
+            summary['errors'][table] = str(e)
+    return summary
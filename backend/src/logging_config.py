@@ -0,0 +1,192 @@
+"""
+Logging Configuration
+Non-blocking, structured logging with request-ID correlation
+
+Records are handed to a QueueHandler on the calling thread and written to
+stdout by a QueueListener thread, so request handlers never wait on the
+stream. Each line is a JSON object with the message, logger, level, the
+request ID of the request that produced it and any `extra` fields:
+
+    logger.info("Voucher redeemed", extra={'voucher_id': voucher.id, 'amount': amount})
+
+Pass values as logger arguments or `extra` rather than pre-formatting them
+with f-strings: records below the configured level are then dropped before
+any string is built.
+
+High-volume debug events can be sampled with log_sampled(), which only keeps
+a LOG_SAMPLE_RATE fraction of them.
+
+Environment:
+    LOG_LEVEL           Root level (default INFO)
+    LOG_LEVELS          Per-module overrides, e.g. "notifications_system=DEBUG,sqlalchemy.engine=WARNING"
+    LOG_FORMAT          'json' (default) or 'text'
+    LOG_SAMPLE_RATE     Fraction of sampled events kept (default 0.01)
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import g, has_request_context, request
+
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', '0.01'))
+
+# Incoming X-Request-ID values are reused only if they look like an ID
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+# Attributes every LogRecord has; anything else on a record came from `extra`
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+
+_listener = None
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the current request's ID (on the calling thread, before queueing)"""
+
+    def filter(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = g.get('request_id') if has_request_context() else None
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc_info'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _QueueHandler(QueueHandler):
+    """QueueHandler that keeps `extra` fields and exception info as data"""
+
+    def prepare(self, record):
+        # The default prepare() formats the record here, on the calling thread,
+        # and throws the structure away; only merge args and render the traceback
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class _TextFormatter(logging.Formatter):
+    def format(self, record):
+        if record.exc_text and not record.exc_info:
+            # Traceback was rendered before queueing
+            return f"{super().format(record)}\n{record.exc_text}"
+        return super().format(record)
+
+
+def _parse_levels(spec):
+    levels = {}
+    for item in (spec or '').split(','):
+        name, sep, level = item.partition('=')
+        if sep and name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(app=None, stream=None):
+    """
+    Route all logging through a queue to a JSON (or text) stream handler
+
+    Safe to call more than once; later calls replace the handlers.
+
+    Args:
+        app: Flask app to add request-ID handling to (optional)
+        stream: Output stream (default sys.stdout)
+    """
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    if os.environ.get('LOG_FORMAT', 'json').lower() == 'text':
+        output.setFormatter(_TextFormatter('%(asctime)s [%(levelname)s] %(name)s %(request_id)s: %(message)s'))
+    else:
+        output.setFormatter(JsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    handler = _QueueHandler(log_queue)
+    handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(os.environ.get('LOG_LEVEL', 'INFO').upper())
+    for name, level in _parse_levels(os.environ.get('LOG_LEVELS')).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+
+    if app is not None:
+        app.before_request(_assign_request_id)
+        app.after_request(_return_request_id)
+
+
+def flush_logging():
+    """Write out everything queued so far (the listener keeps running)"""
+    if _listener is not None:
+        _listener.stop()
+        _listener.start()
+
+
+@atexit.register
+def _stop_listener():
+    if _listener is not None:
+        _listener.stop()
+
+
+def _assign_request_id():
+    incoming = request.headers.get('X-Request-ID', '')
+    g.request_id = incoming if REQUEST_ID_PATTERN.match(incoming) else uuid.uuid4().hex
+
+
+def _return_request_id(response):
+    request_id = g.get('request_id')
+    if request_id:
+        response.headers['X-Request-ID'] = request_id
+    return response
+
+
+def log_sampled(logger, msg, *args, level=logging.DEBUG, rate=None, **kwargs):
+    """
+    Log a high-volume event, keeping only a `rate` fraction (default LOG_SAMPLE_RATE)
+
+    Kept records carry sample_rate, so counts can be scaled back up.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    rate = LOG_SAMPLE_RATE if rate is None else rate
+    if rate < 1 and random.random() >= rate:
+        return
+    extra = dict(kwargs.pop('extra', None) or {}, sample_rate=rate)
+    logger.log(level, msg, *args, extra=extra, **kwargs)
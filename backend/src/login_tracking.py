@@ -0,0 +1,193 @@
+"""
+Login Tracking
+Buffered recording of logins, written in batches off the request path
+
+/api/login used to load the user, bump login_count, insert a login_session
+row and commit before answering. Now it only appends the event to this
+process's buffer; a background thread writes the buffer every
+LOGIN_FLUSH_SECONDS (sooner once LOGIN_FLUSH_BATCH events are waiting) as:
+
+- one executemany of UPDATE user SET login_count = login_count + n,
+  last_login = latest, one row per user in the batch, in user ID order so
+  concurrent flushes from several workers lock rows in the same order
+- one executemany INSERT of the login_session rows
+
+A process that dies without shutting down loses at most the events of the
+last interval; a clean shutdown flushes what is left. A batch that fails to
+write is put back at the front of the buffer and retried on the next flush.
+
+LOGIN_TRACKING=sync writes each login on the request instead (same
+statements, one event per batch), for scripts and single-process setups.
+"""
+
+import atexit
+import logging
+import os
+import threading
+from collections import deque
+from datetime import datetime
+
+from sqlalchemy import bindparam, case, func, select, update
+
+logger = logging.getLogger(__name__)
+
+MODE = os.environ.get('LOGIN_TRACKING', 'buffer')  # 'buffer' or 'sync'
+FLUSH_SECONDS = float(os.environ.get('LOGIN_FLUSH_SECONDS', '2'))
+FLUSH_BATCH = int(os.environ.get('LOGIN_FLUSH_BATCH', '500'))
+MAX_BUFFERED = int(os.environ.get('LOGIN_MAX_BUFFERED', '50000'))  # oldest events are dropped beyond this
+
+# Global references
+app = None
+db = None
+User = None
+LoginSession = None
+
+_buffer = deque()
+_buffer_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_wakeup = threading.Event()
+_worker_thread = None
+_worker_lock = threading.Lock()
+
+
+def init_login_tracking(flask_app, app_db, user_model, login_session_model):
+    """Initialize login tracking with database models"""
+    global app, db, User, LoginSession
+    app = flask_app
+    db = app_db
+    User = user_model
+    LoginSession = login_session_model
+    atexit.register(_flush_at_exit)
+    logger.info("Login tracking initialized", extra={'mode': MODE})
+
+
+def record_login(user_id, ip_address=None, user_agent=None):
+    """Record a successful login; written by the background flush unless LOGIN_TRACKING=sync"""
+    event = (user_id, datetime.utcnow(), ip_address, user_agent)
+    if MODE == 'sync':
+        _write_batch([event])
+        db.session.commit()
+        return
+
+    with _buffer_lock:
+        if len(_buffer) >= MAX_BUFFERED:
+            _buffer.popleft()
+            logger.warning("Login buffer full, dropping oldest event")
+        _buffer.append(event)
+        waiting = len(_buffer)
+    _ensure_worker()
+    if waiting >= FLUSH_BATCH:
+        _wakeup.set()
+
+
+def buffered_count():
+    """Events waiting to be written by this process"""
+    return len(_buffer)
+
+
+# ============================================
+# Writing
+# ============================================
+
+def flush_logins():
+    """
+    Write every buffered event in one transaction
+
+    Safe to call from anywhere; flushes in this process run one at a time,
+    so when it returns, every event recorded before the call is committed.
+
+    Returns:
+        int: Events written
+    """
+    with _flush_lock:
+        with _buffer_lock:
+            events = list(_buffer)
+            _buffer.clear()
+        if not events:
+            return 0
+        try:
+            _write_batch(events)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            with _buffer_lock:
+                _buffer.extendleft(reversed(events))
+            raise
+        return len(events)
+
+
+def _write_batch(events):
+    """Apply a batch of (user_id, login_time, ip_address, user_agent) events. Does not commit."""
+    # Users deleted since they logged in would fail the login_session foreign key and block the buffer
+    user = User.__table__
+    existing = {row[0] for row in db.session.execute(
+        select(user.c.id).where(user.c.id.in_({event[0] for event in events}))
+    )}
+    events = [event for event in events if event[0] in existing]
+    if not events:
+        return
+
+    per_user = {}
+    for user_id, login_time, _, _ in events:
+        count, latest = per_user.get(user_id, (0, login_time))
+        per_user[user_id] = (count + 1, max(latest, login_time))
+
+    db.session.execute(
+        update(user).where(user.c.id == bindparam('user_id')).values(
+            login_count=func.coalesce(user.c.login_count, 0) + bindparam('logins'),
+            last_login=case(
+                (user.c.last_login > bindparam('latest'), user.c.last_login),
+                else_=bindparam('latest')
+            )
+        ),
+        [
+            {'user_id': user_id, 'logins': count, 'latest': latest}
+            for user_id, (count, latest) in sorted(per_user.items())
+        ]
+    )
+    db.session.execute(LoginSession.__table__.insert(), [
+        {'user_id': user_id, 'login_time': login_time, 'ip_address': ip_address, 'user_agent': user_agent}
+        for user_id, login_time, ip_address, user_agent in events
+    ])
+
+
+# ============================================
+# Background flush
+# ============================================
+
+def _ensure_worker():
+    """Start the flush thread once per process (threads don't survive a fork)"""
+    global _worker_thread
+    if _worker_thread and _worker_thread.is_alive():
+        return
+    with _worker_lock:
+        if _worker_thread and _worker_thread.is_alive():
+            return
+        _worker_thread = threading.Thread(target=_worker_loop, name='login-tracking-flush')
+        _worker_thread.daemon = True
+        _worker_thread.start()
+
+
+def _worker_loop():
+    while True:
+        _wakeup.wait(FLUSH_SECONDS)
+        _wakeup.clear()
+        with app.app_context():
+            try:
+                flush_logins()
+            except Exception as e:
+                logger.error("Login tracking flush failed: %s", e, extra={'buffered': buffered_count()})
+            finally:
+                db.session.remove()
+
+
+def _flush_at_exit():
+    if not _buffer or app is None:
+        return
+    try:
+        with app.app_context():
+            written = flush_logins()
+            db.session.remove()
+        logger.info("Flushed buffered logins at exit", extra={'logins': written})
+    except Exception as e:
+        logger.error("Could not flush %d buffered logins at exit: %s", buffered_count(), e)
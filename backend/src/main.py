@@ -1,18 +1,17 @@
-from flask import Flask, request, jsonify, session
+from flask import Flask, request, jsonify, session, g
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import text
+from sqlalchemy import case, func, select, text
+from sqlalchemy.orm import aliased
 from flask_cors import CORS
 from flask_mail import Mail, Message
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_compress import Compress
 from flask_socketio import SocketIO
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
 import os
 import secrets
 import logging
-import sys
 from email_service import email_service
 from charity_verification import verify_charity_number
 from sms_service import sms_service
@@ -20,6 +19,9 @@ import stripe_payment
 from wallet_blueprint import wallet_bp, init_wallet_blueprint
 from admin_enhancements import init_admin_enhancements
 from vcse_verification import init_vcse_verification
+from auth import init_auth, get_principal, current_user, require_role
+from db_config import engine_options
+from logging_config import configure_logging
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'vcse-charity-platform-secret-key-2024')
@@ -36,10 +38,10 @@ else:
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///vcse_charity.db'
 
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
-    'pool_pre_ping': True,
-    'pool_recycle': 300,
-}
+# Pool sized for the gunicorn worker class (see db_config.py and gunicorn_config.py);
+# gunicorn_config.py always sets GUNICORN_WORKER_CLASS, so unset means app.run's threaded server
+WORKER_CLASS = os.environ.get('GUNICORN_WORKER_CLASS', 'threaded').lower()
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'], WORKER_CLASS)
 
 # Email configuration (using environment variables with fallback to demo mode)
 app.config['MAIL_SERVER'] = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
@@ -60,7 +62,10 @@ CORS(app,
      expose_headers=['Content-Type'],
      methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'])
 mail = Mail(app)
-socketio = SocketIO(app, cors_allowed_origins=['https://evoucher.bakupservices.co.uk', 'https://backup-voucher-system-1.onrender.com', 'https://app.breezeconsult.org', 'http://localhost:3000', 'http://localhost:5000'], manage_session=False)
+# Socket.IO must use the same concurrency model as the gunicorn worker (see gunicorn_config.py);
+# left to auto-detect it would pick gevent whenever it is installed, even under sync workers
+SOCKETIO_ASYNC_MODE = os.environ.get('SOCKETIO_ASYNC_MODE') or (WORKER_CLASS if WORKER_CLASS in ('gevent', 'eventlet') else 'threading')
+socketio = SocketIO(app, cors_allowed_origins=['https://evoucher.bakupservices.co.uk', 'https://backup-voucher-system-1.onrender.com', 'https://app.breezeconsult.org', 'http://localhost:3000', 'http://localhost:5000'], manage_session=False, async_mode=SOCKETIO_ASYNC_MODE)
 
 # Session configuration for production
 # CRITICAL: Must set SECURE=True for HTTPS sites, otherwise cookies won't persist!
@@ -73,14 +78,9 @@ app.config['PERMANENT_SESSION_LIFETIME'] = 86400  # 24 hours
 # Initialize Flask-Compress for Gzip compression
 Compress(app)
 
-# Configure logging to avoid WSGI errors
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+# Structured JSON logging through a background queue, tagged with the request ID
+# (levels, format and sampling from LOG_* env, see logging_config.py)
+configure_logging(app)
 logger = logging.getLogger(__name__)
 
 # Initialize Flask-Limiter for rate limiting
@@ -145,6 +145,12 @@ class User(db.Model):
     
     # Food To Go preferred shop for recipients
     preferred_shop_id = db.Column(db.Integer, db.ForeignKey('vendor_shop.id'))  # Recipient's preferred shop
+    
+    __table_args__ = (
+        # Keyset pagination of the admin login statistics (login_analytics.py)
+        db.Index('ix_user_login_count', 'login_count', 'id'),
+        db.Index('ix_user_last_login', 'last_login', 'id'),
+    )
 
 class VendorShop(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -155,6 +161,8 @@ class VendorShop(db.Model):
     city = db.Column(db.String(50))
     town = db.Column(db.String(50))  # Specific town: Wellingborough, Kettering, Corby, Northampton, Daventry, Brackley, Towcester
     phone = db.Column(db.String(20))
+    latitude = db.Column(db.Float)  # Centroid of the postcode's outcode, set by shop_locations.py
+    longitude = db.Column(db.Float)
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -163,15 +171,17 @@ class VendorShop(db.Model):
 class Voucher(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     code = db.Column(db.String(20), unique=True, nullable=False)
-    value = db.Column(db.Float, nullable=False)
+    value = db.Column(db.Float, nullable=False)  # Current balance, cached from voucher_ledger
     recipient_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     issued_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)  # Admin or VCFSE
-    vendor_restrictions = db.Column(db.Text)  # JSON list of allowed vendor IDs
+    vendor_restrictions = db.Column(db.Text)  # Legacy JSON list of allowed shop IDs, mirrors voucher_shop
+    any_shop = db.Column(db.Boolean, default=True, nullable=False)  # False = only the shops in voucher_shop
+    cache_version = db.Column(db.Integer, default=1, nullable=False)  # Bumped on every change to validation state (voucher_cache.py)
     expiry_date = db.Column(db.Date, nullable=False)
     status = db.Column(db.String(20), default='active')  # active, redeemed, expired, reassigned
     redeemed_at = db.Column(db.DateTime)
-    redeemed_by_vendor = db.Column(db.Integer, db.ForeignKey('user.id'))
-    redeemed_at_shop_id = db.Column(db.Integer, db.ForeignKey('vendor_shop.id'))  # Shop where voucher was redeemed
+    redeemed_by_vendor = db.Column(db.Integer, db.ForeignKey('user.id'))  # Latest redemption; full history in voucher_ledger
+    redeemed_at_shop_id = db.Column(db.Integer, db.ForeignKey('vendor_shop.id'))  # Shop of the latest redemption
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     reassignment_count = db.Column(db.Integer, default=0)  # Track number of reassignments
@@ -193,6 +203,39 @@ class Voucher(db.Model):
     original_recipient = db.relationship('User', foreign_keys=[original_recipient_id])
     issued_by_user = db.relationship('User', foreign_keys=[issued_by_user_id], backref='wallet_issued_vouchers')
     wallet_transaction = db.relationship('WalletTransaction', foreign_keys=[wallet_transaction_id])
+    
+    __table_args__ = (
+        db.Index('ix_voucher_recipient_created', 'recipient_id', 'created_at'),
+    )
+
+class VoucherShop(db.Model):
+    """Shops a restricted voucher (any_shop = False) can be redeemed at"""
+    __tablename__ = 'voucher_shop'
+    voucher_id = db.Column(db.Integer, db.ForeignKey('voucher.id', ondelete='CASCADE'), primary_key=True)
+    shop_id = db.Column(db.Integer, db.ForeignKey('vendor_shop.id', ondelete='CASCADE'), primary_key=True, index=True)
+
+class VoucherLedger(db.Model):
+    """Append-only history of voucher balances; voucher.value is the running total (voucher_ledger.py)"""
+    __tablename__ = 'voucher_ledger'
+    id = db.Column(db.Integer, primary_key=True)
+    voucher_id = db.Column(db.Integer, db.ForeignKey('voucher.id'), nullable=False, index=True)
+    entry_type = db.Column(db.String(20), nullable=False)  # issue, redeem, expire, reassign, adjust
+    amount = db.Column(db.Float, nullable=False)  # Signed change to the balance
+    balance_after = db.Column(db.Float, nullable=False)
+    recipient_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    vendor_id = db.Column(db.Integer, db.ForeignKey('user.id'))  # Redemptions only
+    shop_id = db.Column(db.Integer, db.ForeignKey('vendor_shop.id'))  # Redemptions only
+    redemption_request_id = db.Column(db.Integer, db.ForeignKey('redemption_request.id'))
+    related_voucher_id = db.Column(db.Integer, db.ForeignKey('voucher.id'))  # Other side of a reassignment
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    voucher = db.relationship('Voucher', foreign_keys=[voucher_id], backref=db.backref('ledger_entries', lazy='dynamic'))
+    related_voucher = db.relationship('Voucher', foreign_keys=[related_voucher_id])
+    
+    __table_args__ = (
+        db.Index('ix_voucher_ledger_type_created', 'entry_type', 'created_at'),
+        db.Index('ix_voucher_ledger_vendor_created', 'vendor_id', 'created_at'),
+    )
 
 class Category(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -261,7 +304,7 @@ class RedemptionRequest(db.Model):
 class LoginSession(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    login_time = db.Column(db.DateTime, default=datetime.utcnow)
+    login_time = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     logout_time = db.Column(db.DateTime)
     session_duration = db.Column(db.Integer)  # in minutes
     ip_address = db.Column(db.String(45))
@@ -314,7 +357,10 @@ class SurplusItem(db.Model):
     accepted_by_vcse_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     accepted_at = db.Column(db.DateTime)
     collection_time = db.Column(db.DateTime)
-    collection_status = db.Column(db.String(20), default='available')  # available, accepted, collected, expired
+    collection_status = db.Column(db.String(20), default='available', index=True)  # available, accepted, collected, expired
+    # Claimable amount parsed from quantity, decremented by partial claims (see surplus_claims.py)
+    remaining_quantity = db.Column(db.Numeric(10, 2))
+    parent_item_id = db.Column(db.Integer, db.ForeignKey('surplus_item.id'), index=True)  # Original item a partial claim was split from
     
     vendor = db.relationship('User', foreign_keys=[vendor_id], backref='surplus_posted_items')
     shop = db.relationship('VendorShop', backref='shop_surplus_items')
@@ -368,6 +414,19 @@ class PayoutRequest(db.Model):
     shop = db.relationship('VendorShop', backref='payouts')
     reviewer = db.relationship('User', foreign_keys=[reviewed_by], backref='reviewed_payouts')
 
+class ShopBalance(db.Model):
+    """Running redemption and payout totals per shop (shop_balances.py)"""
+    __tablename__ = 'shop_balance'
+    shop_id = db.Column(db.Integer, db.ForeignKey('vendor_shop.id'), primary_key=True)
+    vendor_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    redeemed_total = db.Column(db.Float, default=0.0, nullable=False)
+    redemption_count = db.Column(db.Integer, default=0, nullable=False)
+    period = db.Column(db.String(7))  # 'YYYY-MM' that period_redeemed covers
+    period_redeemed = db.Column(db.Float, default=0.0, nullable=False)
+    reserved_total = db.Column(db.Float, default=0.0, nullable=False)  # Pending and approved payouts
+    paid_out_total = db.Column(db.Float, default=0.0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class WalletTransaction(db.Model):
     """Wallet transactions for schools and VCFSEs"""
     __tablename__ = 'wallet_transaction'
@@ -435,9 +494,13 @@ class Notification(db.Model):
     shop_name = db.Column(db.String(200))
     quantity = db.Column(db.String(50))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    is_read = db.Column(db.Boolean, default=False)
+    is_read = db.Column(db.Boolean, default=False)  # Legacy shared flag; per-user state is in notification_read
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))  # For user-specific notifications
     
+    __table_args__ = (
+        db.Index('ix_notifications_target_group_created', 'target_group', 'created_at'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -453,6 +516,20 @@ class Notification(db.Model):
             'is_read': self.is_read
         }
 
+class NotificationRead(db.Model):
+    """A user has read a group notification (notification_inbox.py)"""
+    __tablename__ = 'notification_read'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    notification_id = db.Column(db.Integer, db.ForeignKey('notifications.id', ondelete='CASCADE'), primary_key=True)
+    read_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+class NotificationInbox(db.Model):
+    """Cached count of a user's unread group notifications (notification_inbox.py)"""
+    __tablename__ = 'notification_inbox'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    unread_count = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class NotificationPreference(db.Model):
     __tablename__ = 'notification_preferences'
     
@@ -470,6 +547,24 @@ class NotificationPreference(db.Model):
             'email_enabled': self.email_enabled
         }
 
+# Initialize shared auth layer (principal loaded once per request)
+init_auth(db, User)
+
+# Password hashing, rehash on login and invite-pending accounts
+from credentials import init_credentials, hash_password, verify_password, INVITE_PENDING
+init_credentials(db, User, WORKER_CLASS)
+
+from notification_fanout import init_notification_fanout, notify_audience, notify_each
+init_notification_fanout(db, UserNotification, User)
+
+# Per-request statement counts and DB time (X-DB-* headers in debug, /api/admin/db-metrics)
+from db_metrics import init_db_metrics
+init_db_metrics(app, db)
+
+# Prometheus metrics at /api/metrics (aggregated across workers via PROMETHEUS_MULTIPROC_DIR)
+from metrics import init_metrics, register_queue
+init_metrics(app, db)
+
 # Initialize and register wallet blueprint
 init_wallet_blueprint(db, User, Voucher, WalletTransaction)
 app.register_blueprint(wallet_bp)
@@ -484,6 +579,8 @@ init_vcse_verification(app, db, User, email_service)
 # Initialize Notifications System
 from notifications_system import notifications_bp, init_socketio, init_notifications_system
 init_notifications_system(db, Notification, NotificationPreference, User, socketio)
+from notification_inbox import init_notification_inbox, delete_notifications
+init_notification_inbox(db, Notification, NotificationRead, NotificationInbox, User)
 app.register_blueprint(notifications_bp)
 init_socketio(socketio)
 
@@ -499,6 +596,33 @@ app.register_blueprint(expiration_bp)
 # Initialize Export System
 from export_reports import export_bp, init_export_system
 init_export_system(db, User, Voucher, SurplusItem, WalletTransaction)
+
+from surplus_claims import init_surplus_claims, accept_surplus_item, claim_listed_item, get_available_quantity
+init_surplus_claims(db, SurplusItem, Item)
+
+from voucher_shops import init_voucher_shops, parse_shop_selection, set_voucher_shops, set_vouchers_shops, get_voucher_shop_ids, can_redeem_at_shop, eligible_vendor_shop, eligible_shops
+init_voucher_shops(db, Voucher, VoucherShop, VendorShop, User)
+
+from voucher_cache import init_voucher_cache, get_voucher_state, eligible_vendor_shops
+init_voucher_cache(db, Voucher, VoucherShop, VendorShop, User)
+
+from shop_locations import init_shop_locations, nearby_shops
+init_shop_locations(db, VendorShop)
+
+from login_analytics import init_login_analytics, login_summary, login_page, daily_logins
+init_login_analytics(db, User, LoginSession)
+
+from login_tracking import init_login_tracking, record_login
+init_login_tracking(app, db, User, LoginSession)
+
+from voucher_ledger import init_voucher_ledger, record_redemption, record_reassignment, ledger_totals
+init_voucher_ledger(db, Voucher, VoucherLedger)
+
+from ledger_analytics import init_ledger_analytics
+init_ledger_analytics(db, Voucher, VoucherLedger, VendorShop)
+
+from shop_balances import init_shop_balances, reserve_payout, release_payout, settle_payout, shop_balance, vendor_balances, sum_balances
+init_shop_balances(db, ShopBalance)
 app.register_blueprint(export_bp)
 
 # Initialize Audit Log System
@@ -517,7 +641,7 @@ app.register_blueprint(bulk_import_bp)
 
 # Initialize Vendor Metrics System
 from vendor_metrics import vendor_metrics_bp, init_vendor_metrics
-init_vendor_metrics(db, User, Voucher, SurplusItem, WalletTransaction, VendorShop)
+init_vendor_metrics(db, User, Voucher, SurplusItem, WalletTransaction, VendorShop, VoucherLedger)
 app.register_blueprint(vendor_metrics_bp)
 
 # Initialize Bulk Upload System for VCFSE/Schools
@@ -669,20 +793,6 @@ def create_notification(user_id, title, message, notification_type='info'):
 def generate_voucher_code():
     return f"BAK{secrets.token_hex(4).upper()}"
 
-def track_login(user_id, ip_address=None, user_agent=None):
-    user = User.query.get(user_id)
-    if user:
-        user.last_login = datetime.utcnow()
-        user.login_count += 1
-        
-        login_session = LoginSession(
-            user_id=user_id,
-            ip_address=ip_address,
-            user_agent=user_agent
-        )
-        db.session.add(login_session)
-        db.session.commit()
-
 # API Routes
 @app.route('/api/health', methods=['GET'])
 @limiter.exempt
@@ -703,6 +813,34 @@ def health_check():
         'timestamp': datetime.utcnow().isoformat()
     })
 
+@app.route('/api/health/ready', methods=['GET'])
+@limiter.exempt
+def readiness_check():
+    """Readiness probe: 200 only when this worker can reach the database"""
+    checks = {}
+    ready = True
+    
+    try:
+        start = datetime.utcnow()
+        db.session.execute(text('SELECT 1'))
+        checks['database'] = {'status': 'ok', 'latency_ms': round((datetime.utcnow() - start).total_seconds() * 1000, 2)}
+    except Exception as e:
+        db.session.rollback()
+        checks['database'] = {'status': 'error', 'error': str(e)}
+        ready = False
+    
+    checks['email'] = {'status': 'ok' if email_service.enabled else 'disabled'}
+    checks['sms'] = {'status': 'ok' if sms_service.enabled else 'disabled'}
+    
+    return jsonify({
+        'status': 'ready' if ready else 'not_ready',
+        'worker_class': WORKER_CLASS,
+        'async_mode': socketio.async_mode,
+        'pid': os.getpid(),
+        'checks': checks,
+        'timestamp': datetime.utcnow().isoformat()
+    }), 200 if ready else 503
+
 @app.route('/api/version', methods=['GET'])
 def version_check():
     """Return deployment version to verify correct code is running"""
@@ -799,7 +937,7 @@ def register():
         # Create new user
         user = User(
             email=data['email'],
-            password_hash=generate_password_hash(data['password']),
+            password_hash=hash_password(data['password']),
             first_name=data['first_name'],
             last_name=data['last_name'],
             phone=data.get('phone', ''),
@@ -968,20 +1106,19 @@ def register():
 def login():
     try:
         data = request.get_json()
-        logger.info(f"[LOGIN DEBUG] Login attempt for email: {data.get('email')}")
-        logger.info(f"[LOGIN DEBUG] Session before login: {dict(session)}")
         
         if not data.get('email') or not data.get('password'):
             return jsonify({'error': 'Email and password are required'}), 400
         
         user = User.query.filter_by(email=data['email']).first()
-        logger.info(f"[LOGIN DEBUG] User lookup result: {user}")
-        if user:
-            logger.info(f"[LOGIN DEBUG] Found user - ID: {user.id}, Email: {user.email}, Type: {user.user_type}")
         
-        if not user or not check_password_hash(user.password_hash, data['password']):
+        if not user or not verify_password(user, data['password']):
+            logger.info("Login failed", extra={'user_id': user.id if user else None})
             return jsonify({'error': 'Invalid email or password'}), 401
         
+        # Keep a hash verify_password upgraded to the current method
+        db.session.commit()
+        
         # Check account status for VCFSE organizations
         if user.account_status == 'PENDING_VERIFICATION':
             return jsonify({
@@ -1001,14 +1138,13 @@ def login():
         if not user.is_active:
             return jsonify({'error': 'Account is deactivated'}), 401
         
-        # Track login
-        track_login(user.id, request.remote_addr, request.headers.get('User-Agent'))
+        # Track login (buffered, written in batches by login_tracking)
+        record_login(user.id, request.remote_addr, request.headers.get('User-Agent'))
         
         # Create session
         session['user_id'] = user.id
         session['user_type'] = user.user_type
-        logger.info(f"[LOGIN DEBUG] Session after setting: {dict(session)}")
-        logger.info(f"[LOGIN DEBUG] Set user_id={user.id}, user_type={user.user_type}")
+        logger.info("Login succeeded", extra={'user_id': user.id, 'user_type': user.user_type})
         
         return jsonify({
             'message': 'Login successful',
@@ -1045,7 +1181,7 @@ def check_auth():
         if not user_id:
             return jsonify({'authenticated': False}), 200
         
-        user = User.query.get(user_id)
+        user = current_user()
         
         if not user:
             session.clear()
@@ -1148,7 +1284,7 @@ def reset_password():
         
         # Update password
         user = User.query.get(reset_token.user_id)
-        user.password_hash = generate_password_hash(new_password)
+        user.password_hash = hash_password(new_password)
         
         # Mark token as used
         reset_token.used = True
@@ -1201,7 +1337,7 @@ def vcse_load_money():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = current_user()
         if not user or user.user_type != 'vcse':
             return jsonify({'error': 'Only VCFSE organizations can load money'}), 403
         
@@ -1242,7 +1378,7 @@ def vcse_analytics():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'vcse':
             return jsonify({'error': 'Only VCFSE organizations can view analytics'}), 403
         
@@ -1282,11 +1418,12 @@ def vcse_analytics():
                 'count': issuance_by_date.get(date, 0)
             })
         
-        # Value distributed by status
+        # Value distributed by status (spent and expired value from the ledger)
+        totals = ledger_totals(issued_by=user_id)
         value_by_status = {
             'active': sum(float(v.value) for v in vouchers if v.status == 'active'),
-            'redeemed': sum(float(v.value) for v in vouchers if v.status == 'redeemed'),
-            'expired': sum(float(v.value) for v in vouchers if v.status == 'expired')
+            'redeemed': totals['redeem']['amount'],
+            'expired': totals['expire']['amount']
         }
         
         return jsonify({
@@ -1315,7 +1452,7 @@ def admin_analytics():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Only admins can view system analytics'}), 403
         
@@ -1367,11 +1504,12 @@ def admin_analytics():
                 'count': issuance_by_date.get(date, 0)
             })
         
-        # Value distributed by status
+        # Value distributed by status (spent and expired value from the ledger)
+        totals = ledger_totals()
         value_by_status = {
             'active': sum(float(v.value) for v in all_vouchers if v.status == 'active'),
-            'redeemed': sum(float(v.value) for v in all_vouchers if v.status == 'redeemed'),
-            'expired': sum(float(v.value) for v in all_vouchers if v.status == 'expired')
+            'redeemed': totals['redeem']['amount'],
+            'expired': totals['expire']['amount']
         }
         
         # Calculate redemption rate
@@ -1426,7 +1564,7 @@ def vcse_get_vouchers():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'vcse':
             return jsonify({'error': 'Only VCFSE organizations can access this'}), 403
         
@@ -1489,7 +1627,7 @@ def vcse_get_recipients():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'vcse':
             return jsonify({'error': 'Only VCFSE organizations can access this'}), 403
         
@@ -1537,7 +1675,7 @@ def vcse_voucher_pdf(voucher_id):
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'vcse':
             return jsonify({'error': 'Only VCFSE organizations can download vouchers'}), 403
         
@@ -1658,7 +1796,7 @@ def vcse_export_vouchers():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'vcse':
             return jsonify({'error': 'Only VCFSE organizations can export vouchers'}), 403
         
@@ -1743,7 +1881,7 @@ def vcse_generate_pdf_report():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = current_user()
         if not user or user.user_type != 'vcse':
             return jsonify({'error': 'Only VCFSE organizations can generate reports'}), 403
         
@@ -1772,7 +1910,7 @@ def vcse_generate_pdf_report():
         
         # Calculate statistics
         total_vouchers = len(vouchers)
-        total_value = sum(float(v.value) for v in vouchers)
+        total_value = ledger_totals(start_date, end_date, issued_by=user_id)['issue']['amount']
         active_vouchers = len([v for v in vouchers if v.status == 'active'])
         redeemed_vouchers = len([v for v in vouchers if v.status == 'redeemed'])
         expired_vouchers = len([v for v in vouchers if v.status == 'expired'])
@@ -1899,7 +2037,7 @@ def school_place_order():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'school':
             return jsonify({'error': 'Only schools can place orders'}), 403
         
@@ -1933,7 +2071,7 @@ def vcse_place_order():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'vcse':
             return jsonify({'error': 'Only VCFSE organizations can place orders'}), 403
         
@@ -2014,7 +2152,7 @@ def vcse_issue_voucher():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = current_user()
         if not user or user.user_type != 'vcse':
             return jsonify({'error': 'Only VCFSE organizations can issue vouchers'}), 403
         
@@ -2038,6 +2176,11 @@ def vcse_issue_voucher():
         if value <= 0:
             return jsonify({'error': 'Voucher value must be positive'}), 400
         
+        try:
+            shop_ids = parse_shop_selection(selected_shops)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
         # Check if VCFSE has sufficient total balance (self-loaded + allocated)
         total_available = (user.balance or 0) + (user.allocated_balance or 0)
         if total_available < value:
@@ -2047,8 +2190,6 @@ def vcse_issue_voucher():
         recipient = User.query.filter_by(email=recipient_email).first()
         if not recipient:
             # Auto-create recipient account with provided details
-            import secrets
-            temp_password = secrets.token_urlsafe(12)
             # Parse date of birth if provided
             dob = None
             if recipient_date_of_birth:
@@ -2060,7 +2201,7 @@ def vcse_issue_voucher():
             
             recipient = User(
                 email=recipient_email,
-                password_hash=generate_password_hash(temp_password),
+                password_hash=INVITE_PENDING,  # Sets a password via the reset link
                 first_name=recipient_first_name,
                 last_name=recipient_last_name,
                 phone=recipient_phone,
@@ -2084,12 +2225,6 @@ def vcse_issue_voucher():
         # Calculate expiry date
         expiry_date = datetime.utcnow().date() + timedelta(days=expiry_days)
         
-        # Create voucher with vendor restrictions
-        import json
-        vendor_restrictions = None
-        if selected_shops and selected_shops != 'all':
-            vendor_restrictions = json.dumps(selected_shops)  # Store as JSON array
-        
         voucher = Voucher(
             code=voucher_code,
             value=value,
@@ -2097,7 +2232,6 @@ def vcse_issue_voucher():
             issued_by=user_id,
             expiry_date=expiry_date,
             status='active',
-            vendor_restrictions=vendor_restrictions,
             original_recipient_id=recipient.id,
             reassignment_count=0,
             assign_shop_method=assign_shop_method
@@ -2114,6 +2248,7 @@ def vcse_issue_voucher():
             user.allocated_balance -= remaining
         
         db.session.add(voucher)
+        set_voucher_shops(voucher, shop_ids)
         db.session.commit()
         
         # Create notifications
@@ -2183,7 +2318,7 @@ def vcse_issue_vouchers_bulk():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = current_user()
         if not user or user.user_type != 'vcse':
             return jsonify({'error': 'Only VCFSE organizations can issue vouchers'}), 403
         
@@ -2233,35 +2368,48 @@ def vcse_issue_vouchers_bulk():
             return jsonify({'error': result['error']}), 400
         
         # Send notifications to successful recipients
+        emails = [item['email'] for item in result['successful']]
+        recipients_by_email = {r.email: r for r in User.query.filter(User.email.in_(emails)).all()} if emails else {}
+        notifications = []
+        sms_messages = []
+        email_messages = []
         for success_item in result['successful']:
-            recipient = User.query.filter_by(email=success_item['email']).first()
+            recipient = recipients_by_email.get(success_item['email'])
             if recipient:
-                # Create in-app notification
-                create_notification(
+                # Queue in-app notification
+                notifications.append((
                     recipient.id,
                     'New Voucher Received',
-                    f'You have received a £{success_item["value"]:.2f} voucher from {user.organization_name}. Code: {success_item["voucher_code"]}',
-                    'success'
-                )
+                    f'You have received a £{success_item["value"]:.2f} voucher from {user.organization_name}. Code: {success_item["voucher_code"]}'
+                ))
                 
-                # Send SMS if phone available
+                # Queue SMS if phone available
                 if recipient.phone:
-                    sms_service.send_voucher_code(
+                    sms_messages.append((
                         recipient.phone,
-                        success_item['voucher_code'],
-                        success_item['name'],
-                        success_item['value']
-                    )
+                        sms_service.voucher_code_message(success_item['voucher_code'], success_item['name'], success_item['value'])
+                    ))
                 
-                # Send email if email available
+                # Queue email if email available
                 if recipient.email:
-                    email_service.send_voucher_issued_email(
+                    email_messages.append(email_service.build_voucher_issued_email(
                         recipient.email,
                         success_item['name'],
                         success_item['voucher_code'],
                         success_item['value'],
                         user.organization_name
-                    )
+                    ))
+        
+        # Dispatch in bulk: batched in-app inserts, concurrent rate-limited SMS and pooled SMTP for email
+        if notifications:
+            notify_each(notifications, 'success')
+            db.session.commit()
+        if sms_messages:
+            sms_summary = sms_service.send_many(sms_messages)
+            if sms_summary['failed']:
+                print(f"Bulk voucher SMS: {sms_summary['sent']} sent, {sms_summary['failed']} failed")
+        if email_messages:
+            email_service.send_many(email_messages)
         
         return jsonify({
             'message': 'Bulk voucher issuance completed',
@@ -2289,7 +2437,7 @@ def admin_check_expirations():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         
@@ -2315,7 +2463,7 @@ def admin_get_expiring_soon():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         
@@ -2344,7 +2492,7 @@ def admin_send_expiration_alerts():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         
@@ -2382,7 +2530,7 @@ def admin_get_expired_report():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         
@@ -2423,7 +2571,7 @@ def admin_export_vouchers():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         
@@ -2470,7 +2618,7 @@ def admin_export_surplus_items():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         
@@ -2498,7 +2646,7 @@ def admin_export_users():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         
@@ -2533,7 +2681,7 @@ def admin_export_financial_report():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         
@@ -2552,7 +2700,7 @@ def admin_export_financial_report():
             end_date = datetime.strptime(end_date_str, '%Y-%m-%d')
         
         from transaction_export import generate_financial_report_csv
-        csv_data = generate_financial_report_csv(Voucher, User, start_date, end_date)
+        csv_data = generate_financial_report_csv(Voucher, User, VoucherLedger, start_date, end_date)
         
         from flask import make_response
         from datetime import datetime
@@ -2573,7 +2721,7 @@ def admin_export_impact_report():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         
@@ -2599,7 +2747,7 @@ def admin_check_low_balances():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         
@@ -2628,7 +2776,7 @@ def admin_send_balance_alerts():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = current_user()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         
@@ -2668,7 +2816,7 @@ def admin_get_balance_summary():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         
@@ -2692,7 +2840,7 @@ def vcse_get_balance():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = current_user()
         if not user or user.user_type != 'vcse':
             return jsonify({'error': 'Only VCFSE organizations can view balance'}), 403
         
@@ -2726,11 +2874,11 @@ def stripe_diagnostic():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         
-        import stripe
+        stripe = stripe_payment.get_stripe()
         raw_secret = os.getenv('STRIPE_SECRET_KEY', '')
         raw_publishable = os.getenv('STRIPE_PUBLISHABLE_KEY', '')
         
@@ -2760,7 +2908,7 @@ def email_diagnostic():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         
@@ -2802,7 +2950,7 @@ def diagnostic_user_counts():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         
@@ -2843,7 +2991,7 @@ def test_email():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = current_user()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         
@@ -2927,7 +3075,7 @@ def create_payment_intent():
             logger.error("[PAYMENT DEBUG] No user_id in session")
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = current_user()
         logger.info(f"[PAYMENT DEBUG] User lookup result: {user}")
         if user:
             logger.info(f"[PAYMENT DEBUG] User type: {user.user_type}, Email: {user.email}")
@@ -2998,7 +3146,7 @@ def verify_payment():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = current_user()
         if not user or user.user_type != 'vcse':
             return jsonify({'error': 'Only VCFSE organizations can load funds'}), 403
         
@@ -3038,30 +3186,31 @@ def verify_payment():
         
         # Update transaction based on verification
         if verification['verified']:
-            transaction.status = 'succeeded'
-            transaction.completed_at = datetime.utcnow()
-            transaction.payment_method_id = verification.get('payment_method')
-            
-            # Add funds to user balance
-            old_balance = user.balance or 0
-            user.balance = old_balance + transaction.amount
-            app.logger.info(f'[VERIFY DEBUG] User {user.id} balance update: {old_balance} + {transaction.amount} = {user.balance}')
+            # Atomic credit shared with the webhook worker, so the payment is only credited once
+            new_balance = credit_succeeded_payment(transaction, verification.get('payment_method'))
+            if new_balance is None:
+                db.session.rollback()
+                return jsonify({
+                    'success': True,
+                    'message': 'Payment already processed',
+                    'amount': transaction.amount,
+                    'new_balance': db.session.query(User.balance).filter_by(id=user.id).scalar(),
+                    'transaction_id': transaction.id
+                }), 200
+            app.logger.info('[VERIFY DEBUG] User %s balance credited %s, new balance %s', user.id, transaction.amount, new_balance)
             
             # Create success notification
             create_notification(
                 user.id,
                 '💳 Payment Successful',
-                f'Your payment of £{transaction.amount:.2f} has been processed successfully. Your new balance is £{user.balance:.2f}.',
+                f'Your payment of £{transaction.amount:.2f} has been processed successfully. Your new balance is £{new_balance:.2f}.',
                 'success'
             )
             
-            db.session.commit()
-            app.logger.info(f'[VERIFY DEBUG] Database committed. Final balance in DB: {user.balance}')
-            
             return jsonify({
                 'success': True,
                 'amount': transaction.amount,
-                'new_balance': user.balance,
+                'new_balance': new_balance,
                 'transaction_id': transaction.id
             }), 200
         else:
@@ -3087,7 +3236,7 @@ def get_payment_history():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = current_user()
         if not user or user.user_type != 'vcse':
             return jsonify({'error': 'Only VCFSE organizations can view payment history'}), 403
         
@@ -3134,9 +3283,15 @@ def get_payment_history():
     except Exception as e:
         return jsonify({'error': f'Failed to get payment history: {str(e)}'}), 500
 
+# Initialize Stripe webhook inbox (verify/store/ACK on the request, apply in a worker)
+from stripe_webhook_inbox import init_stripe_webhook_inbox, store_event, credit_succeeded_payment, queue_depths
+init_stripe_webhook_inbox(app, db, User, PaymentTransaction, notify_each)
+register_queue('stripe_webhook_events', queue_depths)
+
 @app.route('/api/payment/webhook', methods=['POST'])
+@limiter.exempt
 def stripe_webhook():
-    """Handle Stripe webhook events"""
+    """Verify, store and acknowledge Stripe webhook events (applied asynchronously)"""
     try:
         payload = request.data
         sig_header = request.headers.get('Stripe-Signature')
@@ -3147,7 +3302,7 @@ def stripe_webhook():
             return jsonify({'error': 'Webhook not configured'}), 500
         
         try:
-            import stripe
+            stripe = stripe_payment.get_stripe()
             event = stripe.Webhook.construct_event(
                 payload, sig_header, webhook_secret
             )
@@ -3158,80 +3313,13 @@ def stripe_webhook():
             # Invalid signature
             return jsonify({'error': 'Invalid signature'}), 400
         
-        # Handle the event
-        if event['type'] == 'payment_intent.succeeded':
-            payment_intent = event['data']['object']
-            payment_intent_id = payment_intent['id']
-            
-            # Find transaction
-            transaction = PaymentTransaction.query.filter_by(
-                stripe_payment_intent_id=payment_intent_id
-            ).first()
-            
-            if transaction and transaction.status != 'succeeded':
-                # Update transaction
-                transaction.status = 'succeeded'
-                transaction.completed_at = datetime.utcnow()
-                
-                # Update user balance
-                user = User.query.get(transaction.vcse_id)
-                if user:
-                    user.balance = (user.balance or 0) + transaction.amount
-                    
-                    # Create notification
-                    create_notification(
-                        user.id,
-                        '💳 Payment Confirmed',
-                        f'Your payment of £{transaction.amount:.2f} has been confirmed. Your new balance is £{user.balance:.2f}.',
-                        'success'
-                    )
-                
-                db.session.commit()
-                print(f'Payment succeeded webhook processed: {payment_intent_id}')
-        
-        elif event['type'] == 'payment_intent.payment_failed':
-            payment_intent = event['data']['object']
-            payment_intent_id = payment_intent['id']
-            
-            # Find transaction
-            transaction = PaymentTransaction.query.filter_by(
-                stripe_payment_intent_id=payment_intent_id
-            ).first()
-            
-            if transaction:
-                transaction.status = 'failed'
-                transaction.failure_reason = payment_intent.get('last_payment_error', {}).get('message', 'Payment failed')
-                
-                # Create notification
-                user = User.query.get(transaction.vcse_id)
-                if user:
-                    create_notification(
-                        user.id,
-                        '❌ Payment Failed',
-                        f'Your payment of £{transaction.amount:.2f} failed. Please try again or use a different payment method.',
-                        'error'
-                    )
-                
-                db.session.commit()
-                print(f'Payment failed webhook processed: {payment_intent_id}')
-        
-        elif event['type'] == 'payment_intent.canceled':
-            payment_intent = event['data']['object']
-            payment_intent_id = payment_intent['id']
-            
-            # Find transaction
-            transaction = PaymentTransaction.query.filter_by(
-                stripe_payment_intent_id=payment_intent_id
-            ).first()
-            
-            if transaction:
-                transaction.status = 'cancelled'
-                db.session.commit()
-                print(f'Payment cancelled webhook processed: {payment_intent_id}')
+        # Store once per Stripe event ID; retried deliveries are acknowledged as duplicates
+        is_new = store_event(event, payload)
         
-        return jsonify({'success': True}), 200
+        return jsonify({'success': True, 'duplicate': not is_new}), 200
         
     except Exception as e:
+        db.session.rollback()
         print(f'Webhook error: {str(e)}')
         return jsonify({'error': str(e)}), 500
 
@@ -3248,19 +3336,16 @@ def vendor_get_shops():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'vendor':
             return jsonify({'error': 'Only vendors can view shops'}), 403
         
         shops = VendorShop.query.filter_by(vendor_id=user_id, is_active=True).all()
         
-        # Calculate total sales across all vendor's shops
-        # Note: Vouchers are redeemed by vendor (user_id), not by specific shop
-        redemptions = Voucher.query.filter_by(
-            redeemed_by_vendor=user_id,
-            status='redeemed'
-        ).all()
-        total_sales = sum(float(v.value) for v in redemptions)
+        # Running totals per shop (shop_balance), one row each instead of a sum over redemptions
+        balances = vendor_balances(user_id)
+        total_sales = sum(balance['redeemed_total'] for balance in balances.values())
+        no_sales = {'redeemed_total': 0.0, 'redeemed_this_period': 0.0, 'available_to_pay_out': 0.0}
         
         return jsonify({
             'shops': [{
@@ -3271,9 +3356,12 @@ def vendor_get_shops():
                 'city': shop.city,
                 'town': shop.town,
                 'phone': shop.phone,
-                'created_at': shop.created_at.isoformat()
+                'created_at': shop.created_at.isoformat(),
+                'total_sales': balances.get(shop.id, no_sales)['redeemed_total'],
+                'redeemed_this_period': balances.get(shop.id, no_sales)['redeemed_this_period'],
+                'available_to_pay_out': balances.get(shop.id, no_sales)['available_to_pay_out']
             } for shop in shops],
-            'total_sales': float(total_sales)
+            'total_sales': round(total_sales, 2)
         }), 200
         
     except Exception as e:
@@ -3289,7 +3377,7 @@ def vendor_add_shop():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'vendor':
             return jsonify({'error': 'Only vendors can add shops'}), 403
         
@@ -3339,7 +3427,7 @@ def vendor_update_shop(shop_id):
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'vendor':
             return jsonify({'error': 'Only vendors can update shops'}), 403
         
@@ -3396,7 +3484,7 @@ def vendor_delete_shop(shop_id):
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'vendor':
             return jsonify({'error': 'Only vendors can delete shops'}), 403
         
@@ -3429,25 +3517,19 @@ def get_available_shops_for_voucher(voucher_code):
         if voucher.status != 'active':
             return jsonify({'error': 'Voucher is not active'}), 400
         
-        # Get all vendors (for now, vouchers can be redeemed at any vendor)
-        # In future, can implement vendor restrictions
-        vendors = User.query.filter_by(user_type='vendor', is_active=True).all()
-        
+        # Active shops of active vendors that accept this voucher
         shops_list = []
-        for vendor in vendors:
-            # Get all shops for this vendor
-            shops = VendorShop.query.filter_by(vendor_id=vendor.id, is_active=True).all()
-            for shop in shops:
-                shops_list.append({
-                    'id': shop.id,
-                    'vendor_id': vendor.id,
-                    'vendor_name': vendor.shop_name or vendor.organization_name,
-                    'shop_name': shop.shop_name,
-                    'address': shop.address,
-                    'postcode': shop.postcode,
-                    'city': shop.city,
-                    'phone': shop.phone
-                })
+        for shop, vendor in eligible_shops(voucher):
+            shops_list.append({
+                'id': shop.id,
+                'vendor_id': vendor.id,
+                'vendor_name': vendor.shop_name or vendor.organization_name,
+                'shop_name': shop.shop_name,
+                'address': shop.address,
+                'postcode': shop.postcode,
+                'city': shop.city,
+                'phone': shop.phone
+            })
         
         return jsonify({
             'voucher_code': voucher_code,
@@ -3465,74 +3547,68 @@ def get_available_shops_for_voucher(voucher_code):
 
 @app.route('/api/admin/login-stats', methods=['GET'])
 def admin_get_login_stats():
-    """Get login frequency statistics for all users"""
+    """
+    Login statistics for non-admin users
+    
+    Totals plus one page of users, most logins first (?sort=last_login for most
+    recent). ?limit= sets the page size (default 100, max 500) and the
+    next_cursor from a response fetches the following page. ?role= limits
+    everything to one user type.
+    """
     try:
-        from datetime import datetime, timedelta
-        
         user_id = session.get('user_id')
         
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Only admins can view login statistics'}), 403
         
-        # Get all users (excluding admins)
-        all_users = User.query.filter(User.user_type != 'admin', User.is_active == True).all()
-        
-        users_data = []
-        total_logins = 0
-        active_users_count = 0
-        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-        
-        for u in all_users:
-            login_count = u.login_count or 0
-            total_logins += login_count
-            
-            # Calculate days since last login
-            days_since_login = None
-            if u.last_login:
-                days_since_login = (datetime.utcnow() - u.last_login).days
-                if u.last_login >= thirty_days_ago:
-                    active_users_count += 1
-            
-            # Determine display name based on user type
-            if u.user_type == 'vendor':
-                display_name = u.shop_name or f'{u.first_name} {u.last_name}'
-            elif u.user_type == 'vcse':
-                display_name = u.organization_name or f'{u.first_name} {u.last_name}'
-            elif u.user_type == 'school':
-                # School users use organization_name field
-                display_name = u.organization_name or f'{u.first_name} {u.last_name}'
-            else:
-                display_name = f'{u.first_name} {u.last_name}'
-            
-            users_data.append({
-                'id': u.id,
-                'first_name': u.first_name,
-                'last_name': u.last_name,
-                'email': u.email,
-                'role': u.user_type,
-                'login_count': login_count,
-                'last_login': u.last_login.isoformat() if u.last_login else None,
-                'days_since_login': days_since_login,
-                'display_name': display_name
-            })
-        
-        # Sort by login count (descending)
-        users_data.sort(key=lambda x: x['login_count'], reverse=True)
+        role = request.args.get('role') or None
+        sort = request.args.get('sort', 'login_count')
+        try:
+            limit = max(1, min(int(request.args.get('limit', 100)), 500))
+            users_data, next_cursor = login_page(sort, limit, request.args.get('cursor'), role)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
+        summary = login_summary(role)
         return jsonify({
             'users': users_data,
-            'total_users': len(users_data),
-            'active_users': active_users_count,
-            'total_logins': total_logins
+            'next_cursor': next_cursor,
+            'total_users': summary['total_users'],
+            'active_users': summary['active_users'],
+            'total_logins': summary['total_logins'],
+            'summary': summary
         }), 200
         
     except Exception as e:
         return jsonify({'error': f'Failed to get login stats: {str(e)}'}), 500
 
+@app.route('/api/admin/login-stats/daily', methods=['GET'])
+def admin_get_daily_logins():
+    """Logins and distinct users per day over the last ?days= days (default 30, max 366)"""
+    try:
+        user_id = session.get('user_id')
+        
+        if not user_id:
+            return jsonify({'error': 'Not authenticated'}), 401
+        
+        user = get_principal()
+        if not user or user.user_type != 'admin':
+            return jsonify({'error': 'Only admins can view login statistics'}), 403
+        
+        try:
+            days = max(1, min(int(request.args.get('days', 30)), 366))
+        except ValueError:
+            return jsonify({'error': 'days must be a number'}), 400
+        
+        return jsonify({'days': daily_logins(days, request.args.get('role') or None)}), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Failed to get daily logins: {str(e)}'}), 500
+
 @app.route('/api/admin/prepopulate-login-stats', methods=['POST'])
 def prepopulate_login_stats():
     """Prepopulate login statistics with test data for demonstration"""
@@ -3545,7 +3621,7 @@ def prepopulate_login_stats():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Only admins can prepopulate data'}), 403
         
@@ -3597,7 +3673,7 @@ def prepopulate_school_data():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Only admins can prepopulate data'}), 403
         
@@ -3707,7 +3783,7 @@ def admin_get_unredeemed_vouchers():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Only admins can view unredeemed vouchers'}), 403
         
@@ -3748,7 +3824,7 @@ def admin_reassign_voucher(voucher_id):
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Only admins can reassign vouchers'}), 403
         
@@ -3770,28 +3846,28 @@ def admin_reassign_voucher(voucher_id):
         # Store old recipient for notification
         old_recipient_id = voucher.recipient_id
         
-        # Reassign voucher
-        voucher.recipient_id = new_recipient.id
-        voucher.status = 'reassigned'
-        db.session.commit()
-        
-        # Create new active voucher for new recipient
+        # Create new active voucher for new recipient (codes are unique, so it gets its own)
         new_voucher = Voucher(
-            code=voucher.code,
-            value=voucher.value,
+            code=generate_voucher_code(),
+            value=0,
             recipient_id=new_recipient.id,
             issued_by=voucher.issued_by,
             expiry_date=voucher.expiry_date,
             status='active'
         )
+        
+        # Move the remaining balance across in the same transaction
+        voucher.status = 'reassigned'
+        amount = record_reassignment(voucher, new_voucher)
         db.session.add(new_voucher)
+        set_voucher_shops(new_voucher, get_voucher_shop_ids(voucher))
         db.session.commit()
         
         # Notify new recipient
         create_notification(
             new_recipient.id,
             'Voucher Assigned',
-            f'You have been assigned voucher {voucher.code} for £{voucher.value:.2f}',
+            f'You have been assigned voucher {new_voucher.code} for £{amount:.2f}',
             'success'
         )
         
@@ -3827,7 +3903,7 @@ def claim_surplus_item():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = current_user()
         if not user or user.user_type != 'vcse':
             return jsonify({'error': 'Only VCFSE organizations can claim items'}), 403
         
@@ -3840,17 +3916,12 @@ def claim_surplus_item():
             return jsonify({'error': 'Item not found'}), 404
         
         if item.status != 'available':
-            return jsonify({'error': 'Item is not available'}), 400
-        
-        # Claim the item
-        item.status = 'claimed'
-        item.claimed_by = user_id
-        item.claimed_at = datetime.utcnow()
+            return jsonify({'error': 'Item is not available'}), 409
         
-        # Set collection time limit (e.g., 2 hours from now)
-        item.collection_time_limit = datetime.utcnow() + timedelta(hours=2)
-        
-        db.session.commit()
+        # Claim the item atomically (set collection time limit 2 hours from now)
+        if claim_listed_item(item_id, user_id, datetime.utcnow() + timedelta(hours=2)) is None:
+            return jsonify({'error': 'Item has already been claimed'}), 409
+        db.session.refresh(item)
         
         # Notify vendor
         create_notification(
@@ -3920,7 +3991,7 @@ def mark_item_collected(item_id):
         if not item:
             return jsonify({'error': 'Item not found'}), 404
         
-        user = User.query.get(user_id)
+        user = get_principal()
         
         # Either vendor or VCFSE can mark as collected
         if user.user_type not in ['vendor', 'vcse']:
@@ -4013,7 +4084,7 @@ def admin_generate_report():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Only admins can generate reports'}), 403
         
@@ -4033,16 +4104,12 @@ def admin_generate_report():
             Voucher.redeemed_at <= datetime.combine(date_to, datetime.max.time())
         ).count()
         
-        total_value = db.session.query(db.func.sum(Voucher.value)).filter(
-            Voucher.created_at >= datetime.combine(date_from, datetime.min.time()),
-            Voucher.created_at <= datetime.combine(date_to, datetime.max.time())
-        ).scalar() or 0
-        
-        redeemed_value = db.session.query(db.func.sum(Voucher.value)).filter(
-            Voucher.status == 'redeemed',
-            Voucher.redeemed_at >= datetime.combine(date_from, datetime.min.time()),
-            Voucher.redeemed_at <= datetime.combine(date_to, datetime.max.time())
-        ).scalar() or 0
+        totals = ledger_totals(
+            datetime.combine(date_from, datetime.min.time()),
+            datetime.combine(date_to + timedelta(days=1), datetime.min.time())
+        )
+        total_value = totals['issue']['amount']
+        redeemed_value = totals['redeem']['amount']
         
         total_vendors = User.query.filter_by(user_type='vendor', is_active=True).count()
         total_vcse = User.query.filter_by(user_type='vcse', is_active=True).count()
@@ -4092,7 +4159,7 @@ def vcse_generate_report():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = current_user()
         if not user or user.user_type != 'vcse':
             return jsonify({'error': 'Only VCFSE organizations can generate reports'}), 403
         
@@ -4107,12 +4174,18 @@ def vcse_generate_report():
             Voucher.created_at <= datetime.combine(date_to, datetime.max.time())
         ).all()
         
+        totals = ledger_totals(
+            datetime.combine(date_from, datetime.min.time()),
+            datetime.combine(date_to + timedelta(days=1), datetime.min.time()),
+            issued_by=user_id
+        )
+        
         total_issued = len(vouchers_issued)
-        total_value_issued = sum(v.value for v in vouchers_issued)
+        total_value_issued = totals['issue']['amount']
         
         redeemed_vouchers = [v for v in vouchers_issued if v.status == 'redeemed']
         total_redeemed = len(redeemed_vouchers)
-        total_value_redeemed = sum(v.value for v in redeemed_vouchers)
+        total_value_redeemed = totals['redeem']['amount']
         
         # Get unique recipients served
         recipients_served = len(set(v.recipient_id for v in vouchers_issued if v.recipient_id))
@@ -4268,7 +4341,12 @@ def redeem_voucher():
         if not voucher_code or not shop_id:
             return jsonify({'error': 'Voucher code and shop ID required'}), 400
         
-        voucher = Voucher.query.filter_by(code=voucher_code).first()
+        # The shop's running totals need its vendor, so an unknown shop can't be redeemed at
+        shop = db.session.get(VendorShop, shop_id)
+        if not shop:
+            return jsonify({'error': 'Shop not found'}), 404
+        
+        voucher = Voucher.query.filter_by(code=voucher_code).with_for_update().first()
         
         if not voucher:
             return jsonify({'error': 'Voucher not found'}), 404
@@ -4276,15 +4354,20 @@ def redeem_voucher():
         if voucher.status != 'active':
             return jsonify({'error': f'Voucher is {voucher.status}'}), 400
         
-        if voucher.expiry_date and voucher.expiry_date < datetime.utcnow():
+        if not can_redeem_at_shop(voucher, shop_id):
+            return jsonify({'error': 'This voucher cannot be redeemed at this shop'}), 400
+        
+        if voucher.expiry_date and voucher.expiry_date < datetime.utcnow().date():
             voucher.status = 'expired'
             db.session.commit()
             return jsonify({'error': 'Voucher has expired'}), 400
         
-        # Redeem the voucher
-        voucher.status = 'redeemed'
-        voucher.redeemed_date = datetime.utcnow()
-        voucher.redeemed_at_shop_id = shop_id
+        if not vendor_id:
+            vendor_id = shop.vendor_id
+        
+        # Redeem the whole remaining balance
+        redeemed_value = float(voucher.value)
+        record_redemption(voucher, redeemed_value, vendor_id, shop_id)
         
         db.session.commit()
         
@@ -4292,15 +4375,15 @@ def redeem_voucher():
         create_notification(
             voucher.recipient_id,
             'Voucher Redeemed',
-            f'Your voucher {voucher_code} worth £{voucher.value} has been redeemed.',
+            f'Your voucher {voucher_code} worth £{redeemed_value:.2f} has been redeemed.',
             'success'
         )
         
         return jsonify({
             'message': 'Voucher redeemed successfully',
-            'value': float(voucher.value),
+            'value': redeemed_value,
             'code': voucher.code,
-            'redeemed_date': voucher.redeemed_date.isoformat()
+            'redeemed_date': voucher.redeemed_at.isoformat()
         }), 200
         
     except Exception as e:
@@ -4634,7 +4717,7 @@ def get_vendor_surplus_items():
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'vendor':
             return jsonify({'error': 'Vendor access required'}), 403
         
@@ -4684,7 +4767,7 @@ def update_surplus_item(item_id):
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'vendor':
             return jsonify({'error': 'Vendor access required'}), 403
         
@@ -4735,7 +4818,7 @@ def delete_surplus_item(item_id):
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'vendor':
             return jsonify({'error': 'Vendor access required'}), 403
         
@@ -4766,7 +4849,7 @@ def get_vcse_organizations():
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         
@@ -4799,7 +4882,7 @@ def get_schools():
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         
@@ -4831,7 +4914,7 @@ def get_recipients():
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         
@@ -4879,7 +4962,7 @@ def allocate_funds():
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         
@@ -4943,7 +5026,7 @@ def get_fund_allocations():
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         
@@ -4978,7 +5061,7 @@ def get_vcse_balance():
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        user = User.query.get(user_id)
+        user = current_user()
         if not user or user.user_type != 'vcse':
             return jsonify({'error': 'VCFSE access required'}), 403
         
@@ -5006,7 +5089,7 @@ def get_all_vouchers():
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         
@@ -5053,7 +5136,7 @@ def admin_get_all_shops():
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         
@@ -5097,7 +5180,7 @@ def admin_get_all_surplus_items():
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         
@@ -5147,7 +5230,7 @@ def vcse_get_to_go_items():
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'vcse':
             return jsonify({'error': 'VCFSE access required'}), 403
         
@@ -5220,7 +5303,7 @@ def vcse_get_discounted_items():
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'vcse':
             return jsonify({'error': 'VCFSE access required'}), 403
         
@@ -5282,7 +5365,7 @@ def vcse_accept_food_item():
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        user = User.query.get(user_id)
+        user = current_user()
         if not user or user.user_type != 'vcse':
             return jsonify({'error': 'VCSE access required'}), 403
         
@@ -5293,15 +5376,10 @@ def vcse_accept_food_item():
         if not item_id or not collection_time:
             return jsonify({'error': 'Item ID and collection time required'}), 400
         
-        # Get the item
-        item = SurplusItem.query.get(item_id)
-        if not item:
+        # Check the item exists (availability is decided by the atomic claim below)
+        if not db.session.query(SurplusItem.id).filter_by(id=item_id).first():
             return jsonify({'error': 'Item not found'}), 404
         
-        # Check if item is still available
-        if item.collection_status != 'available':
-            return jsonify({'error': 'Item is no longer available'}), 400
-        
         # Parse collection time
         from datetime import datetime
         try:
@@ -5309,13 +5387,19 @@ def vcse_accept_food_item():
         except:
             return jsonify({'error': 'Invalid collection time format'}), 400
         
-        # Update item
-        item.accepted_by_vcse_id = user_id
-        item.accepted_at = datetime.utcnow()
-        item.collection_time = collection_dt
-        item.collection_status = 'accepted'
+        # Claim the whole item, or part of it if a quantity is given
+        try:
+            claim = accept_surplus_item(item_id, user_id, collection_dt, data.get('quantity'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if claim is None:
+            status, remaining = get_available_quantity(item_id)
+            if status == 'available' and remaining:
+                return jsonify({'error': f'Only {float(remaining):g} left', 'remaining_quantity': float(remaining)}), 409
+            return jsonify({'error': 'Item is no longer available'}), 409
         
-        db.session.commit()
+        item = SurplusItem.query.get(claim['item_id'])
         
         # Get shop and vendor info for notification
         shop = VendorShop.query.get(item.shop_id)
@@ -5347,8 +5431,11 @@ def vcse_accept_food_item():
             'item': {
                 'id': item.id,
                 'item_name': item.item_name,
+                'quantity': item.quantity,
                 'collection_time': collection_dt.isoformat(),
-                'collection_status': item.collection_status
+                'collection_status': item.collection_status,
+                'parent_item_id': item.parent_item_id,
+                'remaining_quantity': float(claim['remaining_quantity'])
             }
         }), 200
         
@@ -5364,7 +5451,7 @@ def vcse_mark_collected():
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        user = User.query.get(user_id)
+        user = current_user()
         if not user or user.user_type != 'vcse':
             return jsonify({'error': 'VCSE access required'}), 403
         
@@ -5437,7 +5524,7 @@ def vcse_get_accepted_items():
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'vcse':
             return jsonify({'error': 'VCSE access required'}), 403
         
@@ -5488,7 +5575,7 @@ def get_shops_for_recipient():
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'recipient':
             return jsonify({'error': 'Recipient access required'}), 403
         
@@ -5530,6 +5617,66 @@ def get_shops_for_recipient():
         return jsonify({'error': f'Failed to get shops: {str(e)}'}), 500
 
 
+@app.route('/api/shops/nearby', methods=['GET'])
+def get_nearby_shops():
+    """Active shops nearest a postcode, within ?radius= km (default 5, max 50)"""
+    try:
+        user_id = session.get('user_id')
+        if not user_id:
+            return jsonify({'error': 'Unauthorized'}), 401
+        
+        postcode = request.args.get('postcode', '').strip()
+        if not postcode:
+            return jsonify({'error': 'postcode is required'}), 400
+        try:
+            radius = float(request.args.get('radius', 5))
+            limit = int(request.args.get('limit', 20))
+        except ValueError:
+            return jsonify({'error': 'radius and limit must be numbers'}), 400
+        if not 0 < radius <= 50:
+            return jsonify({'error': 'radius must be between 0 and 50 km'}), 400
+        limit = max(1, min(limit, 100))
+        
+        nearest = nearby_shops(postcode, radius, limit)
+        if nearest is None:
+            return jsonify({'error': f'Postcode area not recognised: {postcode}'}), 400
+        
+        # Details and available surplus counts for just the shops found, in two queries
+        shop_ids = [shop_id for shop_id, _ in nearest]
+        shops = {shop.id: shop for shop in VendorShop.query.filter(VendorShop.id.in_(shop_ids)).all()} if shop_ids else {}
+        surplus_counts = dict(db.session.query(SurplusItem.shop_id, func.count(SurplusItem.id)).filter(
+            SurplusItem.shop_id.in_(shop_ids),
+            SurplusItem.status == 'available'
+        ).group_by(SurplusItem.shop_id).all()) if shop_ids else {}
+        
+        shops_data = []
+        for shop_id, distance in nearest:
+            shop = shops.get(shop_id)
+            if not shop or not shop.is_active:
+                continue  # Changed in another worker since the index was built
+            shops_data.append({
+                'id': shop.id,
+                'shop_name': shop.shop_name,
+                'address': shop.address,
+                'city': shop.city,
+                'town': shop.town,
+                'postcode': shop.postcode,
+                'phone': shop.phone,
+                'distance_km': round(distance, 2),
+                'surplus_items_count': surplus_counts.get(shop.id, 0)
+            })
+        
+        return jsonify({
+            'postcode': postcode.upper(),
+            'radius_km': radius,
+            'shops': shops_data,
+            'total_count': len(shops_data)
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Failed to find nearby shops: {str(e)}'}), 500
+
+
 @app.route('/api/recipient/surplus-items', methods=['GET'])
 def get_surplus_items_for_recipient():
     """Recipient endpoint to view all available surplus items"""
@@ -5538,7 +5685,7 @@ def get_surplus_items_for_recipient():
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'recipient':
             return jsonify({'error': 'Recipient access required'}), 403
         
@@ -5583,7 +5730,7 @@ def get_school_balance():
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        user = User.query.get(user_id)
+        user = current_user()
         if not user or user.user_type != 'school':
             return jsonify({'error': 'School/Care Organization access required'}), 403
         
@@ -5605,15 +5752,13 @@ def school_issue_voucher():
     import string
     import json
     from datetime import datetime, timedelta
-    from werkzeug.security import generate_password_hash
-    import secrets
     
     try:
         user_id = session.get('user_id')
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        user = User.query.get(user_id)
+        user = current_user()
         if not user or user.user_type != 'school':
             return jsonify({'error': 'School/Care Organization access required'}), 403
         
@@ -5628,6 +5773,10 @@ def school_issue_voucher():
         amount = float(data['amount'])
         assign_shop_method = data.get('assign_shop_method', 'specific_shop')  # 'specific_shop' or 'recipient_to_choose'
         selected_shops = data.get('selected_shops')  # List of shop IDs or 'all'
+        try:
+            shop_ids = parse_shop_selection(selected_shops)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         # Enforce £50 maximum per voucher - split into multiple vouchers if needed
         MAX_VOUCHER_VALUE = 50.0
@@ -5647,10 +5796,9 @@ def school_issue_voucher():
         
         if not recipient:
             # Create new recipient account
-            temp_password = secrets.token_urlsafe(12)
             recipient = User(
                 email=data['recipient_email'],
-                password_hash=generate_password_hash(temp_password),
+                password_hash=INVITE_PENDING,  # Sets a password via the reset link
                 first_name=data['recipient_first_name'],
                 last_name=data['recipient_last_name'],
                 phone=data['recipient_phone'],
@@ -5663,10 +5811,6 @@ def school_issue_voucher():
             db.session.flush()
         
         # Generate unique voucher codes and create multiple vouchers
-        vendor_restrictions = None
-        if selected_shops and selected_shops != 'all':
-            vendor_restrictions = json.dumps(selected_shops)  # Store as JSON array
-        
         # Deduct total amount from school wallet balance once
         balance_before = user.balance
         user.balance -= amount
@@ -5687,6 +5831,7 @@ def school_issue_voucher():
         
         # Create multiple vouchers based on split amounts
         voucher_codes = []
+        vouchers = []
         for voucher_value in voucher_amounts:
             voucher_code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=10))
             voucher_codes.append(voucher_code)
@@ -5698,7 +5843,6 @@ def school_issue_voucher():
                 recipient_id=recipient.id,
                 status='active',
                 expiry_date=datetime.utcnow() + timedelta(days=90),
-                vendor_restrictions=vendor_restrictions,
                 assign_shop_method=assign_shop_method,
                 original_recipient_id=recipient.id,
                 reassignment_count=0,
@@ -5707,7 +5851,9 @@ def school_issue_voucher():
                 wallet_transaction_id=wallet_transaction.id
             )
             db.session.add(voucher)
+            vouchers.append(voucher)
         
+        set_vouchers_shops(vouchers, shop_ids)
         db.session.commit()
         
         # Create notification for recipient
@@ -5748,19 +5894,18 @@ def school_issue_voucher():
                     user.organization_name
                 )
             else:
-                # For multiple vouchers, send individual emails for each voucher
-                email_result = True
-                for i, voucher_code in enumerate(voucher_codes):
-                    individual_result = email_service.send_voucher_issued_email(
+                # For multiple vouchers, send individual emails for each voucher over one connection
+                email_summary = email_service.send_many([
+                    email_service.build_voucher_issued_email(
                         recipient.email,
                         f"{recipient.first_name} {recipient.last_name}",
                         voucher_code,
                         voucher_amounts[i],
                         user.organization_name
                     )
-                    if not individual_result:
-                        email_result = False
-                        print(f"Failed to send email for voucher {voucher_code}")
+                    for i, voucher_code in enumerate(voucher_codes)
+                ])
+                email_result = email_summary['failed'] == 0
             if not email_result:
                 print(f"Failed to send email to {recipient.email}")
         
@@ -5786,7 +5931,7 @@ def get_school_vouchers():
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'school':
             return jsonify({'error': 'School/Care Organization access required'}), 403
         
@@ -5822,7 +5967,7 @@ def get_school_to_go_items():
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'school':
             return jsonify({'error': 'School/Care Organization access required'}), 403
         
@@ -5863,16 +6008,11 @@ def get_school_to_go_items():
 # ============================================
 
 @app.route('/api/vendor/redeem-voucher', methods=['POST'])
+@require_role('vendor')
 def vendor_redeem_voucher():
     """Vendor endpoint to redeem a voucher by code"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'error': 'Unauthorized'}), 401
-        
-        user = User.query.get(user_id)
-        if not user or user.user_type != 'vendor':
-            return jsonify({'error': 'Vendor access required'}), 403
+        user_id = g.principal.id
         
         data = request.get_json()
         voucher_code = data.get('code', '').strip().upper()
@@ -5918,16 +6058,35 @@ def vendor_redeem_voucher():
         if redemption_amount > current_voucher_value:
             return jsonify({'error': f'Redemption amount £{redemption_amount:.2f} exceeds voucher balance £{current_voucher_value:.2f}'}), 400
         
+        # Recipient and eligible shops come from the validation cache when it has
+        # this exact version of the voucher (the vendor usually validated it just now)
+        cached = get_voucher_state(voucher_code)
+        if cached is None or cached.version != voucher.cache_version:
+            cached = None
+        
         # Get recipient details
-        recipient = User.query.get(voucher.recipient_id) if voucher.recipient_id else None
+        if cached:
+            recipient_id, recipient_name, recipient_phone = cached.recipient_id, cached.recipient_name, cached.recipient_phone
+        else:
+            recipient = User.query.get(voucher.recipient_id) if voucher.recipient_id else None
+            recipient_id = recipient.id if recipient else None
+            recipient_name = f"{recipient.first_name} {recipient.last_name}" if recipient else None
+            recipient_phone = recipient.phone if recipient else None
         
-        if not recipient:
+        if not recipient_id or not recipient_name:
             return jsonify({'error': 'Voucher has no assigned recipient'}), 400
         
-        # Get shop details
-        shop = VendorShop.query.filter_by(vendor_id=user_id, is_active=True).first()
-        if not shop:
-            return jsonify({'error': 'No active shop found for this vendor'}), 400
+        # Get shop details (the vendor's first shop that accepts this voucher)
+        if cached:
+            shops = eligible_vendor_shops(cached, user_id)
+            shop_id, shop_name = shops[0] if shops else (None, None)
+        else:
+            shop = eligible_vendor_shop(voucher, user_id)
+            shop_id, shop_name = (shop.id, shop.shop_name) if shop else (None, None)
+        if not shop_id:
+            if voucher.any_shop:
+                return jsonify({'error': 'No active shop found for this vendor'}), 400
+            return jsonify({'error': 'This voucher cannot be redeemed at your shops'}), 400
         
         # NEW WORKFLOW: Create redemption request instead of immediate redemption
         # Check if there's already a pending request for this voucher
@@ -5943,8 +6102,8 @@ def vendor_redeem_voucher():
         redemption_request = RedemptionRequest(
             voucher_id=voucher.id,
             vendor_id=user_id,
-            shop_id=shop.id,
-            recipient_id=recipient.id,
+            shop_id=shop_id,
+            recipient_id=recipient_id,
             amount=redemption_amount,
             status='pending',
             expires_at=datetime.now() + timedelta(minutes=5)  # Auto-expire after 5 minutes
@@ -5961,18 +6120,18 @@ def vendor_redeem_voucher():
         # Send notification to recipient via Socket.IO
         from notifications_system import broadcast_redemption_request_notification
         broadcast_redemption_request_notification(
-            recipient_id=recipient.id,
+            recipient_id=recipient_id,
             request_id=redemption_request.id,
-            shop_name=shop.shop_name,
+            shop_name=shop_name,
             amount=redemption_amount,
             voucher_code=voucher_code
         )
         
         # Send SMS to recipient for approval
-        if recipient.phone:
+        if recipient_phone:
             approval_message = f"""BAK UP Redemption Request
 
-{shop.shop_name} wants to redeem £{redemption_amount:.2f} from your voucher {voucher_code}.
+{shop_name} wants to redeem £{redemption_amount:.2f} from your voucher {voucher_code}.
 
 Current balance: £{current_voucher_value:.2f}
 Remaining after: £{round(current_voucher_value - redemption_amount, 2):.2f}
@@ -5980,7 +6139,7 @@ Remaining after: £{round(current_voucher_value - redemption_amount, 2):.2f}
 Please approve or reject in your app within 5 minutes.
 
 BAK UP Team"""
-            sms_result = sms_service.send_sms(recipient.phone, approval_message)
+            sms_result = sms_service.send_sms(recipient_phone, approval_message)
             if not sms_result.get('success'):
                 print(f"Failed to send approval SMS to recipient: {sms_result.get('error')}")
         
@@ -5992,8 +6151,8 @@ BAK UP Team"""
                 'code': voucher.code,
                 'current_balance': float(voucher.value),
                 'recipient': {
-                    'name': f"{recipient.first_name} {recipient.last_name}",
-                    'phone': recipient.phone
+                    'name': recipient_name,
+                    'phone': recipient_phone
                 }
             },
             'redemption_amount': redemption_amount,
@@ -6007,16 +6166,11 @@ BAK UP Team"""
 
 
 @app.route('/api/vendor/validate-voucher', methods=['POST'])
+@require_role('vendor')
 def validate_voucher():
     """Vendor endpoint to validate a voucher code without redeeming it"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'error': 'Unauthorized'}), 401
-        
-        user = User.query.get(user_id)
-        if not user or user.user_type != 'vendor':
-            return jsonify({'error': 'Vendor access required'}), 403
+        user_id = g.principal.id
         
         data = request.get_json()
         voucher_code = data.get('code', '').strip().upper()
@@ -6024,8 +6178,8 @@ def validate_voucher():
         if not voucher_code:
             return jsonify({'error': 'Voucher code is required'}), 400
         
-        # Find voucher by code
-        voucher = Voucher.query.filter_by(code=voucher_code).first()
+        # Find voucher by code (cached validation state, see voucher_cache.py)
+        voucher = get_voucher_state(voucher_code)
         
         if not voucher:
             return jsonify({'valid': False, 'error': 'Invalid voucher code'}), 200
@@ -6039,32 +6193,20 @@ def validate_voucher():
         if voucher.expiry_date and datetime.now().date() > voucher.expiry_date:
             return jsonify({'valid': False, 'error': 'Voucher has expired'}), 200
         
-        # Check vendor restrictions (support multi-shop redemption)
-        if voucher.vendor_restrictions:
-            import json
-            allowed_shop_ids = json.loads(voucher.vendor_restrictions)
-            
-            # Get all shops owned by this vendor
-            vendor_shops = VendorShop.query.filter_by(vendor_id=user_id, is_active=True).all()
-            vendor_shop_ids = [shop.id for shop in vendor_shops]
-            
-            # Check if any of vendor's shops are in the allowed list
-            if not any(shop_id in allowed_shop_ids for shop_id in vendor_shop_ids):
-                return jsonify({'valid': False, 'error': 'This voucher cannot be redeemed at your shops'}), 200
-        
-        # Get recipient details
-        recipient = User.query.get(voucher.recipient_id) if voucher.recipient_id else None
+        # Check shop restrictions (support multi-shop redemption)
+        if voucher.shop_ids is not None and not eligible_vendor_shops(voucher, user_id):
+            return jsonify({'valid': False, 'error': 'This voucher cannot be redeemed at your shops'}), 200
         
         return jsonify({
             'valid': True,
             'voucher': {
                 'code': voucher.code,
-                'value': float(voucher.value),
+                'value': voucher.value,
                 'expiry_date': voucher.expiry_date.isoformat() if voucher.expiry_date else None,
                 'recipient': {
-                    'name': f"{recipient.first_name} {recipient.last_name}" if recipient else 'N/A',
-                    'phone': recipient.phone if recipient else 'N/A'
-                } if recipient else None
+                    'name': voucher.recipient_name or 'N/A',
+                    'phone': voucher.recipient_phone or 'N/A'
+                } if voucher.recipient_name else None
             }
         }), 200
         
@@ -6076,6 +6218,38 @@ def validate_voucher():
 # Recipient Voucher Management Routes
 # ============================================
 
+def recipient_wallet_summary(user_id):
+    """Counts and totals of a recipient's vouchers, in one query of conditional aggregates"""
+    def count_where(condition):
+        return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+    
+    # Redemptions come from the ledger: a redeemed voucher's cached balance is zero
+    redeemed_value = select(func.coalesce(-func.sum(VoucherLedger.amount), 0)).join(
+        Voucher, Voucher.id == VoucherLedger.voucher_id
+    ).where(
+        Voucher.recipient_id == user_id,
+        VoucherLedger.entry_type == 'redeem'
+    ).correlate(None).scalar_subquery()
+    
+    summary = db.session.query(
+        func.count(Voucher.id),
+        count_where(Voucher.status == 'active'),
+        count_where(Voucher.status == 'redeemed'),
+        count_where(Voucher.status == 'expired'),
+        func.coalesce(func.sum(case((Voucher.status == 'active', Voucher.value), else_=0)), 0),
+        redeemed_value
+    ).filter(Voucher.recipient_id == user_id).one()
+    
+    total, active, redeemed, expired, active_value, redeemed_value = summary
+    return {
+        'total_vouchers': total,
+        'active_count': int(active),
+        'redeemed_count': int(redeemed),
+        'expired_count': int(expired),
+        'total_active_value': round(float(active_value), 2),
+        'total_redeemed_value': round(float(redeemed_value), 2)
+    }
+
 @app.route('/api/recipient/vouchers', methods=['GET'])
 def get_recipient_vouchers():
     """Get all vouchers assigned to the logged-in recipient"""
@@ -6084,20 +6258,28 @@ def get_recipient_vouchers():
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'recipient':
             return jsonify({'error': 'Recipient access required'}), 403
         
-        # Get all vouchers for this recipient
-        vouchers = Voucher.query.filter_by(recipient_id=user_id).order_by(
-            Voucher.created_at.desc()
-        ).all()
+        # Vouchers with issuer and redeeming vendor names joined in
+        issuer = aliased(User)
+        vendor = aliased(User)
+        rows = db.session.query(
+            Voucher,
+            issuer.organization_name, issuer.first_name, issuer.last_name, issuer.user_type,
+            vendor.id, vendor.shop_name, vendor.first_name, vendor.last_name
+        ).outerjoin(
+            issuer, issuer.id == Voucher.issued_by
+        ).outerjoin(
+            vendor, vendor.id == Voucher.redeemed_by_vendor
+        ).filter(
+            Voucher.recipient_id == user_id
+        ).order_by(Voucher.created_at.desc()).all()
         
         vouchers_data = []
-        for voucher in vouchers:
-            issued_by_user = User.query.get(voucher.issued_by)
-            redeemed_vendor = User.query.get(voucher.redeemed_by_vendor) if voucher.redeemed_by_vendor else None
-            
+        for (voucher, issuer_org, issuer_first, issuer_last, issuer_type,
+             vendor_id, vendor_shop, vendor_first, vendor_last) in rows:
             vouchers_data.append({
                 'id': voucher.id,
                 'code': voucher.code,
@@ -6107,39 +6289,42 @@ def get_recipient_vouchers():
                 'created_at': voucher.created_at.isoformat() if voucher.created_at else None,
                 'redeemed_at': voucher.redeemed_at.isoformat() if voucher.redeemed_at else None,
                 'issued_by': {
-                    'name': issued_by_user.organization_name or f"{issued_by_user.first_name} {issued_by_user.last_name}",
-                    'type': issued_by_user.user_type
-                } if issued_by_user else None,
+                    'name': issuer_org or f"{issuer_first} {issuer_last}",
+                    'type': issuer_type
+                } if issuer_type else None,
                 'redeemed_by': {
-                    'name': redeemed_vendor.shop_name or f"{redeemed_vendor.first_name} {redeemed_vendor.last_name}"
-                } if redeemed_vendor else None,
+                    'name': vendor_shop or f"{vendor_first} {vendor_last}"
+                } if vendor_id else None,
                 'vendor_restrictions': voucher.vendor_restrictions
             })
         
-        # Calculate summary statistics
-        active_vouchers = [v for v in vouchers if v.status == 'active']
-        redeemed_vouchers = [v for v in vouchers if v.status == 'redeemed']
-        expired_vouchers = [v for v in vouchers if v.status == 'expired']
-        
-        total_value = sum(float(v.value) for v in active_vouchers)
-        total_redeemed = sum(float(v.value) for v in redeemed_vouchers)
-        
         return jsonify({
             'vouchers': vouchers_data,
-            'summary': {
-                'total_vouchers': len(vouchers),
-                'active_count': len(active_vouchers),
-                'redeemed_count': len(redeemed_vouchers),
-                'expired_count': len(expired_vouchers),
-                'total_active_value': total_value,
-                'total_redeemed_value': total_redeemed
-            }
+            'summary': recipient_wallet_summary(user_id)
         }), 200
-        
+    
     except Exception as e:
         return jsonify({'error': f'Failed to get vouchers: {str(e)}'}), 500
 
 
+@app.route('/api/recipient/wallet-summary', methods=['GET'])
+def get_recipient_wallet_summary():
+    """Voucher counts and totals for the logged-in recipient, without the voucher list"""
+    try:
+        user_id = session.get('user_id')
+        if not user_id:
+            return jsonify({'error': 'Unauthorized'}), 401
+        
+        user = get_principal()
+        if not user or user.user_type != 'recipient':
+            return jsonify({'error': 'Recipient access required'}), 403
+        
+        return jsonify({'summary': recipient_wallet_summary(user_id)}), 200
+    
+    except Exception as e:
+        return jsonify({'error': f'Failed to get wallet summary: {str(e)}'}), 500
+
+
 @app.route('/api/recipient/shops', methods=['GET'])
 def get_recipient_shops():
     """Get all participating shops with their to-go items count"""
@@ -6433,7 +6618,7 @@ def resend_voucher_sms(voucher_id):
         if not voucher or voucher.recipient_id != user_id:
             return jsonify({'error': 'Voucher not found'}), 404
         
-        recipient = User.query.get(user_id)
+        recipient = current_user()
         if not recipient.phone:
             return jsonify({'error': 'No phone number on file'}), 400
         
@@ -6507,7 +6692,7 @@ def add_to_cart():
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        user = User.query.get(user_id)
+        user = current_user()
         if not user or user.user_type != 'recipient':
             return jsonify({'error': 'Recipient access required'}), 403
         
@@ -6568,7 +6753,7 @@ def get_cart():
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'recipient':
             return jsonify({'error': 'Recipient access required'}), 403
         
@@ -6681,7 +6866,7 @@ def edit_school(school_id):
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         
@@ -6719,8 +6904,7 @@ def edit_school(school_id):
         
         # Handle password reset if provided
         if 'new_password' in data and data['new_password']:
-            from werkzeug.security import generate_password_hash
-            school.password_hash = generate_password_hash(data['new_password'])
+            school.password_hash = hash_password(data['new_password'])
         
         db.session.commit()
         
@@ -6761,7 +6945,7 @@ def delete_school(school_id):
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         
@@ -6789,7 +6973,7 @@ def delete_school(school_id):
         logger.info(f"Deleted {user_notif_count} user notifications")
         
         # 3. Delete notifications where this user is the recipient (surplus food notifications)
-        notif_count = Notification.query.filter_by(user_id=school_id).delete(synchronize_session=False)
+        notif_count = delete_notifications(Notification.user_id == school_id)
         logger.info(f"Deleted {notif_count} surplus notifications")
         
         # 4. Delete wallet transactions
@@ -6827,7 +7011,7 @@ def edit_vcse(vcse_id):
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         
@@ -6854,7 +7038,7 @@ def edit_vcse(vcse_id):
             vcse.allocated_balance = float(data['allocated_balance'])
         if 'new_password' in data and data['new_password']:
             # Reset password if provided
-            vcse.password_hash = generate_password_hash(data['new_password'])
+            vcse.password_hash = hash_password(data['new_password'])
         
         db.session.commit()
         
@@ -6882,7 +7066,7 @@ def delete_vcse(vcse_id):
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         
@@ -6910,7 +7094,7 @@ def delete_vcse(vcse_id):
         logger.info(f"Deleted {user_notif_count} user notifications")
         
         # 3. Delete notifications where this user is the recipient (surplus food notifications)
-        notif_count = Notification.query.filter_by(user_id=vcse_id).delete(synchronize_session=False)
+        notif_count = delete_notifications(Notification.user_id == vcse_id)
         logger.info(f"Deleted {notif_count} surplus notifications")
         
         # 4. Delete wallet transactions
@@ -6948,7 +7132,7 @@ def delete_recipient(recipient_id):
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         
@@ -6981,7 +7165,7 @@ def delete_recipient(recipient_id):
         logger.info(f"Deleted {user_notif_count} user notifications")
         
         # 3. Delete notifications where this user is the recipient (surplus food notifications)
-        notif_count = Notification.query.filter_by(user_id=recipient_id).delete(synchronize_session=False)
+        notif_count = delete_notifications(Notification.user_id == recipient_id)
         logger.info(f"Deleted {notif_count} surplus notifications")
         
         # 4. Delete wallet transactions
@@ -7024,7 +7208,7 @@ def admin_edit_shop(shop_id):
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         
@@ -7075,7 +7259,7 @@ def admin_delete_shop(shop_id):
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         
@@ -7119,7 +7303,7 @@ def initialize_admin():
         # Create admin user
         admin = User(
             email='prince.caesar@bakup.org',
-            password_hash=generate_password_hash('Prince@2024'),
+            password_hash=hash_password('Prince@2024'),
             first_name='Prince',
             last_name='Caesar',
             user_type='admin',
@@ -7158,16 +7342,16 @@ def change_password():
         if len(new_password) < 8:
             return jsonify({'error': 'New password must be at least 8 characters long'}), 400
         
-        user = User.query.get(user_id)
+        user = current_user()
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
         # Verify current password
-        if not check_password_hash(user.password_hash, current_password):
+        if not verify_password(user, current_password):
             return jsonify({'error': 'Current password is incorrect'}), 401
         
         # Update password
-        user.password_hash = generate_password_hash(new_password)
+        user.password_hash = hash_password(new_password)
         db.session.commit()
         
         return jsonify({'message': 'Password changed successfully'}), 200
@@ -7185,7 +7369,7 @@ def get_all_admins():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         
@@ -7217,7 +7401,7 @@ def create_admin_account():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         
@@ -7241,7 +7425,7 @@ def create_admin_account():
         # Create new admin
         new_admin = User(
             email=email,
-            password_hash=generate_password_hash(password),
+            password_hash=hash_password(password),
             first_name=first_name,
             last_name=last_name,
             user_type='admin',
@@ -7275,7 +7459,7 @@ def delete_admin_account(admin_id):
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         
@@ -7304,7 +7488,7 @@ def delete_admin_account(admin_id):
         logger.info(f"Deleted {user_notif_count} user notifications")
         
         # 3. Delete notifications where this user is the recipient (surplus food notifications)
-        notif_count = Notification.query.filter_by(user_id=admin_id).delete(synchronize_session=False)
+        notif_count = delete_notifications(Notification.user_id == admin_id)
         logger.info(f"Deleted {notif_count} surplus notifications")
         
         # 4. Delete wallet transactions
@@ -7404,7 +7588,7 @@ def unassign_voucher():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
@@ -7479,44 +7663,6 @@ def get_all_vendor_shops():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/admin/login-stats', methods=['GET'])
-def get_login_stats():
-    """Get login frequency statistics for all users"""
-    try:
-        users = User.query.filter(User.user_type != 'admin').all()
-        
-        stats = []
-        for user in users:
-            stats.append({
-                'id': user.id,
-                'name': user.first_name + ' ' + user.last_name,
-                'email': user.email,
-                'user_type': user.user_type,
-                'organization': user.organization_name or user.shop_name or 'N/A',
-                'last_login': user.last_login.isoformat() if user.last_login else 'Never',
-                'login_count': user.login_count,
-                'is_active': user.is_active,
-                'created_at': user.created_at.isoformat()
-            })
-        
-        # Calculate summary statistics
-        total_users = len(stats)
-        active_users = sum(1 for s in stats if s['is_active'])
-        logged_in_users = sum(1 for s in stats if s['last_login'] != 'Never')
-        
-        return jsonify({
-            'users': stats,
-            'summary': {
-                'total_users': total_users,
-                'active_users': active_users,
-                'logged_in_users': logged_in_users,
-                'never_logged_in': total_users - logged_in_users
-            }
-        }), 200
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
 # ==================== PAYOUT REQUEST ROUTES ====================
 
 @app.route('/api/vendor/payout/request', methods=['POST'])
@@ -7529,7 +7675,7 @@ def request_payout():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = current_user()
         if not user or user.user_type != 'vendor':
             return jsonify({'error': 'Unauthorized'}), 403
         
@@ -7544,11 +7690,26 @@ def request_payout():
         if not shop or shop.vendor_id != user_id:
             return jsonify({'error': 'Invalid shop'}), 400
         
+        try:
+            amount = round(float(data['amount']), 2)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Invalid amount'}), 400
+        
+        # Hold the amount back from what the shop has redeemed and not yet been paid
+        try:
+            reserve_payout(shop.id, user_id, amount)
+        except ValueError as e:
+            db.session.rollback()
+            return jsonify({
+                'error': str(e),
+                'available_to_pay_out': shop_balance(shop.id)['available_to_pay_out']
+            }), 400
+        
         # Create payout request
         payout = PayoutRequest(
             vendor_id=user_id,
             shop_id=data['shop_id'],
-            amount=float(data['amount']),
+            amount=amount,
             bank_name=data['bank_name'],
             account_number=data['account_number'],
             sort_code=data['sort_code'],
@@ -7561,19 +7722,16 @@ def request_payout():
         
         # Create in-app notification for all admins
         try:
-            admins = User.query.filter_by(user_type='admin', is_active=True).all()
-            for admin in admins:
-                notification = Notification(
-                    user_id=admin.id,
-                    type='payout_request',
-                    title='New Payout Request',
-                    message=f'{user.first_name} {user.last_name} requested a payout of £{payout.amount:.2f} for {shop.shop_name}',
-                    link=f'/admin/payouts/{payout.id}'
-                )
-                db.session.add(notification)
+            created = notify_audience(
+                'New Payout Request',
+                f'{user.first_name} {user.last_name} requested a payout of £{payout.amount:.2f} for {shop.shop_name}',
+                'payout_request',
+                user_types='admin'
+            )
             db.session.commit()
-            logger.info(f"Created in-app notifications for {len(admins)} admins about payout request")
+            logger.info("Created in-app notifications for %d admins about payout request", created)
         except Exception as e:
+            db.session.rollback()
             logger.error(f"Failed to create in-app notifications for payout request: {e}")
         
         # Send email notification to admin
@@ -7610,7 +7768,7 @@ def get_payout_history():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'vendor':
             return jsonify({'error': 'Unauthorized'}), 403
         
@@ -7635,6 +7793,34 @@ def get_payout_history():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/vendor/payout/balance', methods=['GET'])
+def get_payout_balance():
+    """Get redeemed, paid out and available-to-pay-out totals for each of the vendor's shops"""
+    try:
+        user_id = session.get('user_id')
+        
+        if not user_id:
+            return jsonify({'error': 'Not authenticated'}), 401
+        
+        user = get_principal()
+        if not user or user.user_type != 'vendor':
+            return jsonify({'error': 'Unauthorized'}), 403
+        
+        shops = VendorShop.query.filter_by(vendor_id=user_id).all()
+        balances = vendor_balances(user_id)
+        shop_list = [
+            dict(balances.get(shop.id) or shop_balance(shop.id), shop_name=shop.shop_name)
+            for shop in shops
+        ]
+        
+        return jsonify({
+            'shops': shop_list,
+            'totals': sum_balances(shop_list)
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/admin/payout/requests', methods=['GET'])
 def get_all_payout_requests():
     """Admin: Get all payout requests"""
@@ -7644,7 +7830,7 @@ def get_all_payout_requests():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Unauthorized'}), 403
         
@@ -7708,7 +7894,7 @@ def review_payout(payout_id):
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Unauthorized'}), 403
         
@@ -7719,7 +7905,8 @@ def review_payout(payout_id):
         if action not in ['approve', 'reject']:
             return jsonify({'error': 'Invalid action'}), 400
         
-        payout = PayoutRequest.query.get(payout_id)
+        # Locked, so two admins reviewing at once can't both release the reservation
+        payout = PayoutRequest.query.filter_by(id=payout_id).with_for_update().first()
         if not payout:
             return jsonify({'error': 'Payout request not found'}), 404
         
@@ -7731,23 +7918,23 @@ def review_payout(payout_id):
         payout.reviewed_by = user_id
         payout.reviewed_at = datetime.utcnow()
         payout.admin_notes = admin_notes
+        if payout.status == 'rejected':
+            release_payout(payout)
         
         db.session.commit()
         
         # Create in-app notification for vendor
         try:
             status_text = 'approved' if payout.status == 'approved' else 'rejected'
-            notification = Notification(
-                user_id=payout.vendor_id,
-                type='payout_status',
-                title=f'Payout Request {status_text.title()}',
-                message=f'Your payout request for £{payout.amount:.2f} has been {status_text}. {admin_notes if admin_notes else ""}',
-                link=f'/vendor/payouts/{payout.id}'
+            create_notification(
+                payout.vendor_id,
+                f'Payout Request {status_text.title()}',
+                f'Your payout request for £{payout.amount:.2f} has been {status_text}. {admin_notes if admin_notes else ""}',
+                'payout_status'
             )
-            db.session.add(notification)
-            db.session.commit()
             logger.info(f"Created in-app notification for vendor about payout {status_text}")
         except Exception as e:
+            db.session.rollback()
             logger.error(f"Failed to create in-app notification for payout status: {e}")
         
         # Send email notification to vendor
@@ -7785,11 +7972,12 @@ def mark_payout_paid(payout_id):
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Unauthorized'}), 403
         
-        payout = PayoutRequest.query.get(payout_id)
+        # Locked, so a double submit can't count the payment twice
+        payout = PayoutRequest.query.filter_by(id=payout_id).with_for_update().first()
         if not payout:
             return jsonify({'error': 'Payout request not found'}), 404
         
@@ -7798,22 +7986,21 @@ def mark_payout_paid(payout_id):
         
         payout.status = 'paid'
         payout.paid_at = datetime.utcnow()
+        settle_payout(payout)
         
         db.session.commit()
         
         # Create in-app notification for vendor
         try:
-            notification = Notification(
-                user_id=payout.vendor_id,
-                type='payout_paid',
-                title='Payout Completed',
-                message=f'Your payout of £{payout.amount:.2f} for {payout.shop.shop_name} has been paid.',
-                link=f'/vendor/payouts/{payout.id}'
+            create_notification(
+                payout.vendor_id,
+                'Payout Completed',
+                f'Your payout of £{payout.amount:.2f} for {payout.shop.shop_name} has been paid.',
+                'payout_paid'
             )
-            db.session.add(notification)
-            db.session.commit()
             logger.info(f"Created in-app notification for vendor about payout payment")
         except Exception as e:
+            db.session.rollback()
             logger.error(f"Failed to create in-app notification for payout payment: {e}")
         
         # Send payment confirmation email
@@ -7847,7 +8034,7 @@ def run_migration():
     if not user_id:
         return jsonify({'error': 'Unauthorized'}), 401
     
-    user = User.query.get(user_id)
+    user = get_principal()
     if not user or user.user_type != 'admin':
         return jsonify({'error': 'Unauthorized'}), 403
     
@@ -7956,24 +8143,20 @@ def get_voucher_shop_status(code):
         
         # If shop was preselected by VCFSE/School (specific_shop method)
         if voucher.assign_shop_method == 'specific_shop':
-            # Get shop from vendor_restrictions (legacy) or assigned shop
-            if voucher.vendor_restrictions:
-                import json
-                try:
-                    vendor_ids = json.loads(voucher.vendor_restrictions)
-                    if vendor_ids and len(vendor_ids) > 0:
-                        # Get the first shop from the first vendor
-                        shop = VendorShop.query.filter_by(vendor_id=vendor_ids[0], is_active=True).first()
-                        if shop:
-                            response_data['assigned_shop'] = {
-                                'id': shop.id,
-                                'shop_name': shop.shop_name,
-                                'address': shop.address,
-                                'town': shop.town,
-                                'phone': shop.phone
-                            }
-                except:
-                    pass
+            # First active shop the voucher is restricted to
+            if not voucher.any_shop:
+                shop = VendorShop.query.join(VoucherShop, VoucherShop.shop_id == VendorShop.id).filter(
+                    VoucherShop.voucher_id == voucher.id,
+                    VendorShop.is_active == True
+                ).order_by(VendorShop.id).first()
+                if shop:
+                    response_data['assigned_shop'] = {
+                        'id': shop.id,
+                        'shop_name': shop.shop_name,
+                        'address': shop.address,
+                        'town': shop.town,
+                        'phone': shop.phone
+                    }
         
         # If recipient has selected a shop
         if voucher.recipient_selected_shop_id:
@@ -8029,11 +8212,14 @@ def select_shop_for_voucher():
         if not shop or not shop.is_active:
             return jsonify({'error': 'Shop not found or inactive'}), 404
         
+        if not can_redeem_at_shop(voucher, shop.id):
+            return jsonify({'error': 'This voucher cannot be used at that shop'}), 400
+        
         # Save shop selection to voucher
         voucher.recipient_selected_shop_id = shop_id
         
         # Also save to recipient's preferred shop
-        user = User.query.get(user_id)
+        user = current_user()
         user.preferred_shop_id = shop_id
         
         db.session.commit()
@@ -8061,7 +8247,7 @@ def get_discounted_items_for_recipient():
         if not user_id:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(user_id)
+        user = current_user()
         if not user or user.user_type != 'recipient':
             return jsonify({'error': 'Recipient access required'}), 403
         
@@ -8119,7 +8305,7 @@ create_food_to_go_migration_endpoint(app, db)
 
 # Add Admin Password Reset endpoint
 from admin_password_reset import create_admin_password_reset_endpoint
-create_admin_password_reset_endpoint(app, db, User, generate_password_hash, session, request, jsonify)
+create_admin_password_reset_endpoint(app, db, User, hash_password, session, request, jsonify)
 
 # Add date_of_birth field migration
 from add_date_of_birth_field import create_date_of_birth_migration_endpoint
@@ -8284,7 +8470,7 @@ def get_recipient_redemption_requests():
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        user = User.query.get(user_id)
+        user = get_principal()
         if not user or user.user_type != 'recipient':
             return jsonify({'error': 'Recipient access required'}), 403
         
@@ -8347,7 +8533,7 @@ def respond_to_redemption_request(request_id):
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        user = User.query.get(user_id)
+        user = current_user()
         if not user or user.user_type != 'recipient':
             return jsonify({'error': 'Recipient access required'}), 403
         
@@ -8378,8 +8564,8 @@ def respond_to_redemption_request(request_id):
             db.session.commit()
             return jsonify({'error': 'Request has expired'}), 400
         
-        # Get voucher
-        voucher = Voucher.query.get(redemption_req.voucher_id)
+        # Get voucher (locked, so concurrent approvals can't spend the same balance)
+        voucher = Voucher.query.filter_by(id=redemption_req.voucher_id).with_for_update().first()
         if not voucher:
             return jsonify({'error': 'Voucher not found'}), 404
         
@@ -8396,22 +8582,15 @@ def respond_to_redemption_request(request_id):
             if redemption_amount > current_voucher_value:
                 return jsonify({'error': f'Redemption amount £{redemption_amount:.2f} exceeds current voucher balance £{current_voucher_value:.2f}'}), 400
             
-            # Deduct amount from voucher
-            new_voucher_balance = round(current_voucher_value - redemption_amount, 2)
-            voucher.value = new_voucher_balance
-            
-            # Mark as fully redeemed if balance is zero
-            if new_voucher_balance <= 0:
-                voucher.status = 'redeemed'
-                voucher.redeemed_at = datetime.now()
-            
-            voucher.redeemed_by_vendor = redemption_req.vendor_id
-            voucher.redeemed_at_shop_id = redemption_req.shop_id
+            # Deduct amount from voucher (ledger entry; marks it redeemed at zero)
+            new_voucher_balance = record_redemption(
+                voucher, redemption_amount, redemption_req.vendor_id, redemption_req.shop_id,
+                redemption_request_id=redemption_req.id
+            )
             
-            # Update vendor balance
+            # Update vendor balance (in SQL, so concurrent approvals for the same vendor both count)
             if vendor:
-                current_balance = float(vendor.balance) if vendor.balance else 0.0
-                vendor.balance = round(current_balance + redemption_amount, 2)
+                vendor.balance = func.coalesce(User.balance, 0) + redemption_amount
             
             # Update request status
             redemption_req.status = 'approved'
@@ -8500,61 +8679,6 @@ def respond_to_redemption_request(request_id):
         return jsonify({'error': f'Failed to respond to redemption request: {str(e)}'}), 500
 
 
-# Auto-migration on startup
-def check_and_migrate_database():
-    """Check and add missing database columns on startup"""
-    with app.app_context():
-        try:
-            from sqlalchemy import inspect
-            inspector = inspect(db.engine)
-            
-            # Check if redeemed_at_shop_id column exists in voucher table
-            voucher_columns = [col['name'] for col in inspector.get_columns('voucher')]
-            
-            if 'redeemed_at_shop_id' not in voucher_columns:
-                print("⚠ Missing column 'redeemed_at_shop_id' - adding now...")
-                db.session.execute(text(
-                    "ALTER TABLE voucher ADD COLUMN redeemed_at_shop_id INTEGER"
-                ))
-                db.session.commit()
-                print("✓ Successfully added 'redeemed_at_shop_id' column")
-            
-            # Check if redemption_request table exists
-            tables = inspector.get_table_names()
-            if 'redemption_request' not in tables:
-                print("⚠ Missing table 'redemption_request' - creating now...")
-                db.session.execute(text("""
-                    CREATE TABLE redemption_request (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        voucher_id INTEGER NOT NULL,
-                        vendor_id INTEGER NOT NULL,
-                        shop_id INTEGER NOT NULL,
-                        recipient_id INTEGER NOT NULL,
-                        amount FLOAT NOT NULL,
-                        status VARCHAR(20) DEFAULT 'pending',
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        responded_at TIMESTAMP,
-                        expires_at TIMESTAMP,
-                        rejection_reason TEXT,
-                        FOREIGN KEY (voucher_id) REFERENCES voucher (id),
-                        FOREIGN KEY (vendor_id) REFERENCES user (id),
-                        FOREIGN KEY (shop_id) REFERENCES vendor_shop (id),
-                        FOREIGN KEY (recipient_id) REFERENCES user (id)
-                    )
-                """))
-                db.session.commit()
-                print("✓ Successfully created 'redemption_request' table")
-            
-            print("✓ Database schema is up to date")
-                
-        except Exception as e:
-            print(f"⚠ Migration check failed: {str(e)}")
-            # Don't crash the app if migration fails
-            pass
-
-# Run migration automatically when module is imported (for Gunicorn/production)
-check_and_migrate_database()
-
 if __name__ == '__main__':
     socketio.run(app, host="0.0.0.0", port=5000, debug=True, allow_unsafe_werkzeug=True)
 
@@ -0,0 +1,244 @@
+"""
+Prometheus Metrics
+Request, database, outbound-call, queue and Socket.IO metrics served at /api/metrics
+
+Collection is cheap and in-process: a before/after_request pair times every
+request and reads the statement counters db_metrics keeps on flask.g, outbound
+SMS/email/Stripe calls are wrapped in outbound_call(), and Socket.IO handlers
+move a connection gauge. Queue depths are read from the database when
+/api/metrics is scraped.
+
+Under gunicorn each worker is a separate process. When PROMETHEUS_MULTIPROC_DIR
+is set (gunicorn_config.py sets it), every worker writes its samples to files in
+that directory and a scrape of any worker returns the totals across all live
+workers.
+
+Environment:
+    PROMETHEUS_MULTIPROC_DIR    Shared directory for per-worker sample files
+    METRICS_TOKEN               If set, /api/metrics requires 'Authorization: Bearer <token>'
+
+Without prometheus_client installed every call here is a no-op and
+/api/metrics returns 503.
+"""
+
+import hmac
+import logging
+import os
+import time
+
+from flask import Response, g, jsonify, request
+
+logger = logging.getLogger(__name__)
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+    )
+    from prometheus_client.core import GaugeMetricFamily
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+MULTIPROC_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Outbound providers answer in hundreds of milliseconds to tens of seconds
+OUTBOUND_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Global references
+_pool = None
+
+# name -> callable returning {state: depth}, read at scrape time
+_queues = {}
+
+if PROMETHEUS_AVAILABLE:
+    REQUESTS = Counter(
+        'http_requests_total', 'HTTP requests handled',
+        ['method', 'endpoint', 'status']
+    )
+    REQUEST_LATENCY = Histogram(
+        'http_request_duration_seconds', 'Time spent handling HTTP requests',
+        ['method', 'endpoint']
+    )
+    DB_STATEMENTS = Counter(
+        'db_statements_total', 'SQL statements executed while handling requests',
+        ['endpoint']
+    )
+    DB_TIME = Counter(
+        'db_time_seconds_total', 'Time spent in SQL statements while handling requests',
+        ['endpoint']
+    )
+    DB_POOL_CHECKED_OUT = Gauge(
+        'db_pool_checked_out', 'Database connections checked out of the pool',
+        multiprocess_mode='livesum'
+    )
+    OUTBOUND_LATENCY = Histogram(
+        'outbound_request_duration_seconds', 'Latency of calls to external providers',
+        ['service', 'operation'], buckets=OUTBOUND_BUCKETS
+    )
+    OUTBOUND_ERRORS = Counter(
+        'outbound_request_errors_total', 'Failed calls to external providers',
+        ['service', 'operation']
+    )
+    OUTBOUND_IN_PROGRESS = Gauge(
+        'outbound_requests_in_progress', 'Calls to external providers waiting for an answer',
+        ['service'], multiprocess_mode='livesum'
+    )
+    SOCKETIO_CONNECTIONS = Gauge(
+        'socketio_connections', 'Open Socket.IO connections',
+        multiprocess_mode='livesum'
+    )
+
+
+# ============================================
+# Request middleware
+# ============================================
+
+def init_metrics(app, app_db):
+    """Register the request hooks and /api/metrics"""
+    global _pool
+    if PROMETHEUS_AVAILABLE:
+        with app.app_context():
+            _pool = app_db.engine.pool
+        app.before_request(_start_timer)
+        app.after_request(_observe_request)
+    else:
+        logger.warning("prometheus_client not installed - metrics disabled")
+
+    @app.route('/api/metrics', methods=['GET'])
+    def prometheus_metrics():
+        """Metrics for all workers in Prometheus text exposition format"""
+        if not PROMETHEUS_AVAILABLE:
+            return jsonify({'error': 'Metrics not available'}), 503
+        if METRICS_TOKEN:
+            supplied = request.headers.get('Authorization', '')
+            if not hmac.compare_digest(supplied, f'Bearer {METRICS_TOKEN}'):
+                return jsonify({'error': 'Unauthorized'}), 401
+        return Response(render_metrics(), mimetype=CONTENT_TYPE_LATEST)
+
+    logger.info("Metrics initialized (multiprocess: %s)", bool(MULTIPROC_DIR))
+
+
+def _start_timer():
+    g.metrics_start = time.perf_counter()
+
+
+def _observe_request(response):
+    start = g.pop('metrics_start', None)
+    if start is None:
+        return response
+    endpoint = request.endpoint or 'unmatched'
+    method = request.method
+
+    REQUESTS.labels(method, endpoint, response.status_code).inc()
+    REQUEST_LATENCY.labels(method, endpoint).observe(time.perf_counter() - start)
+
+    statements = g.get('db_statements')
+    if statements:
+        DB_STATEMENTS.labels(endpoint).inc(statements)
+        DB_TIME.labels(endpoint).inc(g.db_time_ms / 1000)
+    if hasattr(_pool, 'checkedout'):
+        DB_POOL_CHECKED_OUT.set(_pool.checkedout())
+    return response
+
+
+# ============================================
+# Outbound calls
+# ============================================
+
+class OutboundCall:
+    """Context manager timing one call to an external provider (see outbound_call)"""
+
+    def __init__(self, service, operation):
+        self.service = service
+        self.operation = operation
+        self.ok = True
+
+    def failed(self):
+        self.ok = False
+
+    def __enter__(self):
+        if PROMETHEUS_AVAILABLE:
+            OUTBOUND_IN_PROGRESS.labels(self.service).inc()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if PROMETHEUS_AVAILABLE:
+            OUTBOUND_IN_PROGRESS.labels(self.service).dec()
+            OUTBOUND_LATENCY.labels(self.service, self.operation).observe(time.perf_counter() - self.start)
+            if exc_type is not None or not self.ok:
+                OUTBOUND_ERRORS.labels(self.service, self.operation).inc()
+        return False
+
+
+def outbound_call(service, operation):
+    """
+    Time a call to an external provider
+
+        with outbound_call('sms', 'send') as call:
+            response = client.messages.create(...)
+            if response.status == 'failed':
+                call.failed()
+
+    An exception escaping the block also counts as an error.
+    """
+    return OutboundCall(service, operation)
+
+
+# ============================================
+# Socket.IO
+# ============================================
+
+def socketio_connected():
+    if PROMETHEUS_AVAILABLE:
+        SOCKETIO_CONNECTIONS.inc()
+
+
+def socketio_disconnected():
+    if PROMETHEUS_AVAILABLE:
+        SOCKETIO_CONNECTIONS.dec()
+
+
+# ============================================
+# Queues and exposition
+# ============================================
+
+def register_queue(name, depths):
+    """
+    Report a queue's depth at scrape time
+
+    Args:
+        name: Queue name (the 'queue' label)
+        depths: Callable returning {state: count}, e.g. {'pending': 3, 'failed': 0}
+    """
+    _queues[name] = depths
+
+
+class _QueueCollector:
+    """Reads registered queue depths once per scrape (shared state, so not per worker)"""
+
+    def collect(self):
+        family = GaugeMetricFamily('queue_depth', 'Items waiting in background queues', labels=['queue', 'state'])
+        for name, depths in _queues.items():
+            try:
+                for state, count in depths().items():
+                    family.add_metric([name, state], count)
+            except Exception as e:
+                logger.warning("Could not read depth of queue %s: %s", name, e)
+        yield family
+
+
+def render_metrics():
+    """Current metrics in text exposition format, summed across workers in multiprocess mode"""
+    if MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    output = generate_latest(registry)
+    queues = CollectorRegistry()
+    queues.register(_QueueCollector())
+    return output + generate_latest(queues)
+
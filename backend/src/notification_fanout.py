@@ -0,0 +1,105 @@
+"""
+Notification Fan-out
+Create in-app notifications (user_notifications) for many users at once
+
+The same message for a whole audience - a user type, a list of user IDs or
+everyone - is a single INSERT ... SELECT from the user table, so the rows are
+built by the database and nothing is loaded into Python. Messages that differ
+per user (e.g. each recipient's voucher code) go through notify_each(), a
+chunked executemany.
+
+Neither function commits; the caller commits with the rest of its work.
+"""
+
+import logging
+from datetime import datetime
+
+from sqlalchemy import bindparam, insert, literal, select
+
+logger = logging.getLogger(__name__)
+
+# Rows per executemany batch / IDs per IN list
+CHUNK_SIZE = 1000
+
+# Global references
+db = None
+UserNotification = None
+User = None
+
+
+def init_notification_fanout(app_db, user_notification_model, user_model):
+    """Initialize notification fan-out with database models"""
+    global db, UserNotification, User
+    db = app_db
+    UserNotification = user_notification_model
+    User = user_model
+    logger.info("Notification fan-out initialized")
+
+
+def notify_audience(title, message, notification_type='info', user_types=None, user_ids=None, active_only=True):
+    """
+    Give every user in an audience the same notification
+
+    With neither user_types nor user_ids the audience is every user. Given
+    both, a user must match both.
+
+    Args:
+        title: Notification title
+        message: Notification text
+        notification_type: info, success, warning, error (or a short event name)
+        user_types: A user type ('admin') or list of them
+        user_ids: Iterable of user IDs
+        active_only: Skip deactivated accounts
+
+    Returns:
+        int: Notifications created
+    """
+    if isinstance(user_types, str):
+        user_types = [user_types]
+    conditions = []
+    if user_types is not None:
+        conditions.append(User.user_type.in_(user_types))
+    if active_only:
+        conditions.append(User.is_active.is_(True))
+
+    table = UserNotification.__table__
+    columns = ['user_id', 'title', 'message', 'type', 'is_read', 'created_at']
+    values = [literal(title[:100]), literal(message), literal(notification_type), literal(False), literal(datetime.utcnow())]
+
+    def insert_for(*where):
+        stmt = insert(table).from_select(columns, select(User.id, *values).where(*conditions, *where))
+        return db.session.execute(stmt).rowcount
+
+    if user_ids is None:
+        created = insert_for()
+    else:
+        user_ids = sorted(set(user_ids))
+        created = sum(
+            insert_for(User.id.in_(user_ids[i:i + CHUNK_SIZE]))
+            for i in range(0, len(user_ids), CHUNK_SIZE)
+        )
+
+    logger.info("Notifications fanned out", extra={'notification_type': notification_type, 'notifications': created})
+    return created
+
+
+def notify_each(notifications, notification_type='info'):
+    """
+    Create a different notification for each user
+
+    Args:
+        notifications: Iterable of (user_id, title, message) tuples
+        notification_type: Type for every row
+
+    Returns:
+        int: Notifications created
+    """
+    table = UserNotification.__table__
+    stmt = insert(table).values(
+        user_id=bindparam('user_id'), title=bindparam('title'), message=bindparam('message'),
+        type=notification_type, is_read=False, created_at=datetime.utcnow()
+    )
+    rows = [{'user_id': user_id, 'title': title[:100], 'message': message} for user_id, title, message in notifications]
+    for i in range(0, len(rows), CHUNK_SIZE):
+        db.session.execute(stmt, rows[i:i + CHUNK_SIZE])
+    return len(rows)
@@ -0,0 +1,253 @@
+"""
+Notification Inbox
+Per-user read state and unread counts for group notifications
+
+Item notifications (the notifications table) are written once per target
+group and fanned out on read: a user's inbox is every notification visible to
+their user type, left-joined to their own notification_read markers. Marking
+a notification read inserts a marker for that user only, instead of flipping
+the is_read flag shared by the whole group. The old flag is still honoured as
+"read by everyone" for rows set before markers existed, but is no longer
+written.
+
+The unread badge is notification_inbox.unread_count, kept in step rather than
+counted:
+- a new notification adds one for every user whose type can see it (one
+  UPDATE, from an after_insert hook so every code path that creates one counts)
+- marking one read takes one off; mark-all-read inserts every missing marker
+  in one INSERT ... SELECT and sets the count to zero
+- deleting a notification takes one off for every user who could see it and
+  hadn't read it (a before_delete hook for session deletes; bulk deletes go
+  through delete_notifications, which does the same)
+- a user with no inbox row yet gets one with a counted total the first time
+  they ask
+"""
+
+import logging
+from datetime import datetime
+
+from sqlalchemy import and_, case, delete, event, exists, false, insert, literal, select, update
+
+logger = logging.getLogger(__name__)
+
+# user_type -> (target groups they see, notification types they see or None for all)
+VISIBILITY = {
+    'vcse': (('vcse', 'all'), None),
+    'school': (('school', 'all'), ('discounted_item',)),
+    'recipient': (('recipient', 'all'), ('discounted_item',)),
+    'admin': (('admin', 'all'), None),
+}
+
+# Global references
+db = None
+Notification = None
+NotificationRead = None
+NotificationInbox = None
+User = None
+
+
+def init_notification_inbox(app_db, notification_model, read_model, inbox_model, user_model):
+    """Initialize the notification inbox with database models"""
+    global db, Notification, NotificationRead, NotificationInbox, User
+    db = app_db
+    Notification = notification_model
+    NotificationRead = read_model
+    NotificationInbox = inbox_model
+    User = user_model
+    event.listen(Notification, 'after_insert', _count_new_notification)
+    event.listen(Notification, 'before_delete', _uncount_deleted_notification)
+    logger.info("Notification inbox initialized")
+
+
+def visible_to(user_type):
+    """Filter for the notifications a user type sees"""
+    groups, types = VISIBILITY.get(user_type, ((), None))
+    if not groups:
+        return false()
+    conditions = [Notification.target_group.in_(groups)]
+    if types:
+        conditions.append(Notification.type.in_(types))
+    return and_(*conditions)
+
+
+def _unread_by(user_id):
+    """Filter for notifications the user hasn't read"""
+    return and_(
+        Notification.is_read.isnot(True),
+        ~exists().where(NotificationRead.notification_id == Notification.id, NotificationRead.user_id == user_id)
+    )
+
+
+def _insert_ignore(model, values, key):
+    """INSERT a row unless one with the same key exists; True if it was inserted"""
+    dialect = db.engine.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        stmt = dialect_insert(model.__table__).values(**values).on_conflict_do_nothing(index_elements=key)
+        return db.session.execute(stmt).rowcount == 1
+    if db.session.get(model, tuple(values[k] for k in key)) is not None:
+        return False
+    db.session.add(model(**values))
+    db.session.flush()
+    return True
+
+
+# ============================================
+# Counter maintenance
+# ============================================
+
+def _user_types_seeing(target_group, notification_type):
+    return [
+        user_type for user_type, (groups, types) in VISIBILITY.items()
+        if target_group in groups and (types is None or notification_type in types)
+    ]
+
+
+def _count_new_notification(mapper, connection, target):
+    """after_insert: add one to the unread count of every user who can see the new notification"""
+    if target.is_read:
+        return
+    user_types = _user_types_seeing(target.target_group, target.type)
+    if not user_types:
+        return
+    inbox = NotificationInbox.__table__
+    connection.execute(
+        update(inbox)
+        .where(inbox.c.user_id.in_(select(User.id).where(User.user_type.in_(user_types))))
+        .values(unread_count=inbox.c.unread_count + 1, updated_at=datetime.utcnow())
+    )
+
+
+def _uncount(connection, notification_id, target_group, notification_type, is_read):
+    """Take a notification about to be deleted off the count of every user who sees it unread"""
+    user_types = _user_types_seeing(target_group, notification_type)
+    if is_read or not user_types:
+        return
+    inbox = NotificationInbox.__table__
+    read = NotificationRead.__table__
+    connection.execute(
+        update(inbox)
+        .where(
+            inbox.c.user_id.in_(select(User.id).where(User.user_type.in_(user_types))),
+            ~exists().where(read.c.notification_id == notification_id, read.c.user_id == inbox.c.user_id)
+        )
+        .values(
+            unread_count=case((inbox.c.unread_count > 0, inbox.c.unread_count - 1), else_=0),
+            updated_at=datetime.utcnow()
+        )
+    )
+
+
+def _uncount_deleted_notification(mapper, connection, target):
+    """before_delete: runs while the read markers still exist"""
+    _uncount(connection, target.id, target.target_group, target.type, target.is_read)
+
+
+def delete_notifications(*criteria):
+    """
+    Bulk-delete the notifications matching criteria, with their read markers,
+    keeping unread counts in step. Does not commit.
+
+    Returns:
+        int: Notifications deleted
+    """
+    doomed = db.session.query(
+        Notification.id, Notification.target_group, Notification.type, Notification.is_read
+    ).filter(*criteria).all()
+    if not doomed:
+        return 0
+
+    connection = db.session.connection()
+    for notification_id, target_group, notification_type, is_read in doomed:
+        _uncount(connection, notification_id, target_group, notification_type, is_read)
+    ids = [row[0] for row in doomed]
+    db.session.execute(delete(NotificationRead.__table__).where(NotificationRead.notification_id.in_(ids)))
+    return Notification.query.filter(Notification.id.in_(ids)).delete(synchronize_session=False)
+
+
+def unread_count(user):
+    """
+    The user's unread count, from their inbox row
+
+    Creates the row with a counted total if it doesn't exist yet. Does not
+    commit.
+    """
+    inbox = db.session.get(NotificationInbox, user.id, populate_existing=True)
+    if inbox is not None:
+        return inbox.unread_count
+
+    count = Notification.query.filter(visible_to(user.user_type), _unread_by(user.id)).count()
+    _insert_ignore(NotificationInbox, {'user_id': user.id, 'unread_count': count, 'updated_at': datetime.utcnow()}, ['user_id'])
+    return count
+
+
+# ============================================
+# Inbox
+# ============================================
+
+def list_notifications(user, limit=50):
+    """
+    The user's most recent notifications with their own read state
+
+    Returns:
+        list: Notification.to_dict() dicts, newest first
+    """
+    rows = db.session.query(Notification, NotificationRead.read_at).outerjoin(
+        NotificationRead,
+        and_(NotificationRead.notification_id == Notification.id, NotificationRead.user_id == user.id)
+    ).filter(
+        visible_to(user.user_type)
+    ).order_by(Notification.created_at.desc()).limit(limit).all()
+    return [dict(n.to_dict(), is_read=read_at is not None or bool(n.is_read)) for n, read_at in rows]
+
+
+def mark_read(user, notification_id):
+    """
+    Mark one notification read for this user. Does not commit.
+
+    Returns:
+        bool: True if it was unread, False if already read, None if the user can't see it
+    """
+    notification = Notification.query.filter(Notification.id == notification_id, visible_to(user.user_type)).first()
+    if notification is None:
+        return None
+    if notification.is_read:
+        return False
+
+    marked = _insert_ignore(
+        NotificationRead,
+        {'user_id': user.id, 'notification_id': notification_id, 'read_at': datetime.utcnow()},
+        ['user_id', 'notification_id']
+    )
+    if marked:
+        inbox = NotificationInbox.__table__
+        db.session.execute(
+            update(inbox).where(inbox.c.user_id == user.id).values(
+                unread_count=case((inbox.c.unread_count > 0, inbox.c.unread_count - 1), else_=0),
+                updated_at=datetime.utcnow()
+            )
+        )
+    return marked
+
+
+def mark_all_read(user):
+    """
+    Mark everything in the user's inbox read with one INSERT ... SELECT. Does not commit.
+
+    Returns:
+        int: Notifications marked
+    """
+    now = datetime.utcnow()
+    stmt = insert(NotificationRead.__table__).from_select(
+        ['user_id', 'notification_id', 'read_at'],
+        select(literal(user.id), Notification.id, literal(now)).where(visible_to(user.user_type), _unread_by(user.id))
+    )
+    marked = db.session.execute(stmt).rowcount
+
+    inbox = NotificationInbox.__table__
+    if not _insert_ignore(NotificationInbox, {'user_id': user.id, 'unread_count': 0, 'updated_at': now}, ['user_id']):
+        db.session.execute(update(inbox).where(inbox.c.user_id == user.id).values(unread_count=0, updated_at=now))
+    return marked
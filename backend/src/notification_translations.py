@@ -3,6 +3,8 @@ Notification Translations for BAK UP E-Voucher System
 Supports: English, Arabic, Romanian, Polish
 """
 
+SUPPORTED_LANGUAGES = ['en', 'ar', 'ro', 'pl']
+
 NOTIFICATION_TRANSLATIONS = {
     'new_free_item': {
         'en': 'New free item available for collection: {item_name} at {shop_name}',
@@ -15,6 +17,97 @@ NOTIFICATION_TRANSLATIONS = {
         'ar': 'عنصر مخفض جديد متاح: {item_name} في {shop_name}',
         'ro': 'Articol nou redus disponibil: {item_name} la {shop_name}',
         'pl': 'Nowy przeceniony artykuł dostępny: {item_name} w {shop_name}'
+    },
+    # New item email (templates/email/new_item_notification.html)
+    'email_free_item': {
+        'en': 'Free Item',
+        'ar': 'عنصر مجاني',
+        'ro': 'Articol gratuit',
+        'pl': 'Darmowy artykuł'
+    },
+    'email_discounted_item': {
+        'en': 'Discounted Item',
+        'ar': 'عنصر مخفض',
+        'ro': 'Articol redus',
+        'pl': 'Przeceniony artykuł'
+    },
+    'email_new_item_subject': {
+        'en': '🔔 New {item_type_text}: {item_name}',
+        'ar': '🔔 {item_type_text} جديد: {item_name}',
+        'ro': '🔔 {item_type_text} nou: {item_name}',
+        'pl': '🔔 Nowy {item_type_text}: {item_name}'
+    },
+    'email_new_item_heading': {
+        'en': 'New {item_type_text} Available!',
+        'ar': '{item_type_text} جديد متاح!',
+        'ro': '{item_type_text} nou disponibil!',
+        'pl': 'Nowy {item_type_text} dostępny!'
+    },
+    'email_greeting': {
+        'en': 'Hello {user_name},',
+        'ar': 'مرحباً {user_name}،',
+        'ro': 'Bună ziua {user_name},',
+        'pl': 'Dzień dobry {user_name},'
+    },
+    'email_new_item_intro': {
+        'en': 'A new item has just been posted and is available now!',
+        'ar': 'تم نشر عنصر جديد وهو متاح الآن!',
+        'ro': 'Un articol nou tocmai a fost publicat și este disponibil acum!',
+        'pl': 'Nowy artykuł został właśnie dodany i jest już dostępny!'
+    },
+    'email_shop': {
+        'en': 'Shop',
+        'ar': 'المتجر',
+        'ro': 'Magazin',
+        'pl': 'Sklep'
+    },
+    'email_location': {
+        'en': 'Location',
+        'ar': 'الموقع',
+        'ro': 'Locație',
+        'pl': 'Lokalizacja'
+    },
+    'email_quantity_available': {
+        'en': 'Quantity Available',
+        'ar': 'الكمية المتاحة',
+        'ro': 'Cantitate disponibilă',
+        'pl': 'Dostępna ilość'
+    },
+    'email_type': {
+        'en': 'Type',
+        'ar': 'النوع',
+        'ro': 'Tip',
+        'pl': 'Rodzaj'
+    },
+    'email_description': {
+        'en': 'Description',
+        'ar': 'الوصف',
+        'ro': 'Descriere',
+        'pl': 'Opis'
+    },
+    'email_new_item_cta_text': {
+        'en': "Log in now to view details and place your order before it's gone!",
+        'ar': 'سجّل الدخول الآن لعرض التفاصيل وتقديم طلبك قبل نفاده!',
+        'ro': 'Conectați-vă acum pentru a vedea detaliile și a plasa comanda înainte să dispară!',
+        'pl': 'Zaloguj się teraz, aby zobaczyć szczegóły i złożyć zamówienie, zanim zniknie!'
+    },
+    'email_new_item_button': {
+        'en': 'View Item Now',
+        'ar': 'عرض العنصر الآن',
+        'ro': 'Vezi articolul acum',
+        'pl': 'Zobacz artykuł'
+    },
+    'email_sign_off': {
+        'en': 'Best regards,',
+        'ar': 'مع أطيب التحيات،',
+        'ro': 'Cu stimă,',
+        'pl': 'Z pozdrowieniami,'
+    },
+    'email_notifications_footer': {
+        'en': "You're receiving this email because you have notifications enabled in your account settings.",
+        'ar': 'تتلقى هذه الرسالة لأن الإشعارات مفعّلة في إعدادات حسابك.',
+        'ro': 'Primiți acest e-mail deoarece aveți notificările activate în setările contului.',
+        'pl': 'Otrzymujesz tę wiadomość, ponieważ masz włączone powiadomienia w ustawieniach konta.'
     }
 }
 
@@ -31,7 +124,7 @@ def get_notification_message(message_key, language='en', **kwargs):
         Translated and formatted message string
     """
     # Default to English if language not supported
-    if language not in ['en', 'ar', 'ro', 'pl']:
+    if language not in SUPPORTED_LANGUAGES:
         language = 'en'
     
     # Get translation
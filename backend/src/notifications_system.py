@@ -3,10 +3,17 @@ Notifications System for BAK UP E-Voucher Platform
 Handles real-time notifications for new items posted by shops
 """
 
+import logging
+
 from flask import Blueprint, jsonify, request, session
+from auth import get_principal
+from notification_inbox import list_notifications, mark_all_read, mark_read, unread_count
+from metrics import socketio_connected, socketio_disconnected
 from flask_socketio import emit, join_room, leave_room
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
 # Blueprint for notifications API
 notifications_bp = Blueprint('notifications', __name__)
 
@@ -65,71 +72,71 @@ def create_notification(notification_type, shop_id, item_id, target_group, messa
 
 @notifications_bp.route('/api/notifications', methods=['GET'])
 def get_user_notifications():
-    """Get all notifications for the current user based on their user type"""
+    """Get the current user's notifications, with their own read state"""
     try:
         user_id = session.get('user_id')
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        user = _User.query.get(user_id)
+        user = get_principal()
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        # Determine target group based on user type
-        if user.user_type == 'vcse':
-            # VCFSEs see both discounted and free items
-            notifications = _Notification.query.filter(
-                (_Notification.target_group == 'vcse') | 
-                (_Notification.target_group == 'all')
-            ).order_by(_Notification.created_at.desc()).limit(50).all()
-        elif user.user_type == 'school':
-            # Schools see only discounted items
-            notifications = _Notification.query.filter(
-                (_Notification.target_group == 'school') | 
-                (_Notification.target_group == 'all'),
-                _Notification.type == 'discounted_item'
-            ).order_by(_Notification.created_at.desc()).limit(50).all()
-        elif user.user_type == 'recipient':
-            # Recipients see only discounted items
-            notifications = _Notification.query.filter(
-                (_Notification.target_group == 'recipient') | 
-                (_Notification.target_group == 'all'),
-                _Notification.type == 'discounted_item'
-            ).order_by(_Notification.created_at.desc()).limit(50).all()
-        elif user.user_type == 'admin':
-            # Admins see ALL notifications
-            notifications = _Notification.query.filter(
-                (_Notification.target_group == 'admin') | 
-                (_Notification.target_group == 'all')
-            ).order_by(_Notification.created_at.desc()).limit(50).all()
-        else:
-            notifications = []
+        notifications = list_notifications(user, limit=50)
+        count = unread_count(user)
+        _db.session.commit()
         
         return jsonify({
-            'notifications': [n.to_dict() for n in notifications],
-            'unread_count': len([n for n in notifications if not n.is_read])
+            'notifications': notifications,
+            'unread_count': count
         }), 200
         
     except Exception as e:
+        _db.session.rollback()
         return jsonify({'error': f'Failed to get notifications: {str(e)}'}), 500
 
 
+@notifications_bp.route('/api/notifications/unread-count', methods=['GET'])
+def get_unread_count():
+    """Get the current user's unread count (for the badge)"""
+    try:
+        user_id = session.get('user_id')
+        if not user_id:
+            return jsonify({'error': 'Unauthorized'}), 401
+        
+        user = get_principal()
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        count = unread_count(user)
+        _db.session.commit()
+        
+        return jsonify({'unread_count': count}), 200
+        
+    except Exception as e:
+        _db.session.rollback()
+        return jsonify({'error': f'Failed to get unread count: {str(e)}'}), 500
+
+
 @notifications_bp.route('/api/notifications/<int:notification_id>/read', methods=['POST'])
 def mark_notification_read(notification_id):
-    """Mark a notification as read"""
+    """Mark a notification as read for the current user"""
     try:
         user_id = session.get('user_id')
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        notification = _Notification.query.get(notification_id)
-        if not notification:
+        user = get_principal()
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        if mark_read(user, notification_id) is None:
             return jsonify({'error': 'Notification not found'}), 404
         
-        notification.is_read = True
+        count = unread_count(user)
         _db.session.commit()
         
-        return jsonify({'message': 'Notification marked as read'}), 200
+        return jsonify({'message': 'Notification marked as read', 'unread_count': count}), 200
         
     except Exception as e:
         _db.session.rollback()
@@ -144,46 +151,14 @@ def mark_all_notifications_read():
         if not user_id:
             return jsonify({'error': 'Unauthorized'}), 401
         
-        user = _User.query.get(user_id)
+        user = get_principal()
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        # Determine target group based on user type
-        if user.user_type == 'vcse':
-            notifications = _Notification.query.filter(
-                (_Notification.target_group == 'vcse') | 
-                (_Notification.target_group == 'all'),
-                _Notification.is_read == False
-            ).all()
-        elif user.user_type == 'school':
-            notifications = _Notification.query.filter(
-                (_Notification.target_group == 'school') | 
-                (_Notification.target_group == 'all'),
-                _Notification.type == 'discounted_item',
-                _Notification.is_read == False
-            ).all()
-        elif user.user_type == 'recipient':
-            notifications = _Notification.query.filter(
-                (_Notification.target_group == 'recipient') | 
-                (_Notification.target_group == 'all'),
-                _Notification.type == 'discounted_item',
-                _Notification.is_read == False
-            ).all()
-        elif user.user_type == 'admin':
-            notifications = _Notification.query.filter(
-                (_Notification.target_group == 'admin') | 
-                (_Notification.target_group == 'all'),
-                _Notification.is_read == False
-            ).all()
-        else:
-            notifications = []
-        
-        for notification in notifications:
-            notification.is_read = True
-        
+        marked = mark_all_read(user)
         _db.session.commit()
         
-        return jsonify({'message': f'Marked {len(notifications)} notifications as read'}), 200
+        return jsonify({'message': f'Marked {marked} notifications as read', 'unread_count': 0}), 200
         
     except Exception as e:
         _db.session.rollback()
@@ -256,9 +231,10 @@ def init_socketio(socketio_instance):
     @socketio_instance.on('connect')
     def handle_connect():
         """Handle client connection"""
+        socketio_connected()
         user_id = session.get('user_id')
         if user_id:
-            user = _User.query.get(user_id)
+            user = get_principal()
             if user:
                 # Join room based on user type
                 room = f"{user.user_type}_room"
@@ -268,9 +244,10 @@ def init_socketio(socketio_instance):
     @socketio_instance.on('disconnect')
     def handle_disconnect():
         """Handle client disconnection"""
+        socketio_disconnected()
         user_id = session.get('user_id')
         if user_id:
-            user = _User.query.get(user_id)
+            user = get_principal()
             if user:
                 room = f"{user.user_type}_room"
                 leave_room(room)
@@ -278,6 +255,43 @@ def init_socketio(socketio_instance):
     return socketio_instance
 
 
+USER_NAME_PLACEHOLDER = '-user_name-'
+
+
+def email_item_notification_to_group(email_service, target_group, item_type, item_name, shop_name, quantity, item_description='', shop_address=''):
+    """
+    Email a new item notification to every user in a group who has email enabled
+
+    Preferences are resolved in one query and the body is rendered once, with
+    each user's name filled in per recipient by send_many().
+
+    Returns:
+        dict: Result of email_service.send_many()
+    """
+    users = _db.session.query(_User.email, _User.first_name).outerjoin(
+        _NotificationPreference, _NotificationPreference.user_id == _User.id
+    ).filter(
+        _User.user_type == target_group,
+        _db.or_(_NotificationPreference.id.is_(None), _NotificationPreference.email_enabled.is_(True))
+    ).all()
+
+    template = email_service.build_new_item_notification(
+        user_email=None,
+        user_name=USER_NAME_PLACEHOLDER,
+        item_name=item_name,
+        item_type=item_type,
+        quantity=quantity,
+        shop_name=shop_name,
+        shop_address=shop_address,
+        item_description=item_description
+    )
+    messages = [
+        dict(template, to=email, substitutions={USER_NAME_PLACEHOLDER: first_name or email.split('@')[0]})
+        for email, first_name in users
+    ]
+    return email_service.send_many(messages)
+
+
 def broadcast_new_item_notification(socketio_instance, item_type, shop_id, item_id, item_name, shop_name, quantity, item_description='', shop_address=''):
     """
     Broadcast a new item notification to appropriate user groups via WebSocket and Email
@@ -293,12 +307,8 @@ def broadcast_new_item_notification(socketio_instance, item_type, shop_id, item_
         item_description: Description of the item (optional)
         shop_address: Address of the shop (optional)
     """
-    print(f"\n🔔 === NOTIFICATION BROADCAST STARTED ===")
-    print(f"Item: {item_name} | Type: {item_type} | Shop: {shop_name}")
-    
     try:
         from email_service import email_service
-        print(f"✅ Email service imported successfully")
         
         if item_type == 'discount':
             # Discounted items go to recipients, schools, VCFSEs, and admins
@@ -346,41 +356,25 @@ def broadcast_new_item_notification(socketio_instance, item_type, shop_id, item_
                                 pass
                             
                             # Send emails
-                            users = _User.query.filter_by(user_type=recipient_group).all()
-                            for user in users:
-                                pref = _NotificationPreference.query.filter_by(user_id=user.id).first()
-                                if not pref or pref.email_enabled:
-                                    try:
-                                        user_name = user.first_name or user.email.split('@')[0]
-                                        email_service.send_new_item_notification(
-                                            user_email=user.email,
-                                            user_name=user_name,
-                                            item_name=item_name,
-                                            item_type='free',
-                                            quantity=quantity,
-                                            shop_name=shop_name,
-                                            shop_address=shop_address,
-                                            item_description=item_description
-                                        )
-                                    except:
-                                        pass
+                            try:
+                                email_item_notification_to_group(
+                                    email_service, recipient_group, 'free', item_name, shop_name,
+                                    quantity, item_description, shop_address
+                                )
+                            except:
+                                pass
             
             # Start delayed notification thread
             delayed_thread = threading.Thread(target=send_delayed_recipient_notification)
             delayed_thread.daemon = True
             delayed_thread.start()
         
-        print(f"📢 Target groups: {', '.join(target_groups)}")
-        print(f"📝 Message: {message}")
-        
         # Create notification in database and send to users
         total_notifications_created = 0
         total_emails_sent = 0
         total_websocket_broadcasts = 0
         
         for target_group in target_groups:
-            print(f"\n👥 Processing target group: {target_group}")
-            
             notification = create_notification(
                 notification_type=notification_type,
                 shop_id=shop_id,
@@ -394,59 +388,41 @@ def broadcast_new_item_notification(socketio_instance, item_type, shop_id, item_
             
             if notification:
                 total_notifications_created += 1
-                print(f"✅ Database notification created (ID: {notification.id})")
                 
                 # Broadcast via WebSocket to the appropriate room
                 room = f"{target_group}_room"
                 try:
                     socketio_instance.emit('new_item_notification', notification.to_dict(), room=room)
                     total_websocket_broadcasts += 1
-                    print(f"📡 WebSocket broadcast sent to room: {room}")
-                except Exception as ws_error:
-                    print(f"❌ WebSocket broadcast failed for {room}: {str(ws_error)}")
+                except Exception:
+                    logger.warning("WebSocket broadcast failed", exc_info=True, extra={'room': room})
                 
-                # Send email notifications to users in this group
-                # Get all users of this type who have email notifications enabled
-                users = _User.query.filter_by(user_type=target_group).all()
-                print(f"📊 Found {len(users)} users in group '{target_group}'")
-                
-                for user in users:
-                    # Check if user has email notifications enabled (default: True)
-                    pref = _NotificationPreference.query.filter_by(user_id=user.id).first()
-                    if not pref or pref.email_enabled:
-                        try:
-                            user_name = user.first_name or user.email.split('@')[0]
-                            print(f"  📧 Sending email to: {user.email} ({user_name})")
-                            email_service.send_new_item_notification(
-                                user_email=user.email,
-                                user_name=user_name,
-                                item_name=item_name,
-                                item_type=item_type,
-                                quantity=quantity,
-                                shop_name=shop_name,
-                                shop_address=shop_address,
-                                item_description=item_description
-                            )
-                            total_emails_sent += 1
-                            print(f"  ✅ Email sent successfully to {user.email}")
-                        except Exception as email_error:
-                            print(f"  ❌ Failed to send email to {user.email}: {str(email_error)}")
-                    else:
-                        print(f"  ⏭️ Skipping {user.email} (email notifications disabled)")
+                # Send email notifications to users in this group who have them enabled
+                try:
+                    email_result = email_item_notification_to_group(
+                        email_service, target_group, item_type, item_name, shop_name,
+                        quantity, item_description, shop_address
+                    )
+                    total_emails_sent += email_result['sent']
+                    logger.debug("Item notification emails for %s: %d sent, %d failed",
+                                 target_group, email_result['sent'], email_result['failed'])
+                except Exception:
+                    logger.warning("Failed to email item notification", exc_info=True, extra={'target_group': target_group})
             else:
-                print(f"❌ Failed to create notification for group: {target_group}")
-        
-        print(f"\n🎯 === NOTIFICATION BROADCAST SUMMARY ===")
-        print(f"📦 Database notifications created: {total_notifications_created}")
-        print(f"📡 WebSocket broadcasts sent: {total_websocket_broadcasts}")
-        print(f"📧 Emails sent: {total_emails_sent}")
-        print(f"✅ Broadcast completed successfully\n")
-        
+                logger.warning("Failed to create item notification", extra={'target_group': target_group})
+        
+        logger.info("Item notification broadcast", extra={
+            'item_id': item_id,
+            'item_type': item_type,
+            'shop_id': shop_id,
+            'target_groups': target_groups,
+            'notifications': total_notifications_created,
+            'websocket_broadcasts': total_websocket_broadcasts,
+            'emails_sent': total_emails_sent
+        })
         return True
-    except Exception as e:
-        print(f"\n❌❌❌ ERROR broadcasting notification: {str(e)}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        logger.exception("Error broadcasting item notification", extra={'item_id': item_id})
         return False
 
 
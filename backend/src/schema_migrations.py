@@ -0,0 +1,69 @@
+"""
+Schema Version Tracking
+Records which database migrations have been applied
+
+Migrations run out of process (migrations/migrate.py), once per deploy, rather
+than being checked by every web worker and cron script at import time. Each
+applied version is recorded in the schema_version table so later runs only
+apply what is new.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, MetaData, String, Table, select
+
+metadata = MetaData()
+
+schema_version = Table(
+    'schema_version', metadata,
+    Column('version', String(20), primary_key=True),
+    Column('description', String(255), nullable=False, default=''),
+    Column('applied_at', DateTime, nullable=False, default=datetime.utcnow),
+)
+
+
+def version_key(version):
+    """Sort key for dotted version strings ('1.0.10' after '1.0.9')"""
+    return tuple(int(part) for part in version.split('.'))
+
+
+def ensure_version_table(engine):
+    """Create schema_version if it doesn't exist"""
+    metadata.create_all(engine, checkfirst=True)
+
+
+def applied_versions(engine):
+    """
+    Versions recorded as applied
+
+    Returns:
+        dict: version -> applied_at
+    """
+    with engine.connect() as conn:
+        return dict(conn.execute(select(schema_version.c.version, schema_version.c.applied_at)).all())
+
+
+def record_version(engine, version, description=''):
+    """Mark a version as applied (no-op if it already is)"""
+    with engine.begin() as conn:
+        exists = conn.execute(
+            select(schema_version.c.version).where(schema_version.c.version == version)
+        ).first()
+        if not exists:
+            conn.execute(schema_version.insert().values(
+                version=version, description=description[:255], applied_at=datetime.utcnow()
+            ))
+
+
+def pending_migrations(engine, migrations):
+    """
+    Migrations not yet applied, in version order
+
+    Args:
+        migrations: Iterable of (version, ...) tuples
+
+    Returns:
+        list: The entries of `migrations` whose version isn't recorded
+    """
+    applied = applied_versions(engine)
+    return sorted((m for m in migrations if m[0] not in applied), key=lambda m: version_key(m[0]))
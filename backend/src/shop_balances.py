@@ -0,0 +1,336 @@
+"""
+Shop Balances
+Running redemption and payout totals per shop
+
+Each shop has one shop_balance row that moves in the same transaction as the
+change it records:
+
+    redeemed_total      +amount for every redemption at the shop (record_redemption)
+    redemption_count    +1 per redemption
+    period_redeemed     redemptions in `period` (calendar month, UTC); the first
+                        redemption of a new month starts it again from zero
+    reserved_total      payout requests that are pending or approved
+    paid_out_total      payout requests that have been paid
+
+so "available to pay out" (redeemed - paid out - reserved) and "redeemed this
+period" are a single-row read instead of a sum over every redemption.
+
+Every change is one atomic UPDATE (column = column + :amount), never a
+read-modify-write, so concurrent redemptions and payout requests at the same
+shop can't overwrite each other. Reserving a payout is a conditional UPDATE
+that only matches while enough is available, so two requests can't both claim
+the same money.
+
+reconcile_shop_balances() recomputes every row from voucher_ledger redeem
+entries and payout_request, a chunk of shops at a time; it is run nightly by
+scripts/reconcile_shop_balances.py and backfills the table when it is added.
+"""
+
+import logging
+import math
+from datetime import datetime
+
+from sqlalchemy import bindparam, case, text, update
+
+logger = logging.getLogger(__name__)
+
+# Amounts closer than this are treated as equal (totals are stored as floats)
+TOLERANCE = 0.005
+
+# Global references
+db = None
+ShopBalance = None
+
+
+def init_shop_balances(app_db, shop_balance_model):
+    """Initialize shop balances with database models"""
+    global db, ShopBalance
+    db = app_db
+    ShopBalance = shop_balance_model
+    logger.info("Shop balances initialized")
+
+
+def current_period(now=None):
+    """Key of the period "redeemed this period" covers, e.g. '2024-05'"""
+    return (now or datetime.utcnow()).strftime('%Y-%m')
+
+
+def _period_start(period):
+    return datetime.strptime(period, '%Y-%m')
+
+
+# ============================================
+# Updates (same transaction as the caller; none of these commit)
+# ============================================
+
+def _ensure_row(shop_id, vendor_id):
+    """Create the shop's zeroed row if it doesn't exist yet"""
+    values = {'shop_id': shop_id, 'vendor_id': vendor_id, 'updated_at': datetime.utcnow()}
+    dialect = db.engine.dialect.name
+
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        db.session.execute(
+            insert(ShopBalance.__table__).values(**values).on_conflict_do_nothing(index_elements=['shop_id'])
+        )
+    elif db.session.get(ShopBalance, shop_id) is None:
+        db.session.add(ShopBalance(**values))
+        db.session.flush()
+
+
+def _update(shop_id, *conditions, **changes):
+    """Apply an UPDATE to one shop's row; True if it matched"""
+    table = ShopBalance.__table__
+    stmt = update(table).where(table.c.shop_id == shop_id, *conditions).values(
+        updated_at=datetime.utcnow(), **changes
+    )
+    return db.session.execute(stmt).rowcount == 1
+
+
+def add_redemption(shop_id, vendor_id, amount, now=None):
+    """
+    Add a redemption to the shop's totals
+
+    Called by voucher_ledger.record_redemption, so it moves with the ledger
+    entry and the voucher balance.
+    """
+    table = ShopBalance.__table__
+    amount = round(float(amount), 2)
+    period = current_period(now)
+    _ensure_row(shop_id, vendor_id)
+    _update(
+        shop_id,
+        redeemed_total=table.c.redeemed_total + amount,
+        redemption_count=table.c.redemption_count + 1,
+        period_redeemed=case((table.c.period == period, table.c.period_redeemed + amount), else_=amount),
+        period=period,
+    )
+
+
+def reserve_payout(shop_id, vendor_id, amount):
+    """
+    Hold back a requested payout from the shop's available balance
+
+    Raises:
+        ValueError: If the amount isn't positive or exceeds what is available
+    """
+    table = ShopBalance.__table__
+    amount = round(float(amount), 2)
+    if not math.isfinite(amount) or amount <= 0:
+        raise ValueError('Payout amount must be greater than 0')
+
+    _ensure_row(shop_id, vendor_id)
+    available = table.c.redeemed_total - table.c.paid_out_total - table.c.reserved_total
+    if not _update(shop_id, available >= amount - TOLERANCE, reserved_total=table.c.reserved_total + amount):
+        balance = shop_balance(shop_id)
+        raise ValueError(
+            f'Payout amount £{amount:.2f} exceeds the £{balance["available_to_pay_out"]:.2f} available for this shop'
+        )
+
+
+def release_payout(payout):
+    """Return a rejected payout's reservation to the available balance"""
+    table = ShopBalance.__table__
+    _update(payout.shop_id, reserved_total=table.c.reserved_total - round(float(payout.amount), 2))
+
+
+def settle_payout(payout):
+    """Move a paid payout from reserved to paid out"""
+    table = ShopBalance.__table__
+    amount = round(float(payout.amount), 2)
+    _update(
+        payout.shop_id,
+        reserved_total=table.c.reserved_total - amount,
+        paid_out_total=table.c.paid_out_total + amount,
+    )
+
+
+# ============================================
+# Reads
+# ============================================
+
+def _as_dict(row, shop_id=None, now=None):
+    if row is None:
+        return {
+            'shop_id': shop_id, 'redeemed_total': 0.0, 'redemption_count': 0, 'paid_out_total': 0.0,
+            'pending_payouts': 0.0, 'available_to_pay_out': 0.0, 'period': current_period(now),
+            'redeemed_this_period': 0.0,
+        }
+    period = current_period(now)
+    available = row.redeemed_total - row.paid_out_total - row.reserved_total
+    return {
+        'shop_id': row.shop_id,
+        'redeemed_total': round(row.redeemed_total, 2),
+        'redemption_count': row.redemption_count,
+        'paid_out_total': round(row.paid_out_total, 2),
+        'pending_payouts': round(row.reserved_total, 2),
+        'available_to_pay_out': max(round(available, 2), 0.0),
+        'period': period,
+        'redeemed_this_period': round(row.period_redeemed, 2) if row.period == period else 0.0,
+    }
+
+
+def shop_balance(shop_id, now=None):
+    """Current totals for one shop (zeros if it has never redeemed anything)"""
+    return _as_dict(db.session.get(ShopBalance, shop_id, populate_existing=True), shop_id, now)
+
+
+def vendor_balances(vendor_id, now=None):
+    """
+    Current totals for each of a vendor's shops
+
+    Returns:
+        dict: shop_id -> totals as returned by shop_balance()
+    """
+    rows = ShopBalance.query.filter_by(vendor_id=vendor_id).populate_existing().all()
+    return {row.shop_id: _as_dict(row, now=now) for row in rows}
+
+
+def sum_balances(balances):
+    """Add up shop_balance() dicts (e.g. the values of vendor_balances())"""
+    keys = ('redeemed_total', 'redemption_count', 'paid_out_total', 'pending_payouts',
+            'available_to_pay_out', 'redeemed_this_period')
+    totals = {key: 0 for key in keys}
+    for balance in balances:
+        for key in keys:
+            totals[key] += balance[key]
+    return {key: round(value, 2) for key, value in totals.items()}
+
+
+# ============================================
+# Nightly reconciliation
+# ============================================
+
+COLUMNS = ('redeemed_total', 'redemption_count', 'period_redeemed', 'reserved_total', 'paid_out_total')
+
+
+def _expected_totals(conn, shop_ids, period):
+    """Recompute each shop's totals from voucher_ledger and payout_request"""
+    params = {'shop_ids': shop_ids, 'period_start': _period_start(period)}
+    expected = {
+        row.id: {'vendor_id': row.vendor_id, 'redeemed_total': 0.0, 'redemption_count': 0,
+                 'period_redeemed': 0.0, 'reserved_total': 0.0, 'paid_out_total': 0.0}
+        for row in conn.execute(
+            text("SELECT id, vendor_id FROM vendor_shop WHERE id IN :shop_ids")
+            .bindparams(bindparam('shop_ids', expanding=True)), params
+        )
+    }
+
+    for row in conn.execute(text("""
+        SELECT shop_id, -SUM(amount) AS redeemed, COUNT(*) AS redemptions,
+               -SUM(CASE WHEN created_at >= :period_start THEN amount ELSE 0 END) AS period_redeemed
+        FROM voucher_ledger
+        WHERE entry_type = 'redeem' AND shop_id IN :shop_ids
+        GROUP BY shop_id
+    """).bindparams(bindparam('shop_ids', expanding=True)), params):
+        expected[row.shop_id].update(
+            redeemed_total=float(row.redeemed), redemption_count=row.redemptions,
+            period_redeemed=float(row.period_redeemed)
+        )
+
+    for row in conn.execute(text("""
+        SELECT shop_id,
+               SUM(CASE WHEN status IN ('pending', 'approved') THEN amount ELSE 0 END) AS reserved,
+               SUM(CASE WHEN status = 'paid' THEN amount ELSE 0 END) AS paid
+        FROM payout_request
+        WHERE shop_id IN :shop_ids
+        GROUP BY shop_id
+    """).bindparams(bindparam('shop_ids', expanding=True)), params):
+        expected[row.shop_id].update(reserved_total=float(row.reserved), paid_out_total=float(row.paid))
+
+    return expected
+
+
+def reconcile_shop_balances(engine, chunk_size=200, fix=False, now=None):
+    """
+    Compare every shop's running totals with the raw data they summarise
+
+    Shops are checked chunk_size at a time, each chunk in its own short
+    transaction. On PostgreSQL the chunk's shop_balance rows are locked first,
+    so a redemption or payout committing mid-check waits rather than showing
+    up as drift.
+
+    Args:
+        engine: SQLAlchemy Engine
+        chunk_size: Shops checked per transaction
+        fix: Overwrite drifted rows (and create missing ones) with the recomputed totals
+        now: Reference time for the current period (defaults to utcnow)
+
+    Returns:
+        dict: {'shops': checked, 'mismatches': [{'shop_id', 'column', 'stored', 'expected'}], 'fixed': rows written}
+    """
+    period = current_period(now)
+    result = {'shops': 0, 'mismatches': [], 'fixed': 0}
+    last_id = 0
+
+    while True:
+        with engine.begin() as conn:
+            shop_ids = conn.execute(
+                text("SELECT id FROM vendor_shop WHERE id > :last_id ORDER BY id LIMIT :limit"),
+                {'last_id': last_id, 'limit': chunk_size}
+            ).scalars().all()
+            if not shop_ids:
+                break
+            last_id = shop_ids[-1]
+
+            lock = ' FOR UPDATE' if conn.dialect.name == 'postgresql' else ''
+            stored = {
+                row.shop_id: row for row in conn.execute(text(
+                    "SELECT shop_id, redeemed_total, redemption_count, period, period_redeemed, "
+                    f"reserved_total, paid_out_total FROM shop_balance WHERE shop_id IN :shop_ids{lock}"
+                ).bindparams(bindparam('shop_ids', expanding=True)), {'shop_ids': shop_ids})
+            }
+            expected = _expected_totals(conn, shop_ids, period)
+
+            for shop_id, totals in expected.items():
+                row = stored.get(shop_id)
+                drifted = []
+                for column in COLUMNS:
+                    if row is None:
+                        value = 0
+                    elif column == 'period_redeemed' and row.period != period:
+                        value = 0
+                    else:
+                        value = getattr(row, column)
+                    if abs(float(value) - totals[column]) >= TOLERANCE:
+                        drifted.append({'shop_id': shop_id, 'column': column,
+                                        'stored': round(float(value), 2), 'expected': round(totals[column], 2)})
+
+                if row is not None and not drifted:
+                    continue
+                for mismatch in drifted:
+                    logger.warning(
+                        "shop_balance drift for shop %s: %s %s != %s",
+                        shop_id, mismatch['column'], mismatch['stored'], mismatch['expected']
+                    )
+                result['mismatches'].extend(drifted)
+
+                if fix:
+                    values = dict(
+                        {column: totals[column] for column in COLUMNS},
+                        vendor_id=totals['vendor_id'], period=period, updated_at=datetime.utcnow()
+                    )
+                    if row is None:
+                        conn.execute(text("""
+                            INSERT INTO shop_balance (shop_id, vendor_id, redeemed_total, redemption_count,
+                                                      period, period_redeemed, reserved_total, paid_out_total, updated_at)
+                            VALUES (:shop_id, :vendor_id, :redeemed_total, :redemption_count,
+                                    :period, :period_redeemed, :reserved_total, :paid_out_total, :updated_at)
+                        """), dict(values, shop_id=shop_id))
+                    else:
+                        conn.execute(text("""
+                            UPDATE shop_balance
+                            SET vendor_id = :vendor_id, redeemed_total = :redeemed_total,
+                                redemption_count = :redemption_count, period = :period,
+                                period_redeemed = :period_redeemed, reserved_total = :reserved_total,
+                                paid_out_total = :paid_out_total, updated_at = :updated_at
+                            WHERE shop_id = :shop_id
+                        """), dict(values, shop_id=shop_id))
+                    result['fixed'] += 1
+
+            result['shops'] += len(shop_ids)
+
+    return result
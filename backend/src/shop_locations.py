@@ -0,0 +1,238 @@
+"""
+Shop Locations
+Nearest-shop lookup by postcode, from an offline outcode table and an in-memory grid
+
+Postcodes are placed by their outcode (the part before the space, "NN9" in
+"NN9 6GR") using data/outcodes.csv, a bundled outcode,latitude,longitude table
+of outcode centroids for the service area: Northamptonshire and the
+neighbouring towns recipients cross into. Nothing is looked up over the
+network. To cover more of the country, replace the file with a complete
+outcode list in the same three columns and rerun the 1.0.13 migration to
+backfill existing shops.
+
+Each vendor_shop stores the latitude/longitude of its outcode, set whenever a
+shop is added or its postcode changes (before_flush, so every route that
+saves a shop is covered).
+
+/api/shops/nearby answers from a per-worker grid of active shops bucketed into
+CELL_DEGREES cells: a query only measures the shops in the cells its radius
+overlaps. The grid is rebuilt on the next lookup after this worker commits a
+shop change, and at least every SHOP_INDEX_TTL seconds so changes made by
+other gunicorn workers show up.
+"""
+
+import csv
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+
+from sqlalchemy import event, inspect as sa_inspect, text
+
+logger = logging.getLogger(__name__)
+
+OUTCODES_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'outcodes.csv')
+SHOP_INDEX_TTL = float(os.environ.get('SHOP_INDEX_TTL', '300'))
+CELL_DEGREES = 0.1  # about 11 km north-south, 7 km east-west at these latitudes
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+_POSTCODE = re.compile(r'^([A-Z]{1,2}[0-9][A-Z0-9]?)([0-9][A-Z]{2})?$')
+
+# Global references
+db = None
+VendorShop = None
+
+_outcodes = None
+_index = None
+_index_lock = threading.Lock()
+
+
+def init_shop_locations(app_db, vendor_shop_model):
+    """Initialize shop locations with database models"""
+    global db, VendorShop
+    db = app_db
+    VendorShop = vendor_shop_model
+    event.listen(db.session, 'before_flush', _locate_shops)
+    event.listen(db.session, 'after_commit', _invalidate_committed)
+    event.listen(db.session, 'after_soft_rollback', _forget_pending)
+    logger.info("Shop locations initialized")
+
+
+# ============================================
+# Postcodes
+# ============================================
+
+def load_outcodes(path=OUTCODES_CSV):
+    """Read an outcode,latitude,longitude CSV into {outcode: (lat, lon)}"""
+    with open(path, newline='') as f:
+        return {
+            row['outcode'].strip().upper(): (float(row['latitude']), float(row['longitude']))
+            for row in csv.DictReader(f)
+        }
+
+
+def _outcode_table():
+    global _outcodes
+    if _outcodes is None:
+        _outcodes = load_outcodes()
+        logger.info("Loaded outcode table", extra={'outcodes': len(_outcodes)})
+    return _outcodes
+
+
+def outcode(postcode):
+    """The outcode of a full or partial UK postcode ("nn9 6gr" -> "NN9"), or None if it isn't one"""
+    if not postcode:
+        return None
+    compact = re.sub(r'\s+', '', str(postcode)).upper()
+    match = _POSTCODE.match(compact)
+    return match.group(1) if match else None
+
+
+def postcode_location(postcode):
+    """(latitude, longitude) of a postcode's outcode, or None if it isn't in the table"""
+    code = outcode(postcode)
+    return _outcode_table().get(code) if code else None
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Great-circle (haversine) distance in kilometres"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+# ============================================
+# Keeping shop coordinates current
+# ============================================
+
+def _locate_shops(session, flush_context, instances):
+    """before_flush: place new shops and shops whose postcode changed"""
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, VendorShop):
+            continue
+        session.info['shops_changed'] = True
+        state = sa_inspect(obj)
+        if obj in session.new or state.attrs.postcode.history.has_changes():
+            location = postcode_location(obj.postcode)
+            obj.latitude, obj.longitude = location if location else (None, None)
+    if any(isinstance(obj, VendorShop) for obj in session.deleted):
+        session.info['shops_changed'] = True
+
+
+def _invalidate_committed(session):
+    if session.info.pop('shops_changed', False):
+        invalidate_shop_index()
+
+
+def _forget_pending(session, previous_transaction):
+    session.info.pop('shops_changed', None)
+
+
+def backfill_shop_coordinates(connection, path=OUTCODES_CSV):
+    """
+    Set latitude/longitude on every vendor_shop from its postcode
+
+    Shops whose outcode isn't in the table are cleared. Runs on a Core
+    connection so migrations can use it without the app.
+
+    Returns:
+        tuple: (shops placed, shops with no known outcode)
+    """
+    outcodes = load_outcodes(path)
+    placed, unknown = [], []
+    for shop_id, postcode in connection.execute(text("SELECT id, postcode FROM vendor_shop")):
+        location = outcodes.get(outcode(postcode))
+        if location:
+            placed.append({'id': shop_id, 'lat': location[0], 'lon': location[1]})
+        else:
+            unknown.append({'id': shop_id})
+    if placed:
+        connection.execute(text("UPDATE vendor_shop SET latitude = :lat, longitude = :lon WHERE id = :id"), placed)
+    if unknown:
+        connection.execute(text("UPDATE vendor_shop SET latitude = NULL, longitude = NULL WHERE id = :id"), unknown)
+    return len(placed), len(unknown)
+
+
+# ============================================
+# Grid index
+# ============================================
+
+def _cell(lat, lon):
+    return (math.floor(lat / CELL_DEGREES), math.floor(lon / CELL_DEGREES))
+
+
+class ShopIndex:
+    """Active shops' coordinates bucketed into CELL_DEGREES grid cells"""
+
+    def __init__(self, shops):
+        self.cells = defaultdict(list)
+        self.size = 0
+        for shop_id, lat, lon in shops:
+            self.cells[_cell(lat, lon)].append((shop_id, lat, lon))
+            self.size += 1
+        self.built_at = time.monotonic()
+
+    def nearby(self, lat, lon, radius_km, limit=None):
+        """
+        Shops within radius_km of a point, nearest first
+
+        Returns:
+            list: (shop_id, distance_km) tuples
+        """
+        lat_span = radius_km / KM_PER_DEGREE
+        lon_span = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+        low_row, low_col = _cell(lat - lat_span, lon - lon_span)
+        high_row, high_col = _cell(lat + lat_span, lon + lon_span)
+
+        found = []
+        for row in range(low_row, high_row + 1):
+            for col in range(low_col, high_col + 1):
+                for shop_id, shop_lat, shop_lon in self.cells.get((row, col), ()):
+                    distance = distance_km(lat, lon, shop_lat, shop_lon)
+                    if distance <= radius_km:
+                        found.append((shop_id, distance))
+        found.sort(key=lambda item: (item[1], item[0]))
+        return found[:limit] if limit else found
+
+
+def invalidate_shop_index():
+    """Rebuild the grid on the next lookup"""
+    global _index
+    _index = None
+
+
+def shop_index():
+    """This worker's grid of active shops, rebuilt if invalidated or older than SHOP_INDEX_TTL"""
+    global _index
+    index = _index
+    if index is not None and time.monotonic() - index.built_at < SHOP_INDEX_TTL:
+        return index
+    with _index_lock:
+        index = _index
+        if index is None or time.monotonic() - index.built_at >= SHOP_INDEX_TTL:
+            rows = db.session.query(VendorShop.id, VendorShop.latitude, VendorShop.longitude).filter(
+                VendorShop.is_active == True,
+                VendorShop.latitude.isnot(None),
+                VendorShop.longitude.isnot(None)
+            ).all()
+            index = _index = ShopIndex(rows)
+            logger.info("Rebuilt shop location index", extra={'shops': index.size})
+    return index
+
+
+def nearby_shops(postcode, radius_km, limit=None):
+    """
+    Active shops within radius_km of a postcode, nearest first
+
+    Returns:
+        list: (shop_id, distance_km) tuples, or None if the postcode's outcode isn't known
+    """
+    location = postcode_location(postcode)
+    if location is None:
+        return None
+    return shop_index().nearby(location[0], location[1], radius_km, limit)
@@ -4,16 +4,61 @@ Handles SMS notifications via Twilio
 """
 
 import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import outbound_call
+
+# Twilio is imported only once credentials are configured (see SMSService.__init__):
+# it is a slow import and most environments run with SMS disabled
+
+# Bulk sending limits. Twilio queues anything it accepts, but the REST API caps
+# concurrent requests per account and a UK long code delivers ~1 message per
+# second, so keep these in line with the sending number / messaging service.
+SMS_MAX_WORKERS = int(os.environ.get('SMS_MAX_WORKERS', '8'))
+SMS_RATE_PER_SECOND = float(os.environ.get('SMS_RATE_PER_SECOND', '10'))
+
+
+def normalize_number(to_number):
+    """
+    Normalize a phone number to E.164, assuming UK for numbers without a country code
+    
+    Returns:
+        str: Normalized number, or None if the input is empty
+    """
+    if not to_number:
+        return None
+    
+    to_number = re.sub(r'[\s\-().]', '', str(to_number))
+    if to_number.startswith('00'):
+        to_number = '+' + to_number[2:]
+    if not to_number.startswith('+'):
+        # Assume UK number if no country code
+        to_number = '+44' + to_number.lstrip('0')
+    return to_number
+
+
+class RateLimiter:
+    """Thread-safe pacer that spaces calls evenly at a fixed rate per second"""
+    
+    def __init__(self, rate_per_second):
+        self.interval = 1.0 / rate_per_second if rate_per_second and rate_per_second > 0 else 0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+    
+    def wait(self):
+        """Block until the caller may make the next call"""
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
 
-# Try to import Twilio, but don't fail if it's not available
-try:
-    from twilio.rest import Client
-    from twilio.base.exceptions import TwilioRestException
-    TWILIO_AVAILABLE = True
-except ImportError:
-    TWILIO_AVAILABLE = False
-    Client = None
-    TwilioRestException = Exception
 
 class SMSService:
     """Service for sending SMS notifications via Twilio"""
@@ -24,15 +69,15 @@ class SMSService:
         self.auth_token = os.environ.get('TWILIO_AUTH_TOKEN')
         self.from_number = os.environ.get('TWILIO_PHONE_NUMBER')
         
-        # Check if Twilio library is available
-        if not TWILIO_AVAILABLE:
-            self.client = None
-            self.enabled = False
-            # Twilio library not installed - SMS service disabled silently
-            return
-        
         # Initialize client only if credentials are available
         if self.account_sid and self.auth_token and self.from_number:
+            try:
+                from twilio.rest import Client
+            except ImportError:
+                self.client = None
+                self.enabled = False
+                # Twilio library not installed - SMS service disabled silently
+                return
             self.client = Client(self.account_sid, self.auth_token)
             self.enabled = True
         else:
@@ -58,23 +103,24 @@ class SMSService:
             }
         
         # Validate phone number format
+        to_number = normalize_number(to_number)
         if not to_number:
             return {
                 'success': False,
                 'error': 'Phone number is required'
             }
         
-        # Ensure phone number starts with + (E.164 format)
-        if not to_number.startswith('+'):
-            # Assume UK number if no country code
-            to_number = '+44' + to_number.lstrip('0')
-        
+        return self._deliver(to_number, message)
+    
+    def _deliver(self, to_number, message):
+        """Make the Twilio API call for an already normalized number"""
         try:
-            message_obj = self.client.messages.create(
-                body=message,
-                from_=self.from_number,
-                to=to_number
-            )
+            with outbound_call('sms', 'send'):
+                message_obj = self.client.messages.create(
+                    body=message,
+                    from_=self.from_number,
+                    to=to_number
+                )
             
             return {
                 'success': True,
@@ -82,32 +128,77 @@ class SMSService:
                 'status': message_obj.status
             }
         
-        except TwilioRestException as e:
-            error_msg = e.msg if hasattr(e, 'msg') else str(e)
-            print(f"Twilio error: {error_msg}")
-            return {
-                'success': False,
-                'error': f'Failed to send SMS: {error_msg}'
-            }
-        
         except Exception as e:
-            print(f"SMS error: {str(e)}")
+            # TwilioRestException carries the provider's message in .msg
+            error_msg = getattr(e, 'msg', None) or str(e)
+            print(f"SMS error: {error_msg}")
             return {
                 'success': False,
-                'error': f'Failed to send SMS: {str(e)}'
+                'error': f'Failed to send SMS: {error_msg}'
             }
     
-    def send_voucher_code(self, phone_number, voucher_code, recipient_name, value):
+    def send_many(self, messages, max_workers=None, rate_per_second=None):
         """
-        Send voucher code via SMS
+        Send a batch of SMS concurrently, paced to the provider's rate limit
+        
+        Numbers are normalized once and identical (number, message) pairs are
+        only sent once; the duplicates share the first send's result.
         
         Args:
-            phone_number (str): Recipient phone number
-            voucher_code (str): Voucher code
-            recipient_name (str): Recipient name
-            value (float): Voucher value
+            messages (list): (to_number, message) tuples or dicts with 'to' and 'message'
+            max_workers (int): Concurrent API calls (default SMS_MAX_WORKERS)
+            rate_per_second (float): Maximum sends per second (default SMS_RATE_PER_SECOND)
+        
+        Returns:
+            dict: 'sent', 'failed' and 'duplicates' counts plus 'results', one per
+                  input message in input order, each with the send_sms() keys and 'to'
         """
-        message = f"""BAK UP Voucher
+        messages = [(m['to'], m['message']) if isinstance(m, dict) else tuple(m) for m in messages]
+        results = [None] * len(messages)
+        
+        if not self.enabled:
+            for index, (to_number, _) in enumerate(messages):
+                results[index] = {'to': to_number, 'success': False, 'error': 'SMS service not configured'}
+            return {'sent': 0, 'failed': len(messages), 'duplicates': 0, 'results': results}
+        
+        unique = {}  # (number, message) -> indexes of the input messages it answers
+        invalid = 0
+        for index, (to_number, message) in enumerate(messages):
+            number = normalize_number(to_number)
+            if not number:
+                results[index] = {'to': to_number, 'success': False, 'error': 'Phone number is required'}
+                invalid += 1
+                continue
+            unique.setdefault((number, message), []).append(index)
+        
+        limiter = RateLimiter(SMS_RATE_PER_SECOND if rate_per_second is None else rate_per_second)
+        
+        def deliver(key):
+            limiter.wait()
+            return self._deliver(*key)
+        
+        sent = 0
+        if unique:
+            keys = list(unique)
+            with ThreadPoolExecutor(max_workers=min(max_workers or SMS_MAX_WORKERS, len(keys))) as pool:
+                for key, result in zip(keys, pool.map(deliver, keys)):
+                    sent += 1 if result['success'] else 0
+                    first, *duplicates = unique[key]
+                    results[first] = dict(result, to=key[0])
+                    for index in duplicates:
+                        results[index] = dict(result, to=key[0], duplicate=True)
+        
+        return {
+            'sent': sent,
+            'failed': len(unique) - sent + invalid,
+            'duplicates': len(messages) - len(unique) - invalid,
+            'results': results
+        }
+    
+    @staticmethod
+    def voucher_code_message(voucher_code, recipient_name, value):
+        """Text of the voucher code SMS"""
+        return f"""BAK UP Voucher
 
 Hello {recipient_name},
 
@@ -118,8 +209,18 @@ Show this code at participating vendors to redeem.
 
 Thank you,
 BAK UP Team"""
+    
+    def send_voucher_code(self, phone_number, voucher_code, recipient_name, value):
+        """
+        Send voucher code via SMS
         
-        return self.send_sms(phone_number, message)
+        Args:
+            phone_number (str): Recipient phone number
+            voucher_code (str): Voucher code
+            recipient_name (str): Recipient name
+            value (float): Voucher value
+        """
+        return self.send_sms(phone_number, self.voucher_code_message(voucher_code, recipient_name, value))
     
     def send_surplus_alert(self, phone_number, vcse_name, vendor_name, item_name, quantity):
         """
@@ -0,0 +1,189 @@
+"""
+Static Asset Serving
+Serves the built frontend from an in-memory manifest of the dist/ directory
+
+The manifest is built once at startup: for every file it records the content
+type, size, a content-hash ETag and any precompressed .br/.gz siblings written
+by scripts/precompress_assets.py. Serving a request is then a dict lookup plus
+an open() - no stat calls, no MIME guessing, no on-the-fly compression:
+
+- Vite's hashed bundles (assets/name.<hash>.js) never change under the same
+  name, so they are served as `public, max-age=31536000, immutable`.
+- index.html and the other unhashed files (service worker, manifest.json,
+  icons) get a short TTL and are revalidated with If-None-Match / 304.
+- The smallest encoding the client accepts is chosen from Accept-Encoding.
+
+The manifest does not notice files added to dist/ after startup; restart the
+server after a rebuild.
+
+Environment:
+    STATIC_MAX_AGE      Cache lifetime in seconds for unhashed files (default 60)
+"""
+
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+from collections import namedtuple
+
+from flask import Response, request
+from werkzeug.wsgi import wrap_file
+
+logger = logging.getLogger(__name__)
+
+STATIC_MAX_AGE = int(os.environ.get('STATIC_MAX_AGE', '60'))
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Vite output names: assets/index.Dk36t62w.js, assets/logo-3f9a1c2b.png
+HASHED_NAME = re.compile(r'[.-][A-Za-z0-9_-]{8,}\.[A-Za-z0-9]+$')
+
+# Preferred first; (Content-Encoding, sibling suffix)
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+# File types worth precompressing
+COMPRESSIBLE = {'.js', '.mjs', '.css', '.html', '.json', '.svg', '.txt', '.map', '.xml', '.webmanifest', '.ico'}
+
+CONTENT_TYPES = {
+    '.js': 'application/javascript; charset=utf-8',
+    '.mjs': 'application/javascript; charset=utf-8',
+    '.css': 'text/css; charset=utf-8',
+    '.html': 'text/html; charset=utf-8',
+    '.json': 'application/json',
+    '.webmanifest': 'application/manifest+json',
+    '.svg': 'image/svg+xml',
+    '.map': 'application/json',
+}
+
+Asset = namedtuple('Asset', ['path', 'file', 'content_type', 'size', 'etag', 'immutable', 'variants'])
+Asset.__doc__ = """A servable file; variants maps a Content-Encoding to (file, size)"""
+
+
+def content_type_for(name):
+    ext = os.path.splitext(name)[1].lower()
+    if ext in CONTENT_TYPES:
+        return CONTENT_TYPES[ext]
+    guessed, _ = mimetypes.guess_type(name)
+    if guessed and guessed.startswith('text/'):
+        return f'{guessed}; charset=utf-8'
+    return guessed or 'application/octet-stream'
+
+
+def _digest(file_path):
+    digest = hashlib.blake2b(digest_size=10)
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class StaticManifest:
+    """In-memory index of a built frontend directory"""
+
+    def __init__(self, root):
+        self.root = str(root)
+        self.assets = {}
+        self.build()
+
+    def build(self):
+        """(Re)scan the directory"""
+        assets = {}
+        compressed = 0
+        if os.path.isdir(self.root):
+            for directory, _, names in os.walk(self.root):
+                present = set(names)
+                for name in names:
+                    if name.endswith(('.br', '.gz')) and name[:-3] in present:
+                        continue  # a sibling, indexed with its original
+                    file_path = os.path.join(directory, name)
+                    rel_path = os.path.relpath(file_path, self.root).replace(os.sep, '/')
+                    variants = {}
+                    for encoding, suffix in ENCODINGS:
+                        if name + suffix in present:
+                            variants[encoding] = (file_path + suffix, os.path.getsize(file_path + suffix))
+                    compressed += bool(variants)
+                    assets[rel_path] = Asset(
+                        path=rel_path,
+                        file=file_path,
+                        content_type=content_type_for(name),
+                        size=os.path.getsize(file_path),
+                        etag=_digest(file_path),
+                        immutable=rel_path.startswith('assets/') and bool(HASHED_NAME.search(name)),
+                        variants=variants
+                    )
+        self.assets = assets
+        logger.info("Static manifest built: %d files (%d precompressed) from %s", len(assets), compressed, self.root)
+
+    def get(self, path):
+        """The asset at a URL path relative to the root, or None"""
+        return self.assets.get(path)
+
+    @property
+    def index(self):
+        return self.assets.get('index.html')
+
+    def response(self, asset):
+        """Response for an asset in the current request (304 if the client's copy is current)"""
+        encoding, file_path, size = None, asset.file, asset.size
+        accepted = request.accept_encodings
+        for candidate, _ in ENCODINGS:
+            if candidate in asset.variants and accepted[candidate] > 0:
+                encoding = candidate
+                file_path, size = asset.variants[candidate]
+                break
+
+        etag = f'{asset.etag}-{encoding}' if encoding else asset.etag
+        headers = {
+            'ETag': f'"{etag}"',
+            'Cache-Control': IMMUTABLE_CACHE_CONTROL if asset.immutable else f'public, max-age={STATIC_MAX_AGE}, must-revalidate',
+        }
+        if asset.variants:
+            headers['Vary'] = 'Accept-Encoding'
+
+        if request.if_none_match.contains_weak(etag):
+            return Response(status=304, headers=headers)
+
+        headers['Content-Length'] = str(size)
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        body = wrap_file(request.environ, open(file_path, 'rb'))
+        return Response(body, headers=headers, content_type=asset.content_type, direct_passthrough=True)
+
+
+def precompress(root, min_size=256):
+    """
+    Write .br (if the brotli package is installed) and .gz siblings for compressible files
+
+    Returns:
+        dict: {'files': int, 'br': int, 'gzip': int}
+    """
+    import gzip
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+
+    counts = {'files': 0, 'br': 0, 'gzip': 0}
+    for directory, _, names in os.walk(str(root)):
+        for name in names:
+            if os.path.splitext(name)[1].lower() not in COMPRESSIBLE:
+                continue
+            file_path = os.path.join(directory, name)
+            with open(file_path, 'rb') as f:
+                data = f.read()
+            if len(data) < min_size:
+                continue
+            counts['files'] += 1
+
+            gz = gzip.compress(data, compresslevel=9, mtime=0)
+            if len(gz) < len(data):
+                with open(file_path + '.gz', 'wb') as f:
+                    f.write(gz)
+                counts['gzip'] += 1
+            if brotli is not None:
+                br = brotli.compress(data, quality=11)
+                if len(br) < len(data):
+                    with open(file_path + '.br', 'wb') as f:
+                        f.write(br)
+                    counts['br'] += 1
+    return counts
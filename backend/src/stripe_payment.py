@@ -1,26 +1,40 @@
 # Stripe Payment Integration for VCFSE Self-Service Fund Loading
-import stripe
 import os
 from datetime import datetime
 
-# Initialize Stripe with API key from environment
-# Clean and validate the API key
-raw_api_key = os.getenv('STRIPE_SECRET_KEY', '')
+from metrics import outbound_call
 
-# Remove any 'Bearer ' prefix if present (common misconfiguration)
-if raw_api_key.startswith('Bearer '):
-    raw_api_key = raw_api_key[7:]  # Remove 'Bearer ' prefix
-elif raw_api_key.startswith('bearer '):
-    raw_api_key = raw_api_key[7:]  # Remove 'bearer ' prefix
+# The stripe SDK is imported on first use (get_stripe) rather than at startup:
+# it is one of the slowest imports in the app and most requests never touch it
+_stripe = None
 
-# Strip whitespace
-raw_api_key = raw_api_key.strip()
 
-# Validate API key format (should start with sk_test_ or sk_live_)
-if raw_api_key and not (raw_api_key.startswith('sk_test_') or raw_api_key.startswith('sk_live_')):
-    print(f"WARNING: Invalid Stripe API key format. Key should start with 'sk_test_' or 'sk_live_'. Current: {raw_api_key[:10]}...")
+def clean_api_key(raw_api_key):
+    """Strip whitespace and a stray 'Bearer ' prefix (common misconfiguration) from a secret key"""
+    raw_api_key = (raw_api_key or '').strip()
+    if raw_api_key.lower().startswith('bearer '):
+        raw_api_key = raw_api_key[7:].strip()
+    return raw_api_key
+
+
+def get_stripe():
+    """
+    The stripe module, configured with STRIPE_SECRET_KEY
+
+    Returns:
+        module: stripe, with api_key set
+    """
+    global _stripe
+    if _stripe is None:
+        import stripe
+        api_key = clean_api_key(os.getenv('STRIPE_SECRET_KEY', ''))
+        # Validate API key format (should start with sk_test_ or sk_live_)
+        if api_key and not (api_key.startswith('sk_test_') or api_key.startswith('sk_live_')):
+            print(f"WARNING: Invalid Stripe API key format. Key should start with 'sk_test_' or 'sk_live_'. Current: {api_key[:10]}...")
+        stripe.api_key = api_key
+        _stripe = stripe
+    return _stripe
 
-stripe.api_key = raw_api_key
 
 def get_publishable_key():
     """
@@ -44,6 +58,7 @@ def create_payment_intent(amount, vcse_id, vcse_email, description="Fund Loading
     Returns:
         dict: Payment intent details including client_secret
     """
+    stripe = get_stripe()
     # Check if Stripe API key is configured
     if not stripe.api_key or len(stripe.api_key) < 20:
         raise Exception("Stripe API key is not properly configured. Please contact the administrator.")
@@ -53,20 +68,21 @@ def create_payment_intent(amount, vcse_id, vcse_email, description="Fund Loading
         amount_in_pence = int(float(amount) * 100)
         
         # Create Payment Intent
-        intent = stripe.PaymentIntent.create(
-            amount=amount_in_pence,
-            currency='gbp',
-            description=description,
-            metadata={
-                'vcse_id': vcse_id,
-                'vcse_email': vcse_email,
-                'purpose': 'fund_loading',
-                'timestamp': datetime.now().isoformat()
-            },
-            automatic_payment_methods={
-                'enabled': True,
-            }
-        )
+        with outbound_call('stripe', 'create_payment_intent'):
+            intent = stripe.PaymentIntent.create(
+                amount=amount_in_pence,
+                currency='gbp',
+                description=description,
+                metadata={
+                    'vcse_id': vcse_id,
+                    'vcse_email': vcse_email,
+                    'purpose': 'fund_loading',
+                    'timestamp': datetime.now().isoformat()
+                },
+                automatic_payment_methods={
+                    'enabled': True,
+                }
+            )
         
         return {
             'client_secret': intent.client_secret,
@@ -91,8 +107,10 @@ def verify_payment(payment_intent_id):
     Returns:
         dict: Payment verification details
     """
+    stripe = get_stripe()
     try:
-        intent = stripe.PaymentIntent.retrieve(payment_intent_id)
+        with outbound_call('stripe', 'retrieve_payment_intent'):
+            intent = stripe.PaymentIntent.retrieve(payment_intent_id)
         
         return {
             'verified': intent.status == 'succeeded',
@@ -118,14 +136,16 @@ def get_payment_methods(customer_id=None):
     Returns:
         list: List of payment methods
     """
+    stripe = get_stripe()
     try:
         if not customer_id:
             return []
         
-        payment_methods = stripe.PaymentMethod.list(
-            customer=customer_id,
-            type='card'
-        )
+        with outbound_call('stripe', 'list_payment_methods'):
+            payment_methods = stripe.PaymentMethod.list(
+                customer=customer_id,
+                type='card'
+            )
         
         return [{
             'id': pm.id,
@@ -0,0 +1,404 @@
+"""
+Stripe Webhook Inbox
+Durable, idempotent ingestion of Stripe webhook events
+
+The webhook endpoint only verifies the signature, stores the event in the
+stripe_webhook_event table (keyed by Stripe's event ID, so retried deliveries
+are ignored) and acknowledges. A background worker then applies stored events
+in Stripe creation order, crediting balances with atomic UPDATE statements.
+
+The worker starts with the process, so events left pending by a restart are
+applied without waiting for the next delivery. An event claimed by a worker
+that died mid-way stays 'processing' until STRIPE_WEBHOOK_CLAIM_TIMEOUT_SECONDS
+have passed, then goes back to pending (or failed, once out of attempts). A
+handler never commits: its balance credit and notification are inserted in the
+worker's transaction and commit together with the event's status, so a crashed
+attempt leaves nothing behind and applying the event again is safe.
+"""
+
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, func, or_
+
+logger = logging.getLogger(__name__)
+
+# Global references
+app = None
+db = None
+User = None
+PaymentTransaction = None
+StripeWebhookEvent = None
+notify = None
+
+# 'thread' runs the worker inside each web process, 'off' leaves it to
+# scripts/stripe_webhook_replay.py --drain (e.g. a dedicated worker dyno)
+WORKER_MODE = os.environ.get('STRIPE_WEBHOOK_WORKER', 'thread')
+POLL_INTERVAL = float(os.environ.get('STRIPE_WEBHOOK_POLL_SECONDS', '5'))
+MAX_ATTEMPTS = int(os.environ.get('STRIPE_WEBHOOK_MAX_ATTEMPTS', '5'))
+CLAIM_TIMEOUT = float(os.environ.get('STRIPE_WEBHOOK_CLAIM_TIMEOUT_SECONDS', '300'))
+BATCH_SIZE = 100
+
+_wakeup = threading.Event()
+_worker_thread = None
+_worker_lock = threading.Lock()
+
+
+def init_stripe_webhook_inbox(flask_app, app_db, user_model, payment_transaction_model, notify_each):
+    """Initialize the webhook inbox; notify_each must insert without committing"""
+    global app, db, User, PaymentTransaction, StripeWebhookEvent, notify
+    app = flask_app
+    db = app_db
+    User = user_model
+    PaymentTransaction = payment_transaction_model
+    notify = notify_each
+
+    class StripeWebhookEvent(db.Model):
+        __tablename__ = 'stripe_webhook_event'
+        __table_args__ = (
+            db.Index('ix_stripe_webhook_event_pending', 'status', 'stripe_created'),
+        )
+
+        event_id = db.Column(db.String(255), primary_key=True)  # Stripe evt_... ID
+        event_type = db.Column(db.String(100), nullable=False)
+        stripe_created = db.Column(db.Integer, nullable=False, default=0)  # Unix time from Stripe
+        payload = db.Column(db.Text, nullable=False)
+        status = db.Column(db.String(20), nullable=False, default='pending')  # pending, processing, processed, ignored, failed
+        attempts = db.Column(db.Integer, nullable=False, default=0)
+        last_error = db.Column(db.Text)
+        claimed_at = db.Column(db.DateTime)  # when the current 'processing' attempt started
+        received_at = db.Column(db.DateTime, default=datetime.utcnow)
+        processed_at = db.Column(db.DateTime)
+
+        def to_dict(self):
+            return {
+                'event_id': self.event_id,
+                'event_type': self.event_type,
+                'status': self.status,
+                'attempts': self.attempts,
+                'last_error': self.last_error,
+                'received_at': self.received_at.isoformat() if self.received_at else None,
+                'processed_at': self.processed_at.isoformat() if self.processed_at else None
+            }
+
+    globals()['StripeWebhookEvent'] = StripeWebhookEvent
+
+    # Start now rather than on the next delivery, so a restart doesn't strand pending events
+    if WORKER_MODE == 'thread':
+        _ensure_worker()
+    logger.info("Stripe webhook inbox initialized", extra={'worker_mode': WORKER_MODE})
+
+
+# ============================================
+# Ingestion (request path)
+# ============================================
+
+def store_event(event, raw_payload):
+    """
+    Insert a verified Stripe event into the inbox, ignoring duplicates
+
+    Args:
+        event: Event returned by stripe.Webhook.construct_event
+        raw_payload: Request body (bytes or str) exactly as Stripe sent it
+
+    Returns:
+        bool: True if the event is new, False if it was already stored
+    """
+    if isinstance(raw_payload, bytes):
+        raw_payload = raw_payload.decode('utf-8')
+
+    values = {
+        'event_id': event['id'],
+        'event_type': event['type'],
+        'stripe_created': int(event.get('created') or 0),
+        'payload': raw_payload,
+        'status': 'pending',
+        'attempts': 0,
+        'received_at': datetime.utcnow()
+    }
+    dialect = db.engine.dialect.name
+
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(StripeWebhookEvent.__table__).values(**values).on_conflict_do_nothing(
+            index_elements=['event_id']
+        )
+        inserted = db.session.execute(stmt).rowcount == 1
+    else:
+        inserted = db.session.get(StripeWebhookEvent, values['event_id']) is None
+        if inserted:
+            db.session.add(StripeWebhookEvent(**values))
+
+    db.session.commit()
+    if inserted:
+        wake_worker()
+    return inserted
+
+
+def wake_worker():
+    """Signal the in-process worker that new events are waiting"""
+    if WORKER_MODE != 'thread':
+        return
+    _ensure_worker()
+    _wakeup.set()
+
+
+def _ensure_worker():
+    """Start the worker thread once per process (threads don't survive a fork)"""
+    global _worker_thread
+    if _worker_thread and _worker_thread.is_alive():
+        return
+    with _worker_lock:
+        if _worker_thread and _worker_thread.is_alive():
+            return
+        _worker_thread = threading.Thread(target=_worker_loop, name='stripe-webhook-worker')
+        _worker_thread.daemon = True
+        _worker_thread.start()
+
+
+def _worker_loop():
+    while True:
+        _wakeup.wait(POLL_INTERVAL)
+        _wakeup.clear()
+        if WORKER_MODE != 'thread':
+            continue
+        with app.app_context():
+            try:
+                while process_pending_events() == BATCH_SIZE:
+                    pass
+            except Exception as e:
+                logger.error("Stripe webhook worker error: %s", e)
+                db.session.rollback()
+            finally:
+                db.session.remove()
+
+
+# ============================================
+# Processing (worker path)
+# ============================================
+
+def process_pending_events(limit=BATCH_SIZE):
+    """
+    Apply pending events in Stripe creation order
+
+    Each event is claimed with a conditional UPDATE, so several workers can
+    drain the inbox concurrently without applying an event twice. Stale
+    claims are released first (see reclaim_stale_events).
+
+    Returns:
+        int: Number of events looked at
+    """
+    reclaim_stale_events()
+    pending = db.session.query(StripeWebhookEvent.event_id).filter(
+        StripeWebhookEvent.status == 'pending'
+    ).order_by(
+        StripeWebhookEvent.stripe_created, StripeWebhookEvent.received_at
+    ).limit(limit).all()
+
+    for (event_id,) in pending:
+        process_event(event_id)
+    return len(pending)
+
+
+def process_event(event_id):
+    """
+    Claim and apply a single stored event
+
+    Returns:
+        str: Final status of the event, or None if another worker holds it
+    """
+    claimed = StripeWebhookEvent.query.filter_by(event_id=event_id, status='pending').update({
+        'status': 'processing',
+        'attempts': StripeWebhookEvent.attempts + 1,
+        'claimed_at': datetime.utcnow()
+    }, synchronize_session=False)
+    db.session.commit()
+    if not claimed:
+        return None
+
+    record = db.session.get(StripeWebhookEvent, event_id)
+    try:
+        event = json.loads(record.payload)
+        handler = EVENT_HANDLERS.get(event['type'])
+        result = handler(event['data']['object']) if handler else 'ignored'
+
+        record.status = 'ignored' if result == 'ignored' else 'processed'
+        record.last_error = None if handler else f"No handler for {event['type']}"
+        record.processed_at = datetime.utcnow()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        record = db.session.get(StripeWebhookEvent, event_id)
+        record.status = 'failed' if record.attempts >= MAX_ATTEMPTS else 'pending'
+        record.last_error = str(e)
+        db.session.commit()
+        logger.error("Stripe event %s failed (attempt %d): %s", event_id, record.attempts, e)
+
+    return record.status
+
+
+def reclaim_stale_events(now=None):
+    """
+    Release events left 'processing' by a worker that died while applying them
+
+    An event claimed more than CLAIM_TIMEOUT seconds ago (or before claims
+    were timestamped) goes back to pending, or to failed if it has used all
+    its attempts.
+
+    Returns:
+        int: Number of events released
+    """
+    cutoff = (now or datetime.utcnow()) - timedelta(seconds=CLAIM_TIMEOUT)
+    released = StripeWebhookEvent.query.filter(
+        StripeWebhookEvent.status == 'processing',
+        or_(StripeWebhookEvent.claimed_at.is_(None), StripeWebhookEvent.claimed_at < cutoff)
+    ).update({
+        'status': case((StripeWebhookEvent.attempts >= MAX_ATTEMPTS, 'failed'), else_='pending'),
+        'last_error': 'Worker stopped while processing the event',
+        'claimed_at': None
+    }, synchronize_session=False)
+    db.session.commit()
+    if released:
+        logger.warning("Released %d stale Stripe webhook claims", released)
+    return released
+
+
+def credit_succeeded_payment(transaction, payment_method_id=None):
+    """
+    Mark a payment transaction succeeded and credit the VCFSE balance exactly once
+
+    Both updates are conditional/atomic SQL, so a webhook and /api/payment/verify
+    racing on the same payment can never credit it twice. The caller commits.
+
+    Returns:
+        float: New balance if this call credited the payment, None if it was already credited
+    """
+    values = {'status': 'succeeded', 'completed_at': datetime.utcnow()}
+    if payment_method_id:
+        values['payment_method_id'] = payment_method_id
+
+    claimed = PaymentTransaction.query.filter(
+        PaymentTransaction.id == transaction.id,
+        PaymentTransaction.status != 'succeeded'
+    ).update(values, synchronize_session=False)
+    if not claimed:
+        return None
+
+    User.query.filter_by(id=transaction.vcse_id).update({
+        'balance': func.coalesce(User.balance, 0) + transaction.amount
+    }, synchronize_session=False)
+    db.session.expire_all()
+    return db.session.query(User.balance).filter_by(id=transaction.vcse_id).scalar()
+
+
+def _find_transaction(payment_intent):
+    return PaymentTransaction.query.filter_by(stripe_payment_intent_id=payment_intent['id']).first()
+
+
+def _handle_payment_succeeded(payment_intent):
+    transaction = _find_transaction(payment_intent)
+    if not transaction:
+        return 'ignored'
+
+    new_balance = credit_succeeded_payment(transaction, payment_intent.get('payment_method'))
+    if new_balance is None:
+        return 'ignored'
+
+    notify([(
+        transaction.vcse_id,
+        '💳 Payment Confirmed',
+        f'Your payment of £{transaction.amount:.2f} has been confirmed. Your new balance is £{new_balance:.2f}.'
+    )], 'success')
+    logger.info("Payment succeeded webhook processed: %s", payment_intent['id'])
+    return 'processed'
+
+
+def _handle_payment_failed(payment_intent):
+    transaction = _find_transaction(payment_intent)
+    if not transaction:
+        return 'ignored'
+
+    # A late failure event must never undo a payment that already succeeded
+    updated = PaymentTransaction.query.filter(
+        PaymentTransaction.id == transaction.id,
+        PaymentTransaction.status.notin_(['succeeded', 'failed'])
+    ).update({
+        'status': 'failed',
+        'failure_reason': (payment_intent.get('last_payment_error') or {}).get('message', 'Payment failed')
+    }, synchronize_session=False)
+    if not updated:
+        return 'ignored'
+
+    notify([(
+        transaction.vcse_id,
+        '❌ Payment Failed',
+        f'Your payment of £{transaction.amount:.2f} failed. Please try again or use a different payment method.'
+    )], 'error')
+    logger.info("Payment failed webhook processed: %s", payment_intent['id'])
+    return 'processed'
+
+
+def _handle_payment_canceled(payment_intent):
+    transaction = _find_transaction(payment_intent)
+    if not transaction:
+        return 'ignored'
+
+    updated = PaymentTransaction.query.filter(
+        PaymentTransaction.id == transaction.id,
+        PaymentTransaction.status.notin_(['succeeded', 'cancelled'])
+    ).update({'status': 'cancelled'}, synchronize_session=False)
+    logger.info("Payment cancelled webhook processed: %s", payment_intent['id'])
+    return 'processed' if updated else 'ignored'
+
+
+EVENT_HANDLERS = {
+    'payment_intent.succeeded': _handle_payment_succeeded,
+    'payment_intent.payment_failed': _handle_payment_failed,
+    'payment_intent.canceled': _handle_payment_canceled,
+}
+
+
+# ============================================
+# Replay
+# ============================================
+
+def replay_events(event_ids=None, status=None, since=None):
+    """
+    Reset stored events to pending so the worker applies them again
+
+    Handlers are idempotent (conditional updates), so replaying an event that
+    already took effect is harmless.
+
+    Args:
+        event_ids: Specific Stripe event IDs to replay
+        status: Replay every event currently in this status (e.g. 'failed')
+        since: Only events received on or after this datetime
+
+    Returns:
+        int: Number of events queued for replay
+    """
+    query = StripeWebhookEvent.query
+    if event_ids:
+        query = query.filter(StripeWebhookEvent.event_id.in_(event_ids))
+    if status:
+        query = query.filter(StripeWebhookEvent.status == status)
+    if since:
+        query = query.filter(StripeWebhookEvent.received_at >= since)
+
+    count = query.update({'status': 'pending', 'attempts': 0, 'last_error': None}, synchronize_session=False)
+    db.session.commit()
+    return count
+
+
+def queue_depths():
+    """Events waiting to be applied and events that gave up, for metrics"""
+    counts = dict(db.session.query(StripeWebhookEvent.status, func.count()).filter(
+        StripeWebhookEvent.status.in_(('pending', 'processing', 'failed'))
+    ).group_by(StripeWebhookEvent.status).all())
+    return {status: counts.get(status, 0) for status in ('pending', 'processing', 'failed')}
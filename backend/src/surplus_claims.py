@@ -0,0 +1,255 @@
+"""
+Surplus Claim Engine
+Lock-free claiming of surplus food items
+
+Claims are single conditional UPDATE statements (WHERE ... status = 'available'
+... RETURNING), so when many VCSEs go for the same item at once exactly one
+wins and the others see zero rows updated, without holding row locks across
+the request.
+
+Partial claims work off surplus_item.remaining_quantity, the numeric part of
+the free-text quantity ("10 kg" -> 10). Claiming part of an item decrements the
+remaining quantity and splits the claimed amount into its own accepted
+surplus_item row (parent_item_id points at the original), so the existing
+accepted/collected workflow applies to it unchanged. Whoever claims exactly
+what is left takes the original row itself.
+"""
+
+import logging
+import re
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import case, event, func, null, select, update
+
+logger = logging.getLogger(__name__)
+
+# Global references
+db = None
+SurplusItem = None
+Item = None
+
+QUANTITY_PATTERN = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([^\d]*?)\s*$')
+
+# Columns copied from an item onto the row split off by a partial claim
+SPLIT_COLUMNS = (
+    'vendor_id', 'shop_id', 'item_name', 'unit', 'category', 'item_type',
+    'price', 'original_price', 'description', 'expiry_date', 'status', 'posted_at'
+)
+
+
+def init_surplus_claims(app_db, surplus_item_model, item_model):
+    """Initialize the claim engine with database models"""
+    global db, SurplusItem, Item
+    db = app_db
+    SurplusItem = surplus_item_model
+    Item = item_model
+    event.listen(SurplusItem.quantity, 'set', _sync_remaining_quantity)
+    logger.info("Surplus claim engine initialized")
+
+
+def parse_quantity(text):
+    """
+    Split a free-text quantity into its amount and the rest of the text
+
+    Args:
+        text: Quantity as entered by the vendor, e.g. '10 kg', '3', '2.5 litres'
+
+    Returns:
+        tuple: (Decimal amount, remainder) or (None, None) if there is no leading number
+    """
+    match = QUANTITY_PATTERN.match(str(text or ''))
+    if not match:
+        return None, None
+    try:
+        return Decimal(match.group(1)), match.group(2)
+    except InvalidOperation:
+        return None, None
+
+
+def format_quantity(amount, remainder=''):
+    """Inverse of parse_quantity: (Decimal('7.50'), 'kg') -> '7.5 kg'"""
+    amount = Decimal(amount).normalize()
+    text = f"{amount:f}"
+    return f"{text} {remainder}" if remainder else text
+
+
+def _sync_remaining_quantity(target, value, oldvalue, initiator):
+    """Whenever the quantity text is set through the ORM, reset the claimable amount to match"""
+    target.remaining_quantity, _ = parse_quantity(value)
+
+
+def _execute_returning(stmt, table, key, columns):
+    """
+    Run a conditional UPDATE and return the updated row (or None if no row matched)
+
+    Uses UPDATE ... RETURNING where the dialect supports it (PostgreSQL, SQLite
+    3.35+), otherwise falls back to the row count plus a read in the same
+    transaction.
+    """
+    if db.engine.dialect.update_returning:
+        return db.session.execute(stmt.returning(*columns)).first()
+    if db.session.execute(stmt).rowcount != 1:
+        return None
+    return db.session.execute(select(*columns).where(table.c.id == key)).first()
+
+
+# ============================================
+# Food to Go (surplus_item)
+# ============================================
+
+def accept_surplus_item(item_id, vcse_id, collection_time, quantity=None):
+    """
+    Claim a surplus item, or part of it, for a VCSE
+
+    Args:
+        item_id: SurplusItem ID
+        vcse_id: Claiming VCSE user ID
+        collection_time: Scheduled collection datetime
+        quantity: Amount to claim; None claims everything that is left
+
+    Returns:
+        dict: 'item_id' (the accepted row, a new split row for partial claims),
+              'quantity', 'remaining_quantity' and 'partial';
+              None if the item is no longer available in that quantity
+
+    Raises:
+        ValueError: If the quantity is invalid or the item can't be split
+    """
+    table = SurplusItem.__table__
+    now = datetime.utcnow()
+
+    if quantity is not None:
+        try:
+            quantity = Decimal(str(quantity))
+        except InvalidOperation:
+            raise ValueError('Quantity must be a number')
+        if quantity <= 0:
+            raise ValueError('Quantity must be greater than zero')
+
+        unit_text = _ensure_remaining_quantity(item_id)
+
+        # Partial claim: take some of the remaining quantity, leave the rest available
+        row = _execute_returning(
+            update(table).where(
+                table.c.id == item_id,
+                table.c.collection_status == 'available',
+                table.c.remaining_quantity > quantity
+            ).values(remaining_quantity=table.c.remaining_quantity - quantity),
+            table, item_id,
+            [table.c.remaining_quantity] + [table.c[name] for name in SPLIT_COLUMNS]
+        )
+        if row is not None:
+            remaining = row.remaining_quantity
+            # Only the latest claim's text wins if two claims interleave
+            db.session.execute(update(table).where(
+                table.c.id == item_id, table.c.remaining_quantity == remaining
+            ).values(quantity=format_quantity(remaining, unit_text)))
+
+            split = SurplusItem(
+                quantity=format_quantity(quantity, unit_text),
+                parent_item_id=item_id,
+                accepted_by_vcse_id=vcse_id,
+                accepted_at=now,
+                collection_time=collection_time,
+                collection_status='accepted',
+                **{name: getattr(row, name) for name in SPLIT_COLUMNS}
+            )
+            split.remaining_quantity = 0
+            db.session.add(split)
+            db.session.commit()
+            return {'item_id': split.id, 'quantity': quantity, 'remaining_quantity': remaining, 'partial': True}
+
+    # Whole claim (or a partial claim for exactly what is left)
+    conditions = [table.c.id == item_id, table.c.collection_status == 'available']
+    if quantity is not None:
+        conditions.append(table.c.remaining_quantity == quantity)
+
+    row = _execute_returning(
+        update(table).where(*conditions).values(
+            collection_status='accepted',
+            accepted_by_vcse_id=vcse_id,
+            accepted_at=now,
+            collection_time=collection_time,
+            remaining_quantity=case((table.c.remaining_quantity.is_(None), null()), else_=0)
+        ),
+        table, item_id,
+        [table.c.id, table.c.quantity]
+    )
+    if row is None:
+        db.session.rollback()
+        return None
+
+    db.session.commit()
+    claimed, _ = parse_quantity(row.quantity)
+    return {'item_id': row.id, 'quantity': claimed, 'remaining_quantity': Decimal(0), 'partial': False}
+
+
+def _ensure_remaining_quantity(item_id):
+    """
+    Make sure a row has remaining_quantity set (rows from before the column existed)
+
+    Returns:
+        str: The unit text that follows the amount in the quantity field
+
+    Raises:
+        ValueError: If the quantity has no numeric amount to split
+    """
+    table = SurplusItem.__table__
+    row = db.session.execute(
+        select(table.c.quantity, table.c.remaining_quantity).where(table.c.id == item_id)
+    ).first()
+    if row is None:
+        return ''
+
+    amount, unit_text = parse_quantity(row.quantity)
+    if row.remaining_quantity is not None:
+        return unit_text or ''
+    if amount is None:
+        raise ValueError('This item can only be claimed in full')
+
+    db.session.execute(update(table).where(
+        table.c.id == item_id, table.c.remaining_quantity.is_(None)
+    ).values(remaining_quantity=amount))
+    return unit_text
+
+
+def get_available_quantity(item_id):
+    """Current remaining quantity and status, for conflict responses"""
+    table = SurplusItem.__table__
+    return db.session.execute(
+        select(table.c.collection_status, func.coalesce(table.c.remaining_quantity, 0)).where(table.c.id == item_id)
+    ).first()
+
+
+# ============================================
+# Listed items (item)
+# ============================================
+
+def claim_listed_item(item_id, vcse_id, collection_time_limit):
+    """
+    Claim a listed item for a VCSE
+
+    Returns:
+        int: Vendor ID of the claimed item, or None if someone else claimed it first
+    """
+    table = Item.__table__
+    row = _execute_returning(
+        update(table).where(
+            table.c.id == item_id,
+            table.c.status == 'available'
+        ).values(
+            status='claimed',
+            claimed_by=vcse_id,
+            claimed_at=datetime.utcnow(),
+            collection_time_limit=collection_time_limit
+        ),
+        table, item_id,
+        [table.c.vendor_id]
+    )
+    if row is None:
+        db.session.rollback()
+        return None
+
+    db.session.commit()
+    return row.vendor_id
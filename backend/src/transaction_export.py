@@ -5,7 +5,7 @@ Handles CSV/Excel export of vouchers, transactions, and reports
 
 import csv
 import io
-from datetime import datetime
+from datetime import datetime, timedelta
 
 def export_vouchers_csv(vouchers, User):
     """
@@ -138,10 +138,28 @@ def export_users_csv(users):
     return output.getvalue()
 
 
-def generate_financial_report_csv(Voucher, User, start_date=None, end_date=None):
+def _user_names(User, ids, *name_columns):
+    """{user_id: first non-empty of name_columns, else email} for a list of IDs, in one query"""
+    from sqlalchemy import func
+    ids = [user_id for user_id in ids if user_id]
+    if not ids:
+        return {}
+    name = func.coalesce(*name_columns, User.email)
+    return dict(User.query.session.query(User.id, name).filter(User.id.in_(ids)).all())
+
+
+def generate_financial_report_csv(Voucher, User, VoucherLedger, start_date=None, end_date=None):
     """
     Generate comprehensive financial report
+
+    Values come from the voucher ledger, so money issued, spent and expired in
+    the period is counted when it happened, however much is left on each voucher.
+    Totals and breakdowns are computed over the ledger snapshot (ledger_analytics.py).
     """
+    from sqlalchemy import func
+    from sqlalchemy.orm import aliased
+    from ledger_analytics import ledger_frame
+
     output = io.StringIO()
     writer = csv.writer(output)
     
@@ -154,76 +172,121 @@ def generate_financial_report_csv(Voucher, User, start_date=None, end_date=None)
         writer.writerow(['End Date:', end_date.strftime('%Y-%m-%d')])
     writer.writerow([])
     
-    # Query vouchers
-    query = Voucher.query
-    if start_date and hasattr(Voucher, 'created_at'):
-        query = query.filter(Voucher.created_at >= start_date)
-    if end_date and hasattr(Voucher, 'created_at'):
-        query = query.filter(Voucher.created_at <= end_date)
+    # The end date is inclusive
+    end = end_date + timedelta(days=1) if end_date else None
     
-    vouchers = query.all()
+    def in_range(query):
+        if start_date:
+            query = query.filter(VoucherLedger.created_at >= start_date)
+        if end:
+            query = query.filter(VoucherLedger.created_at < end)
+        return query
+    
+    session = Voucher.query.session
+    ledger = ledger_frame()
+    totals = ledger.totals(start_date, end)
+    
+    # Current status of the vouchers issued in the period
+    status_counts = {
+        status: count for status, count, _ in ledger.breakdown('status', 'issue', start_date, end)
+    }
     
     # Summary statistics
     writer.writerow(['SUMMARY STATISTICS'])
     writer.writerow([])
     
-    total_issued = len(vouchers)
-    total_value = sum(float(v.value) for v in vouchers)
-    active_vouchers = [v for v in vouchers if v.status == 'active']
-    redeemed_vouchers = [v for v in vouchers if v.status == 'redeemed']
-    expired_vouchers = [v for v in vouchers if v.status == 'expired']
-    
-    writer.writerow(['Total Vouchers Issued:', total_issued])
-    writer.writerow(['Total Value Issued:', f"£{total_value:.2f}"])
-    writer.writerow(['Active Vouchers:', len(active_vouchers)])
-    writer.writerow(['Redeemed Vouchers:', len(redeemed_vouchers)])
-    writer.writerow(['Expired Vouchers:', len(expired_vouchers)])
+    writer.writerow(['Total Vouchers Issued:', totals['issue']['count']])
+    writer.writerow(['Total Value Issued:', f"£{totals['issue']['amount']:.2f}"])
+    writer.writerow(['Total Value Redeemed:', f"£{totals['redeem']['amount']:.2f}"])
+    writer.writerow(['Redemptions:', totals['redeem']['count']])
+    writer.writerow(['Total Value Expired:', f"£{totals['expire']['amount']:.2f}"])
+    writer.writerow(['Active Vouchers:', status_counts.get('active', 0)])
+    writer.writerow(['Redeemed Vouchers:', status_counts.get('redeemed', 0)])
+    writer.writerow(['Expired Vouchers:', status_counts.get('expired', 0)])
     writer.writerow([])
     
     # By issuer breakdown
     writer.writerow(['BREAKDOWN BY ISSUER'])
     writer.writerow(['Organization', 'Vouchers Issued', 'Total Value (£)'])
     
-    issuer_stats = {}
-    for voucher in vouchers:
-        issuer = User.query.get(voucher.issued_by) if voucher.issued_by else None
-        if issuer:
-            org_name = issuer.organization_name if hasattr(issuer, 'organization_name') else issuer.email
-            if org_name not in issuer_stats:
-                issuer_stats[org_name] = {'count': 0, 'value': 0}
-            issuer_stats[org_name]['count'] += 1
-            issuer_stats[org_name]['value'] += float(voucher.value)
+    issuer_stats = ledger.breakdown('issuer', 'issue', start_date, end)
+    issuer_names = _user_names(User, [issuer_id for issuer_id, _, _ in issuer_stats], User.organization_name)
+    for issuer_id, count, value in issuer_stats:
+        writer.writerow([issuer_names.get(issuer_id, 'Unknown'), count, f"£{value:.2f}"])
+    
+    writer.writerow([])
+    
+    # Where vouchers were spent
+    writer.writerow(['BREAKDOWN BY VENDOR'])
+    writer.writerow(['Vendor', 'Redemptions', 'Total Value (£)'])
+    
+    vendor_stats = ledger.breakdown('vendor', 'redeem', start_date, end)
+    vendor_names = _user_names(User, [vendor_id for vendor_id, _, _ in vendor_stats], User.shop_name, User.organization_name)
+    for vendor_id, count, value in vendor_stats:
+        writer.writerow([vendor_names.get(vendor_id, 'Unknown'), count, f"£{value:.2f}"])
+    
+    writer.writerow([])
+    
+    writer.writerow(['BREAKDOWN BY TOWN'])
+    writer.writerow(['Town', 'Redemptions', 'Total Value (£)'])
+    for town, count, value in ledger.breakdown('town', 'redeem', start_date, end):
+        writer.writerow([town or 'Unknown', count, f"£{value:.2f}"])
+    
+    writer.writerow([])
+    
+    # Month by month
+    writer.writerow(['MONTHLY BREAKDOWN'])
+    writer.writerow(['Month', 'Vouchers Issued', 'Value Issued (£)', 'Redemptions', 'Value Redeemed (£)', 'Value Expired (£)'])
     
-    for org_name, stats in issuer_stats.items():
-        writer.writerow([org_name, stats['count'], f"£{stats['value']:.2f}"])
+    months = {}
+    for entry_type in ('issue', 'redeem', 'expire'):
+        for month, count, value in ledger.breakdown('month', entry_type, start_date, end):
+            months.setdefault(month, {})[entry_type] = (count, value)
+    for month in sorted(months):
+        issued, redeemed, expired = (months[month].get(t, (0, 0.0)) for t in ('issue', 'redeem', 'expire'))
+        writer.writerow([month, issued[0], f"{issued[1]:.2f}", redeemed[0], f"{redeemed[1]:.2f}", f"{expired[1]:.2f}"])
     
     writer.writerow([])
     
-    # Detailed transactions
+    # Detailed transactions, one row per ledger entry
     writer.writerow(['DETAILED TRANSACTIONS'])
     writer.writerow([
         'Date',
         'Voucher Code',
-        'Value (£)',
-        'Status',
+        'Transaction',
+        'Amount (£)',
+        'Balance After (£)',
         'Issuer',
         'Recipient',
         'Redeemed By'
     ])
     
-    for voucher in vouchers:
-        issuer = User.query.get(voucher.issued_by) if voucher.issued_by else None
-        recipient = User.query.get(voucher.recipient_id) if voucher.recipient_id else None
-        redeemer = User.query.get(voucher.redeemed_by) if hasattr(voucher, 'redeemed_by') and voucher.redeemed_by else None
-        
+    Issuer = aliased(User)
+    Recipient = aliased(User)
+    Vendor = aliased(User)
+    entries = in_range(
+        session.query(
+            VoucherLedger.created_at, Voucher.code, VoucherLedger.entry_type,
+            VoucherLedger.amount, VoucherLedger.balance_after, Issuer.organization_name,
+            Recipient.first_name, Recipient.last_name,
+            func.coalesce(Vendor.shop_name, Vendor.organization_name)
+        )
+        .join(Voucher, Voucher.id == VoucherLedger.voucher_id)
+        .outerjoin(Issuer, Issuer.id == Voucher.issued_by)
+        .outerjoin(Recipient, Recipient.id == VoucherLedger.recipient_id)
+        .outerjoin(Vendor, Vendor.id == VoucherLedger.vendor_id)
+    ).order_by(VoucherLedger.created_at, VoucherLedger.id)
+    
+    for created_at, code, entry_type, amount, balance, issuer, r_first, r_last, vendor in entries.yield_per(1000):
         writer.writerow([
-            voucher.created_at.strftime('%Y-%m-%d') if hasattr(voucher, 'created_at') else '',
-            voucher.code,
-            f"{voucher.value:.2f}",
-            voucher.status,
-            issuer.organization_name if issuer and hasattr(issuer, 'organization_name') else '',
-            f"{recipient.first_name} {recipient.last_name}" if recipient else '',
-            redeemer.organization_name if redeemer and hasattr(redeemer, 'organization_name') else ''
+            created_at.strftime('%Y-%m-%d') if created_at else '',
+            code,
+            entry_type,
+            f"{amount:.2f}",
+            f"{balance:.2f}",
+            issuer or '',
+            f"{r_first} {r_last}" if r_first or r_last else '',
+            vendor or ''
         ])
     
     return output.getvalue()
@@ -233,6 +296,9 @@ def export_impact_report_csv(Voucher, SurplusItem, User):
     """
     Generate impact report showing social and environmental impact
     """
+    from sqlalchemy import func
+    from ledger_analytics import ledger_frame
+
     output = io.StringIO()
     writer = csv.writer(output)
     
@@ -245,38 +311,49 @@ def export_impact_report_csv(Voucher, SurplusItem, User):
     writer.writerow(['VOUCHER PROGRAM IMPACT'])
     writer.writerow([])
     
-    all_vouchers = Voucher.query.all()
-    unique_recipients = len(set(v.recipient_id for v in all_vouchers if v.recipient_id))
-    total_value_distributed = sum(float(v.value) for v in all_vouchers)
+    session = Voucher.query.session
+    unique_recipients = session.query(func.count(func.distinct(Voucher.recipient_id))).scalar()
+    ledger = ledger_frame()
+    totals = ledger.totals()
     
     writer.writerow(['Total Families Served:', unique_recipients])
-    writer.writerow(['Total Value Distributed:', f"£{total_value_distributed:.2f}"])
-    writer.writerow(['Total Vouchers Issued:', len(all_vouchers)])
+    writer.writerow(['Total Value Distributed:', f"£{totals['issue']['amount']:.2f}"])
+    writer.writerow(['Total Value Spent at Local Shops:', f"£{totals['redeem']['amount']:.2f}"])
+    writer.writerow(['Total Vouchers Issued:', totals['issue']['count']])
+    writer.writerow([])
+    
+    writer.writerow(['SPENDING BY TOWN'])
+    writer.writerow(['Town', 'Redemptions', 'Value Spent (£)'])
+    for town, count, value in ledger.breakdown('town', 'redeem'):
+        writer.writerow([town or 'Unknown', count, f"£{value:.2f}"])
     writer.writerow([])
     
     # Surplus food impact
     writer.writerow(['SURPLUS FOOD PROGRAM IMPACT'])
     writer.writerow([])
     
-    all_surplus = SurplusItem.query.all() if SurplusItem else []
-    total_items_posted = len(all_surplus)
-    claimed_items = [s for s in all_surplus if s.status == 'claimed']
+    surplus_counts = dict(
+        session.query(SurplusItem.status, func.count(SurplusItem.id)).group_by(SurplusItem.status).all()
+    ) if SurplusItem else {}
+    claimed_items = surplus_counts.get('claimed', 0)
     
-    writer.writerow(['Total Surplus Items Posted:', total_items_posted])
-    writer.writerow(['Total Items Claimed:', len(claimed_items)])
-    writer.writerow(['Food Waste Prevented:', f"{len(claimed_items)} items"])
+    writer.writerow(['Total Surplus Items Posted:', sum(surplus_counts.values())])
+    writer.writerow(['Total Items Claimed:', claimed_items])
+    writer.writerow(['Food Waste Prevented:', f"{claimed_items} items"])
     writer.writerow([])
     
     # Participating organizations
     writer.writerow(['PARTICIPATING ORGANIZATIONS'])
     writer.writerow([])
     
-    vcse_orgs = User.query.filter_by(user_type='vcse').count()
-    vendors = User.query.filter_by(user_type='vendor').count()
-    schools = User.query.filter_by(user_type='school').count()
+    user_counts = dict(
+        session.query(User.user_type, func.count(User.id))
+        .filter(User.user_type.in_(('vcse', 'vendor', 'school')))
+        .group_by(User.user_type).all()
+    )
     
-    writer.writerow(['VCFSE Organizations:', vcse_orgs])
-    writer.writerow(['Local Food Shops:', vendors])
-    writer.writerow(['Schools:', schools])
+    writer.writerow(['VCFSE Organizations:', user_counts.get('vcse', 0)])
+    writer.writerow(['Local Food Shops:', user_counts.get('vendor', 0)])
+    writer.writerow(['Schools:', user_counts.get('school', 0)])
     
     return output.getvalue()
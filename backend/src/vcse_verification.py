@@ -5,6 +5,8 @@ Handles approval/rejection of VCFSE organization registrations
 from flask import Blueprint, request, jsonify, session
 from datetime import datetime
 
+from auth import get_principal
+
 def init_vcse_verification(app, db, User, email_service):
     """Initialize VCFSE verification endpoints"""
     
@@ -16,7 +18,7 @@ def init_vcse_verification(app, db, User, email_service):
             if not user_id:
                 return jsonify({'error': 'Not authenticated'}), 401
             
-            admin = User.query.get(user_id)
+            admin = get_principal()
             if not admin or admin.user_type != 'admin':
                 return jsonify({'error': 'Unauthorized - Admin access required'}), 403
             
@@ -59,7 +61,7 @@ def init_vcse_verification(app, db, User, email_service):
             if not user_id:
                 return jsonify({'error': 'Not authenticated'}), 401
             
-            admin = User.query.get(user_id)
+            admin = get_principal()
             if not admin or admin.user_type != 'admin':
                 return jsonify({'error': 'Unauthorized - Admin access required'}), 403
             
@@ -114,7 +116,7 @@ def init_vcse_verification(app, db, User, email_service):
             if not user_id:
                 return jsonify({'error': 'Not authenticated'}), 401
             
-            admin = User.query.get(user_id)
+            admin = get_principal()
             if not admin or admin.user_type != 'admin':
                 return jsonify({'error': 'Unauthorized - Admin access required'}), 403
             
@@ -172,7 +174,7 @@ def init_vcse_verification(app, db, User, email_service):
             if not user_id:
                 return jsonify({'error': 'Not authenticated'}), 401
             
-            admin = User.query.get(user_id)
+            admin = get_principal()
             if not admin or admin.user_type != 'admin':
                 return jsonify({'error': 'Unauthorized - Admin access required'}), 403
             
@@ -4,6 +4,9 @@ Provides analytics and performance tracking for vendors
 """
 
 from flask import Blueprint, request, jsonify, session
+from auth import get_principal
+from voucher_ledger import redemption_query, redeemed_total
+from shop_balances import vendor_balances, sum_balances
 from datetime import datetime, timedelta
 from sqlalchemy import func, and_, or_
 import logging
@@ -19,6 +22,7 @@ Voucher = None
 SurplusItem = None
 Transaction = None
 VendorShop = None
+VoucherLedger = None
 
 @vendor_metrics_bp.route('/api/vendor/metrics/overview', methods=['GET'])
 def get_vendor_overview():
@@ -30,7 +34,7 @@ def get_vendor_overview():
         if 'user_id' not in session:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(session['user_id'])
+        user = get_principal()
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
@@ -65,15 +69,15 @@ def get_vendor_overview():
         else:  # all
             start_date = datetime(2020, 1, 1)
         
-        # Get voucher redemption statistics
-        redeemed_vouchers = Voucher.query.filter(
-            Voucher.redeemed_by_vendor == vendor_id,
-            Voucher.status == 'redeemed',
-            Voucher.redeemed_at >= start_date
-        ).all()
-        
-        total_vouchers_redeemed = len(redeemed_vouchers)
-        total_revenue = sum(v.value for v in redeemed_vouchers)
+        # Get voucher redemption statistics (every partial redemption counts)
+        total_redemptions, total_vouchers_redeemed, total_revenue, unique_customers = redemption_query(
+            func.count(VoucherLedger.id),
+            func.count(func.distinct(VoucherLedger.voucher_id)),
+            redeemed_total(),
+            func.count(func.distinct(VoucherLedger.recipient_id)),
+            vendor_id=vendor_id, start=start_date
+        ).one()
+        total_revenue = float(total_revenue)
         
         # Get Food To Go statistics
         togo_items = SurplusItem.query.filter(
@@ -93,22 +97,20 @@ def get_vendor_overview():
         shop_count = VendorShop.query.filter_by(vendor_id=vendor_id, is_active=True).count()
         
         # Calculate average transaction value
-        avg_transaction_value = total_revenue / total_vouchers_redeemed if total_vouchers_redeemed > 0 else 0
-        
-        # Get unique customers
-        unique_customers = len(set(v.recipient_id for v in redeemed_vouchers if v.recipient_id))
+        avg_transaction_value = total_revenue / total_redemptions if total_redemptions > 0 else 0
         
         # Calculate trends (compare with previous period)
         previous_start = start_date - (end_date - start_date)
-        previous_redeemed = Voucher.query.filter(
-            Voucher.redeemed_by_vendor == vendor_id,
-            Voucher.status == 'redeemed',
-            Voucher.redeemed_at >= previous_start,
-            Voucher.redeemed_at < start_date
-        ).count()
+        previous_redeemed = redemption_query(
+            func.count(func.distinct(VoucherLedger.voucher_id)),
+            vendor_id=vendor_id, start=previous_start, end=start_date
+        ).scalar()
         
         voucher_trend = ((total_vouchers_redeemed - previous_redeemed) / previous_redeemed * 100) if previous_redeemed > 0 else 0
         
+        # Lifetime, this-month and payout figures from the per-shop running totals
+        balance = sum_balances(vendor_balances(vendor_id).values())
+        
         return jsonify({
             'vendor_id': vendor_id,
             'vendor_name': vendor.shop_name or vendor.organization_name,
@@ -119,12 +121,20 @@ def get_vendor_overview():
             },
             'metrics': {
                 'total_vouchers_redeemed': total_vouchers_redeemed,
+                'total_redemptions': total_redemptions,
                 'total_revenue': round(total_revenue, 2),
                 'average_transaction_value': round(avg_transaction_value, 2),
                 'unique_customers': unique_customers,
                 'shop_count': shop_count,
                 'voucher_trend': round(voucher_trend, 1)
             },
+            'balance': {
+                'lifetime_revenue': balance['redeemed_total'],
+                'redeemed_this_month': balance['redeemed_this_period'],
+                'paid_out': balance['paid_out_total'],
+                'pending_payouts': balance['pending_payouts'],
+                'available_to_pay_out': balance['available_to_pay_out']
+            },
             'food_to_go': {
                 'total_items_posted': total_togo_items,
                 'items_claimed': claimed_togo_items,
@@ -149,7 +159,7 @@ def get_revenue_trend():
         if 'user_id' not in session:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(session['user_id'])
+        user = get_principal()
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
@@ -179,25 +189,24 @@ def get_revenue_trend():
         else:  # year
             start_date = end_date - timedelta(days=365)
         
-        # Get redeemed vouchers
-        vouchers = Voucher.query.filter(
-            Voucher.redeemed_by_vendor == vendor_id,
-            Voucher.status == 'redeemed',
-            Voucher.redeemed_at >= start_date
+        # Get redemptions (just the two columns needed, from the ledger index)
+        redemptions = redemption_query(
+            VoucherLedger.created_at, (-VoucherLedger.amount).label('amount'),
+            vendor_id=vendor_id, start=start_date
         ).all()
         
         # Group by time period
         trend_data = {}
         
-        for voucher in vouchers:
+        for redeemed_at, amount in redemptions:
             if group_by == 'day':
-                key = voucher.redeemed_at.strftime('%Y-%m-%d')
+                key = redeemed_at.strftime('%Y-%m-%d')
             elif group_by == 'week':
                 # Get start of week (Monday)
-                week_start = voucher.redeemed_at - timedelta(days=voucher.redeemed_at.weekday())
+                week_start = redeemed_at - timedelta(days=redeemed_at.weekday())
                 key = week_start.strftime('%Y-%m-%d')
             else:  # month
-                key = voucher.redeemed_at.strftime('%Y-%m')
+                key = redeemed_at.strftime('%Y-%m')
             
             if key not in trend_data:
                 trend_data[key] = {
@@ -206,7 +215,7 @@ def get_revenue_trend():
                     'voucher_count': 0
                 }
             
-            trend_data[key]['revenue'] += voucher.value
+            trend_data[key]['revenue'] += amount
             trend_data[key]['voucher_count'] += 1
         
         # Sort by date
@@ -237,7 +246,7 @@ def get_top_customers():
         if 'user_id' not in session:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(session['user_id'])
+        user = get_principal()
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
@@ -270,19 +279,18 @@ def get_top_customers():
             start_date = datetime(2020, 1, 1)
         
         # Get customer statistics
-        customer_stats = db.session.query(
-            Voucher.recipient_id,
-            func.count(Voucher.id).label('voucher_count'),
-            func.sum(Voucher.value).label('total_spent')
+        total_spent = redeemed_total()
+        customer_stats = redemption_query(
+            VoucherLedger.recipient_id,
+            func.count(VoucherLedger.id).label('voucher_count'),
+            total_spent.label('total_spent'),
+            vendor_id=vendor_id, start=start_date
         ).filter(
-            Voucher.redeemed_by_vendor == vendor_id,
-            Voucher.status == 'redeemed',
-            Voucher.redeemed_at >= start_date,
-            Voucher.recipient_id.isnot(None)
+            VoucherLedger.recipient_id.isnot(None)
         ).group_by(
-            Voucher.recipient_id
+            VoucherLedger.recipient_id
         ).order_by(
-            func.sum(Voucher.value).desc()
+            total_spent.desc()
         ).limit(limit).all()
         
         # Get customer details
@@ -319,7 +327,7 @@ def get_category_breakdown():
         if 'user_id' not in session:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(session['user_id'])
+        user = get_principal()
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
@@ -400,7 +408,7 @@ def get_performance_score():
         if 'user_id' not in session:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(session['user_id'])
+        user = get_principal()
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
@@ -419,12 +427,14 @@ def get_performance_score():
         end_date = datetime.utcnow()
         start_date = end_date - timedelta(days=30)
         
+        # Redemption timestamps and customers for the period, in one indexed range read
+        redemptions = redemption_query(
+            VoucherLedger.created_at, VoucherLedger.recipient_id,
+            vendor_id=vendor_id, start=start_date
+        ).all()
+        
         # 1. Voucher Redemption Activity (40 points)
-        redeemed_count = Voucher.query.filter(
-            Voucher.redeemed_by_vendor == vendor_id,
-            Voucher.status == 'redeemed',
-            Voucher.redeemed_at >= start_date
-        ).count()
+        redeemed_count = len(redemptions)
         
         # Score based on redemptions (0-40 points)
         # 0 redemptions = 0 points, 50+ redemptions = 40 points
@@ -445,13 +455,7 @@ def get_performance_score():
         togo_score = posting_score + collection_score
         
         # 3. Customer Diversity (15 points)
-        unique_customers = db.session.query(
-            func.count(func.distinct(Voucher.recipient_id))
-        ).filter(
-            Voucher.redeemed_by_vendor == vendor_id,
-            Voucher.status == 'redeemed',
-            Voucher.redeemed_at >= start_date
-        ).scalar()
+        unique_customers = len({recipient_id for _, recipient_id in redemptions if recipient_id})
         
         # Score based on unique customers (0-15 points)
         # 0 customers = 0 points, 30+ customers = 15 points
@@ -464,14 +468,7 @@ def get_performance_score():
             week_start = end_date - timedelta(days=(week + 1) * 7)
             week_end = end_date - timedelta(days=week * 7)
             
-            activity = Voucher.query.filter(
-                Voucher.redeemed_by_vendor == vendor_id,
-                Voucher.status == 'redeemed',
-                Voucher.redeemed_at >= week_start,
-                Voucher.redeemed_at < week_end
-            ).count()
-            
-            if activity > 0:
+            if any(week_start <= redeemed_at < week_end for redeemed_at, _ in redemptions):
                 weeks_with_activity += 1
         
         consistency_score = (weeks_with_activity / 4) * 15
@@ -536,7 +533,7 @@ def get_vendor_comparison():
         if 'user_id' not in session:
             return jsonify({'error': 'Not authenticated'}), 401
         
-        user = User.query.get(session['user_id'])
+        user = get_principal()
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         
@@ -558,25 +555,25 @@ def get_vendor_comparison():
             start_date = datetime(2020, 1, 1)
         
         # Get vendor statistics
-        vendor_stats = db.session.query(
-            Voucher.redeemed_by_vendor,
-            func.count(Voucher.id).label('voucher_count'),
-            func.sum(Voucher.value).label('total_revenue'),
-            func.count(func.distinct(Voucher.recipient_id)).label('unique_customers')
+        total_revenue = redeemed_total()
+        vendor_stats = redemption_query(
+            VoucherLedger.vendor_id,
+            func.count(VoucherLedger.id).label('voucher_count'),
+            total_revenue.label('total_revenue'),
+            func.count(func.distinct(VoucherLedger.recipient_id)).label('unique_customers'),
+            start=start_date
         ).filter(
-            Voucher.status == 'redeemed',
-            Voucher.redeemed_at >= start_date,
-            Voucher.redeemed_by_vendor.isnot(None)
+            VoucherLedger.vendor_id.isnot(None)
         ).group_by(
-            Voucher.redeemed_by_vendor
+            VoucherLedger.vendor_id
         ).order_by(
-            func.sum(Voucher.value).desc()
+            total_revenue.desc()
         ).limit(limit).all()
         
         # Get vendor details and Food To Go stats
         vendors = []
         for stat in vendor_stats:
-            vendor = User.query.get(stat.redeemed_by_vendor)
+            vendor = User.query.get(stat.vendor_id)
             if vendor:
                 # Get Food To Go stats
                 togo_count = SurplusItem.query.filter(
@@ -604,7 +601,7 @@ def get_vendor_comparison():
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
 
-def init_vendor_metrics(database, user_model, voucher_model, surplus_model, transaction_model, shop_model):
+def init_vendor_metrics(database, user_model, voucher_model, surplus_model, transaction_model, shop_model, ledger_model):
     """
     Initialize vendor metrics system
     
@@ -615,8 +612,9 @@ def init_vendor_metrics(database, user_model, voucher_model, surplus_model, tran
         surplus_model: SurplusItem model class
         transaction_model: Transaction model class
         shop_model: VendorShop model class
+        ledger_model: VoucherLedger model class
     """
-    global db, User, Voucher, SurplusItem, Transaction, VendorShop
+    global db, User, Voucher, SurplusItem, Transaction, VendorShop, VoucherLedger
     
     db = database
     User = user_model
@@ -624,5 +622,6 @@ def init_vendor_metrics(database, user_model, voucher_model, surplus_model, tran
     SurplusItem = surplus_model
     Transaction = transaction_model
     VendorShop = shop_model
+    VoucherLedger = ledger_model
     
     logger.info("Vendor metrics system initialized")
@@ -0,0 +1,282 @@
+"""
+Voucher Validation Cache
+Read-through, per-worker cache of the voucher state vendors check at the till
+
+Entries map a voucher code to what validation needs: id, status, balance,
+expiry, recipient display details and the shops it is restricted to. Each
+entry carries the voucher's cache_version, which is bumped in the same UPDATE
+as any change to those fields (redemption approval, reassignment, expiry,
+shop changes - see _bump_versions), so:
+
+- within VOUCHER_CACHE_TTL seconds an entry is served without touching the DB;
+- after that it is revalidated with a single-column lookup of cache_version
+  and only reloaded if the version moved;
+- after VOUCHER_CACHE_MAX_AGE seconds it is reloaded regardless, which bounds
+  how stale recipient names and phone numbers can get.
+
+Writes in this worker evict their entries as soon as they commit. Other gunicorn
+workers see a change within VOUCHER_CACHE_TTL, so cached state is only ever
+used to answer validation and to skip lookups; redemption still re-reads the
+voucher under a row lock and only uses the cached extras if the versions match.
+
+A vendor's active shops are cached the same way (TTL only), keyed by vendor ID.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from sqlalchemy import event, inspect as sa_inspect, select
+
+logger = logging.getLogger(__name__)
+
+VOUCHER_CACHE_TTL = float(os.environ.get('VOUCHER_CACHE_TTL', '2'))
+VOUCHER_CACHE_MAX_AGE = float(os.environ.get('VOUCHER_CACHE_MAX_AGE', '300'))
+VOUCHER_CACHE_SIZE = int(os.environ.get('VOUCHER_CACHE_SIZE', '10000'))
+
+# Voucher columns whose change must invalidate cached validation state
+TRACKED_FIELDS = ('code', 'status', 'value', 'expiry_date', 'recipient_id', 'any_shop', 'vendor_restrictions')
+
+VoucherState = namedtuple('VoucherState', [
+    'id', 'code', 'status', 'value', 'expiry_date', 'recipient_id',
+    'recipient_name', 'recipient_phone', 'shop_ids', 'version'
+])
+VoucherState.__doc__ = """Cached validation state; shop_ids is a frozenset, or None for any shop"""
+
+# Global references
+db = None
+Voucher = None
+VoucherShop = None
+VendorShop = None
+User = None
+
+
+class TTLCache:
+    """Small thread-safe LRU of (value, loaded_at, checked_at) entries"""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, value, loaded_at=None):
+        now = time.monotonic()
+        with self._lock:
+            self._entries[key] = (value, loaded_at or now, now)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def touch(self, key):
+        """Mark an entry as checked against the database just now"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = (entry[0], entry[1], time.monotonic())
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_vouchers = TTLCache(VOUCHER_CACHE_SIZE)
+_vendor_shops = TTLCache(VOUCHER_CACHE_SIZE)
+_MISSING = object()  # cached "no voucher with this code"
+
+
+def init_voucher_cache(app_db, voucher_model, voucher_shop_model, vendor_shop_model, user_model):
+    """Initialize the validation cache with database models"""
+    global db, Voucher, VoucherShop, VendorShop, User
+    db = app_db
+    Voucher = voucher_model
+    VoucherShop = voucher_shop_model
+    VendorShop = vendor_shop_model
+    User = user_model
+    event.listen(db.session, 'before_flush', _bump_versions)
+    event.listen(db.session, 'after_commit', _evict_committed)
+    event.listen(db.session, 'after_soft_rollback', _forget_pending)
+    logger.info("Voucher validation cache initialized")
+
+
+# ============================================
+# Invalidation
+# ============================================
+
+def _changed(obj, fields):
+    state = sa_inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in fields)
+
+
+def _bump_versions(session, flush_context, instances):
+    """Bump cache_version on vouchers whose validation state changes in this flush"""
+    codes = session.info.setdefault('voucher_cache_evict', set())
+    vendors = session.info.setdefault('vendor_shops_evict', set())
+
+    for obj in session.dirty:
+        if isinstance(obj, Voucher) and _changed(obj, TRACKED_FIELDS):
+            # SQL expression, so concurrent writers can't both write the same version
+            obj.cache_version = Voucher.cache_version + 1
+            codes.add(obj.code)
+            history = sa_inspect(obj).attrs.code.history
+            codes.update(history.deleted or ())
+        elif isinstance(obj, VendorShop):
+            vendors.add(obj.vendor_id)
+
+    for obj in session.new:
+        if isinstance(obj, Voucher):
+            codes.add(obj.code)  # drop a cached "no such code"
+        elif isinstance(obj, VendorShop):
+            vendors.add(obj.vendor_id)
+
+    for obj in session.deleted:
+        if isinstance(obj, Voucher):
+            codes.add(obj.code)
+        elif isinstance(obj, VendorShop):
+            vendors.add(obj.vendor_id)
+
+
+def _evict_committed(session):
+    for code in session.info.pop('voucher_cache_evict', ()):
+        _vouchers.pop(code)
+    for vendor_id in session.info.pop('vendor_shops_evict', ()):
+        _vendor_shops.pop(vendor_id)
+
+
+def _forget_pending(session, previous_transaction):
+    session.info.pop('voucher_cache_evict', None)
+    session.info.pop('vendor_shops_evict', None)
+
+
+def invalidate_voucher(code):
+    """Drop a code from this worker's cache (for writes that bypass the ORM)"""
+    _vouchers.pop(code)
+
+
+def clear_cache():
+    """Empty both caches in this worker"""
+    _vouchers.clear()
+    _vendor_shops.clear()
+
+
+def cache_stats():
+    """Hit/miss counters for this worker"""
+    return {
+        'vouchers': len(_vouchers),
+        'vendors': len(_vendor_shops),
+        'hits': _vouchers.hits,
+        'misses': _vouchers.misses,
+        'revalidations': _vouchers.revalidations
+    }
+
+
+# ============================================
+# Lookups
+# ============================================
+
+def _load_voucher_state(code):
+    row = db.session.execute(
+        select(
+            Voucher.id, Voucher.code, Voucher.status, Voucher.value, Voucher.expiry_date,
+            Voucher.recipient_id, Voucher.any_shop, Voucher.cache_version,
+            User.first_name, User.last_name, User.phone
+        ).outerjoin(User, User.id == Voucher.recipient_id).where(Voucher.code == code)
+    ).first()
+    if row is None:
+        return None
+
+    shop_ids = None
+    if not row.any_shop:
+        shop_ids = frozenset(db.session.execute(
+            select(VoucherShop.shop_id).where(VoucherShop.voucher_id == row.id)
+        ).scalars())
+
+    return VoucherState(
+        id=row.id,
+        code=row.code,
+        status=row.status,
+        value=float(row.value),
+        expiry_date=row.expiry_date,
+        recipient_id=row.recipient_id,
+        recipient_name=f"{row.first_name} {row.last_name}" if row.recipient_id and row.first_name is not None else None,
+        recipient_phone=row.phone,
+        shop_ids=shop_ids,
+        version=row.cache_version or 0
+    )
+
+
+def get_voucher_state(code):
+    """
+    Validation state for a voucher code, from the cache when possible
+
+    Returns:
+        VoucherState: The state, or None if there is no voucher with that code
+    """
+    now = time.monotonic()
+    entry = _vouchers.get(code)
+
+    if entry is not None:
+        state, loaded_at, checked_at = entry
+        if now - checked_at < VOUCHER_CACHE_TTL:
+            _vouchers.hits += 1
+            return None if state is _MISSING else state
+
+        if state is not _MISSING and now - loaded_at < VOUCHER_CACHE_MAX_AGE:
+            _vouchers.revalidations += 1
+            version = db.session.execute(
+                select(Voucher.cache_version).where(Voucher.id == state.id)
+            ).scalar()
+            if version is not None and version == state.version and state.code == code:
+                _vouchers.touch(code)
+                return state
+
+    _vouchers.misses += 1
+    state = _load_voucher_state(code)
+    _vouchers.put(code, _MISSING if state is None else state)
+    return state
+
+
+def get_vendor_shops(vendor_id):
+    """
+    A vendor's active shops, cached for VOUCHER_CACHE_TTL
+
+    Returns:
+        tuple: (shop_id, shop_name) pairs ordered by shop ID
+    """
+    entry = _vendor_shops.get(vendor_id)
+    if entry is not None and time.monotonic() - entry[2] < VOUCHER_CACHE_TTL:
+        return entry[0]
+
+    shops = tuple(db.session.execute(
+        select(VendorShop.id, VendorShop.shop_name)
+        .where(VendorShop.vendor_id == vendor_id, VendorShop.is_active == True)
+        .order_by(VendorShop.id)
+    ).tuples())
+    _vendor_shops.put(vendor_id, shops)
+    return shops
+
+
+def eligible_vendor_shops(state, vendor_id):
+    """The vendor's active shops that accept a voucher, as (shop_id, shop_name) pairs"""
+    shops = get_vendor_shops(vendor_id)
+    if state.shop_ids is None:
+        return shops
+    return tuple(shop for shop in shops if shop[0] in state.shop_ids)
@@ -0,0 +1,363 @@
+"""
+Voucher Ledger
+Append-only history of every change to a voucher's balance
+
+Each voucher has one voucher_ledger row per balance change, with a signed
+amount and the balance after it:
+
+    issue       +value when the voucher is created
+    redeem      -amount spent at a shop (vendor, shop and redemption request recorded)
+    expire      -whatever was left when the voucher expired
+    reassign    -balance on the old voucher, +balance on the new one
+    adjust      any other direct change to voucher.value
+
+voucher.value is the cached running balance (the sum of its entries), so
+validation and redemption still read a single row. Reports read the ledger
+instead: "redeemed in this period" is an indexed range sum over redeem entries
+rather than a scan of vouchers guessing from whatever balance is left.
+
+Redemptions and reassignments are recorded explicitly with record_redemption()
+and record_reassignment(); a redemption also moves the shop's running totals
+(shop_balances.py) in the same transaction. Issue, expire and adjust entries are added by a
+before_flush hook, so every code path that creates a voucher, expires it or
+edits its value keeps the ledger complete without knowing about it.
+"""
+
+import logging
+from datetime import datetime
+
+from sqlalchemy import event, func, text
+from sqlalchemy import inspect as sa_inspect
+
+from shop_balances import add_redemption
+
+logger = logging.getLogger(__name__)
+
+ENTRY_TYPES = ('issue', 'redeem', 'expire', 'reassign', 'adjust')
+
+# Global references
+db = None
+Voucher = None
+VoucherLedger = None
+
+
+def init_voucher_ledger(app_db, voucher_model, ledger_model):
+    """Initialize the voucher ledger with database models"""
+    global db, Voucher, VoucherLedger
+    db = app_db
+    Voucher = voucher_model
+    VoucherLedger = ledger_model
+    event.listen(db.session, 'before_flush', _follow_voucher_changes)
+    logger.info("Voucher ledger initialized")
+
+
+# ============================================
+# Recording
+# ============================================
+
+def _entry(voucher, entry_type, amount, balance_after, **fields):
+    entry = VoucherLedger(
+        voucher=voucher,
+        entry_type=entry_type,
+        amount=round(amount, 2),
+        balance_after=round(balance_after, 2),
+        recipient_id=fields.pop('recipient_id', voucher.recipient_id),
+        created_at=datetime.utcnow(),
+        **fields
+    )
+    db.session.add(entry)
+    return entry
+
+
+def _record(voucher, entry_type, amount, **fields):
+    """Apply a signed amount to voucher.value and append the matching entry"""
+    balance = round(float(voucher.value or 0) + amount, 2)
+    voucher.value = balance
+    return _entry(voucher, entry_type, amount, balance, **fields)
+
+
+def record_redemption(voucher, amount, vendor_id, shop_id, redemption_request_id=None):
+    """
+    Spend part or all of a voucher's balance at a shop
+
+    The caller should hold the voucher row lock (with_for_update) so two
+    redemptions can't both spend the same balance. Marks the voucher redeemed
+    when the balance reaches zero. Does not commit.
+
+    Args:
+        voucher: Voucher instance
+        amount: Amount spent (positive)
+        vendor_id: Vendor who redeemed it
+        shop_id: Shop it was redeemed at
+        redemption_request_id: Approved RedemptionRequest, if any
+
+    Returns:
+        float: The new balance
+
+    Raises:
+        ValueError: If the amount isn't positive or exceeds the balance
+    """
+    amount = round(float(amount), 2)
+    balance = round(float(voucher.value or 0), 2)
+    if amount <= 0:
+        raise ValueError('Redemption amount must be greater than 0')
+    if amount > balance:
+        raise ValueError(f'Redemption amount £{amount:.2f} exceeds voucher balance £{balance:.2f}')
+
+    _record(
+        voucher, 'redeem', -amount,
+        vendor_id=vendor_id,
+        shop_id=shop_id,
+        redemption_request_id=redemption_request_id
+    )
+    if shop_id:
+        add_redemption(shop_id, vendor_id, amount)
+    voucher.redeemed_by_vendor = vendor_id
+    voucher.redeemed_at_shop_id = shop_id
+    if voucher.value <= 0:
+        voucher.status = 'redeemed'
+        voucher.redeemed_at = datetime.utcnow()
+    return voucher.value
+
+
+def record_reassignment(old_voucher, new_voucher):
+    """
+    Move the remaining balance of a voucher to its replacement
+
+    Call before anything flushes the new voucher, so it gets a reassign entry
+    instead of an issue entry. Does not commit.
+
+    Returns:
+        float: The amount moved
+    """
+    amount = round(float(old_voucher.value or 0), 2)
+    _record(old_voucher, 'reassign', -amount, related_voucher=new_voucher)
+    new_voucher.value = amount
+    _entry(new_voucher, 'reassign', amount, amount, related_voucher=old_voucher,
+           recipient_id=new_voucher.recipient_id)
+    return amount
+
+
+def _follow_voucher_changes(session, flush_context, instances):
+    """Add issue/expire/adjust entries for voucher changes not recorded explicitly"""
+    recorded = {obj.voucher for obj in session.new if isinstance(obj, VoucherLedger)}
+
+    for obj in list(session.new):
+        if isinstance(obj, Voucher) and obj not in recorded:
+            value = round(float(obj.value or 0), 2)
+            _entry(obj, 'issue', value, value)
+
+    for obj in list(session.dirty):
+        if not isinstance(obj, Voucher) or obj in recorded:
+            continue
+        state = sa_inspect(obj)
+        status = state.attrs.status.history
+        value = state.attrs.value.history
+
+        if status.added and status.added[0] == 'expired' and 'expired' not in (status.deleted or ()):
+            balance = round(float(obj.value or 0), 2)
+            if balance > 0:
+                _record(obj, 'expire', -balance)
+        elif value.has_changes():
+            if value.deleted:
+                previous = value.deleted[0]
+            else:
+                # Value was assigned without being loaded first
+                with session.no_autoflush:
+                    previous = session.query(Voucher.value).filter(Voucher.id == obj.id).scalar()
+            change = round(float(obj.value or 0) - float(previous or 0), 2)
+            if change:
+                _entry(obj, 'adjust', change, float(obj.value or 0))
+
+
+# ============================================
+# Reporting
+# ============================================
+
+def _in_range(query, start=None, end=None):
+    """Entries created in [start, end)"""
+    if start is not None:
+        query = query.filter(VoucherLedger.created_at >= start)
+    if end is not None:
+        query = query.filter(VoucherLedger.created_at < end)
+    return query
+
+
+def redeemed_total():
+    """SQL expression for the value redeemed by the rows of a redemption_query()"""
+    return func.coalesce(-func.sum(VoucherLedger.amount), 0)
+
+
+def redemption_query(*columns, vendor_id=None, start=None, end=None):
+    """
+    Query over redeem entries, optionally for one vendor and a date range
+
+        count, revenue = redemption_query(func.count(VoucherLedger.id), redeemed_total(),
+                                          vendor_id=vendor_id, start=start_date).one()
+
+    Served by the (vendor_id, created_at) and (entry_type, created_at) indexes.
+    """
+    query = db.session.query(*columns).filter(VoucherLedger.entry_type == 'redeem')
+    if vendor_id is not None:
+        query = query.filter(VoucherLedger.vendor_id == vendor_id)
+    return _in_range(query, start, end)
+
+
+def ledger_totals(start=None, end=None, issued_by=None):
+    """
+    Entry counts and values by type over a date range
+
+    Args:
+        start, end: Optional datetime range [start, end)
+        issued_by: Only vouchers issued by this user
+
+    Returns:
+        dict: entry_type -> {'count': int, 'amount': float}; amounts are the
+              value moved (issued, redeemed, expired), so always positive
+              except for the net of 'reassign' and 'adjust'
+    """
+    query = db.session.query(
+        VoucherLedger.entry_type,
+        func.count(VoucherLedger.id),
+        func.coalesce(func.sum(VoucherLedger.amount), 0)
+    ).group_by(VoucherLedger.entry_type)
+    if issued_by is not None:
+        query = query.join(Voucher, Voucher.id == VoucherLedger.voucher_id).filter(Voucher.issued_by == issued_by)
+
+    totals = {entry_type: {'count': 0, 'amount': 0.0} for entry_type in ENTRY_TYPES}
+    for entry_type, count, amount in _in_range(query, start, end):
+        amount = round(float(amount), 2)
+        totals[entry_type] = {'count': count, 'amount': -amount if entry_type in ('redeem', 'expire') else amount}
+    return totals
+
+
+def expired_amounts(voucher_ids):
+    """
+    Balance written off when each voucher expired
+
+    Returns:
+        dict: voucher_id -> amount
+    """
+    if not voucher_ids:
+        return {}
+    rows = db.session.query(VoucherLedger.voucher_id, (-func.sum(VoucherLedger.amount)).label('amount')).filter(
+        VoucherLedger.entry_type == 'expire',
+        VoucherLedger.voucher_id.in_(list(voucher_ids))
+    ).group_by(VoucherLedger.voucher_id)
+    return {voucher_id: round(float(amount), 2) for voucher_id, amount in rows}
+
+
+def find_balance_mismatches(limit=100):
+    """
+    Vouchers whose cached balance differs from the sum of their ledger entries
+
+    Returns:
+        list: (voucher_id, cached_balance, ledger_balance) tuples
+    """
+    ledger_balance = func.coalesce(func.sum(VoucherLedger.amount), 0)
+    rows = db.session.query(Voucher.id, Voucher.value, ledger_balance).outerjoin(
+        VoucherLedger, VoucherLedger.voucher_id == Voucher.id
+    ).group_by(Voucher.id, Voucher.value).having(
+        func.abs(Voucher.value - ledger_balance) >= 0.005
+    ).limit(limit)
+    return [(voucher_id, float(value), round(float(balance), 2)) for voucher_id, value, balance in rows]
+
+
+# ============================================
+# Backfill
+# ============================================
+
+def backfill_voucher_ledger(connection, batch_size=500):
+    """
+    Reconstruct ledger entries for vouchers that have none
+
+    For each voucher: an issue entry for its original value (current balance
+    plus approved redemption requests), a redeem entry per approved request,
+    and a closing entry for the remaining balance of vouchers that are
+    expired, reassigned or were fully redeemed by the old single-step route
+    (which left value untouched). Those closing entries bring voucher.value to
+    zero. Safe to run more than once.
+
+    Args:
+        connection: SQLAlchemy Connection (the caller owns the transaction)
+        batch_size: Vouchers read per batch
+
+    Returns:
+        int: Number of vouchers backfilled
+    """
+    now = datetime.utcnow()
+    last_id = 0
+    backfilled = 0
+
+    while True:
+        vouchers = connection.execute(text("""
+            SELECT v.id, v.value, v.status, v.recipient_id, v.created_at, v.expiry_date,
+                   v.redeemed_at, v.redeemed_by_vendor, v.redeemed_at_shop_id
+            FROM voucher v
+            WHERE v.id > :last_id
+              AND NOT EXISTS (SELECT 1 FROM voucher_ledger l WHERE l.voucher_id = v.id)
+            ORDER BY v.id LIMIT :limit
+        """), {'last_id': last_id, 'limit': batch_size}).fetchall()
+        if not vouchers:
+            break
+        last_id = vouchers[-1].id
+
+        redemptions = {}
+        for row in connection.execute(text("""
+            SELECT voucher_id, id, amount, vendor_id, shop_id, recipient_id,
+                   COALESCE(responded_at, created_at) AS redeemed_at
+            FROM redemption_request
+            WHERE status = 'approved' AND voucher_id BETWEEN :first_id AND :last_id
+            ORDER BY voucher_id, COALESCE(responded_at, created_at), id
+        """), {'first_id': vouchers[0].id, 'last_id': last_id}):
+            redemptions.setdefault(row.voucher_id, []).append(row)
+
+        entries = []
+        closed = []
+        for voucher in vouchers:
+            approved = redemptions.get(voucher.id, [])
+            balance = round(float(voucher.value or 0), 2)
+            created_at = voucher.created_at or now
+
+            # (entry_type, signed amount, when, extra columns) in order
+            changes = [('issue', balance + sum(float(r.amount) for r in approved), created_at, {})]
+            changes += [
+                ('redeem', -float(r.amount), r.redeemed_at, {
+                    'recipient_id': r.recipient_id, 'vendor_id': r.vendor_id,
+                    'shop_id': r.shop_id, 'redemption_request_id': r.id
+                })
+                for r in approved
+            ]
+            if balance > 0 and voucher.status == 'redeemed' and not approved:
+                changes.append(('redeem', -balance, voucher.redeemed_at, {
+                    'vendor_id': voucher.redeemed_by_vendor, 'shop_id': voucher.redeemed_at_shop_id
+                }))
+            elif balance > 0 and voucher.status == 'expired':
+                changes.append(('expire', -balance, voucher.expiry_date, {}))
+            elif balance > 0 and voucher.status == 'reassigned':
+                changes.append(('reassign', -balance, now, {}))  # when isn't recorded anywhere
+
+            running = 0.0
+            for entry_type, amount, when, fields in changes:
+                running = round(running + amount, 2)
+                entries.append(dict({
+                    'voucher_id': voucher.id, 'recipient_id': voucher.recipient_id, 'vendor_id': None,
+                    'shop_id': None, 'redemption_request_id': None
+                }, entry_type=entry_type, amount=round(amount, 2), balance_after=running,
+                    created_at=when or created_at, **fields))
+            if running != balance:
+                closed.append({'id': voucher.id, 'value': running})
+
+        connection.execute(text("""
+            INSERT INTO voucher_ledger (voucher_id, entry_type, amount, balance_after, recipient_id,
+                                        vendor_id, shop_id, redemption_request_id, created_at)
+            VALUES (:voucher_id, :entry_type, :amount, :balance_after, :recipient_id,
+                    :vendor_id, :shop_id, :redemption_request_id, :created_at)
+        """), entries)
+        if closed:
+            connection.execute(text(
+                "UPDATE voucher SET value = :value, cache_version = cache_version + 1 WHERE id = :id"
+            ), closed)
+        backfilled += len(vouchers)
+
+    return backfilled
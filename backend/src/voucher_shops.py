@@ -0,0 +1,239 @@
+"""
+Voucher Shop Eligibility
+Which shops a voucher can be redeemed at, as an indexed link table
+
+A voucher either has any_shop set (redeemable at every active shop) or one
+voucher_shop row per shop it is restricted to. "Can voucher V be used at
+shop S" is then a primary key lookup on voucher_shop (voucher_id, shop_id),
+and "which of this vendor's shops take V" / "which shops take V" are single
+joined queries, instead of parsing the JSON in voucher.vendor_restrictions.
+
+vendor_restrictions is still written as a mirror of the link rows for older
+clients that read it, but nothing in the backend reads it any more.
+"""
+
+import json
+import logging
+
+from sqlalchemy import select, text
+
+logger = logging.getLogger(__name__)
+
+# Global references
+db = None
+Voucher = None
+VoucherShop = None
+VendorShop = None
+User = None
+
+
+def init_voucher_shops(app_db, voucher_model, voucher_shop_model, vendor_shop_model, user_model):
+    """Initialize voucher shop eligibility with database models"""
+    global db, Voucher, VoucherShop, VendorShop, User
+    db = app_db
+    Voucher = voucher_model
+    VoucherShop = voucher_shop_model
+    VendorShop = vendor_shop_model
+    User = user_model
+    logger.info("Voucher shop eligibility initialized")
+
+
+def parse_shop_selection(selected_shops):
+    """
+    Normalize a 'selected_shops' request value into a list of shop IDs
+
+    Args:
+        selected_shops: 'all', None, a list of shop IDs, or a JSON string of one
+
+    Returns:
+        list: Shop IDs, or None if the voucher can be used at any shop
+
+    Raises:
+        ValueError: If the selection contains something that isn't a shop ID
+    """
+    if isinstance(selected_shops, str):
+        if selected_shops.strip() in ('', 'all'):
+            return None
+        selected_shops = json.loads(selected_shops)
+    if not selected_shops or selected_shops == 'all':
+        return None
+    if not isinstance(selected_shops, (list, tuple)):
+        selected_shops = [selected_shops]
+    try:
+        return sorted({int(shop_id) for shop_id in selected_shops})
+    except (TypeError, ValueError):
+        raise ValueError('selected_shops must be "all" or a list of shop IDs')
+
+
+def set_voucher_shops(voucher, shop_ids):
+    """
+    Restrict a voucher to some shops, or open it to all of them
+
+    The voucher must be added to the session; it is flushed if it has no ID
+    yet. Existing link rows are replaced. Does not commit.
+
+    Args:
+        voucher: Voucher instance
+        shop_ids: Shop IDs, or None/empty for any shop
+    """
+    shop_ids = sorted({int(shop_id) for shop_id in shop_ids or []})
+    if voucher.id is None:
+        db.session.flush()
+    else:
+        VoucherShop.query.filter_by(voucher_id=voucher.id).delete(synchronize_session=False)
+
+    voucher.any_shop = not shop_ids
+    voucher.vendor_restrictions = json.dumps(shop_ids) if shop_ids else None
+    if shop_ids:
+        db.session.execute(
+            VoucherShop.__table__.insert(),
+            [{'voucher_id': voucher.id, 'shop_id': shop_id} for shop_id in shop_ids]
+        )
+
+
+def set_vouchers_shops(vouchers, shop_ids):
+    """set_voucher_shops for a batch of new vouchers with one flush and one insert"""
+    shop_ids = sorted({int(shop_id) for shop_id in shop_ids or []})
+    vouchers = list(vouchers)
+    db.session.flush()
+    for voucher in vouchers:
+        voucher.any_shop = not shop_ids
+        voucher.vendor_restrictions = json.dumps(shop_ids) if shop_ids else None
+    if shop_ids and vouchers:
+        db.session.execute(
+            VoucherShop.__table__.insert(),
+            [{'voucher_id': voucher.id, 'shop_id': shop_id} for voucher in vouchers for shop_id in shop_ids]
+        )
+
+
+def get_voucher_shop_ids(voucher):
+    """Shop IDs a voucher is restricted to, or None if it can be used at any shop"""
+    if voucher.any_shop:
+        return None
+    return [row.shop_id for row in VoucherShop.query.filter_by(voucher_id=voucher.id).order_by(VoucherShop.shop_id)]
+
+
+def can_redeem_at_shop(voucher, shop_id):
+    """Whether a voucher can be used at a shop (one primary key lookup for restricted vouchers)"""
+    if voucher.any_shop:
+        return True
+    try:
+        shop_id = int(shop_id)
+    except (TypeError, ValueError):
+        return False
+    return db.session.get(VoucherShop, (voucher.id, shop_id)) is not None
+
+
+def _eligible_condition(voucher):
+    """Join condition/filter selecting the vendor_shop rows a voucher can be used at"""
+    if voucher.any_shop:
+        return None
+    return VendorShop.id.in_(
+        select(VoucherShop.shop_id).where(VoucherShop.voucher_id == voucher.id)
+    )
+
+
+def eligible_vendor_shop(voucher, vendor_id):
+    """
+    First active shop of a vendor that accepts a voucher
+
+    Returns:
+        VendorShop: The shop, or None if none of the vendor's shops accept it
+    """
+    query = VendorShop.query.filter_by(vendor_id=vendor_id, is_active=True)
+    condition = _eligible_condition(voucher)
+    if condition is not None:
+        query = query.filter(condition)
+    return query.order_by(VendorShop.id).first()
+
+
+def eligible_shops(voucher):
+    """
+    Every active shop (of an active vendor) that accepts a voucher, in one query
+
+    Returns:
+        list: (VendorShop, vendor User) tuples ordered by shop ID
+    """
+    query = db.session.query(VendorShop, User).join(User, User.id == VendorShop.vendor_id).filter(
+        VendorShop.is_active.is_(True),
+        User.user_type == 'vendor',
+        User.is_active.is_(True)
+    )
+    condition = _eligible_condition(voucher)
+    if condition is not None:
+        query = query.filter(condition)
+    return query.order_by(VendorShop.id).all()
+
+
+def shops_by_voucher(voucher_ids):
+    """
+    Shops linked to each of a set of vouchers, in one query
+
+    Returns:
+        dict: voucher_id -> list of VendorShop ordered by shop ID (vouchers open
+              to any shop have no entry)
+    """
+    voucher_ids = list(voucher_ids)
+    shops = {}
+    if not voucher_ids:
+        return shops
+    rows = db.session.query(VoucherShop.voucher_id, VendorShop).join(
+        VendorShop, VendorShop.id == VoucherShop.shop_id
+    ).filter(VoucherShop.voucher_id.in_(voucher_ids)).order_by(VoucherShop.voucher_id, VendorShop.id)
+    for voucher_id, shop in rows:
+        shops.setdefault(voucher_id, []).append(shop)
+    return shops
+
+
+def backfill_voucher_shops(connection, batch_size=1000):
+    """
+    Build voucher_shop rows and any_shop from the legacy vendor_restrictions JSON
+
+    Entries that aren't IDs of existing shops are dropped; a voucher whose list
+    had entries but none of them valid stays restricted (to no shops), which is
+    how validation treated it before. Safe to run more than once.
+
+    Args:
+        connection: SQLAlchemy Connection (the caller owns the transaction)
+        batch_size: Vouchers read per batch
+
+    Returns:
+        int: Number of restricted vouchers backfilled
+    """
+    shop_ids = {row[0] for row in connection.execute(text("SELECT id FROM vendor_shop"))}
+    last_id = 0
+    restricted = 0
+
+    while True:
+        rows = connection.execute(text("""
+            SELECT id, vendor_restrictions FROM voucher
+            WHERE id > :last_id AND vendor_restrictions IS NOT NULL
+            ORDER BY id LIMIT :limit
+        """), {'last_id': last_id, 'limit': batch_size}).fetchall()
+        if not rows:
+            break
+
+        links = []
+        restricted_ids = []
+        for voucher_id, restrictions in rows:
+            try:
+                selection = parse_shop_selection(restrictions)
+            except ValueError:
+                selection = None
+                logger.warning("Voucher %s has unreadable vendor_restrictions, leaving it open to any shop", voucher_id)
+            if not selection:
+                continue
+            restricted_ids.append(voucher_id)
+            links.extend({'voucher_id': voucher_id, 'shop_id': shop_id} for shop_id in selection if shop_id in shop_ids)
+
+        if restricted_ids:
+            params = [{'id': voucher_id} for voucher_id in restricted_ids]
+            connection.execute(text("DELETE FROM voucher_shop WHERE voucher_id = :id"), params)
+            connection.execute(text("UPDATE voucher SET any_shop = :flag WHERE id = :id"),
+                               [dict(p, flag=False) for p in params])
+        if links:
+            connection.execute(text("INSERT INTO voucher_shop (voucher_id, shop_id) VALUES (:voucher_id, :shop_id)"), links)
+        restricted += len(restricted_ids)
+        last_id = rows[-1][0]
+
+    return restricted
@@ -4,6 +4,7 @@ Flask blueprint containing all wallet-related endpoints
 """
 
 from flask import Blueprint, request, session, jsonify
+from auth import get_principal
 from datetime import datetime, timedelta
 import random
 import string
@@ -83,7 +84,7 @@ def get_school_wallet_transactions():
     if not user_id:
         return jsonify({'error': 'Not authenticated'}), 401
     
-    user = User.query.get(user_id)
+    user = get_principal()
     if not user or user.user_type not in ['school', 'vcse']:
         return jsonify({'error': 'Unauthorized - School/VCFSE access only'}), 403
     
@@ -311,7 +312,7 @@ def get_school_vouchers():
     if not user_id:
         return jsonify({'error': 'Not authenticated'}), 401
     
-    user = User.query.get(user_id)
+    user = get_principal()
     if not user or user.user_type not in ['school', 'vcse']:
         return jsonify({'error': 'Unauthorized - School/VCFSE access only'}), 403
     
@@ -420,7 +421,7 @@ def get_school_voucher_spend():
     if not user_id:
         return jsonify({'error': 'Not authenticated'}), 401
     
-    user = User.query.get(user_id)
+    user = get_principal()
     if not user or user.user_type not in ['school', 'vcse']:
         return jsonify({'error': 'Unauthorized - School/VCFSE access only'}), 403
     
@@ -0,0 +1,105 @@
+"""
+Test the daily audit rollup and the stats endpoint that reads it
+"""
+import unittest
+import sys
+import os
+from datetime import datetime, timedelta
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from sqlalchemy import func
+
+import audit_log
+from auth import clear_principal_cache
+from main import app, db, User
+from audit_log import log_activity, rebuild_audit_summary
+
+
+class TestAuditSummary(unittest.TestCase):
+    """Test that audit_daily_summary agrees with the raw audit_logs rows"""
+
+    def setUp(self):
+        app.config["TESTING"] = True
+        self.client = app.test_client()
+        clear_principal_cache()
+        with app.app_context():
+            db.create_all()
+            admin = User(email="audit-admin@example.com", password_hash="!", first_name="Ad", last_name="Min", user_type="admin")
+            vendor = User(email="audit-vendor@example.com", password_hash="!", first_name="Ven", last_name="Dor", user_type="vendor")
+            db.session.add_all([admin, vendor])
+            db.session.commit()
+            self.admin, self.vendor = admin.id, vendor.id
+
+        with app.test_request_context('/'):
+            for _ in range(3):
+                log_activity('login', user_id=self.vendor)
+            log_activity('login', status='failure', user_id=self.vendor)
+            log_activity('create_voucher', 'voucher', 7, {'value': 10}, user_id=self.admin)
+            log_activity('login', user_id=self.admin)
+            log_activity('system_check')
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def raw_counts(self):
+        AuditLog = audit_log.AuditLog
+        rows = db.session.query(
+            AuditLog.action, func.coalesce(AuditLog.status, ''), func.coalesce(AuditLog.user_email, ''), func.count(AuditLog.id)
+        ).group_by(AuditLog.action, AuditLog.status, AuditLog.user_email).all()
+        return {(action, status, email): count for action, status, email, count in rows}
+
+    def rollup_counts(self):
+        Summary = audit_log.AuditDailySummary
+        rows = db.session.query(Summary.action, Summary.status, Summary.user_email, func.sum(Summary.count)).group_by(
+            Summary.action, Summary.status, Summary.user_email
+        ).all()
+        return {(action, status, email): int(count) for action, status, email, count in rows}
+
+    def test_increments_match_raw_rows(self):
+        with app.app_context():
+            raw = self.raw_counts()
+            self.assertEqual(self.rollup_counts(), raw)
+            self.assertEqual(raw[('login', 'success', 'audit-vendor@example.com')], 3)
+            self.assertEqual(raw[('system_check', 'success', '')], 1)
+            # One upserted row per (day, action, status, user), not one per event
+            self.assertEqual(audit_log.AuditDailySummary.query.count(), len(raw))
+
+    def test_rebuild_reproduces_increments(self):
+        with app.app_context():
+            incremental = self.rollup_counts()
+            self.assertEqual(rebuild_audit_summary(), len(incremental))
+            self.assertEqual(self.rollup_counts(), incremental)
+
+    def test_stats_endpoint_matches_raw_rows(self):
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = self.admin
+        response = self.client.get('/api/admin/audit-logs/stats', query_string={'days': 7})
+        self.assertEqual(response.status_code, 200)
+        stats = response.json
+
+        with app.app_context():
+            AuditLog = audit_log.AuditLog
+            self.assertEqual(stats['total_logs'], AuditLog.query.count())
+            self.assertEqual(stats['success_logs'], AuditLog.query.filter_by(status='success').count())
+            self.assertEqual(stats['failure_logs'], AuditLog.query.filter_by(status='failure').count())
+
+        self.assertEqual(stats['top_actions'][0], {'action': 'login', 'count': 5})
+        self.assertEqual(stats['top_users'][0], {'email': 'audit-vendor@example.com', 'user_type': 'vendor', 'count': 4})
+        self.assertEqual(stats['activity_by_day'], [{'date': datetime.utcnow().date().isoformat(), 'count': 7}])
+
+    def test_stats_window_excludes_older_days(self):
+        with app.app_context():
+            audit_log.AuditDailySummary.query.update({'day': datetime.utcnow().date() - timedelta(days=10)})
+            db.session.commit()
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = self.admin
+        stats = self.client.get('/api/admin/audit-logs/stats', query_string={'days': 7}).json
+        self.assertEqual(stats['total_logs'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
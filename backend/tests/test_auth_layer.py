@@ -0,0 +1,73 @@
+"""
+Test the shared auth layer: require_role and the cached principal
+"""
+import unittest
+import sys
+import os
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from auth import clear_principal_cache
+from main import app, db, User
+
+
+class TestAuthLayer(unittest.TestCase):
+    """Test role checks on analytics and vendor routes"""
+
+    def setUp(self):
+        app.config["TESTING"] = True
+        self.client = app.test_client()
+        clear_principal_cache()
+        with app.app_context():
+            db.create_all()
+            admin = User(email="auth-admin@example.com", password_hash="!", first_name="Admin", last_name="User", user_type="admin")
+            vendor = User(email="auth-vendor@example.com", password_hash="!", first_name="Vendor", last_name="User", user_type="vendor")
+            db.session.add_all([admin, vendor])
+            db.session.commit()
+            self.admin_id, self.vendor_id = admin.id, vendor.id
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def login_as(self, user_id):
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = user_id
+
+    def test_analytics_requires_admin_user_type(self):
+        self.assertEqual(self.client.get('/api/analytics/overview').status_code, 401)
+        self.login_as(self.vendor_id)
+        self.assertEqual(self.client.get('/api/analytics/overview').status_code, 403)
+        self.login_as(self.admin_id)
+        self.assertEqual(self.client.get('/api/analytics/overview').status_code, 200)
+
+    def test_deactivation_evicts_cached_principal(self):
+        self.login_as(self.vendor_id)
+        response = self.client.post('/api/vendor/validate-voucher', json={'code': 'NOPE'})
+        self.assertEqual(response.status_code, 200)
+
+        with app.app_context():
+            db.session.get(User, self.vendor_id).is_active = False
+            db.session.commit()
+
+        response = self.client.post('/api/vendor/validate-voucher', json={'code': 'NOPE'})
+        self.assertEqual(response.status_code, 403)
+
+    def test_full_row_routes_use_the_request_user(self):
+        self.assertEqual(self.client.get('/api/check-auth').json, {'authenticated': False})
+        self.login_as(self.vendor_id)
+        self.assertEqual(self.client.get('/api/check-auth').json['user']['email'], 'auth-vendor@example.com')
+        self.assertEqual(self.client.get('/api/vcse/balance').status_code, 403)
+        self.assertEqual(self.client.get('/api/admin/vcse-verifications/pending').status_code, 403)
+        self.login_as(self.admin_id)
+        self.assertEqual(self.client.get('/api/admin/vcse-verifications/pending').status_code, 200)
+
+        # A session for a deleted account is cleared
+        self.login_as(9999)
+        self.assertEqual(self.client.get('/api/check-auth').json, {'authenticated': False})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+"""
+Test password hashing, rehash on login and invite-pending accounts
+"""
+import unittest
+import sys
+import os
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from werkzeug.security import generate_password_hash
+import credentials
+from main import app, db, User
+from credentials import INVITE_PENDING, hash_password, has_usable_password, needs_rehash, verify_password
+
+
+class TestCredentials(unittest.TestCase):
+    """Test the credentials module"""
+
+    def setUp(self):
+        app.config["TESTING"] = True
+        with app.app_context():
+            db.create_all()
+            legacy = User(email="cred-legacy@example.com", password_hash=generate_password_hash("old-secret", "pbkdf2:sha256:1000"),
+                          first_name="Leg", last_name="Acy", user_type="vcse")
+            invited = User(email="cred-invited@example.com", password_hash=INVITE_PENDING,
+                           first_name="In", last_name="Vited", user_type="recipient")
+            db.session.add_all([legacy, invited])
+            db.session.commit()
+            self.legacy, self.invited = legacy.id, invited.id
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_hash_uses_configured_method(self):
+        stored = hash_password("secret")
+        self.assertTrue(stored.startswith(credentials.HASH_METHOD))
+        self.assertFalse(needs_rehash(stored))
+        self.assertTrue(needs_rehash(generate_password_hash("secret", "pbkdf2:sha256:1000")))
+
+    def test_outdated_hash_upgraded_on_successful_login(self):
+        with app.app_context():
+            user = db.session.get(User, self.legacy)
+            self.assertFalse(verify_password(user, "wrong"))
+            self.assertTrue(db.session.get(User, self.legacy, populate_existing=True).password_hash.startswith('pbkdf2'))
+
+            self.assertTrue(verify_password(user, "old-secret"))
+            stored = db.session.get(User, self.legacy, populate_existing=True).password_hash
+            self.assertFalse(needs_rehash(stored))
+            self.assertEqual(user.password_hash, stored)
+            self.assertTrue(verify_password(user, "old-secret"))
+
+            # Left to the caller's transaction, not committed behind its back
+            db.session.rollback()
+            self.assertTrue(db.session.get(User, self.legacy, populate_existing=True).password_hash.startswith('pbkdf2'))
+
+    def test_login_commits_the_upgraded_hash(self):
+        with app.app_context():
+            user = db.session.get(User, self.legacy)
+            user.is_verified = True
+            db.session.commit()
+        response = app.test_client().post('/api/login', json={'email': 'cred-legacy@example.com', 'password': 'old-secret'})
+        self.assertEqual(response.status_code, 200)
+        with app.app_context():
+            self.assertFalse(needs_rehash(db.session.get(User, self.legacy).password_hash))
+
+    def test_invite_pending_account_cannot_log_in(self):
+        with app.app_context():
+            user = db.session.get(User, self.invited)
+            self.assertFalse(has_usable_password(user.password_hash))
+            self.assertFalse(verify_password(user, INVITE_PENDING))
+        response = app.test_client().post('/api/login', json={'email': 'cred-invited@example.com', 'password': INVITE_PENDING})
+        self.assertEqual(response.status_code, 401)
+
+
+if __name__ == '__main__':
+    unittest.main()
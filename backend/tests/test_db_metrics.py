@@ -0,0 +1,85 @@
+"""
+Test per-request DB instrumentation and pool configuration
+"""
+import unittest
+import sys
+import os
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from sqlalchemy.pool import NullPool
+
+from auth import clear_principal_cache
+from db_config import engine_options
+from db_metrics import reset_db_metrics
+from main import app, db, User
+
+
+class TestEngineOptions(unittest.TestCase):
+    """Test pool sizing per worker class"""
+
+    def test_pool_sized_per_worker_class(self):
+        url = 'postgresql://localhost/bakup'
+        self.assertEqual(engine_options(url, 'sync')['pool_size'], 2)
+        # Not under gunicorn: one threaded process serves everything
+        self.assertEqual((engine_options(url)['pool_size'], engine_options(url)['max_overflow']), (5, 10))
+        self.assertEqual(engine_options(url, 'gevent')['pool_size'], 10)
+        self.assertEqual(engine_options('sqlite:///test.db', 'gevent'), {})
+
+    def test_pgbouncer_mode_disables_client_pool(self):
+        os.environ['DB_PGBOUNCER'] = 'true'
+        try:
+            self.assertEqual(engine_options('postgresql://localhost/bakup', 'gevent'), {'poolclass': NullPool})
+            options = engine_options('postgresql+psycopg://localhost/bakup', 'sync')
+            self.assertIsNone(options['connect_args']['prepare_threshold'])
+        finally:
+            del os.environ['DB_PGBOUNCER']
+
+
+class TestDbMetrics(unittest.TestCase):
+    """Test statement counters in headers and /api/admin/db-metrics"""
+
+    def setUp(self):
+        app.config["TESTING"] = True
+        self.client = app.test_client()
+        clear_principal_cache()
+        reset_db_metrics()
+        with app.app_context():
+            db.create_all()
+            admin = User(email="metrics-admin@example.com", password_hash="!", first_name="Admin", last_name="User", user_type="admin")
+            db.session.add(admin)
+            db.session.commit()
+            self.admin_id = admin.id
+
+    def tearDown(self):
+        app.debug = False
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_headers_only_in_debug(self):
+        response = self.client.get('/api/health/ready')
+        self.assertNotIn('X-DB-Statements', response.headers)
+
+        app.debug = True
+        response = self.client.get('/api/health/ready')
+        self.assertEqual(response.headers['X-DB-Statements'], '1')
+        self.assertIn('db;dur=', response.headers['Server-Timing'])
+
+    def test_metrics_endpoint_aggregates_per_endpoint(self):
+        self.client.get('/api/health/ready')
+        self.client.get('/api/health/ready')
+
+        self.assertEqual(self.client.get('/api/admin/db-metrics').status_code, 401)
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = self.admin_id
+        response = self.client.get('/api/admin/db-metrics')
+        self.assertEqual(response.status_code, 200)
+        ready = response.json['endpoints']['readiness_check']
+        self.assertEqual(ready['requests'], 2)
+        self.assertEqual(ready['statements'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -76,5 +76,89 @@ class TestEmailService(unittest.TestCase):
                 f"send_password_reset_email MUST have parameter: {param}"
             )
 
+    def test_send_many_reuses_one_connection(self):
+        """Verify bulk sends share a pooled SMTP connection and escape substitutions"""
+        from unittest import mock
+        from email_service import EmailService
+
+        service = EmailService()
+        service.enabled = True
+        template = service.build_new_item_notification(None, '-user_name-', 'Bread', 'free', 3, 'Shop')
+        messages = [dict(template, to=f'user{i}@example.com', substitutions={'-user_name-': '<Sam>'}) for i in range(5)]
+
+        with mock.patch('smtplib.SMTP') as smtp:
+            result = service.send_many(messages)
+
+        self.assertEqual(result['sent'], 5)
+        self.assertEqual(smtp.call_count, 1)
+        sent = smtp.return_value.send_message.call_args[0][0]
+        self.assertIn('&lt;Sam&gt;', sent.get_payload()[0].get_payload(decode=True).decode())
+
+    def test_send_many_fails_only_the_rejected_message(self):
+        """A per-message SMTP error (here SMTPDataError) doesn't fail the rest of the batch"""
+        import smtplib
+        from unittest import mock
+        from email_service import EmailService
+
+        service = EmailService()
+        service.enabled = True
+        messages = [{'to': f'user{i}@example.com', 'subject': 'Hi', 'html': '<p>Hi</p>'} for i in range(4)]
+
+        with mock.patch('smtplib.SMTP') as smtp:
+            smtp.return_value.send_message.side_effect = [None, smtplib.SMTPDataError(554, b'rejected'), None, None]
+            result = service.send_many(messages)
+
+        self.assertEqual((result['sent'], result['failed']), (3, 1))
+        self.assertFalse(result['results'][1]['success'])
+        self.assertEqual(smtp.call_count, 1)
+
+    def test_send_many_gives_up_when_the_server_is_down(self):
+        """Repeated connection failures abort the batch instead of reconnecting once per message"""
+        from unittest import mock
+        from email_service import EmailService
+
+        service = EmailService()
+        service.enabled = True
+        service.CONNECT_BACKOFF_SECONDS = 0
+        messages = [{'to': f'user{i}@example.com', 'subject': 'Hi', 'html': '<p>Hi</p>'} for i in range(10)]
+
+        with mock.patch('smtplib.SMTP', side_effect=ConnectionRefusedError('refused')) as smtp:
+            result = service.send_many(messages)
+
+        self.assertEqual((result['sent'], result['failed']), (0, 10))
+        self.assertEqual(smtp.call_count, service.MAX_CONNECT_FAILURES)
+
+    def test_sendgrid_send_many_batches_and_records_calls(self):
+        """The SendGrid backend logs instead of printing and times each API call"""
+        import contextlib
+        import io
+        from unittest import mock
+        import email_service_sendgrid
+
+        service = email_service_sendgrid.EmailService()
+        service.enabled = True
+        service.client = mock.Mock()
+        service.client.send.side_effect = [mock.Mock(status_code=202), mock.Mock(status_code=500, body='down')]
+        messages = [{'to': f'user{i}@example.com', 'subject': 'Hi', 'html': '<p>Hi</p>'} for i in range(3)]
+        messages.append({'to': 'other@example.com', 'subject': 'Other', 'html': '<p>Other</p>'})
+
+        stdout = io.StringIO()
+        with mock.patch.object(email_service_sendgrid, 'outbound_call', wraps=email_service_sendgrid.outbound_call) as call, \
+                contextlib.redirect_stdout(stdout):
+            result = service.send_many(messages)
+
+        self.assertEqual((result['sent'], result['failed']), (3, 1))
+        self.assertEqual(service.client.send.call_count, 2)
+        self.assertEqual(call.call_args_list, [mock.call('email', 'send_many')] * 2)
+        self.assertEqual(stdout.getvalue(), '')
+
+    def test_expiration_check_route_is_registered(self):
+        """cron_expiration_check.py POSTs to this URL"""
+        from main import app
+
+        adapter = app.url_map.bind('localhost')
+        endpoint, _ = adapter.match('/api/admin/trigger-expiration-check', method='POST')
+        self.assertEqual(endpoint, 'expiration.trigger_expiration_check')
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,120 @@
+"""
+Test the streaming PDF/Excel report exports
+"""
+import unittest
+import sys
+import os
+from datetime import date, timedelta
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import openpyxl
+
+import export_reports
+from auth import clear_principal_cache
+from main import app, db, User, VendorShop, Voucher, SurplusItem, WalletTransaction
+from export_reports import generate_excel_report, generate_pdf_report, iter_report_rows
+from voucher_ledger import record_redemption
+
+
+class TestExportReports(unittest.TestCase):
+    """Test iter_report_rows and the PDF/Excel writers fed from it"""
+
+    def setUp(self):
+        app.config["TESTING"] = True
+        self.client = app.test_client()
+        clear_principal_cache()
+        with app.app_context():
+            db.create_all()
+            admin = User(email="export-admin@example.com", password_hash="!", first_name="Ad", last_name="Min", user_type="admin")
+            issuer = User(email="export-issuer@example.com", password_hash="!", first_name="Food", last_name="Bank", user_type="vcse")
+            vendor = User(email="export-vendor@example.com", password_hash="!", first_name="Ven", last_name="Dor", user_type="vendor")
+            recipient = User(email="export-recipient@example.com", password_hash="!", first_name="Rec", last_name="Ipient", user_type="recipient")
+            db.session.add_all([admin, issuer, vendor, recipient])
+            db.session.flush()
+            shop = VendorShop(vendor_id=vendor.id, shop_name="Corner Shop", address="1 High St", postcode="NN9 6GR")
+            db.session.add(shop)
+            db.session.flush()
+            vouchers = [
+                Voucher(code=f"EXPORT{i:03d}", value=10.0, issued_by=issuer.id, recipient_id=recipient.id,
+                        expiry_date=date.today() + timedelta(days=30))
+                for i in range(3)
+            ]
+            db.session.add_all(vouchers)
+            db.session.add(SurplusItem(vendor_id=vendor.id, shop_id=shop.id, item_name="Bread", quantity="5",
+                                       category="edible", price=1, original_price=4))
+            db.session.add(WalletTransaction(user_id=issuer.id, transaction_type='credit', amount=100.0,
+                                             balance_before=0.0, balance_after=100.0, created_by=admin.id))
+            db.session.commit()
+            record_redemption(vouchers[0], 10.0, vendor.id, shop.id)
+            db.session.commit()
+            self.admin, self.vendor = admin.id, vendor.id
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def login(self, user_id):
+        clear_principal_cache()
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = user_id
+
+    def test_record_reports(self):
+        with app.app_context():
+            vouchers = list(iter_report_rows('vouchers'))
+            self.assertEqual(len(vouchers), 3)
+            self.assertEqual(vouchers[0][:5], ['EXPORT000', '£0.00', 'redeemed', 'Rec Ipient', 'Food Bank'])
+            self.assertEqual(len(list(iter_report_rows('users'))), 4)
+            self.assertEqual(list(iter_report_rows('togo'))[0][:4], ['Bread', 'Corner Shop', '£4.00', '75%'])
+            self.assertEqual(list(iter_report_rows('transactions'))[0][1:5], ['credit', '£100.00', 'Ad Min', 'Food Bank'])
+
+    def test_financial_report_has_rows(self):
+        with app.app_context():
+            rows = dict(iter_report_rows('financial'))
+        self.assertEqual(rows['Vouchers Issued'], 3)
+        self.assertEqual(rows['Total Value Issued'], '£30.00')
+        self.assertEqual(rows['Total Value Redeemed'], '£10.00')
+        self.assertEqual(rows['Active Vouchers'], 2)
+        self.assertEqual(rows['Active Vouchers Remaining Balance'], '£20.00')
+        self.assertEqual(rows['Wallet Credit Total'], '£100.00')
+
+    def test_excel_contains_every_streamed_row(self):
+        rows = [[f'CODE{i}', f'£{i}.00', 'active', 'R', 'I', '2026-10-19'] for i in range(2500)]
+        output = generate_excel_report('vouchers', iter(rows), {'status': 'active'})
+        sheet = openpyxl.load_workbook(output, read_only=True).active
+        values = list(sheet.iter_rows(values_only=True))
+        self.assertEqual(values[0][0], 'BAK UP E-Voucher System')
+        self.assertEqual(values[3][0], 'Filters: status: active')
+        self.assertEqual(values[5][0], 'Code')
+        self.assertEqual(len(values), 6 + 2500)
+        self.assertEqual(values[-1][0], 'CODE2499')
+
+    def test_pdf_is_paged(self):
+        rows = [[f'CODE{i}', '£1.00', 'active', 'R', 'I', '2026-10-19'] for i in range(100)]
+        output = generate_pdf_report('vouchers', iter(rows))
+        content = output.read()
+        self.assertTrue(content.startswith(b'%PDF'))
+        # 32 rows under the header on page one, then PDF_ROWS_PER_PAGE per page
+        first = export_reports.PDF_ROWS_PER_PAGE - 8
+        expected_pages = 1 + -(-(100 - first) // export_reports.PDF_ROWS_PER_PAGE)
+        self.assertEqual(content.count(b'/Type /Page\n'), expected_pages)
+
+        # An empty report is still a one-page document with headers
+        self.assertTrue(generate_pdf_report('vouchers', iter([])).read().startswith(b'%PDF'))
+
+    def test_export_endpoint(self):
+        self.login(self.admin)
+        response = self.client.post('/api/export/financial/excel', json={})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('financial_report_', response.headers['Content-Disposition'])
+        self.assertEqual(self.client.post('/api/export/payroll/pdf', json={}).status_code, 400)
+        self.assertEqual(self.client.post('/api/export/vouchers/csv', json={}).status_code, 400)
+
+        self.login(self.vendor)
+        self.assertEqual(self.client.post('/api/export/vouchers/pdf', json={}).status_code, 403)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+"""
+Test health and readiness endpoints
+"""
+import unittest
+import sys
+import os
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from main import app
+
+
+class TestHealth(unittest.TestCase):
+    """Test /api/health and /api/health/ready"""
+
+    def setUp(self):
+        app.config["TESTING"] = True
+        self.client = app.test_client()
+
+    def test_liveness(self):
+        response = self.client.get('/api/health')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['status'], 'healthy')
+
+    def test_readiness_checks_database(self):
+        response = self.client.get('/api/health/ready')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['status'], 'ready')
+        self.assertEqual(response.json['checks']['database']['status'], 'ok')
+        self.assertEqual(response.json['async_mode'], 'threading')
+
+
+if __name__ == '__main__':
+    unittest.main()
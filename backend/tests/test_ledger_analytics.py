@@ -0,0 +1,153 @@
+"""
+Test the vectorized ledger breakdowns and their on-disk snapshot
+"""
+import unittest
+import shutil
+import sys
+import os
+import tempfile
+from datetime import date, datetime, timedelta
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import ledger_analytics
+from auth import clear_principal_cache
+from main import app, db, User, VendorShop, Voucher
+from ledger_analytics import ledger_frame, snapshot_path
+from voucher_ledger import ledger_totals, record_redemption
+
+
+class TestLedgerAnalytics(unittest.TestCase):
+    """Test ledger_frame() breakdowns, incremental refresh and the financial report"""
+
+    def setUp(self):
+        app.config["TESTING"] = True
+        self.client = app.test_client()
+        clear_principal_cache()
+        self.snapshot_dir = tempfile.mkdtemp()
+        self.original_dir = ledger_analytics.SNAPSHOT_DIR
+        ledger_analytics.SNAPSHOT_DIR = self.snapshot_dir
+        ledger_analytics.SETTLE_SECONDS = 0
+        ledger_analytics._snapshot = None
+        with app.app_context():
+            db.create_all()
+            admin = User(email="analytics-admin@example.com", password_hash="!", first_name="Ad", last_name="Min", user_type="admin")
+            issuer = User(email="analytics-issuer@example.com", password_hash="!", first_name="V", last_name="C", user_type="vcse", organization_name="Food Bank")
+            vendor = User(email="analytics-vendor@example.com", password_hash="!", first_name="Ven", last_name="Dor", user_type="vendor", shop_name="Corner Shop Ltd")
+            recipient = User(email="analytics-recipient@example.com", password_hash="!", first_name="Rec", last_name="Ipient", user_type="recipient")
+            db.session.add_all([admin, issuer, vendor, recipient])
+            db.session.flush()
+            shop = VendorShop(vendor_id=vendor.id, shop_name="Corner Shop", address="1 High St", postcode="NN8 1AA", town="Wellingborough")
+            db.session.add(shop)
+            db.session.commit()
+            self.admin, self.issuer, self.vendor, self.recipient, self.shop = admin.id, issuer.id, vendor.id, recipient.id, shop.id
+
+            self.first = self.issue('ANALYT01', 30.0)
+            self.issue('ANALYT02', 20.0)
+            self.redeem(self.first, 12.5)
+
+    def tearDown(self):
+        ledger_analytics.SNAPSHOT_DIR = self.original_dir
+        ledger_analytics.SETTLE_SECONDS = 60
+        ledger_analytics._snapshot = None
+        shutil.rmtree(self.snapshot_dir, ignore_errors=True)
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def issue(self, code, value):
+        voucher = Voucher(code=code, value=value, issued_by=self.issuer, recipient_id=self.recipient,
+                          expiry_date=date.today() + timedelta(days=30))
+        db.session.add(voucher)
+        db.session.commit()
+        return voucher.id
+
+    def redeem(self, voucher_id, amount):
+        record_redemption(db.session.get(Voucher, voucher_id), amount, self.vendor, self.shop)
+        db.session.commit()
+
+    def test_breakdowns_match_the_ledger(self):
+        with app.app_context():
+            ledger = ledger_frame()
+            self.assertEqual(ledger.totals(), ledger_totals())
+            self.assertEqual(ledger.breakdown('issuer', 'issue'), [(self.issuer, 2, 50.0)])
+            self.assertEqual(ledger.breakdown('vendor', 'redeem'), [(self.vendor, 1, 12.5)])
+            self.assertEqual(ledger.breakdown('town', 'redeem'), [('Wellingborough', 1, 12.5)])
+            self.assertEqual(ledger.breakdown('month', 'issue'), [(datetime.utcnow().strftime('%Y-%m'), 2, 50.0)])
+            self.assertEqual(ledger.breakdown('status', 'issue'), [('active', 2, 50.0)])
+            self.assertEqual(ledger.breakdown('entry_type')[0][:2], ('issue', 2))
+            self.assertEqual(ledger.distinct('recipient_id', 'issue'), 1)
+
+            tomorrow = datetime.utcnow() + timedelta(days=1)
+            self.assertEqual(ledger.totals(start=tomorrow)['issue']['count'], 0)
+
+    def test_refresh_reads_only_new_entries(self):
+        with app.app_context():
+            self.assertEqual(len(ledger_frame()), 3)
+            self.assertTrue(os.path.exists(snapshot_path()))
+            high_water = ledger_analytics._snapshot[1]
+
+            # A fresh process loads the file instead of rereading the ledger
+            ledger_analytics._snapshot = None
+            fetched = []
+            original = ledger_analytics._fetch_after
+            ledger_analytics._fetch_after = lambda mark: fetched.append(mark) or original(mark)
+            try:
+                self.redeem(self.first, 7.5)
+                ledger = ledger_frame()
+            finally:
+                ledger_analytics._fetch_after = original
+            self.assertEqual(fetched, [high_water])
+            self.assertEqual(len(ledger), 4)
+            self.assertEqual(ledger.breakdown('vendor', 'redeem'), [(self.vendor, 2, 20.0)])
+            self.assertEqual(ledger_analytics._snapshot[1], high_water + 1)
+
+    def test_recent_entries_read_but_not_saved(self):
+        ledger_analytics.SETTLE_SECONDS = 3600
+        with app.app_context():
+            self.assertEqual(len(ledger_frame()), 3)
+            self.assertFalse(os.path.exists(snapshot_path()))
+            self.assertEqual(ledger_analytics._snapshot[1], 0)
+
+    def test_rebuilds_when_database_is_replaced(self):
+        with app.app_context():
+            ledger_frame()
+            db.session.remove()
+            db.drop_all()
+            db.create_all()
+            issuer = User(email="analytics-issuer@example.com", password_hash="!", first_name="V", last_name="C", user_type="vcse")
+            recipient = User(email="analytics-recipient@example.com", password_hash="!", first_name="R", last_name="I", user_type="recipient")
+            db.session.add_all([issuer, recipient])
+            db.session.commit()
+            self.issuer, self.recipient = issuer.id, recipient.id
+            self.issue('ANALYT99', 5.0)
+
+            ledger_analytics._snapshot = None
+            ledger = ledger_frame()
+            self.assertEqual(len(ledger), 1)
+            self.assertEqual(ledger.totals()['issue']['amount'], 5.0)
+
+    def test_financial_report_breakdowns(self):
+        with app.app_context():
+            # Issued by an account that no longer exists
+            self.issuer = 9999
+            self.issue('ANALYT03', 5.0)
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = self.admin
+        response = self.client.get('/api/admin/export/financial-report')
+        self.assertEqual(response.status_code, 200)
+        report = response.get_data(as_text=True)
+        self.assertIn('Food Bank,2,£50.00', report)
+        self.assertIn('Unknown,1,£5.00', report)
+        self.assertIn('Corner Shop Ltd,1,£12.50', report)
+        self.assertIn('Wellingborough,1,£12.50', report)
+        self.assertIn('Active Vouchers:,3', report)
+
+        impact = self.client.get('/api/admin/export/impact-report').get_data(as_text=True)
+        self.assertIn('Total Value Spent at Local Shops:,£12.50', impact)
+        self.assertIn('Local Food Shops:,1', impact)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+"""
+Test log table retention helpers (SQLite fallback path, and native partitions
+when TEST_POSTGRES_URL points at a scratch PostgreSQL database)
+"""
+import unittest
+import sys
+import os
+import gzip
+import shutil
+import tempfile
+from datetime import date
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from sqlalchemy import create_engine, text
+
+
+class TestLogPartitions(unittest.TestCase):
+    """Test month arithmetic and archive-then-prune retention"""
+
+    def setUp(self):
+        self.archive_dir = tempfile.mkdtemp()
+        self.engine = create_engine('sqlite://')
+        with self.engine.begin() as conn:
+            conn.execute(text(
+                "CREATE TABLE login_session (id INTEGER PRIMARY KEY, user_id INTEGER, login_time TIMESTAMP)"
+            ))
+            for i, ts in enumerate(['2025-01-15 10:00:00', '2025-01-20 11:00:00',
+                                    '2025-02-03 09:00:00', '2026-10-01 08:00:00']):
+                conn.execute(text("INSERT INTO login_session VALUES (:id, 1, :ts)"), {'id': i + 1, 'ts': ts})
+
+    def tearDown(self):
+        shutil.rmtree(self.archive_dir)
+
+    def test_add_months_wraps_year(self):
+        from log_partitions import add_months, partition_name
+        self.assertEqual(add_months(date(2025, 11, 1), 3), date(2026, 2, 1))
+        self.assertEqual(add_months(date(2025, 1, 1), -1), date(2024, 12, 1))
+        self.assertEqual(partition_name('audit_logs', date(2026, 3, 1)), 'audit_logs_y2026m03')
+
+    def test_archive_and_prune_removes_expired_months_only(self):
+        from log_partitions import archive_and_prune
+        pruned = archive_and_prune(self.engine, 'login_session', retention_days=180,
+                                   archive_dir=self.archive_dir, today=date(2026, 10, 19))
+
+        self.assertEqual(pruned['2025-01-01'], 2)
+        self.assertEqual(pruned['2025-02-01'], 1)
+
+        with self.engine.connect() as conn:
+            remaining = conn.execute(text("SELECT COUNT(*) FROM login_session")).scalar()
+        self.assertEqual(remaining, 1)
+
+        archive = os.path.join(self.archive_dir, 'login_session', 'login_session_y2025m01.csv.gz')
+        with gzip.open(archive, 'rt') as handle:
+            lines = handle.read().strip().splitlines()
+        self.assertEqual(lines[0], 'id,user_id,login_time')
+        self.assertEqual(len(lines), 3)
+
+    def test_ensure_partitions_is_noop_on_sqlite(self):
+        from log_partitions import ensure_monthly_partitions
+        self.assertEqual(ensure_monthly_partitions(self.engine), [])
+
+
+@unittest.skipUnless(os.environ.get('TEST_POSTGRES_URL'), 'TEST_POSTGRES_URL not set')
+class TestNativePartitions(unittest.TestCase):
+    """Test partition maintenance against partitioned PostgreSQL tables"""
+
+    def setUp(self):
+        self.archive_dir = tempfile.mkdtemp()
+        self.engine = create_engine(os.environ['TEST_POSTGRES_URL'])
+        with self.engine.begin() as conn:
+            for table, column in (('audit_logs', 'timestamp'), ('login_session', 'login_time')):
+                conn.execute(text(f'DROP TABLE IF EXISTS "{table}" CASCADE'))
+                conn.execute(text(
+                    f'CREATE TABLE "{table}" (id INTEGER, "{column}" TIMESTAMP NOT NULL, PRIMARY KEY (id, "{column}")) '
+                    f'PARTITION BY RANGE ("{column}")'
+                ))
+                conn.execute(text(f'CREATE TABLE "{table}_default" PARTITION OF "{table}" DEFAULT'))
+
+    def tearDown(self):
+        shutil.rmtree(self.archive_dir)
+        with self.engine.begin() as conn:
+            conn.execute(text('DROP TABLE IF EXISTS audit_logs, login_session CASCADE'))
+        self.engine.dispose()
+
+    def test_rows_in_default_partition_move_to_the_new_month(self):
+        from log_partitions import run_log_maintenance
+        with self.engine.begin() as conn:
+            # The cron missed the lookahead: a January row landed in the default partition
+            conn.execute(text("INSERT INTO login_session VALUES (1, '2027-01-05 10:00:00'), (2, '2030-06-01 00:00:00')"))
+
+        summary = run_log_maintenance(self.engine, archive_dir=self.archive_dir, today=date(2026, 10, 19))
+        self.assertEqual(summary['errors'], {})
+        self.assertIn('login_session_y2027m01', summary['partitions'])
+        self.assertEqual(summary['pruned'], {'audit_logs': {}, 'login_session': {}})
+
+        with self.engine.connect() as conn:
+            placed = dict(conn.execute(text("SELECT id, tableoid::regclass::text FROM login_session")).all())
+            default = conn.execute(text(
+                "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = 'login_session'::regclass AND pg_get_expr(c.relpartbound, c.oid) = 'DEFAULT'"
+            )).scalar()
+        self.assertEqual(placed, {1: 'login_session_y2027m01', 2: 'login_session_default'})
+        self.assertEqual(default, 'login_session_default')
+
+        # Already in place: nothing to move the second time
+        self.assertEqual(run_log_maintenance(self.engine, archive_dir=self.archive_dir, today=date(2026, 10, 19))['errors'], {})
+
+    def test_failure_on_one_table_does_not_stop_the_other(self):
+        from log_partitions import run_log_maintenance
+        with self.engine.begin() as conn:
+            conn.execute(text('DROP TABLE audit_logs CASCADE'))
+            conn.execute(text("INSERT INTO login_session VALUES (1, '2025-01-05 10:00:00')"))
+
+        summary = run_log_maintenance(self.engine, archive_dir=self.archive_dir, today=date(2026, 10, 19))
+        self.assertIn('audit_logs', summary['errors'])
+        self.assertEqual(summary['pruned']['login_session']['2025-01-01'], 1)
+        with self.engine.connect() as conn:
+            self.assertEqual(conn.execute(text("SELECT COUNT(*) FROM login_session")).scalar(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+"""
+Test structured logging: JSON lines, request-ID correlation, levels and sampling
+"""
+import unittest
+import sys
+import os
+import io
+import json
+import logging
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from logging_config import configure_logging, flush_logging, log_sampled
+from main import app
+
+
+class TestLogging(unittest.TestCase):
+    """Test logging_config output"""
+
+    def setUp(self):
+        app.config["TESTING"] = True
+        self.client = app.test_client()
+        self.stream = io.StringIO()
+        configure_logging(stream=self.stream)
+        self.logger = logging.getLogger('test_logging')
+
+    def tearDown(self):
+        os.environ.pop('LOG_LEVELS', None)
+        logging.getLogger('test_logging').setLevel(logging.NOTSET)
+        configure_logging()
+
+    def lines(self):
+        flush_logging()
+        return [json.loads(line) for line in self.stream.getvalue().splitlines()]
+
+    def test_json_lines_carry_request_id_and_extra(self):
+        with app.test_request_context(headers={'X-Request-ID': 'req-123'}):
+            app.preprocess_request()
+            self.logger.info("Voucher %s redeemed", 'ABC', extra={'amount': 5})
+        entry = self.lines()[-1]
+        self.assertEqual(entry['msg'], 'Voucher ABC redeemed')
+        self.assertEqual(entry['request_id'], 'req-123')
+        self.assertEqual(entry['amount'], 5)
+        self.assertEqual(entry['logger'], 'test_logging')
+
+    def test_request_id_returned_and_malformed_ids_replaced(self):
+        response = self.client.get('/api/health', headers={'X-Request-ID': 'bad id; ' + 'x' * 100})
+        self.assertRegex(response.headers['X-Request-ID'], r'^[0-9a-f]{32}$')
+
+    def test_per_module_levels_and_sampling(self):
+        os.environ['LOG_LEVELS'] = 'test_logging=WARNING'
+        configure_logging(stream=self.stream)
+        self.logger.info("dropped")
+        self.logger.warning("kept")
+        logging.getLogger('test_logging').setLevel(logging.DEBUG)
+        log_sampled(self.logger, "never", rate=0)
+        log_sampled(self.logger, "always", rate=1)
+        messages = [(entry['msg'], entry.get('sample_rate')) for entry in self.lines()]
+        self.assertEqual(messages, [('kept', None), ('always', 1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+"""
+Test the admin login statistics endpoints
+"""
+import unittest
+import sys
+import os
+from datetime import datetime, timedelta
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from auth import clear_principal_cache
+from main import app, db, User, LoginSession
+
+
+class TestLoginAnalytics(unittest.TestCase):
+    """Test /api/admin/login-stats and /api/admin/login-stats/daily"""
+
+    def setUp(self):
+        app.config["TESTING"] = True
+        self.client = app.test_client()
+        clear_principal_cache()
+        now = datetime.utcnow()
+        with app.app_context():
+            db.create_all()
+            admin = User(email="stats-admin@example.com", password_hash="!", first_name="Ad", last_name="Min",
+                         user_type="admin", login_count=99, last_login=now)
+            db.session.add(admin)
+            users = [
+                User(email="stats-vendor@example.com", password_hash="!", first_name="Ven", last_name="Dor",
+                     user_type="vendor", shop_name="Corner Shop", login_count=12, last_login=now - timedelta(days=2)),
+                User(email="stats-vcse@example.com", password_hash="!", first_name="V", last_name="C",
+                     user_type="vcse", organization_name="Food Bank", login_count=12, last_login=now - timedelta(days=40)),
+                User(email="stats-recipient@example.com", password_hash="!", first_name="Rec", last_name="Ipient",
+                     user_type="recipient", login_count=3, last_login=now - timedelta(hours=1)),
+                User(email="stats-new@example.com", password_hash="!", first_name="New", last_name="User",
+                     user_type="recipient", login_count=0),
+                User(email="stats-gone@example.com", password_hash="!", first_name="Gone", last_name="User",
+                     user_type="recipient", login_count=50, is_active=False),
+            ]
+            db.session.add_all(users)
+            db.session.flush()
+            vendor, vcse, recipient = users[0], users[1], users[2]
+            db.session.add_all([
+                LoginSession(user_id=vendor.id, login_time=now - timedelta(days=2)),
+                LoginSession(user_id=vendor.id, login_time=now - timedelta(days=2)),
+                LoginSession(user_id=recipient.id, login_time=now - timedelta(days=2)),
+                LoginSession(user_id=recipient.id, login_time=now),
+                LoginSession(user_id=vcse.id, login_time=now - timedelta(days=40)),
+            ])
+            db.session.commit()
+            self.admin, self.vendor, self.vcse, self.recipient = admin.id, vendor.id, vcse.id, recipient.id
+
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = self.admin
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_summary_and_ordering(self):
+        response = self.client.get('/api/admin/login-stats')
+        self.assertEqual(response.status_code, 200)
+        data = response.json
+        self.assertEqual((data['total_users'], data['active_users'], data['total_logins']), (4, 2, 27))
+        self.assertEqual(data['summary']['never_logged_in'], 1)
+        self.assertIsNone(data['next_cursor'])
+
+        # Ties on login count break by newest account first
+        self.assertEqual([u['id'] for u in data['users'][:3]], [self.vcse, self.vendor, self.recipient])
+        vendor = data['users'][1]
+        self.assertEqual(vendor['display_name'], 'Corner Shop')
+        self.assertEqual(vendor['days_since_login'], 2)
+
+    def test_cursor_pages_cover_every_user_once(self):
+        for sort in ('login_count', 'last_login'):
+            seen, cursor = [], None
+            while True:
+                params = {'limit': 1, 'sort': sort}
+                if cursor:
+                    params['cursor'] = cursor
+                data = self.client.get('/api/admin/login-stats', query_string=params).json
+                seen.extend(u['id'] for u in data['users'])
+                cursor = data['next_cursor']
+                if not cursor:
+                    break
+            self.assertEqual(len(seen), 4)
+            self.assertEqual(len(set(seen)), 4)
+            if sort == 'last_login':
+                self.assertEqual(seen[:3], [self.recipient, self.vendor, self.vcse])
+
+    def test_role_filter_and_bad_input(self):
+        data = self.client.get('/api/admin/login-stats', query_string={'role': 'recipient'}).json
+        self.assertEqual(data['total_users'], 2)
+        self.assertEqual(self.client.get('/api/admin/login-stats', query_string={'cursor': 'nonsense'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/admin/login-stats', query_string={'sort': 'email'}).status_code, 400)
+
+    def test_daily_histogram(self):
+        response = self.client.get('/api/admin/login-stats/daily', query_string={'days': 7})
+        self.assertEqual(response.status_code, 200)
+        days = response.json['days']
+        self.assertEqual(len(days), 7)
+        self.assertEqual(days[-1]['date'], datetime.utcnow().date().isoformat())
+        self.assertEqual((days[-3]['logins'], days[-3]['users']), (3, 2))
+        self.assertEqual(sum(day['logins'] for day in days), 4)
+
+        vendors = self.client.get('/api/admin/login-stats/daily', query_string={'days': 7, 'role': 'vendor'}).json['days']
+        self.assertEqual(sum(day['logins'] for day in vendors), 2)
+
+    def test_requires_admin(self):
+        clear_principal_cache()
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = self.vendor
+        self.assertEqual(self.client.get('/api/admin/login-stats').status_code, 403)
+        self.assertEqual(self.client.get('/api/admin/login-stats/daily').status_code, 403)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+"""
+Test buffered login tracking
+"""
+import unittest
+import sys
+import os
+from datetime import timedelta
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import login_tracking
+from main import app, db, User, LoginSession
+from login_tracking import record_login, flush_logins, buffered_count
+
+
+class TestLoginTracking(unittest.TestCase):
+    """Test record_login and the batched flush"""
+
+    def setUp(self):
+        app.config["TESTING"] = True
+        with app.app_context():
+            db.create_all()
+            regular = User(email="track-regular@example.com", password_hash="!", first_name="Reg", last_name="Ular",
+                           user_type="recipient", login_count=5)
+            new = User(email="track-new@example.com", password_hash="!", first_name="New", last_name="User",
+                       user_type="recipient", login_count=None)
+            db.session.add_all([regular, new])
+            db.session.commit()
+            self.regular, self.new = regular.id, new.id
+
+    def tearDown(self):
+        login_tracking.MODE = 'buffer'
+        with app.app_context():
+            flush_logins()
+            db.session.remove()
+            db.drop_all()
+
+    def test_logins_are_buffered_then_written_in_one_batch(self):
+        with app.app_context():
+            for _ in range(3):
+                record_login(self.regular, '10.0.0.1', 'test-agent')
+            record_login(self.new)
+            record_login(999999)  # deleted since logging in: dropped, doesn't block the batch
+
+            flush_logins()
+            self.assertEqual(buffered_count(), 0)
+
+            regular = db.session.get(User, self.regular, populate_existing=True)
+            new = db.session.get(User, self.new, populate_existing=True)
+            self.assertEqual((regular.login_count, new.login_count), (8, 1))
+            self.assertIsNotNone(regular.last_login)
+            self.assertEqual(LoginSession.query.filter_by(user_id=self.regular, ip_address='10.0.0.1').count(), 3)
+            self.assertEqual(LoginSession.query.count(), 4)
+
+    def test_last_login_never_moves_backwards(self):
+        with app.app_context():
+            record_login(self.regular)
+            flush_logins()
+            latest = db.session.get(User, self.regular, populate_existing=True).last_login
+
+            # An older event flushed late (e.g. from another worker) keeps the newer timestamp
+            login_tracking._write_batch([(self.regular, latest - timedelta(minutes=5), None, None)])
+            db.session.commit()
+            user = db.session.get(User, self.regular, populate_existing=True)
+            self.assertEqual((user.login_count, user.last_login), (7, latest))
+
+    def test_sync_mode_writes_on_the_request(self):
+        login_tracking.MODE = 'sync'
+        with app.app_context():
+            record_login(self.new)
+            self.assertEqual(buffered_count(), 0)
+            self.assertEqual(db.session.get(User, self.new, populate_existing=True).login_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+"""
+Test the Prometheus metrics endpoint
+"""
+import unittest
+import sys
+import os
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from metrics import outbound_call
+from main import app, db
+
+
+class TestMetrics(unittest.TestCase):
+    """Test /api/metrics exposition"""
+
+    def setUp(self):
+        app.config["TESTING"] = True
+        self.client = app.test_client()
+        with app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def scrape(self):
+        response = self.client.get('/api/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        return response.get_data(as_text=True)
+
+    def test_request_latency_and_db_statements_per_endpoint(self):
+        self.client.get('/api/health/ready')
+        body = self.scrape()
+        self.assertIn('http_requests_total{endpoint="readiness_check",method="GET",status="200"}', body)
+        self.assertIn('http_request_duration_seconds_bucket{endpoint="readiness_check",le="0.005",method="GET"}', body)
+        self.assertIn('db_statements_total{endpoint="readiness_check"}', body)
+
+    def test_outbound_errors_and_queue_depth(self):
+        with self.assertRaises(RuntimeError):
+            with outbound_call('sms', 'send'):
+                raise RuntimeError('provider down')
+        body = self.scrape()
+        self.assertIn('outbound_request_errors_total{operation="send",service="sms"}', body)
+        self.assertIn('queue_depth{queue="stripe_webhook_events",state="pending"} 0.0', body)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+"""
+Test set-based notification fan-out and the routes that use it
+"""
+import unittest
+import sys
+import os
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from auth import clear_principal_cache
+from main import app, db, User, UserNotification
+from notification_fanout import notify_audience, notify_each
+
+
+class TestNotificationFanout(unittest.TestCase):
+    """Test audience and per-user notification inserts"""
+
+    def setUp(self):
+        app.config["TESTING"] = True
+        self.client = app.test_client()
+        clear_principal_cache()
+        with app.app_context():
+            db.create_all()
+            users = [
+                User(email="fanout-admin@example.com", password_hash="!", first_name="Ad", last_name="Min", user_type="admin", is_active=True),
+                User(email="fanout-vcse@example.com", password_hash="!", first_name="V", last_name="C", user_type="vcse", is_active=True),
+                User(email="fanout-school@example.com", password_hash="!", first_name="S", last_name="C", user_type="school", is_active=True),
+                User(email="fanout-inactive@example.com", password_hash="!", first_name="I", last_name="N", user_type="vcse", is_active=False),
+            ]
+            db.session.add_all(users)
+            db.session.commit()
+            self.admin, self.vcse, self.school, self.inactive = [u.id for u in users]
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def inbox(self):
+        return sorted(
+            (n.user_id, n.title, n.type) for n in UserNotification.query.all()
+        )
+
+    def test_notify_audience_by_type_ids_and_everyone(self):
+        with app.app_context():
+            self.assertEqual(notify_audience('Hello', 'Body', user_types=['vcse', 'school']), 2)
+            self.assertEqual(notify_audience('Ids', 'Body', user_ids=[self.admin, self.inactive, self.admin]), 1)
+            self.assertEqual(notify_audience('All', 'Body', active_only=False), 4)
+            db.session.commit()
+
+            self.assertEqual(UserNotification.query.filter_by(title='Hello').count(), 2)
+            self.assertEqual([n.user_id for n in UserNotification.query.filter_by(title='Ids')], [self.admin])
+            note = UserNotification.query.filter_by(title='Hello', user_id=self.vcse).one()
+            self.assertEqual((note.message, note.type, note.is_read), ('Body', 'info', False))
+            self.assertIsNotNone(note.created_at)
+
+    def test_notify_each(self):
+        with app.app_context():
+            created = notify_each([(self.vcse, 'Voucher', 'Code A'), (self.school, 'Voucher', 'Code B')], 'success')
+            db.session.commit()
+            self.assertEqual(created, 2)
+            self.assertEqual(
+                sorted((n.user_id, n.message) for n in UserNotification.query.all()),
+                [(self.vcse, 'Code A'), (self.school, 'Code B')]
+            )
+
+    def test_admin_broadcast_creates_in_app_notifications(self):
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = self.admin
+        response = self.client.post('/api/admin/broadcast', json={
+            'title': 'Closure', 'body': 'Closed on Monday', 'audiences': ['vcse', 'school']
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['notifications_created'], 2)
+        self.assertEqual(response.json['total_recipients'], 2)
+        with app.app_context():
+            self.assertEqual(self.inbox(), [(self.vcse, 'Closure', 'info'), (self.school, 'Closure', 'info')])
+
+
+if __name__ == '__main__':
+    unittest.main()
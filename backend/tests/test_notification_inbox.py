@@ -0,0 +1,140 @@
+"""
+Test per-user read state and unread counts for group notifications
+"""
+import unittest
+import sys
+import os
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from auth import clear_principal_cache
+from main import app, db, User, VendorShop, Notification, NotificationInbox
+from notification_inbox import delete_notifications
+from notifications_system import create_notification
+
+
+class TestNotificationInbox(unittest.TestCase):
+    """Test the notification inbox endpoints"""
+
+    def setUp(self):
+        app.config["TESTING"] = True
+        self.client = app.test_client()
+        clear_principal_cache()
+        with app.app_context():
+            db.create_all()
+            vendor = User(email="inbox-vendor@example.com", password_hash="!", first_name="Ven", last_name="Dor", user_type="vendor")
+            vcse_a = User(email="inbox-vcse-a@example.com", password_hash="!", first_name="A", last_name="V", user_type="vcse")
+            vcse_b = User(email="inbox-vcse-b@example.com", password_hash="!", first_name="B", last_name="V", user_type="vcse")
+            school = User(email="inbox-school@example.com", password_hash="!", first_name="S", last_name="C", user_type="school")
+            db.session.add_all([vendor, vcse_a, vcse_b, school])
+            db.session.flush()
+            shop = VendorShop(vendor_id=vendor.id, shop_name="Corner Shop", address="1 High St", postcode="NN9 6GR")
+            db.session.add(shop)
+            db.session.commit()
+            self.shop, self.vcse_a, self.vcse_b, self.school = shop.id, vcse_a.id, vcse_b.id, school.id
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def post_item(self, item_type='free_item', target_group='vcse'):
+        with app.app_context():
+            return create_notification(item_type, self.shop, None, target_group, 'Bread available', 'Bread', 'Corner Shop', '5').id
+
+    def login(self, user_id):
+        clear_principal_cache()
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = user_id
+
+    def inbox(self, user_id):
+        self.login(user_id)
+        response = self.client.get('/api/notifications')
+        self.assertEqual(response.status_code, 200)
+        return response.json
+
+    def test_read_state_is_per_user(self):
+        first = self.post_item()
+        self.post_item()
+
+        self.login(self.vcse_a)
+        response = self.client.post(f'/api/notifications/{first}/read')
+        self.assertEqual(response.json['unread_count'], 1)
+
+        inbox_a = self.inbox(self.vcse_a)
+        self.assertEqual(inbox_a['unread_count'], 1)
+        self.assertEqual({n['id']: n['is_read'] for n in inbox_a['notifications']}[first], True)
+
+        # Another member of the group still sees it unread
+        inbox_b = self.inbox(self.vcse_b)
+        self.assertEqual(inbox_b['unread_count'], 2)
+        self.assertFalse(any(n['is_read'] for n in inbox_b['notifications']))
+
+        # Marking it read again doesn't count twice
+        self.login(self.vcse_a)
+        self.assertEqual(self.client.post(f'/api/notifications/{first}/read').json['unread_count'], 1)
+
+    def test_counter_follows_new_notifications_and_mark_all_read(self):
+        self.post_item()
+        self.assertEqual(self.inbox(self.vcse_a)['unread_count'], 1)
+
+        # Counted incrementally once the inbox row exists; the school only sees discounted items
+        self.post_item('free_item', 'all')
+        self.post_item('discounted_item', 'all')
+        self.assertEqual(self.inbox(self.school)['unread_count'], 1)
+        with app.app_context():
+            self.assertEqual(db.session.get(NotificationInbox, self.vcse_a).unread_count, 3)
+
+        self.login(self.vcse_a)
+        response = self.client.post('/api/notifications/mark-all-read')
+        self.assertEqual(response.json['message'], 'Marked 3 notifications as read')
+        self.assertEqual(self.client.get('/api/notifications/unread-count').json['unread_count'], 0)
+        self.assertEqual(self.inbox(self.vcse_b)['unread_count'], 3)
+
+        self.post_item()
+        self.login(self.vcse_a)
+        self.assertEqual(self.client.get('/api/notifications/unread-count').json['unread_count'], 1)
+
+    def test_deleting_notifications_keeps_counts_in_step(self):
+        first = self.post_item()
+        self.post_item()
+        self.post_item('discounted_item', 'all')
+        self.login(self.vcse_a)
+        self.client.post(f'/api/notifications/{first}/read')
+        self.assertEqual(self.inbox(self.vcse_a)['unread_count'], 2)
+        self.assertEqual(self.inbox(self.vcse_b)['unread_count'], 3)
+        self.assertEqual(self.inbox(self.school)['unread_count'], 1)
+
+        # Bulk delete, as the user-deletion endpoints do: vcse_a had already read the first
+        with app.app_context():
+            self.assertEqual(delete_notifications(Notification.target_group == 'vcse'), 2)
+            db.session.commit()
+            counts = {user_id: db.session.get(NotificationInbox, user_id).unread_count
+                      for user_id in (self.vcse_a, self.vcse_b, self.school)}
+        self.assertEqual(counts, {self.vcse_a: 1, self.vcse_b: 1, self.school: 1})
+
+        # Deleting through the session counts too
+        with app.app_context():
+            db.session.delete(Notification.query.one())
+            db.session.commit()
+        for user_id in (self.vcse_a, self.vcse_b, self.school):
+            self.assertEqual(self.inbox(user_id)['unread_count'], 0)
+
+    def test_cannot_mark_notifications_outside_inbox(self):
+        hidden = self.post_item('free_item', 'vcse')
+        self.login(self.school)
+        self.assertEqual(self.client.post(f'/api/notifications/{hidden}/read').status_code, 404)
+
+    def test_legacy_shared_flag_counts_as_read(self):
+        legacy = self.post_item()
+        with app.app_context():
+            db.session.get(Notification, legacy).is_read = True
+            db.session.commit()
+        inbox = self.inbox(self.vcse_a)
+        self.assertEqual(inbox['unread_count'], 0)
+        self.assertTrue(inbox['notifications'][0]['is_read'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+"""
+Test the recipient voucher list and wallet summary
+"""
+import unittest
+import sys
+import os
+from datetime import date, timedelta
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from auth import clear_principal_cache
+from main import app, db, User, VendorShop, Voucher
+from voucher_ledger import record_redemption
+
+
+class TestRecipientWallet(unittest.TestCase):
+    """Test /api/recipient/vouchers and /api/recipient/wallet-summary"""
+
+    def setUp(self):
+        app.config["TESTING"] = True
+        self.client = app.test_client()
+        clear_principal_cache()
+        with app.app_context():
+            db.create_all()
+            issuer = User(email="wallet-issuer@example.com", password_hash="!", first_name="VCSE", last_name="Org", user_type="vcse", organization_name="Food Bank")
+            vendor = User(email="wallet-vendor@example.com", password_hash="!", first_name="Ven", last_name="Dor", user_type="vendor", shop_name="Corner Shop Ltd")
+            recipient = User(email="wallet-recipient@example.com", password_hash="!", first_name="Rec", last_name="Ipient", user_type="recipient")
+            db.session.add_all([issuer, vendor, recipient])
+            db.session.flush()
+            shop = VendorShop(vendor_id=vendor.id, shop_name="Corner Shop", address="1 High St", postcode="NN9 6GR")
+            db.session.add(shop)
+            db.session.commit()
+            self.issuer, self.vendor, self.recipient, self.shop = issuer.id, vendor.id, recipient.id, shop.id
+
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = self.recipient
+
+    def tearDown(self):
+        app.debug = False
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def issue(self, code, value, status='active'):
+        with app.app_context():
+            voucher = Voucher(code=code, value=value, issued_by=self.issuer, recipient_id=self.recipient,
+                              expiry_date=date.today() + timedelta(days=30), status=status)
+            db.session.add(voucher)
+            db.session.commit()
+            return voucher.id
+
+    def redeem(self, voucher_id, amount):
+        with app.app_context():
+            record_redemption(Voucher.query.get(voucher_id), amount, self.vendor, self.shop)
+            db.session.commit()
+
+    def test_vouchers_with_names_and_summary(self):
+        partly = self.issue('WALLET01', 20.0)
+        spent = self.issue('WALLET02', 15.0)
+        self.issue('WALLET03', 5.0, status='expired')
+        self.redeem(partly, 5)
+        self.redeem(spent, 15)
+
+        response = self.client.get('/api/recipient/vouchers')
+        self.assertEqual(response.status_code, 200)
+        vouchers = {v['code']: v for v in response.json['vouchers']}
+        self.assertEqual(vouchers['WALLET01']['issued_by'], {'name': 'Food Bank', 'type': 'vcse'})
+        self.assertEqual(vouchers['WALLET02']['redeemed_by'], {'name': 'Corner Shop Ltd'})
+        self.assertIsNone(vouchers['WALLET03']['redeemed_by'])
+
+        expected = {
+            'total_vouchers': 3, 'active_count': 1, 'redeemed_count': 1, 'expired_count': 1,
+            'total_active_value': 15.0, 'total_redeemed_value': 20.0
+        }
+        self.assertEqual(response.json['summary'], expected)
+
+        summary = self.client.get('/api/recipient/wallet-summary')
+        self.assertEqual(summary.status_code, 200)
+        self.assertEqual(summary.json, {'summary': expected})
+
+    def test_statement_count_does_not_grow_with_vouchers(self):
+        app.debug = True
+        self.issue('WALLET01', 10.0)
+        one = int(self.client.get('/api/recipient/vouchers').headers['X-DB-Statements'])
+        for i in range(2, 6):
+            self.issue(f'WALLET0{i}', 10.0)
+        clear_principal_cache()
+        five = int(self.client.get('/api/recipient/vouchers').headers['X-DB-Statements'])
+        self.assertEqual(one, five)
+
+    def test_wallet_summary_requires_recipient(self):
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = self.vendor
+        self.assertEqual(self.client.get('/api/recipient/wallet-summary').status_code, 403)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,190 @@
+"""
+Test the per-shop running totals and the payout checks that use them
+"""
+import unittest
+import sys
+import os
+from datetime import date, datetime, timedelta
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from auth import clear_principal_cache
+from main import app, db, User, VendorShop, Voucher, PayoutRequest, ShopBalance
+from shop_balances import current_period, reconcile_shop_balances, shop_balance
+from voucher_ledger import record_redemption
+
+PAYOUT = {
+    'amount': 0, 'bank_name': 'Bank', 'account_number': '12345678',
+    'sort_code': '00-00-00', 'account_holder_name': 'Vendor One'
+}
+
+
+class TestShopBalances(unittest.TestCase):
+    """Test redemption and payout totals, payout validation and reconciliation"""
+
+    def setUp(self):
+        app.config["TESTING"] = True
+        self.client = app.test_client()
+        clear_principal_cache()
+        with app.app_context():
+            db.create_all()
+            issuer = User(email="balance-issuer@example.com", password_hash="!", first_name="VCSE", last_name="Org", user_type="vcse")
+            vendor = User(email="balance-vendor@example.com", password_hash="!", first_name="Vendor", last_name="One", user_type="vendor", is_active=True, balance=0.0)
+            admin = User(email="balance-admin@example.com", password_hash="!", first_name="Ad", last_name="Min", user_type="admin", is_active=True)
+            recipient = User(email="balance-recipient@example.com", password_hash="!", first_name="Rec", last_name="Ipient", user_type="recipient")
+            db.session.add_all([issuer, vendor, admin, recipient])
+            db.session.flush()
+            shop = VendorShop(vendor_id=vendor.id, shop_name="Corner Shop", address="1 High St", postcode="NN9 6GR")
+            db.session.add(shop)
+            db.session.flush()
+            voucher = Voucher(code="BALANCE01", value=50.0, issued_by=issuer.id, recipient_id=recipient.id,
+                              expiry_date=date.today() + timedelta(days=30))
+            db.session.add(voucher)
+            db.session.commit()
+            self.vendor, self.admin, self.shop, self.voucher = vendor.id, admin.id, shop.id, voucher.id
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def redeem(self, *amounts):
+        with app.app_context():
+            voucher = Voucher.query.get(self.voucher)
+            for amount in amounts:
+                record_redemption(voucher, amount, self.vendor, self.shop)
+                db.session.commit()
+
+    def login(self, user_id):
+        clear_principal_cache()
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = user_id
+
+    def request_payout(self, amount):
+        self.login(self.vendor)
+        return self.client.post('/api/vendor/payout/request', json=dict(PAYOUT, shop_id=self.shop, amount=amount))
+
+    def test_redemptions_update_running_totals(self):
+        self.redeem(12.5, 7.5)
+        with app.app_context():
+            balance = shop_balance(self.shop)
+        self.assertEqual(balance['redeemed_total'], 20.0)
+        self.assertEqual(balance['redemption_count'], 2)
+        self.assertEqual(balance['redeemed_this_period'], 20.0)
+        self.assertEqual(balance['available_to_pay_out'], 20.0)
+
+        # A new month starts "redeemed this period" again without touching the lifetime total
+        with app.app_context():
+            db.session.get(ShopBalance, self.shop).period = '2000-01'
+            db.session.commit()
+            self.assertEqual(shop_balance(self.shop)['redeemed_this_period'], 0.0)
+        self.redeem(5)
+        with app.app_context():
+            balance = shop_balance(self.shop)
+        self.assertEqual((balance['redeemed_total'], balance['redeemed_this_period']), (25.0, 5.0))
+
+    def test_redeem_endpoint_rejects_unknown_shop(self):
+        response = self.client.post('/api/vouchers/redeem', json={'code': 'BALANCE01', 'shop_id': 9999})
+        self.assertEqual(response.status_code, 404)
+        with app.app_context():
+            self.assertEqual(Voucher.query.get(self.voucher).status, 'active')
+            self.assertEqual(ShopBalance.query.count(), 0)
+
+        response = self.client.post('/api/vouchers/redeem', json={'code': 'BALANCE01', 'shop_id': self.shop})
+        self.assertEqual(response.status_code, 200)
+        with app.app_context():
+            self.assertEqual(shop_balance(self.shop)['redeemed_total'], 50.0)
+            self.assertEqual(db.session.get(ShopBalance, self.shop).vendor_id, self.vendor)
+
+    def test_payout_requests_are_limited_to_available_balance(self):
+        self.redeem(30)
+
+        response = self.request_payout(40)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json['available_to_pay_out'], 30.0)
+        self.assertEqual(self.request_payout(0).status_code, 400)
+
+        self.assertEqual(self.request_payout(20).status_code, 201)
+        # The pending request is held back, so a second one can't claim the same money
+        self.assertEqual(self.request_payout(20).status_code, 400)
+        first = self.request_payout(10)
+        self.assertEqual(first.status_code, 201)
+
+        with app.app_context():
+            self.assertEqual(PayoutRequest.query.count(), 2)
+            balance = shop_balance(self.shop)
+        self.assertEqual((balance['pending_payouts'], balance['available_to_pay_out']), (30.0, 0.0))
+
+        response = self.client.get('/api/vendor/payout/balance')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['totals']['pending_payouts'], 30.0)
+
+    def test_review_and_payment_move_reservations(self):
+        self.redeem(30)
+        rejected = self.request_payout(10).json['payout_id']
+        paid = self.request_payout(15).json['payout_id']
+
+        self.login(self.admin)
+        self.assertEqual(self.client.post(f'/api/admin/payout/{rejected}/review', json={'action': 'reject'}).status_code, 200)
+        self.assertEqual(self.client.post(f'/api/admin/payout/{paid}/review', json={'action': 'approve'}).status_code, 200)
+        self.assertEqual(self.client.post(f'/api/admin/payout/{paid}/mark-paid').status_code, 200)
+        # Paying twice doesn't count twice
+        self.assertEqual(self.client.post(f'/api/admin/payout/{paid}/mark-paid').status_code, 400)
+
+        with app.app_context():
+            balance = shop_balance(self.shop)
+        self.assertEqual(balance['paid_out_total'], 15.0)
+        self.assertEqual(balance['pending_payouts'], 0.0)
+        self.assertEqual(balance['available_to_pay_out'], 15.0)
+
+    def test_approved_request_adds_to_vendor_balance(self):
+        from main import RedemptionRequest
+        with app.app_context():
+            redemption = RedemptionRequest(
+                voucher_id=self.voucher, vendor_id=self.vendor, shop_id=self.shop,
+                recipient_id=Voucher.query.get(self.voucher).recipient_id, amount=20.0, status='pending',
+                expires_at=datetime.now() + timedelta(minutes=5)
+            )
+            db.session.add(redemption)
+            db.session.commit()
+            redemption_id, recipient_id = redemption.id, redemption.recipient_id
+
+        self.login(recipient_id)
+        response = self.client.post(f'/api/recipient/redemption-requests/{redemption_id}/respond', json={'action': 'approve'})
+        self.assertEqual(response.status_code, 200)
+        with app.app_context():
+            self.assertEqual(User.query.get(self.vendor).balance, 20.0)
+            self.assertEqual(shop_balance(self.shop)['available_to_pay_out'], 20.0)
+
+    def test_reconcile_reports_and_fixes_drift(self):
+        self.redeem(30)
+        self.request_payout(10)
+        with app.app_context():
+            self.assertEqual(reconcile_shop_balances(db.engine)['mismatches'], [])
+
+            row = db.session.get(ShopBalance, self.shop)
+            row.redeemed_total = 99.0
+            row.reserved_total = 0.0
+            db.session.commit()
+
+            result = reconcile_shop_balances(db.engine, chunk_size=1)
+            self.assertEqual(
+                {(m['column'], m['stored'], m['expected']) for m in result['mismatches']},
+                {('redeemed_total', 99.0, 30.0), ('reserved_total', 0.0, 10.0)}
+            )
+            self.assertEqual(result['fixed'], 0)
+
+            # Backfill: a missing row is created from the raw data
+            db.session.delete(row)
+            db.session.commit()
+            result = reconcile_shop_balances(db.engine, fix=True)
+            self.assertEqual(result['fixed'], 1)
+            balance = shop_balance(self.shop)
+            self.assertEqual((balance['redeemed_total'], balance['pending_payouts']), (30.0, 10.0))
+            self.assertEqual(balance['period'], current_period())
+            self.assertEqual(reconcile_shop_balances(db.engine)['mismatches'], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
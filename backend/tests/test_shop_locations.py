@@ -0,0 +1,109 @@
+"""
+Test postcode placement of shops and the nearby-shops lookup
+"""
+import unittest
+import random
+import sys
+import os
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from auth import clear_principal_cache
+from main import app, db, User, VendorShop
+from shop_locations import ShopIndex, distance_km, invalidate_shop_index, outcode, postcode_location
+
+
+class TestShopLocations(unittest.TestCase):
+    """Test /api/shops/nearby and shop coordinates"""
+
+    def setUp(self):
+        app.config["TESTING"] = True
+        self.client = app.test_client()
+        clear_principal_cache()
+        invalidate_shop_index()
+        with app.app_context():
+            db.create_all()
+            vendor = User(email="nearby-vendor@example.com", password_hash="!", first_name="Ven", last_name="Dor", user_type="vendor")
+            recipient = User(email="nearby-recipient@example.com", password_hash="!", first_name="Rec", last_name="Ipient", user_type="recipient")
+            db.session.add_all([vendor, recipient])
+            db.session.flush()
+            shops = [
+                VendorShop(vendor_id=vendor.id, shop_name="Wellingborough", address="1 High St", postcode="NN8 1AA"),
+                VendorShop(vendor_id=vendor.id, shop_name="Rushden", address="2 High St", postcode="nn10 9xx"),
+                VendorShop(vendor_id=vendor.id, shop_name="Corby", address="3 High St", postcode="NN17 1AA"),
+                VendorShop(vendor_id=vendor.id, shop_name="Unplaced", address="4 High St", postcode="ZZ1 1ZZ"),
+            ]
+            db.session.add_all(shops)
+            db.session.commit()
+            self.vendor, self.recipient = vendor.id, recipient.id
+            self.shops = {shop.shop_name: shop.id for shop in shops}
+
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = self.recipient
+
+    def tearDown(self):
+        invalidate_shop_index()
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def nearby(self, **params):
+        return self.client.get('/api/shops/nearby', query_string=params)
+
+    def test_outcode_parsing(self):
+        self.assertEqual(outcode('nn9 6gr'), 'NN9')
+        self.assertEqual(outcode('NN96GR'), 'NN9')
+        self.assertEqual(outcode(' NN10 '), 'NN10')
+        self.assertIsNone(outcode('not a postcode'))
+        self.assertIsNone(postcode_location('ZZ1 1ZZ'))
+
+    def test_shops_placed_from_postcode(self):
+        with app.app_context():
+            placed = db.session.get(VendorShop, self.shops['Rushden'])
+            self.assertEqual((placed.latitude, placed.longitude), postcode_location('NN10'))
+            self.assertIsNone(db.session.get(VendorShop, self.shops['Unplaced']).latitude)
+
+    def test_nearby_sorted_by_distance_within_radius(self):
+        response = self.nearby(postcode='NN9 6GR', radius=10)
+        self.assertEqual(response.status_code, 200)
+        names = [shop['shop_name'] for shop in response.json['shops']]
+        self.assertEqual(names, ['Rushden', 'Wellingborough'])
+        distances = [shop['distance_km'] for shop in response.json['shops']]
+        self.assertEqual(distances, sorted(distances))
+
+        wide = self.nearby(postcode='NN9 6GR', radius=50, limit=2).json
+        self.assertEqual(wide['total_count'], 2)
+
+    def test_index_follows_shop_changes(self):
+        self.assertEqual(self.nearby(postcode='NN17', radius=5).json['total_count'], 1)
+
+        with app.app_context():
+            db.session.get(VendorShop, self.shops['Corby']).postcode = 'NN11 4AA'
+            db.session.get(VendorShop, self.shops['Wellingborough']).is_active = False
+            db.session.commit()
+
+        self.assertEqual(self.nearby(postcode='NN17', radius=5).json['total_count'], 0)
+        daventry = self.nearby(postcode='NN11', radius=5).json['shops']
+        self.assertEqual([shop['shop_name'] for shop in daventry], ['Corby'])
+        self.assertNotIn('Wellingborough', [s['shop_name'] for s in self.nearby(postcode='NN8', radius=5).json['shops']])
+
+    def test_rejects_unknown_postcode_and_bad_radius(self):
+        self.assertEqual(self.nearby(postcode='ZZ1 1ZZ').status_code, 400)
+        self.assertEqual(self.nearby(postcode='NN8', radius=500).status_code, 400)
+        self.assertEqual(self.nearby().status_code, 400)
+
+    def test_grid_matches_brute_force(self):
+        rng = random.Random(46)
+        points = [(i, rng.uniform(51.9, 52.7), rng.uniform(-1.4, -0.2)) for i in range(2000)]
+        index = ShopIndex(points)
+        for _ in range(20):
+            lat, lon, radius = rng.uniform(52.0, 52.6), rng.uniform(-1.3, -0.3), rng.uniform(1, 25)
+            expected = sorted(
+                (shop_id for shop_id, p_lat, p_lon in points if distance_km(lat, lon, p_lat, p_lon) <= radius)
+            )
+            self.assertEqual(sorted(shop_id for shop_id, _ in index.nearby(lat, lon, radius)), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+"""
+Test bulk SMS dispatch: normalization, de-duplication and per-message results
+"""
+import unittest
+import sys
+import os
+from types import SimpleNamespace
+from unittest import mock
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+
+class TestSMSSendMany(unittest.TestCase):
+    """Test SMSService.send_many"""
+
+    def setUp(self):
+        from sms_service import SMSService
+
+        self.service = SMSService()
+        self.service.client = mock.Mock()
+        self.service.client.messages.create.return_value = SimpleNamespace(sid='SM1', status='queued')
+        self.service.from_number = '+447000000000'
+        self.service.enabled = True
+
+    def test_normalize_number(self):
+        from sms_service import normalize_number
+
+        self.assertEqual(normalize_number('07700 900123'), '+447700900123')
+        self.assertEqual(normalize_number('0044 7700-900123'), '+447700900123')
+        self.assertEqual(normalize_number('+447700900123'), '+447700900123')
+        self.assertIsNone(normalize_number(''))
+
+    def test_duplicates_sent_once_with_results_in_order(self):
+        result = self.service.send_many([
+            ('07700 900123', 'hello'),
+            ('+447700900123', 'hello'),
+            ('', 'hello'),
+            {'to': '07700900456', 'message': 'hello'},
+        ], rate_per_second=0)
+
+        self.assertEqual(self.service.client.messages.create.call_count, 2)
+        self.assertEqual((result['sent'], result['failed'], result['duplicates']), (2, 1, 1))
+        self.assertEqual([r['success'] for r in result['results']], [True, True, False, True])
+        self.assertTrue(result['results'][1]['duplicate'])
+        self.assertEqual(result['results'][3]['to'], '+447700900456')
+
+
+if __name__ == '__main__':
+    unittest.main()
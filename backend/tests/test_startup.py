@@ -0,0 +1,116 @@
+"""
+Test app startup: optional dependencies stay lazy and schema versions are tracked
+"""
+import unittest
+import sys
+import os
+import tempfile
+
+# Add src, scripts and migrations to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'migrations'))
+
+from sqlalchemy import create_engine, text
+from import_time_benchmark import LAZY_MODULES, measure
+from schema_migrations import applied_versions, ensure_version_table, pending_migrations, record_version
+
+# `import main` measures 0.6-0.9 s; a regression like an eager reportlab/numpy import pushes it past this
+IMPORT_TIME_BUDGET_MS = int(os.environ.get('IMPORT_TIME_BUDGET_MS', '1500'))
+
+
+class TestImportTime(unittest.TestCase):
+    """Import main in a fresh interpreter"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.timings = measure('main')
+
+    def test_optional_dependencies_not_imported(self):
+        eager = [name for name in LAZY_MODULES if name in self.timings]
+        self.assertEqual(eager, [])
+
+    def test_import_within_budget(self):
+        self.assertLess(self.timings['main'][1] / 1000, IMPORT_TIME_BUDGET_MS)
+
+
+class TestSchemaVersions(unittest.TestCase):
+    """Test the schema_version bookkeeping migrate.py relies on"""
+
+    MIGRATIONS = [
+        ('1.0.10', 'tenth', None),
+        ('1.0.0', 'baseline', None),
+        ('1.0.9', 'ninth', None),
+    ]
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmp.name, 'versions.db')}")
+        ensure_version_table(self.engine)
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmp.cleanup()
+
+    def test_pending_in_version_order(self):
+        pending = pending_migrations(self.engine, self.MIGRATIONS)
+        self.assertEqual([m[0] for m in pending], ['1.0.0', '1.0.9', '1.0.10'])
+
+    def test_recorded_versions_not_pending(self):
+        record_version(self.engine, '1.0.0', 'baseline')
+        record_version(self.engine, '1.0.0', 'baseline')  # idempotent
+        self.assertEqual(list(applied_versions(self.engine)), ['1.0.0'])
+        pending = pending_migrations(self.engine, self.MIGRATIONS)
+        self.assertEqual([m[0] for m in pending], ['1.0.9', '1.0.10'])
+
+
+class TestMigrationScripts(unittest.TestCase):
+    """Run every registered migration script the way migrate.py does"""
+
+    def run_all(self, url):
+        import migrate
+        from main import db
+
+        engine = create_engine(url)
+        db.metadata.create_all(engine)
+        original = os.environ.get('DATABASE_URL')
+        os.environ['DATABASE_URL'] = url
+        try:
+            for version, _, step in migrate.MIGRATIONS:
+                if callable(step):
+                    continue
+                with self.subTest(version=version, script=step):
+                    with open(os.path.join(migrate.MIGRATIONS_DIR, step)) as handle:
+                        self.assertTrue('def run_migration(' in handle.read(), f'{step} has no run_migration()')
+                    self.assertTrue(migrate.run_script(step))
+        finally:
+            if original is None:
+                os.environ.pop('DATABASE_URL', None)
+            else:
+                os.environ['DATABASE_URL'] = original
+            if engine.dialect.name == 'postgresql':
+                # The scratch database: drop_all can't order the user <-> vendor_shop cycle
+                with engine.begin() as conn:
+                    conn.execute(text('DROP SCHEMA public CASCADE; CREATE SCHEMA public'))
+            engine.dispose()
+
+    def test_scripts_run_on_sqlite(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            self.run_all(f"sqlite:///{os.path.join(tmp, 'migrations.db')}")
+
+    @unittest.skipUnless(os.environ.get('TEST_POSTGRES_URL'), 'TEST_POSTGRES_URL not set')
+    def test_scripts_run_on_postgres(self):
+        self.run_all(os.environ['TEST_POSTGRES_URL'])
+
+    def test_failing_script_is_reported(self):
+        import migrate
+        with tempfile.NamedTemporaryFile('w', suffix='.py', dir=migrate.MIGRATIONS_DIR, delete=False) as script:
+            script.write("raise RuntimeError('no database')\n")
+        try:
+            self.assertFalse(migrate.run_script(os.path.basename(script.name)))
+        finally:
+            os.remove(script.name)
+
+
+if __name__ == '__main__':
+    unittest.main()
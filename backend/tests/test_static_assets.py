@@ -0,0 +1,65 @@
+"""
+Test the static asset manifest: caching headers, precompressed variants and ETags
+"""
+import unittest
+import sys
+import os
+import gzip
+import shutil
+import tempfile
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from static_assets import StaticManifest, precompress
+from main import app
+
+
+class TestStaticAssets(unittest.TestCase):
+    """Test StaticManifest against a throwaway dist/ directory"""
+
+    def setUp(self):
+        self.dist = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.dist, 'assets'))
+        self.bundle = 'console.log("voucher");\n' * 50
+        with open(os.path.join(self.dist, 'assets', 'index.Dk36t62w.js'), 'w') as f:
+            f.write(self.bundle)
+        with open(os.path.join(self.dist, 'index.html'), 'w') as f:
+            f.write('<!doctype html><div id="root"></div>' * 20)
+        precompress(self.dist)
+        self.manifest = StaticManifest(self.dist)
+
+    def tearDown(self):
+        shutil.rmtree(self.dist)
+
+    def serve(self, path, headers=None):
+        with app.test_request_context('/' + path, headers=headers or {}):
+            response = self.manifest.response(self.manifest.get(path))
+            body = b''.join(response.response)
+            response.close()
+            return response, body
+
+    def test_hashed_bundle_is_immutable_and_precompressed(self):
+        response, body = self.serve('assets/index.Dk36t62w.js', {'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+        self.assertTrue(response.content_type.startswith('application/javascript'))
+        self.assertEqual(gzip.decompress(body).decode(), self.bundle)
+
+        response, body = self.serve('assets/index.Dk36t62w.js')
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(body.decode(), self.bundle)
+
+    def test_index_short_ttl_and_not_modified(self):
+        response, _ = self.serve('index.html', {'Accept-Encoding': 'br, gzip'})
+        self.assertIn('max-age=60', response.headers['Cache-Control'])
+        self.assertEqual(response.headers['Content-Encoding'], 'br')
+
+        response, body = self.serve('index.html', {'Accept-Encoding': 'br, gzip', 'If-None-Match': response.headers['ETag']})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(body, b'')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+"""
+Test the Stripe webhook inbox: idempotent storage, exactly-once crediting and retries
+"""
+import unittest
+import sys
+import os
+import json
+from datetime import datetime, timedelta
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import stripe_webhook_inbox as inbox
+from main import app, db, User, PaymentTransaction, UserNotification
+
+
+def payment_event(event_id, intent_id, event_type='payment_intent.succeeded', created=1760000000):
+    return {
+        'id': event_id,
+        'type': event_type,
+        'created': created,
+        'data': {'object': {'id': intent_id, 'payment_method': 'pm_card'}}
+    }
+
+
+class TestStripeWebhookInbox(unittest.TestCase):
+    """Test store_event, process_event and reclaim_stale_events"""
+
+    def setUp(self):
+        # The tests drive the inbox themselves; keep the background worker idle
+        self.original_mode = inbox.WORKER_MODE
+        inbox.WORKER_MODE = 'off'
+        with app.app_context():
+            db.create_all()
+            vcse = User(email="inbox-vcse@example.com", password_hash="!", first_name="V", last_name="C",
+                        user_type="vcse", balance=10.0)
+            db.session.add(vcse)
+            db.session.flush()
+            payment = PaymentTransaction(vcse_id=vcse.id, amount=25.0, stripe_payment_intent_id='pi_inbox_1', status='pending')
+            db.session.add(payment)
+            db.session.commit()
+            self.vcse, self.payment = vcse.id, payment.id
+
+    def tearDown(self):
+        inbox.WORKER_MODE = self.original_mode
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def store(self, event):
+        return inbox.store_event(event, json.dumps(event).encode())
+
+    def balance(self):
+        return db.session.get(User, self.vcse).balance
+
+    def test_worker_started_at_init(self):
+        self.assertTrue(inbox._worker_thread is not None and inbox._worker_thread.is_alive())
+
+    def test_duplicate_delivery_is_stored_once(self):
+        with app.app_context():
+            event = payment_event('evt_dup', 'pi_inbox_1')
+            self.assertTrue(self.store(event))
+            self.assertFalse(self.store(event))
+            self.assertEqual(inbox.StripeWebhookEvent.query.count(), 1)
+
+            self.assertEqual(inbox.process_event('evt_dup'), 'processed')
+            # Already claimed and applied: a second attempt does nothing
+            self.assertIsNone(inbox.process_event('evt_dup'))
+            self.assertEqual(self.balance(), 35.0)
+
+    def test_payment_credited_exactly_once(self):
+        with app.app_context():
+            # Stripe can send distinct events for the same payment; /api/payment/verify can race them too
+            self.store(payment_event('evt_a', 'pi_inbox_1'))
+            self.store(payment_event('evt_b', 'pi_inbox_1', created=1760000001))
+            self.assertEqual(inbox.process_pending_events(), 2)
+
+            statuses = dict(db.session.query(inbox.StripeWebhookEvent.event_id, inbox.StripeWebhookEvent.status))
+            self.assertEqual(statuses, {'evt_a': 'processed', 'evt_b': 'ignored'})
+            self.assertEqual(self.balance(), 35.0)
+            self.assertIsNone(inbox.credit_succeeded_payment(db.session.get(PaymentTransaction, self.payment)))
+            self.assertEqual(db.session.get(PaymentTransaction, self.payment).status, 'succeeded')
+
+    def test_retries_then_fails(self):
+        def broken(payment_intent):
+            raise RuntimeError('handler exploded')
+
+        original = inbox.EVENT_HANDLERS['payment_intent.succeeded']
+        inbox.EVENT_HANDLERS['payment_intent.succeeded'] = broken
+        try:
+            with app.app_context():
+                self.store(payment_event('evt_retry', 'pi_inbox_1'))
+                statuses = [inbox.process_event('evt_retry') for _ in range(inbox.MAX_ATTEMPTS)]
+                record = db.session.get(inbox.StripeWebhookEvent, 'evt_retry')
+                self.assertEqual(statuses, ['pending'] * (inbox.MAX_ATTEMPTS - 1) + ['failed'])
+                self.assertEqual(record.attempts, inbox.MAX_ATTEMPTS)
+                self.assertEqual(record.last_error, 'handler exploded')
+                self.assertIsNone(inbox.process_event('evt_retry'))
+                self.assertEqual(self.balance(), 10.0)
+        finally:
+            inbox.EVENT_HANDLERS['payment_intent.succeeded'] = original
+
+    def test_failed_attempt_leaves_no_credit_behind(self):
+        original = inbox.notify
+
+        def notify_then_fail(*args):
+            original(*args)
+            raise RuntimeError('crashed after notifying')
+
+        inbox.notify = notify_then_fail
+        try:
+            with app.app_context():
+                self.store(payment_event('evt_crash', 'pi_inbox_1'))
+                self.assertEqual(inbox.process_event('evt_crash'), 'pending')
+                # Credit and notification were rolled back with the attempt
+                self.assertEqual(self.balance(), 10.0)
+                self.assertEqual(db.session.get(PaymentTransaction, self.payment).status, 'pending')
+                self.assertEqual(UserNotification.query.count(), 0)
+        finally:
+            inbox.notify = original
+
+        with app.app_context():
+            self.assertEqual(inbox.process_event('evt_crash'), 'processed')
+            self.assertEqual(self.balance(), 35.0)
+            self.assertEqual(UserNotification.query.filter_by(user_id=self.vcse, type='success').count(), 1)
+
+    def test_stale_claims_are_released_and_applied(self):
+        with app.app_context():
+            self.store(payment_event('evt_stale', 'pi_inbox_1'))
+            self.store(payment_event('evt_busy', 'pi_other'))
+            now = datetime.utcnow()
+            Event = inbox.StripeWebhookEvent
+            # One claim from a worker that died long ago, one still being worked on
+            Event.query.filter_by(event_id='evt_stale').update({
+                'status': 'processing', 'attempts': 1, 'claimed_at': now - timedelta(seconds=inbox.CLAIM_TIMEOUT + 60)
+            })
+            Event.query.filter_by(event_id='evt_busy').update({'status': 'processing', 'attempts': 1, 'claimed_at': now})
+            db.session.commit()
+
+            self.assertEqual(inbox.process_pending_events(), 1)
+            self.assertEqual(db.session.get(Event, 'evt_stale').status, 'processed')
+            self.assertEqual(db.session.get(Event, 'evt_stale').attempts, 2)
+            self.assertEqual(db.session.get(Event, 'evt_busy').status, 'processing')
+            self.assertEqual(self.balance(), 35.0)
+
+    def test_stale_claim_out_of_attempts_fails(self):
+        with app.app_context():
+            self.store(payment_event('evt_dead', 'pi_inbox_1'))
+            inbox.StripeWebhookEvent.query.filter_by(event_id='evt_dead').update({
+                'status': 'processing', 'attempts': inbox.MAX_ATTEMPTS, 'claimed_at': None
+            })
+            db.session.commit()
+            self.assertEqual(inbox.reclaim_stale_events(), 1)
+            self.assertEqual(db.session.get(inbox.StripeWebhookEvent, 'evt_dead').status, 'failed')
+
+
+if __name__ == '__main__':
+    unittest.main()
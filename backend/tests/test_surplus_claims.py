@@ -0,0 +1,73 @@
+"""
+Test atomic surplus item claiming: one winner, 409 for the rest, partial claims
+"""
+import unittest
+import sys
+import os
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from main import app, db, User, VendorShop, SurplusItem
+
+
+class TestSurplusClaims(unittest.TestCase):
+    """Test /api/vcse/accept-food-item against the claim engine"""
+
+    def setUp(self):
+        app.config["TESTING"] = True
+        self.client = app.test_client()
+        with app.app_context():
+            db.create_all()
+            vendor = User(email="claim-vendor@example.com", password_hash="!", first_name="Vendor", last_name="User", user_type="vendor")
+            vcse_a = User(email="claim-vcse-a@example.com", password_hash="!", first_name="VCSE", last_name="A", user_type="vcse")
+            vcse_b = User(email="claim-vcse-b@example.com", password_hash="!", first_name="VCSE", last_name="B", user_type="vcse")
+            db.session.add_all([vendor, vcse_a, vcse_b])
+            db.session.flush()
+            shop = VendorShop(vendor_id=vendor.id, shop_name="Claim Shop", address="1 High St", postcode="NN9 6GR")
+            db.session.add(shop)
+            db.session.flush()
+            item = SurplusItem(vendor_id=vendor.id, shop_id=shop.id, item_name="Bread", quantity="10 loaves", category="edible")
+            db.session.add(item)
+            db.session.commit()
+            self.item_id, self.vcse_a, self.vcse_b = item.id, vcse_a.id, vcse_b.id
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def accept(self, vcse_id, **extra):
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = vcse_id
+        return self.client.post('/api/vcse/accept-food-item', json=dict(
+            item_id=self.item_id, collection_time='2026-10-20T10:00:00', **extra
+        ))
+
+    def test_second_whole_claim_gets_409(self):
+        self.assertEqual(self.accept(self.vcse_a).status_code, 200)
+        response = self.accept(self.vcse_b)
+        self.assertEqual(response.status_code, 409)
+        with app.app_context():
+            self.assertEqual(db.session.get(SurplusItem, self.item_id).accepted_by_vcse_id, self.vcse_a)
+
+    def test_partial_claims_split_item(self):
+        response = self.accept(self.vcse_a, quantity=4)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['item']['quantity'], '4 loaves')
+        self.assertEqual(response.json['item']['remaining_quantity'], 6)
+
+        self.assertEqual(self.accept(self.vcse_b, quantity=7).status_code, 409)
+        response = self.accept(self.vcse_b, quantity=6)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['item']['id'], self.item_id)
+
+        with app.app_context():
+            original = db.session.get(SurplusItem, self.item_id)
+            self.assertEqual((original.quantity, original.collection_status), ('6 loaves', 'accepted'))
+            split = SurplusItem.query.filter_by(parent_item_id=self.item_id).one()
+            self.assertEqual((split.accepted_by_vcse_id, split.collection_status), (self.vcse_a, 'accepted'))
+
+
+if __name__ == '__main__':
+    unittest.main()
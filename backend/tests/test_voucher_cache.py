@@ -0,0 +1,91 @@
+"""
+Test the vendor validation cache: hits skip the database, writes invalidate
+"""
+import unittest
+import sys
+import os
+from datetime import date, timedelta
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from sqlalchemy import event
+
+from auth import clear_principal_cache
+from main import app, db, User, VendorShop, Voucher
+import voucher_cache
+
+
+class TestVoucherCache(unittest.TestCase):
+    """Test get_voucher_state and /api/vendor/validate-voucher"""
+
+    def setUp(self):
+        app.config["TESTING"] = True
+        self.client = app.test_client()
+        clear_principal_cache()
+        voucher_cache.clear_cache()
+        self.ttl = voucher_cache.VOUCHER_CACHE_TTL
+        voucher_cache.VOUCHER_CACHE_TTL = 60
+        with app.app_context():
+            db.create_all()
+            issuer = User(email="cache-issuer@example.com", password_hash="!", first_name="VCSE", last_name="Org", user_type="vcse")
+            recipient = User(email="cache-recipient@example.com", password_hash="!", first_name="Rita", last_name="Recipient", user_type="recipient", phone="07700900000")
+            vendor = User(email="cache-vendor@example.com", password_hash="!", first_name="Vendor", last_name="User", user_type="vendor")
+            db.session.add_all([issuer, recipient, vendor])
+            db.session.flush()
+            db.session.add(VendorShop(vendor_id=vendor.id, shop_name="Cache Shop", address="1 High St", postcode="NN9 6GR"))
+            db.session.add(Voucher(code="CACHE1", value=20.0, issued_by=issuer.id, recipient_id=recipient.id,
+                                   expiry_date=date.today() + timedelta(days=30)))
+            db.session.commit()
+            self.vendor_id = vendor.id
+
+    def tearDown(self):
+        voucher_cache.VOUCHER_CACHE_TTL = self.ttl
+        voucher_cache.clear_cache()
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def count_queries(self, fn):
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            result = fn()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        return result, statements
+
+    def test_hit_served_without_query(self):
+        with app.app_context():
+            first, _ = self.count_queries(lambda: voucher_cache.get_voucher_state("CACHE1"))
+            self.assertEqual(first.recipient_name, "Rita Recipient")
+            second, statements = self.count_queries(lambda: voucher_cache.get_voucher_state("CACHE1"))
+            self.assertIs(second, first)
+            self.assertEqual(statements, [])
+
+    def test_commit_bumps_version_and_evicts(self):
+        with app.app_context():
+            before = voucher_cache.get_voucher_state("CACHE1")
+            voucher = Voucher.query.filter_by(code="CACHE1").first()
+            voucher.value = 5.0
+            db.session.commit()
+            after = voucher_cache.get_voucher_state("CACHE1")
+            self.assertEqual(after.value, 5.0)
+            self.assertEqual(after.version, before.version + 1)
+
+    def test_validate_endpoint_uses_cache(self):
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = self.vendor_id
+        response = self.client.post('/api/vendor/validate-voucher', json={'code': 'cache1'})
+        self.assertTrue(response.json['valid'])
+        self.assertEqual(response.json['voucher']['recipient']['name'], "Rita Recipient")
+        self.assertGreaterEqual(voucher_cache.cache_stats()['misses'], 1)
+
+        response = self.client.post('/api/vendor/redeem-voucher', json={'code': 'CACHE1', 'amount': 5})
+        self.assertEqual(response.status_code, 200, response.json)
+        self.assertEqual(response.json['voucher']['recipient']['name'], "Rita Recipient")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+"""
+Test the append-only voucher ledger and the reports that read it
+"""
+import unittest
+import sys
+import os
+from datetime import date, datetime, timedelta
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from auth import clear_principal_cache
+from main import app, db, User, VendorShop, Voucher, VoucherLedger, RedemptionRequest
+from voucher_ledger import (
+    backfill_voucher_ledger, expired_amounts, find_balance_mismatches, ledger_totals, record_redemption
+)
+
+
+class TestVoucherLedger(unittest.TestCase):
+    """Test ledger entries for issue, redeem, expire and adjust, and the backfill"""
+
+    def setUp(self):
+        app.config["TESTING"] = True
+        self.client = app.test_client()
+        clear_principal_cache()
+        with app.app_context():
+            db.create_all()
+            issuer = User(email="ledger-issuer@example.com", password_hash="!", first_name="VCSE", last_name="Org", user_type="vcse", organization_name="Food Bank")
+            vendor = User(email="ledger-vendor@example.com", password_hash="!", first_name="Vendor", last_name="One", user_type="vendor", is_active=True, balance=0.0)
+            recipient = User(email="ledger-recipient@example.com", password_hash="!", first_name="Rec", last_name="Ipient", user_type="recipient")
+            db.session.add_all([issuer, vendor, recipient])
+            db.session.flush()
+            shop = VendorShop(vendor_id=vendor.id, shop_name="Corner Shop", address="1 High St", postcode="NN9 6GR")
+            db.session.add(shop)
+            db.session.flush()
+            voucher = Voucher(code="LEDGER01", value=30.0, issued_by=issuer.id, recipient_id=recipient.id,
+                              expiry_date=date.today() + timedelta(days=30))
+            db.session.add(voucher)
+            db.session.commit()
+            self.issuer, self.vendor, self.recipient = issuer.id, vendor.id, recipient.id
+            self.shop, self.voucher = shop.id, voucher.id
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def entries(self, voucher_id=None):
+        return [
+            (e.entry_type, e.amount, e.balance_after)
+            for e in VoucherLedger.query.filter_by(voucher_id=voucher_id or self.voucher).order_by(VoucherLedger.id)
+        ]
+
+    def test_issue_and_partial_redemptions_keep_history(self):
+        with app.app_context():
+            voucher = Voucher.query.get(self.voucher)
+            record_redemption(voucher, 12.5, self.vendor, self.shop)
+            db.session.commit()
+            record_redemption(voucher, 17.5, self.vendor, self.shop)
+            db.session.commit()
+
+            self.assertEqual(self.entries(), [('issue', 30.0, 30.0), ('redeem', -12.5, 17.5), ('redeem', -17.5, 0.0)])
+            self.assertEqual(voucher.status, 'redeemed')
+            self.assertEqual(find_balance_mismatches(), [])
+
+            totals = ledger_totals()
+            self.assertEqual(totals['issue'], {'count': 1, 'amount': 30.0})
+            self.assertEqual(totals['redeem'], {'count': 2, 'amount': 30.0})
+
+            with self.assertRaises(ValueError):
+                record_redemption(voucher, 1, self.vendor, self.shop)
+
+    def test_approved_request_is_recorded_and_counted_as_revenue(self):
+        with app.app_context():
+            request_id = RedemptionRequest(
+                voucher_id=self.voucher, vendor_id=self.vendor, shop_id=self.shop, recipient_id=self.recipient,
+                amount=30.0, status='pending', expires_at=datetime.now() + timedelta(minutes=5)
+            )
+            db.session.add(request_id)
+            db.session.commit()
+            request_id = request_id.id
+
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = self.recipient
+        response = self.client.post(f'/api/recipient/redemption-requests/{request_id}/respond', json={'action': 'approve'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['remaining_balance'], 0.0)
+
+        with app.app_context():
+            entry = VoucherLedger.query.filter_by(entry_type='redeem').one()
+            self.assertEqual((entry.vendor_id, entry.shop_id, entry.redemption_request_id), (self.vendor, self.shop, request_id))
+
+        # Fully redeemed vouchers used to report £0 revenue (the balance left)
+        clear_principal_cache()
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = self.vendor
+        metrics = self.client.get('/api/vendor/metrics/overview').json['metrics']
+        self.assertEqual(metrics['total_revenue'], 30.0)
+        self.assertEqual(metrics['total_redemptions'], 1)
+
+    def test_expiry_writes_off_balance(self):
+        with app.app_context():
+            voucher = Voucher.query.get(self.voucher)
+            record_redemption(voucher, 10, self.vendor, self.shop)
+            db.session.commit()
+            voucher.status = 'expired'
+            db.session.commit()
+
+            self.assertEqual(self.entries()[-1], ('expire', -20.0, 0.0))
+            self.assertEqual(voucher.value, 0.0)
+            self.assertEqual(expired_amounts([self.voucher]), {self.voucher: 20.0})
+
+    def test_direct_value_change_is_an_adjustment(self):
+        with app.app_context():
+            voucher = Voucher.query.get(self.voucher)
+            voucher.value = 25.0
+            db.session.commit()
+            self.assertEqual(self.entries()[-1], ('adjust', -5.0, 25.0))
+            self.assertEqual(find_balance_mismatches(), [])
+
+    def test_backfill_reconstructs_history(self):
+        with app.app_context():
+            # A partly redeemed voucher from before the ledger existed: £30 issued, £12 approved, then expired
+            db.session.add(RedemptionRequest(
+                voucher_id=self.voucher, vendor_id=self.vendor, shop_id=self.shop, recipient_id=self.recipient,
+                amount=12.0, status='approved', responded_at=datetime.utcnow()
+            ))
+            db.session.commit()
+            with db.engine.begin() as conn:
+                conn.execute(VoucherLedger.__table__.delete())
+                conn.execute(Voucher.__table__.update().values(value=18.0, status='expired'))
+
+            with db.engine.begin() as conn:
+                self.assertEqual(backfill_voucher_ledger(conn), 1)
+            with db.engine.begin() as conn:
+                self.assertEqual(backfill_voucher_ledger(conn), 0)
+
+            db.session.expire_all()
+            self.assertEqual(self.entries(), [('issue', 30.0, 30.0), ('redeem', -12.0, 18.0), ('expire', -18.0, 0.0)])
+            self.assertEqual(Voucher.query.get(self.voucher).value, 0.0)
+            self.assertEqual(find_balance_mismatches(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
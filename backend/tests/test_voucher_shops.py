@@ -0,0 +1,75 @@
+"""
+Test voucher shop eligibility through the voucher_shop link table
+"""
+import unittest
+import sys
+import os
+from datetime import date, timedelta
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from auth import clear_principal_cache
+from main import app, db, User, VendorShop, Voucher
+from voucher_shops import can_redeem_at_shop, set_voucher_shops
+
+
+class TestVoucherShops(unittest.TestCase):
+    """Test validation and shop listing for restricted and unrestricted vouchers"""
+
+    def setUp(self):
+        app.config["TESTING"] = True
+        self.client = app.test_client()
+        clear_principal_cache()
+        with app.app_context():
+            db.create_all()
+            issuer = User(email="shops-issuer@example.com", password_hash="!", first_name="VCSE", last_name="Org", user_type="vcse")
+            vendor_a = User(email="shops-vendor-a@example.com", password_hash="!", first_name="Vendor", last_name="A", user_type="vendor", is_active=True)
+            vendor_b = User(email="shops-vendor-b@example.com", password_hash="!", first_name="Vendor", last_name="B", user_type="vendor", is_active=True)
+            db.session.add_all([issuer, vendor_a, vendor_b])
+            db.session.flush()
+            shop_a = VendorShop(vendor_id=vendor_a.id, shop_name="Shop A", address="1 High St", postcode="NN9 6GR")
+            shop_b = VendorShop(vendor_id=vendor_b.id, shop_name="Shop B", address="2 High St", postcode="NN8 1AA")
+            db.session.add_all([shop_a, shop_b])
+            db.session.flush()
+
+            expiry = date.today() + timedelta(days=30)
+            restricted = Voucher(code="SHOPONLYA", value=10.0, issued_by=issuer.id, expiry_date=expiry)
+            anywhere = Voucher(code="SHOPANY", value=10.0, issued_by=issuer.id, expiry_date=expiry)
+            db.session.add_all([restricted, anywhere])
+            set_voucher_shops(restricted, [shop_a.id])
+            db.session.commit()
+            self.vendor_a, self.vendor_b = vendor_a.id, vendor_b.id
+            self.shop_a, self.shop_b = shop_a.id, shop_b.id
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def validate(self, vendor_id, code):
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = vendor_id
+        return self.client.post('/api/vendor/validate-voucher', json={'code': code}).json
+
+    def test_restricted_voucher_only_valid_at_linked_shop(self):
+        self.assertTrue(self.validate(self.vendor_a, "SHOPONLYA")['valid'])
+        self.assertFalse(self.validate(self.vendor_b, "SHOPONLYA")['valid'])
+        self.assertTrue(self.validate(self.vendor_b, "SHOPANY")['valid'])
+
+        with app.app_context():
+            voucher = Voucher.query.filter_by(code="SHOPONLYA").first()
+            self.assertFalse(voucher.any_shop)
+            self.assertTrue(can_redeem_at_shop(voucher, self.shop_a))
+            self.assertFalse(can_redeem_at_shop(voucher, self.shop_b))
+
+    def test_available_shops_lists_only_eligible_shops(self):
+        response = self.client.get('/api/vouchers/SHOPONLYA/available-shops')
+        self.assertEqual([s['id'] for s in response.json['available_shops']], [self.shop_a])
+
+        response = self.client.get('/api/vouchers/SHOPANY/available-shops')
+        self.assertEqual([s['id'] for s in response.json['available_shops']], [self.shop_a, self.shop_b])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -16,5 +16,9 @@ rm -rf node_modules/.vite
 
 echo "Building frontend..."
 npm run build
+cd ..
+
+echo "Precompressing frontend assets..."
+python3 backend/scripts/precompress_assets.py frontend/dist
 
 echo "Build complete!"
@@ -3663,6 +3663,8 @@ function AdminSettingsTab({ user }) {
     }
   }, [settingsTab])
 
+  const [loadingMoreLogins, setLoadingMoreLogins] = useState(false)
+
   const loadLoginStats = async () => {
     try {
       const data = await apiCall('/admin/login-stats')
@@ -3672,6 +3674,20 @@ function AdminSettingsTab({ user }) {
     }
   }
 
+  // The endpoint returns one page of users; next_cursor fetches the page after it
+  const loadMoreLoginStats = async () => {
+    if (!loginStats?.next_cursor) return
+    setLoadingMoreLogins(true)
+    try {
+      const data = await apiCall(`/admin/login-stats?cursor=${encodeURIComponent(loginStats.next_cursor)}`)
+      setLoginStats(prev => ({...data, users: [...prev.users, ...data.users]}))
+    } catch (error) {
+      console.error('Error loading more login stats:', error)
+    } finally {
+      setLoadingMoreLogins(false)
+    }
+  }
+
   const loadAdmins = async () => {
     try {
       const data = await apiCall('/admin/admins')
@@ -4021,6 +4037,18 @@ function AdminSettingsTab({ user }) {
                   </tbody>
                 </table>
               </div>
+              <div style={{display: 'flex', justifyContent: 'space-between', alignItems: 'center', marginTop: '20px', color: '#666'}}>
+                <span>Showing {loginStats.users.length} of {loginStats.total_users} users</span>
+                {loginStats.next_cursor && (
+                  <button
+                    onClick={loadMoreLoginStats}
+                    disabled={loadingMoreLogins}
+                    style={{padding: '10px 20px', backgroundColor: '#2196F3', color: 'white', border: 'none', borderRadius: '5px', cursor: loadingMoreLogins ? 'wait' : 'pointer'}}
+                  >
+                    {loadingMoreLogins ? 'Loading...' : 'Load More'}
+                  </button>
+                )}
+              </div>
             </div>
           ) : (
             <p>Loading statistics...</p>
@@ -12,10 +12,13 @@ from pathlib import Path
 backend_path = Path(__file__).parent / 'backend' / 'src'
 sys.path.insert(0, str(backend_path))
 
-from flask import send_from_directory, Response, abort, redirect, request
-import mimetypes
-from main import app, db, Category, User
-from werkzeug.security import generate_password_hash
+from flask import abort, redirect, request
+import logging
+from main import app, db
+from logging_config import log_sampled
+from static_assets import StaticManifest
+
+logger = logging.getLogger('unified_server')
 
 # Configure frontend serving
 # In production (Render), the build is at /opt/render/project/src/frontend/dist
@@ -25,12 +28,15 @@ if os.environ.get('RENDER'):
 else:
     frontend_build = Path(__file__).parent / 'frontend' / 'dist'
 
+# Index the build once; requests are served from memory (restart after a rebuild)
+static_manifest = StaticManifest(frontend_build)
+
 # Redirect middleware to force custom domain
 @app.before_request
 def redirect_to_custom_domain():
     """Redirect from Render domain and old domain to new custom domain"""
-    # Skip redirect for health check endpoint
-    if request.path == '/api/health':
+    # Skip redirect for health checks and metrics scrapes
+    if request.path.startswith(('/api/health', '/api/metrics')):
         return None
     
     host = request.host.lower()
@@ -47,36 +53,19 @@ def redirect_to_custom_domain():
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve_frontend(path):
-    """Serve React frontend with correct MIME types"""
-    # Ensure proper MIME types for JavaScript modules
-    mimetypes.add_type('application/javascript', '.js')
-    mimetypes.add_type('application/javascript', '.mjs')
-    mimetypes.add_type('text/css', '.css')
-    
-    # Debug logging
-    if path and path.endswith('.js'):
-        file_path = frontend_build / path
-        print(f"[SERVE] Requested: {path}")
-        print(f"[SERVE] Looking in: {frontend_build}")
-        print(f"[SERVE] Full path: {file_path}")
-        print(f"[SERVE] Exists: {file_path.exists()}")
-        if file_path.exists():
-            print(f"[SERVE] File size: {file_path.stat().st_size} bytes")
+    """Serve React frontend: hashed bundles as immutable, everything else revalidated"""
+    log_sampled(logger, "Serving frontend path %s", path)
     
-    if path and (frontend_build / path).exists():
-        # Get the file and set correct MIME type
-        file_path = frontend_build / path
-        mime_type, _ = mimetypes.guess_type(str(file_path))
-        response = send_from_directory(str(frontend_build), path)
-        if mime_type:
-            response.headers['Content-Type'] = mime_type
-        # Add cache-busting headers for JavaScript and CSS files
-        if path.endswith(('.js', '.mjs', '.css')):
-            response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-            response.headers['Pragma'] = 'no-cache'
-            response.headers['Expires'] = '0'
-        return response
-    return send_from_directory(str(frontend_build), 'index.html')
+    asset = static_manifest.get(path) if path else None
+    if asset is None:
+        # A missing bundle must not come back as index.html (the browser would run HTML as JS)
+        if path.startswith('assets/'):
+            abort(404)
+        # Client-side routes get the SPA shell
+        asset = static_manifest.index
+        if asset is None:
+            abort(404)
+    return static_manifest.response(asset)
 
 if __name__ == '__main__':
     # Verify frontend build exists
@@ -120,75 +109,11 @@ if __name__ == '__main__':
             except Exception as e:
                 print(f"  - Could not read build details: {e}")
     
-    # Initialize database
-    with app.app_context():
-        print("Initializing database...")
-        db.create_all()
-        
-        # Create default categories if they don't exist
-        if not Category.query.first():
-            categories = [
-                Category(name='Fresh Produce', type='edible', description='Fruits, vegetables, and fresh items'),
-                Category(name='Bakery', type='edible', description='Bread, pastries, and baked goods'),
-                Category(name='Dairy', type='edible', description='Milk, cheese, yogurt, and dairy products'),
-                Category(name='Meat & Fish', type='edible', description='Fresh and frozen meat and fish'),
-                Category(name='Packaged Foods', type='edible', description='Canned, boxed, and packaged items'),
-                Category(name='Non-Food Items', type='non-edible', description='Toiletries, household items, and other essentials')
-            ]
-            db.session.add_all(categories)
-            db.session.commit()
-            print("Database initialized with default categories")
-        else:
-            print("Database already initialized")
-        
-        # Add missing columns to user table (VCSE verification system)
-        try:
-            from sqlalchemy import text, inspect
-            inspector = inspect(db.engine)
-            user_columns = [col['name'] for col in inspector.get_columns('user')]
-            
-            columns_to_add = [
-                ('account_status', "VARCHAR(30) DEFAULT 'ACTIVE'"),
-                ('rejection_reason', "TEXT"),
-                ('verified_at', "TIMESTAMP"),
-                ('verified_by_admin_id', "INTEGER REFERENCES \"user\"(id)")
-            ]
-            
-            for col_name, col_def in columns_to_add:
-                if col_name not in user_columns:
-                    db.session.execute(text(f"ALTER TABLE \"user\" ADD COLUMN {col_name} {col_def}"))
-                    db.session.commit()
-                    print(f"✓ Added column '{col_name}' to user table")
-            
-            print("✓ User table schema updated")
-        except Exception as e:
-            print(f"Note: User table migration: {e}")
-            db.session.rollback()
-        
-        # Create cart_notification table if it doesn't exist
-        try:
-            from sqlalchemy import text
-            db.session.execute(text("""
-                CREATE TABLE IF NOT EXISTS cart_notification (
-                    id SERIAL PRIMARY KEY,
-                    user_id INTEGER NOT NULL,
-                    message TEXT NOT NULL,
-                    type VARCHAR(50) NOT NULL,
-                    surplus_item_id INTEGER,
-                    is_read BOOLEAN DEFAULT FALSE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES "user" (id)
-                )
-            """))
-            db.session.commit()
-            print("✓ cart_notification table created/verified")
-        except Exception as e:
-            print(f"Note: cart_notification table setup: {e}")
-            db.session.rollback()
-        
-        # Note: Admin accounts are now managed through the create_admin_account endpoint
-        # No automatic admin creation on startup to prevent auto-recreation after deletion
-        print("✓ Admin account management: Use /api/create-admin endpoint")
+    # Bring the schema up to date before serving (tables, columns, default categories)
+    sys.path.insert(0, str(Path(__file__).parent / 'backend' / 'migrations'))
+    from migrate import apply_pending
+    if not apply_pending(app, db):
+        sys.exit(1)
     
     port = int(os.environ.get('PORT', 8080))
     print("=" * 60)